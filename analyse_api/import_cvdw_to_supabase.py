@@ -3,7 +3,9 @@ Importa dados do CVDW para tabelas Supabase já criadas (ver supabase_schema.sql
 Usa backoff para 429/500. Ajuste SUPABASE_URL/KEY no ambiente.
 """
 import asyncio
+import hashlib
 import httpx
+import json
 import os
 from supabase import create_client, Client
 
@@ -31,6 +33,13 @@ ENDPOINTS = {
 BACKOFFS = [60, 120, 180, 240, 300]
 PAGE_SIZE = 500
 
+# Tabelas com rollup diário (database/migrations/004) -> campo de data do dia
+ROLLUP_DATE_FIELDS = {
+    "vendas": "data_venda",
+    "reservas": "data_cad",
+    "leads": "data_cad",
+}
+
 
 def get_supabase_client() -> Client:
     url = os.environ["SUPABASE_URL"]
@@ -68,6 +77,15 @@ def chunkify(seq, size):
 
 
 async def import_endpoint(ep: str, table: str, sb: Client):
+    """
+    Importa o endpoint
+
+    Retorna os dias (YYYY-MM-DD) tocados, para o rollup, o checksum do
+    conteúdo importado e o total de registros.
+    """
+    date_field = ROLLUP_DATE_FIELDS.get(table)
+    touched_days = set()
+    digest = hashlib.sha256()
     async with httpx.AsyncClient(timeout=60) as client:
         page = 1
         total_pages = None
@@ -81,11 +99,14 @@ async def import_endpoint(ep: str, table: str, sb: Client):
             # monta objetos com raw; upsert pelo campo chave quando existir
             payload_db = []
             for r in rows:
+                digest.update(json.dumps(r, sort_keys=True, default=str).encode("utf-8"))
                 obj = {"raw": r}
                 # tenta uma chave plausível
                 for key in ("id", "idreserva", "idlead", "idunidade", "idimobiliaria", "idcorretor", "idrepasse", "idpessoa"):
                     if key in r:
                         obj[key] = r[key]
+                if date_field and r.get(date_field):
+                    touched_days.add(str(r[date_field])[:10])
                 payload_db.append(obj)
             # upsert em lotes de 500
             for chunk in chunkify(payload_db, 500):
@@ -97,15 +118,51 @@ async def import_endpoint(ep: str, table: str, sb: Client):
             page += 1
             await asyncio.sleep(1)
         print(f"[{ep}] total importado: {total_records}")
+    return touched_days, digest.hexdigest(), total_records
+
+
+def refresh_rollup(table: str, days, sb: Client):
+    """Recalcula o rollup diário apenas dos dias importados"""
+    if not days:
+        return
+    result = sb.rpc("refresh_rollup_diario", {"p_fato": table, "p_dias": sorted(days)}).execute()
+    print(f"[{table}] rollup diario: {len(days)} dias recalculados ({result.data} linhas)")
+
+
+def publish_data_version(table: str, checksum: str, total: int, sb: Client):
+    """
+    Publica o fim da importação da tabela (database/migrations/005)
+
+    A versão só sobe se o conteúdo mudou; a API então invalida os caches
+    derivados da tabela.
+    """
+    result = sb.rpc(
+        "bump_data_version", {"p_tabela": table, "p_checksum": checksum, "p_linhas": total}
+    ).execute()
+    if result.data:
+        print(f"[{table}] nova versao de dados: {result.data}")
+    else:
+        print(f"[{table}] conteudo inalterado, versao mantida")
 
 
 async def main():
     sb = get_supabase_client()
     for ep, table in ENDPOINTS.items():
         try:
-            await import_endpoint(ep, table, sb)
+            touched_days, checksum, total = await import_endpoint(ep, table, sb)
         except Exception as e:
             print(f"Erro ao importar {ep}: {e}")
+            continue
+        if table in ROLLUP_DATE_FIELDS:
+            try:
+                refresh_rollup(table, touched_days, sb)
+            except Exception as e:
+                print(f"Erro ao atualizar rollup de {table}: {e}")
+                continue
+        try:
+            publish_data_version(table, checksum, total, sb)
+        except Exception as e:
+            print(f"Erro ao publicar versao de {table}: {e}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,172 @@
+-- ============================================================
+-- ROLLUP DIÁRIO INCREMENTAL - VENDAS, RESERVAS E LEADS
+-- Grão: dia × empreendimento × corretor × imobiliária
+-- Execute após 001_performance_optimization.sql
+-- ============================================================
+--
+-- KPIs, tendências e relatórios leem daqui em vez de reagregar as tabelas
+-- RAW. O importador chama refresh_rollup_diario(fato, dias) apenas com os
+-- dias que ele tocou. Clientes distintos são guardados como sketch KMV
+-- (k menores hashes), que pode ser unido entre linhas com kmv_union().
+
+-- ============================================================
+-- 1. SKETCH KMV (CLIENTES DISTINTOS MESCLÁVEIS)
+-- ============================================================
+
+-- Mantém os k menores hashes distintos
+CREATE OR REPLACE FUNCTION kmv_trim(p_hashes bigint[], p_k int DEFAULT 256)
+RETURNS bigint[] AS $$
+    SELECT COALESCE(array_agg(h ORDER BY h), '{}')
+    FROM (
+        SELECT DISTINCT h
+        FROM unnest(p_hashes) AS h
+        WHERE h IS NOT NULL
+        ORDER BY h
+        LIMIT p_k
+    ) s;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION kmv_union_step(p_state bigint[], p_sketch bigint[])
+RETURNS bigint[] AS $$
+    SELECT kmv_trim(COALESCE(p_state, '{}') || COALESCE(p_sketch, '{}'));
+$$ LANGUAGE sql IMMUTABLE;
+
+DROP AGGREGATE IF EXISTS kmv_union(bigint[]);
+CREATE AGGREGATE kmv_union(bigint[]) (
+    SFUNC = kmv_union_step,
+    STYPE = bigint[],
+    INITCOND = '{}'
+);
+
+-- Estimativa de cardinalidade: exata abaixo de k, (k-1)/u_k acima
+CREATE OR REPLACE FUNCTION kmv_estimate(p_sketch bigint[], p_k int DEFAULT 256)
+RETURNS numeric AS $$
+    SELECT CASE
+        WHEN p_sketch IS NULL THEN 0
+        WHEN cardinality(p_sketch) < p_k THEN cardinality(p_sketch)
+        ELSE ROUND((p_k - 1) / ((p_sketch[p_k]::numeric + 9223372036854775808) / 18446744073709551616))
+    END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- ============================================================
+-- 2. TABELA DE ROLLUP
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS rollup_diario (
+    fato text NOT NULL CHECK (fato IN ('vendas', 'reservas', 'leads')),
+    dia date NOT NULL,
+    idempreendimento int NOT NULL DEFAULT 0,
+    idcorretor int NOT NULL DEFAULT 0,
+    idimobiliaria int NOT NULL DEFAULT 0,
+    quantidade bigint NOT NULL DEFAULT 0,
+    valor_total numeric NOT NULL DEFAULT 0,
+    vgv numeric NOT NULL DEFAULT 0,
+    clientes_sketch bigint[] NOT NULL DEFAULT '{}',
+    atualizado_em timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (fato, dia, idempreendimento, idcorretor, idimobiliaria)
+);
+
+CREATE INDEX IF NOT EXISTS idx_rollup_diario_fato_corretor_dia
+ON rollup_diario(fato, idcorretor, dia);
+
+CREATE INDEX IF NOT EXISTS idx_rollup_diario_fato_empreendimento_dia
+ON rollup_diario(fato, idempreendimento, dia);
+
+-- ============================================================
+-- 3. REFRESH INCREMENTAL (APENAS OS DIAS INFORMADOS)
+-- ============================================================
+
+-- p_dias NULL reconstrói o fato inteiro
+CREATE OR REPLACE FUNCTION refresh_rollup_diario(p_fato text, p_dias date[] DEFAULT NULL)
+RETURNS integer AS $$
+DECLARE
+    v_inicio date;
+    v_fim date;
+    v_linhas integer;
+BEGIN
+    IF p_dias IS NOT NULL THEN
+        SELECT MIN(d), MAX(d) + 1 INTO v_inicio, v_fim FROM unnest(p_dias) AS d;
+        IF v_inicio IS NULL THEN
+            RETURN 0;
+        END IF;
+    END IF;
+
+    DELETE FROM rollup_diario
+    WHERE fato = p_fato
+      AND (p_dias IS NULL OR dia = ANY(p_dias));
+
+    IF p_fato = 'vendas' THEN
+        INSERT INTO rollup_diario (fato, dia, idempreendimento, idcorretor, idimobiliaria,
+                                   quantidade, valor_total, vgv, clientes_sketch)
+        SELECT
+            'vendas',
+            data_venda::date,
+            COALESCE(idempreendimento, 0),
+            COALESCE(idcorretor, 0),
+            COALESCE(idimobiliaria, 0),
+            COUNT(*),
+            COALESCE(SUM(valor_contrato), 0),
+            COALESCE(SUM(valor_contrato), 0),
+            kmv_trim(array_agg(hashtextextended(idcliente::text, 0)) FILTER (WHERE idcliente IS NOT NULL))
+        FROM vendas
+        WHERE data_venda IS NOT NULL
+          AND (p_dias IS NULL OR (data_venda >= v_inicio AND data_venda < v_fim AND data_venda::date = ANY(p_dias)))
+        GROUP BY 2, 3, 4, 5;
+
+    ELSIF p_fato = 'reservas' THEN
+        INSERT INTO rollup_diario (fato, dia, idempreendimento, idcorretor, idimobiliaria,
+                                   quantidade, valor_total, vgv, clientes_sketch)
+        SELECT
+            'reservas',
+            data_cad::date,
+            COALESCE(idempreendimento, 0),
+            COALESCE(idcorretor, 0),
+            COALESCE(idimobiliaria, 0),
+            COUNT(*),
+            COALESCE(SUM(valor_contrato), 0),
+            COALESCE(SUM(vgv_tabela), 0),
+            kmv_trim(array_agg(hashtextextended(idcliente::text, 0)) FILTER (WHERE idcliente IS NOT NULL))
+        FROM reservas
+        WHERE data_cad IS NOT NULL
+          AND (p_dias IS NULL OR (data_cad >= v_inicio AND data_cad < v_fim AND data_cad::date = ANY(p_dias)))
+        GROUP BY 2, 3, 4, 5;
+
+    ELSIF p_fato = 'leads' THEN
+        INSERT INTO rollup_diario (fato, dia, idempreendimento, idcorretor, idimobiliaria,
+                                   quantidade, valor_total, vgv, clientes_sketch)
+        SELECT
+            'leads',
+            data_cad::date,
+            COALESCE(idempreendimento_ultimo, 0),
+            COALESCE(idcorretor, 0),
+            COALESCE(idimobiliaria, 0),
+            COUNT(*),
+            0,
+            0,
+            kmv_trim(array_agg(hashtextextended(idlead::text, 0)))
+        FROM leads
+        WHERE data_cad IS NOT NULL
+          AND (p_dias IS NULL OR (data_cad >= v_inicio AND data_cad < v_fim AND data_cad::date = ANY(p_dias)))
+        GROUP BY 2, 3, 4, 5;
+
+    ELSE
+        RAISE EXCEPTION 'Fato invalido para rollup: %', p_fato;
+    END IF;
+
+    GET DIAGNOSTICS v_linhas = ROW_COUNT;
+    RETURN v_linhas;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================
+-- 4. CARGA INICIAL
+-- ============================================================
+
+SELECT refresh_rollup_diario('vendas');
+SELECT refresh_rollup_diario('reservas');
+SELECT refresh_rollup_diario('leads');
+
+-- Verificar
+SELECT fato, COUNT(*) AS linhas, MIN(dia) AS primeiro_dia, MAX(dia) AS ultimo_dia
+FROM rollup_diario
+GROUP BY fato;
@@ -0,0 +1,34 @@
+-- ============================================================
+-- VERSÃO DOS DADOS POR TABELA RAW
+-- Execute após 004_create_rollup_diario.sql
+-- ============================================================
+--
+-- O importador CVDW publica, ao terminar cada tabela, um checksum do
+-- conteúdo importado. A versão só sobe quando o checksum muda. A API
+-- acompanha esta tabela e invalida na hora os caches derivados
+-- (tags table:<tabela>), que por isso podem ter TTL longo.
+
+CREATE TABLE IF NOT EXISTS data_versions (
+    tabela text PRIMARY KEY,
+    versao bigint NOT NULL DEFAULT 0,
+    checksum text,
+    linhas bigint NOT NULL DEFAULT 0,
+    atualizado_em timestamptz NOT NULL DEFAULT now()
+);
+
+-- Retorna a versão atual (incrementada apenas se o checksum mudou)
+CREATE OR REPLACE FUNCTION bump_data_version(p_tabela text, p_checksum text, p_linhas bigint DEFAULT 0)
+RETURNS bigint AS $$
+    INSERT INTO data_versions AS dv (tabela, versao, checksum, linhas, atualizado_em)
+    VALUES (p_tabela, 1, p_checksum, p_linhas, now())
+    ON CONFLICT (tabela) DO UPDATE
+    SET versao = dv.versao + 1,
+        checksum = EXCLUDED.checksum,
+        linhas = EXCLUDED.linhas,
+        atualizado_em = now()
+    WHERE dv.checksum IS DISTINCT FROM EXCLUDED.checksum
+    RETURNING versao;
+$$ LANGUAGE sql;
+
+-- Verificar
+SELECT tabela, versao, linhas, atualizado_em FROM data_versions ORDER BY tabela;
@@ -1,6 +1,8 @@
 """
 Main FastAPI application
 """
+import asyncio
+
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from src.config import get_settings
@@ -62,7 +64,34 @@ app.include_router(agents_router)
 async def startup_event():
     """Initialize the analytics agent on application startup"""
     from src.agents.agno_agent import analytics_agent
+    from src.cache.warming import cache_warmer
+    from src.cache.data_versions import data_version_watcher
+    from src.agents.jobs import job_queue
+    from src.agents.keepalive import model_keepalive
+    from src.agents.tokens import load_encoding
+    from src.supabase_client import supabase_admin_client
+    # The tiktoken encoding may download its BPE file: load it off the event loop
+    await asyncio.to_thread(load_encoding)
     await analytics_agent.initialize()
+    cache_warmer.start()
+    data_version_watcher.start(supabase_admin_client)
+    job_queue.start()
+    model_keepalive.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks (jobs, cache), persist warming frequencies and close LLM connections"""
+    from src.cache.warming import cache_warmer
+    from src.cache.data_versions import data_version_watcher
+    from src.agents.llm_router import llm_router
+    from src.agents.jobs import job_queue
+    from src.agents.keepalive import model_keepalive
+    await model_keepalive.stop()
+    await job_queue.stop()
+    await data_version_watcher.stop()
+    await cache_warmer.stop()
+    await llm_router.close()
 
 
 @app.get("/")
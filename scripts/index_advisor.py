@@ -0,0 +1,98 @@
+"""
+Index advisor: propõe (e opcionalmente cria) índices a partir de pg_stat_statements
+
+Execute:
+    python scripts/index_advisor.py                 # apenas relatório
+    python scripts/index_advisor.py --apply --top 3 # cria os 3 melhores com CONCURRENTLY
+    python scripts/index_advisor.py --slow-log slow_queries.json
+"""
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+
+# Adicionar o diretório raiz ao path
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from dotenv import load_dotenv
+
+from src.database.index_advisor import IndexAdvisor, statements_from_query_monitor
+
+load_dotenv()
+
+try:
+    import psycopg2
+except ImportError:
+    print("ERRO: psycopg2 nao instalado. Use: pip install psycopg2-binary")
+    sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index advisor baseado em pg_stat_statements")
+    parser.add_argument("--limit", type=int, default=50, help="Queries de pg_stat_statements a analisar")
+    parser.add_argument("--min-rows", type=int, default=1000, help="Ignorar tabelas menores que isso")
+    parser.add_argument("--slow-log", help="JSON exportado de /analyses/performance/slow-queries")
+    parser.add_argument("--apply", action="store_true", help="Criar os indices com CREATE INDEX CONCURRENTLY")
+    parser.add_argument("--top", type=int, default=None, help="Com --apply, criar apenas os N melhores")
+    parser.add_argument("--json", action="store_true", help="Saida em JSON")
+    args = parser.parse_args()
+
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        print("ERRO: DATABASE_URL nao encontrada no .env")
+        return False
+
+    extra = []
+    if args.slow_log:
+        payload = json.loads(Path(args.slow_log).read_text(encoding="utf-8"))
+        extra = statements_from_query_monitor(payload.get("fingerprints", []))
+
+    conn = psycopg2.connect(database_url)
+    try:
+        advisor = IndexAdvisor(conn, min_rows=args.min_rows)
+        scan_stats = advisor.table_scan_stats()
+        proposals = advisor.analyze(limit=args.limit, extra_statements=extra)
+
+        if args.json:
+            print(json.dumps({
+                "scan_stats": scan_stats,
+                "proposals": [p.to_dict() for p in proposals]
+            }, ensure_ascii=False, indent=2, default=str))
+        else:
+            print("=" * 80)
+            print("INDEX ADVISOR - pg_stat_statements")
+            print("=" * 80)
+            print()
+            print("[1] Scans sequenciais por tabela:")
+            for table, stats in sorted(scan_stats.items()):
+                print(f"  {table:15} seq_scan={stats['seq_scan']:<8} idx_scan={stats['idx_scan']:<8} "
+                      f"linhas={stats['n_live_tup']}")
+            print()
+            print(f"[2] Indices propostos: {len(proposals)}")
+            for i, p in enumerate(proposals, 1):
+                print(f"  {i}. {p.ddl};")
+                print(f"     queries={p.statements} calls={p.calls} tempo_total={p.total_time_ms:.0f}ms "
+                      f"ganho_estimado={p.estimated_saving_ms:.0f}ms ({p.estimated_benefit_pct}%, {p.estimate_method})")
+            print()
+
+        if args.apply:
+            selected = proposals[:args.top] if args.top else proposals
+            print(f"[3] Criando {len(selected)} indices (CONCURRENTLY)...")
+            for p in selected:
+                try:
+                    advisor.apply(p)
+                    print(f"  [OK] {p.name}")
+                except Exception as e:
+                    conn.rollback()
+                    print(f"  [ERRO] {p.name} -> {e}")
+    finally:
+        conn.close()
+
+    return True
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
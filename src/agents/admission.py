@@ -0,0 +1,139 @@
+"""
+Controle de admissão das chamadas ao LLM
+
+Um único Ollama local atende todo o chat. Antes de cada chamada ao modelo
+a requisição pega uma vaga (limite global de concorrência); sem vaga, espera
+numa fila limitada em que os usuários (ou divisões) são atendidos em
+rodízio, de modo que uma rajada de um usuário não passa na frente dos
+outros. Com a fila cheia a chamada é recusada na hora (429 + Retry-After).
+"""
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+from .monitoring import performance_monitor
+
+
+class AdmissionRejected(Exception):
+    """Fila de LLM cheia; tentar de novo após retry_after segundos"""
+
+    def __init__(self, retry_after: int, queued: int):
+        super().__init__(f"Fila do modelo cheia ({queued} aguardando); tente novamente em {retry_after}s")
+        self.retry_after = retry_after
+        self.queued = queued
+
+
+class LLMAdmissionController:
+    """Limite global de concorrência com fila justa por usuário ou divisão"""
+
+    def __init__(
+        self,
+        max_concurrent: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        fairness: Optional[str] = None
+    ):
+        self.max_concurrent = max_concurrent or int(os.getenv('LLM_MAX_CONCURRENT', '2'))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv('LLM_MAX_QUEUE', '20'))
+        self.fairness = fairness or os.getenv('LLM_FAIRNESS_KEY', 'user')  # user | division
+        self.active = 0
+        self.queued = 0
+        self._queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self._service_s: Deque[float] = deque(maxlen=50)
+        self.admitted = 0
+        self.rejected = 0
+
+    def key_for(self, user_id: Any, permissions: Optional[Dict[str, Any]] = None) -> str:
+        """Chave de justiça da fila: usuário ou divisão"""
+        if self.fairness == 'division':
+            return f"div:{(permissions or {}).get('divisao', 'ALL')}"
+        return f"user:{user_id}"
+
+    def retry_after(self) -> int:
+        """Estimativa (s) até a fila andar: tempo médio de serviço x filas à frente"""
+        avg = sum(self._service_s) / len(self._service_s) if self._service_s else 5.0
+        return max(1, math.ceil(avg * (self.queued + 1) / self.max_concurrent))
+
+    async def acquire(self, key: str) -> None:
+        if self.active < self.max_concurrent and self.queued == 0:
+            self.active += 1
+            self.admitted += 1
+            performance_monitor.record_metric("llm_queue_wait_ms", 0.0)
+            return
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            performance_monitor.increment_counter("llm_admission_rejected")
+            raise AdmissionRejected(self.retry_after(), self.queued)
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append(future)
+        self.queued += 1
+        performance_monitor.record_metric("llm_queue_depth", float(self.queued))
+        start = time.monotonic()
+        try:
+            await future
+        except BaseException:
+            if future.done() and not future.cancelled():
+                self.release()  # vaga já concedida: devolve
+            else:
+                self._discard(key, future)
+            raise
+        self.admitted += 1
+        performance_monitor.record_metric("llm_queue_wait_ms", (time.monotonic() - start) * 1000)
+
+    def release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    def _discard(self, key: str, future: asyncio.Future) -> None:
+        queue = self._queues.get(key)
+        if queue and future in queue:
+            queue.remove(future)
+            self.queued -= 1
+            if not queue:
+                del self._queues[key]
+
+    def _dispatch(self) -> None:
+        """Concede vagas livres em rodízio entre as chaves com fila"""
+        while self.active < self.max_concurrent and self._queues:
+            key, queue = self._queues.popitem(last=False)
+            future = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self._queues[key] = queue  # volta para o fim do rodízio
+            if future.done():
+                continue
+            self.active += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, key: str, timeout: Optional[float] = None):
+        """Vaga para uma chamada ao modelo (usar em volta de cada chamada); a espera conta no timeout"""
+        await asyncio.wait_for(self.acquire(key), timeout=timeout)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_s.append(time.monotonic() - start)
+            self.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'fairness': self.fairness,
+            'active': self.active,
+            'queued': self.queued,
+            'queued_by_key': {key: len(queue) for key, queue in self._queues.items()},
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'wait_ms': performance_monitor.get_metric_stats("llm_queue_wait_ms"),
+            'retry_after_s': self.retry_after(),
+        }
+
+
+# Instância global
+llm_admission = LLMAdmissionController()
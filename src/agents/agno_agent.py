@@ -1,12 +1,11 @@
 """Analytics AI agent using Agno framework."""
 import os
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import UUID
 
 from agno.agent import Agent, RunOutput
 from agno.models.openai import OpenAIChat
-import httpx
 
 from .api_doc_reader import api_doc_reader
 from .analysis_explainer import analysis_explainer, AnalysisExplanation
@@ -16,13 +15,38 @@ from .predictive_insights import predictive_insights
 from .alert_generator import alert_generator
 from .report_summarizer import report_summarizer
 from .cache_manager import cache_manager, conversation_memory
+from ..cache.warming import cache_warmer, WARM_FRESH, WARM_WARMED, WARM_FAILED
+from ..cache.data_versions import ANY_DATA_TAG
 from .monitoring import audit_logger, performance_monitor, usage_tracker
-from .rag_store import RagStore
+from .rag_store import RagStore, RagHit
 from .response_formatter import response_formatter
+from .pipeline import RequestDeadline
+from .llm_router import llm_router
+from .admission import llm_admission, AdmissionRejected
+from .jobs import job_queue
+from .tool_output import tool_output, full_output
+from .prompt_budget import prompt_assembler
+from .keepalive import model_keepalive
+from .tokens import count_tokens
+from .fast_path import FastPathAnswerer
+from .model_router import model_router, ROUTE_RULES
 from ..integrations.sienge.client import SiengeClient
 from ..integrations.cvdw.client import CVDWClient
 from ..config import get_settings
 from ..supabase_client import supabase_admin_client
+from ..auth.permissions import build_permissions, load_user_permissions, permission_tier
+from ..database.aggregations import RawAggregator, AggregationError
+from ..database.rollups import DailyRollups
+from ..database.query_monitor import query_monitor, filter_shape, postgrest_equivalent_sql
+from ..database.raw_tables import (
+    ALLOWED_TABLES,
+    FILTER_COLUMNS,
+    COUNT_MODES,
+    EXACT_COUNT_TTL_SECONDS,
+    date_column,
+    default_count_mode,
+    resolve_projection,
+)
 import time
 import asyncio
 
@@ -38,6 +62,11 @@ class AnalyticsAgent:
         self.explainer = analysis_explainer
         self.chart_gen = chart_generator
         self.rag_store = RagStore()
+        self.aggregator = RawAggregator(supabase_admin_client)
+        self.rollups = DailyRollups(supabase_admin_client)
+        self.fast_path = FastPathAnswerer(self.aggregator)
+        cache_warmer.register("agent_answers", self._warm_answer)
+        self._register_jobs()
 
         # Prefer local Ollama first, then Groq; only use OpenAI if explicitly enabled.
         self.llm = self._setup_llm()
@@ -49,6 +78,7 @@ class AnalyticsAgent:
                 self.find_api_endpoints,
                 self.fetch_data_from_api,
                 self.query_raw_data,
+                self.aggregate_raw_data,
                 self.explain_analysis,
                 self.generate_charts,
                 self.analyze_trends,
@@ -101,11 +131,221 @@ class AnalyticsAgent:
         )
         return None
 
+    async def load_request_state(self, user_id: UUID, query: str) -> Dict[str, Any]:
+        """
+        Carrega histórico e perfil de permissões do usuário com um único
+        round-trip ao cache; com o perfil em cache e sem histórico, busca
+        também a resposta do nível de acesso (compartilhada pelos usuários
+        do mesmo nível).
+        """
+        history, permissions = await cache_manager.get_many([
+            ("conversation", str(user_id)),
+            ("permissions", str(user_id), [f"user:{user_id}"]),
+        ])
+        answer = None
+        if permissions and self._shares_answers(history):
+            answer = await self._cached_answer(permissions, query)
+        return {"history": history, "permissions": permissions, "answer": answer}
+
+    async def handle_chat(
+        self, user_id: UUID, query: str, deadline: Optional[RequestDeadline] = None
+    ) -> Dict[str, Any]:
+        """
+        Entrada do chat: estado em cache, permissões, processamento e cache da resposta.
+
+        A busca RAG (CPU, em thread) começa junto com a leitura do cache e
+        corre em paralelo com a consulta de permissões; o pré-LLM custa o
+        estágio mais lento, não a soma.
+
+        A resposta do nível só é lida e gravada sem histórico: com conversa
+        anterior a resposta depende do contexto do próprio usuário. Um acerto
+        no cache também entra no histórico do usuário.
+        """
+        deadline = deadline or self._new_deadline()
+        model_keepalive.touch()
+        rag_task = asyncio.ensure_future(deadline.run_stage("rag", self._retrieve_rag_context(query, deadline=deadline)))
+
+        state = await deadline.run_stage("cache", self.load_request_state(user_id, query))
+        if state["answer"] is not None:
+            rag_task.cancel()
+            self._record_question(user_id, query, state["permissions"])
+            return await self._serve_cached(user_id, query, state["answer"], state["history"], deadline)
+
+        with deadline.stage("pre_llm"):
+            permissions, rag = await asyncio.gather(
+                deadline.run_stage("permissions", self._resolve_permissions(user_id, state["permissions"])),
+                rag_task,
+            )
+        self._record_question(user_id, query, permissions)
+        shared = self._shares_answers(state["history"])
+        if state["permissions"] is None and shared:
+            # Perfil veio do banco: a resposta do nível ainda não foi consultada
+            answer = await self._cached_answer(permissions, query)
+            if answer is not None:
+                return await self._serve_cached(user_id, query, answer, state["history"], deadline)
+
+        result = await self.process_query(
+            user_id=user_id,
+            query=query,
+            permissions=permissions,
+            history=state["history"] or [],
+            deadline=deadline,
+            rag=rag,
+        )
+        # Respostas degradadas (LLM fora ou sem tempo) ou com contexto do usuário não vão para o cache
+        if shared and result.get("success") and not result.get("pipeline", {}).get("degraded"):
+            await cache_manager.set(
+                "answers", self._answer_cache_key(permissions, query), result, tags=[ANY_DATA_TAG]
+            )
+        return result
+
+    @staticmethod
+    def _shares_answers(history: Optional[List[Dict[str, Any]]]) -> bool:
+        """Respostas do nível só valem para perguntas sem conversa anterior."""
+        return not history
+
+    async def _serve_cached(
+        self, user_id: UUID, query: str, answer: Dict[str, Any],
+        history: Optional[List[Dict[str, Any]]], deadline: RequestDeadline
+    ) -> Dict[str, Any]:
+        """Devolve a resposta do nível e registra o turno no histórico do usuário."""
+        await conversation_memory.save_message(
+            user_id=str(user_id),
+            message=query,
+            response=(answer.get("response") or "")[:500],
+            metadata={"tools_used": answer.get("tools_used") or [], "cached": True},
+            history=history or [],
+        )
+        return {**answer, "cached": True, "pipeline": deadline.report()}
+
+    async def _resolve_permissions(self, user_id: UUID, cached: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return cached or await self.check_user_permissions(user_id)
+
+    def _record_question(self, user_id: UUID, query: str, permissions: Optional[Dict[str, Any]]) -> None:
+        """Conta a pergunta para o cache warming, uma receita por nível de acesso e divisão."""
+        if not permissions:
+            return
+        cache_warmer.record("agent_answers", {
+            "nivel_acesso": permissions.get("nivel_acesso"),
+            "divisao": permissions.get("divisao"),
+            "query": " ".join(query.split()),
+        }, permission_tier(permissions))
+
+    async def _warm_answer(self, params: Dict[str, Any]) -> str:
+        """Pré-calcula a resposta de uma pergunta frequente do nível (válida até o próximo ciclo de warming)."""
+        query = params["query"]
+        tier = permission_tier(params)
+        permissions = build_permissions(f"warming:{tier}", params["nivel_acesso"], params["divisao"])
+        if await self._cached_answer(permissions, query) is not None:
+            return WARM_FRESH
+
+        result = await self.process_query(
+            user_id=permissions["user_id"],
+            query=query,
+            permissions=permissions,
+            history=[],
+            remember=False,
+        )
+        if not result.get("success") or result.get("pipeline", {}).get("degraded"):
+            return WARM_FAILED
+        await cache_manager.set(
+            "answers", self._answer_cache_key(permissions, query), result,
+            ttl=cache_warmer.interval_seconds, tags=[ANY_DATA_TAG]
+        )
+        return WARM_WARMED
+
+    async def _cached_answer(self, permissions: Dict[str, Any], query: str) -> Optional[Dict[str, Any]]:
+        return await cache_manager.get("answers", self._answer_cache_key(permissions, query), tags=[ANY_DATA_TAG])
+
+    def _answer_cache_key(self, permissions: Dict[str, Any], query: str) -> str:
+        """Respostas dependem só do que o nível pode ver: a chave é o nível + a pergunta normalizada."""
+        return cache_manager._hash_key({"tier": permission_tier(permissions), "query": " ".join(query.lower().split())})
+
+    def _new_deadline(self, seconds: Optional[float] = None) -> RequestDeadline:
+        """Deadline de uma requisição de chat (AGENT_REQUEST_DEADLINE_SECONDS, ou `seconds` em jobs)."""
+        return RequestDeadline(
+            seconds or float(os.getenv(
+                "AGENT_REQUEST_DEADLINE_SECONDS", str(self.settings.agent_request_deadline_seconds)
+            )),
+            min_llm_attempt_s=float(os.getenv(
+                "AGENT_LLM_MIN_ATTEMPT_SECONDS", str(self.settings.agent_llm_min_attempt_seconds)
+            )),
+            fallback_reserve_s=float(os.getenv(
+                "AGENT_FALLBACK_RESERVE_SECONDS", str(self.settings.agent_fallback_reserve_seconds)
+            )),
+        )
+
+    def _register_jobs(self) -> None:
+        """Tipos de job assíncrono (POST /agents/jobs)."""
+        job_queue.register("chat", self._job_chat)
+        for kind, tool in (
+            ("trends", self.analyze_trends),
+            ("compare", self.compare_periods),
+            ("forecast", self.forecast_future),
+            ("anomalies", self.detect_anomalies),
+            ("summary", self.create_summary_report),
+            ("charts", self.generate_charts),
+        ):
+            job_queue.register(kind, self._tool_job(tool))
+
+    async def _job_chat(self, user_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Pergunta ao chat sem o limite de uma requisição HTTP (deadline do job)."""
+        deadline = self._new_deadline(job_queue.timeout_seconds)
+        while True:
+            try:
+                return await self.handle_chat(user_id, params["message"], deadline=deadline)
+            except AdmissionRejected as e:
+                # Job pode esperar: tenta de novo quando a fila do modelo andar
+                if deadline.remaining() <= e.retry_after + deadline.fallback_reserve_s:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+    def _tool_job(self, tool):
+        """Executa uma tool de análise como job (saída JSON completa; tools síncronas rodam em thread)."""
+        async def run(user_id: str, params: Dict[str, Any]) -> Any:
+            if params.get("fact"):
+                permissions = await self.check_user_permissions(user_id)
+                if not permissions.get("can_access_cvdw"):
+                    raise PermissionError("Sem permissao para dados do CVDW")
+            with full_output():
+                if asyncio.iscoroutinefunction(tool):
+                    output = await tool(**params)
+                else:
+                    output = await asyncio.to_thread(lambda: tool(**params))  # herda o contexto
+            result = json.loads(output)
+            if isinstance(result, dict) and "erro" in result:
+                raise RuntimeError(result["erro"])
+            return result
+        return run
+
     async def process_query(
-        self, user_id: UUID, query: str, permissions: Dict[str, Any]
+        self,
+        user_id: UUID,
+        query: str,
+        permissions: Dict[str, Any],
+        history: Optional[List[Dict[str, Any]]] = None,
+        deadline: Optional[RequestDeadline] = None,
+        remember: bool = True,
+        rag: Optional[Tuple[List[RagHit], List[str]]] = None
     ) -> Dict[str, Any]:
-        """Processa uma consulta com IA ou fallback baseado em regras."""
-        start_time = time.time()
+        """
+        Processa uma consulta em estágios sob um único deadline:
+        fast path -> rota -> memória -> RAG -> LLM direto -> Agno (opcional) -> fallback por regras.
+
+        Perguntas quantitativas reconhecidas pelo fast path são respondidas
+        com uma agregação, sem LLM; a confiança do match vai em "fast_path".
+        As demais passam pelo model_router: conversa é respondida por regra,
+        perguntas simples vão ao modelo pequeno e o resto ao principal
+        (decisão em "model_route").
+        Cada estágio de LLM faz uma única tentativa; quando o tempo restante
+        não a cobre, a consulta cai direto no fallback. Memória e RAG têm
+        fatias do deadline e, esgotadas, seguem vazios. Toda chamada ao
+        modelo passa pelo controle de admissão (AdmissionRejected = fila
+        cheia). Histórico e RAG já resolvidos (ver handle_chat) podem ser
+        passados prontos.
+        """
+        deadline = deadline or self._new_deadline()
+        fair_key = llm_admission.key_for(user_id, permissions)
 
         context = {
             "user_id": str(user_id),
@@ -121,109 +361,137 @@ class AnalyticsAgent:
         if permissions.get("can_access_powerbi"):
             context["available_apis"].append("Power BI Dashboards")
 
-        # Verificar histórico de conversas
-        conversation_context = conversation_memory.get_context(str(user_id), last_n=2)
-
-        system_prompt = self._build_system_prompt(context)
-        rag_context, rag_sources = self._get_rag_context(query)
-        if rag_context:
-            system_prompt += "\n\nContexto recuperado (RAG):\n" + rag_context
-        if conversation_context and conversation_context != "Sem histórico anterior.":
-            system_prompt += f"\n\nContexto de conversas anteriores:\n{conversation_context}"
-
-        # Tentar caminho direto sem Agno primeiro (evita timeouts e problemas de tool-calls)
-        direct = await self._llm_direct_response(query, system_prompt)
-        if direct:
-            return {
-                "success": True,
-                "response": direct,
-                "tools_used": ["llm_direct"],
-                "explanation": None,
-                "charts": [],
-                "rag_sources": rag_sources if rag_sources else None,
-            }
-
-        use_agno = os.getenv("AGENT_USE_AGNO", "false").lower() in {"1", "true", "yes"}
-
         try:
-            if use_agno and self.agent.model:
-                try:
-                    timeout_s = int(os.getenv("AGENT_LLM_TIMEOUT_SECONDS", str(self.settings.agent_llm_timeout_seconds)))
-                    response: RunOutput = await asyncio.wait_for(
-                        self.agent.arun(query, context=system_prompt),
-                        timeout=timeout_s
-                    )
-
-                    tool_calls = getattr(response, "tool_calls", None) or []
-                    tools_used = [call.function.name for call in tool_calls]
-                    result = {
+            # Estágio: fast path determinístico (sem LLM)
+            with deadline.stage("fast_path"):
+                fast_result, fast_path = await self._fast_path_answer(query, permissions, deadline)
+            # Rota por complexidade: regra, modelo pequeno ou principal
+            route = None
+            if fast_result is None:
+                route = model_router.classify(query)
+                if route.route == ROUTE_RULES:
+                    fast_result = {
                         "success": True,
-                        "response": response.content,
-                        "tools_used": tools_used,
+                        "response": route.reply,
+                        "tools_used": ["rule_chit_chat"],
                         "explanation": None,
                         "charts": [],
-                        "rag_sources": rag_sources if rag_sources else None,
                     }
-
-                    # Registrar métricas
-                    duration_ms = (time.time() - start_time) * 1000
-                    performance_monitor.record_metric("agent_query_time", duration_ms)
-                    performance_monitor.increment_counter("total_agent_queries")
-
-                    # Audit log
-                    audit_logger.log_agent_query(
-                        user_id=str(user_id),
-                        query=query,
-                        tools_used=tools_used,
-                        response_length=len(response.content),
-                        success=True
-                    )
-
-                    # Salvar na memória
-                    conversation_memory.save_message(
-                        user_id=str(user_id),
-                        message=query,
-                        response=response.content[:500],  # Resumo
-                        metadata={"tools_used": tools_used, "duration_ms": duration_ms}
+            if fast_result is not None and rag is None:
+                rag = ([], [])  # resposta não passa pelo LLM; RAG desnecessário
+
+            # Estágios independentes em paralelo: histórico de conversas e RAG
+            if history is None or rag is None:
+                with deadline.stage("pre_llm"):
+                    history, rag = await asyncio.gather(
+                        deadline.run_stage("memory", self._load_history(user_id, history, deadline)),
+                        deadline.run_stage("rag", self._retrieve_rag_context(query, rag, deadline)),
                     )
+            rag_hits, rag_sources = rag
+            # Instruções + RAG (por score) + histórico (recência/relevância) dentro do orçamento de tokens
+            system_prompt, prompt_report, prompt_prefix = "", None, ""
+            if fast_result is None:
+                prompt_prefix, request_block = self._build_system_prompt(context)
+                system_prompt, prompt_report = prompt_assembler.assemble(
+                    prompt_prefix, query, rag_hits, history, suffix=request_block
+                )
 
-                    return result
-                except Exception as e:
-                    # Log detalhado do erro para debug
-                    print(f"[ERROR] LLM falhou: {type(e).__name__}: {e}")
-                    import traceback
-                    traceback.print_exc()
-                    audit_logger.log_error(
-                        user_id=str(user_id),
-                        error_type="agent_processing_error",
-                        error_message=str(e)
+            # Estágio: LLM direto (evita timeouts e problemas de tool-calls do Agno)
+            result = fast_result
+            tools_used: List[str] = list(fast_result["tools_used"]) if fast_result else []
+            direct = None
+            if result is None:
+                with deadline.stage("llm"):
+                    direct = await self._llm_direct_response(
+                        query, system_prompt, deadline=deadline, fair_key=fair_key, prefix=prompt_prefix,
+                        tier=route.llm_tier
                     )
-                    direct = await self._llm_direct_response(query, system_prompt)
-                    if direct:
-                        return {
-                            "success": True,
-                            "response": direct,
-                            "tools_used": ["llm_direct"],
-                            "explanation": None,
-                            "charts": [],
-                            "rag_sources": rag_sources if rag_sources else None,
-                        }
-                    fallback = await self._fallback_process_query(query, context)
-                    fallback["rag_sources"] = rag_sources if rag_sources else None
-                    return fallback
-            direct = await self._llm_direct_response(query, system_prompt)
             if direct:
-                return {
+                tools_used = ["llm_direct"]
+                result = {
                     "success": True,
                     "response": direct,
-                    "tools_used": ["llm_direct"],
+                    "tools_used": tools_used,
                     "explanation": None,
                     "charts": [],
-                    "rag_sources": rag_sources if rag_sources else None,
                 }
-            fallback = await self._fallback_process_query(query, context)
-            fallback["rag_sources"] = rag_sources if rag_sources else None
-            return fallback
+
+            # Estágio: Agno com tools (opcional), apenas se ainda couber no deadline
+            use_agno = os.getenv("AGENT_USE_AGNO", "false").lower() in {"1", "true", "yes"}
+            if result is None and use_agno and self.agent.model:
+                if deadline.llm_budget() <= 0:
+                    deadline.degrade("deadline_before_agno")
+                else:
+                    with deadline.stage("agno"):
+                        try:
+                            budget = deadline.llm_budget()
+                            async with llm_admission.slot(fair_key, timeout=budget):
+                                response: RunOutput = await asyncio.wait_for(
+                                    self.agent.arun(query, context=system_prompt),
+                                    timeout=max(0.1, deadline.llm_budget())
+                                )
+                            tool_calls = getattr(response, "tool_calls", None) or []
+                            tools_used = [call.function.name for call in tool_calls]
+                            result = {
+                                "success": True,
+                                "response": response.content,
+                                "tools_used": tools_used,
+                                "explanation": None,
+                                "charts": [],
+                            }
+                        except AdmissionRejected:
+                            raise
+                        except Exception as e:
+                            print(f"[ERROR] Agno falhou: {type(e).__name__}: {e}")
+                            deadline.degrade("agno_error")
+                            audit_logger.log_error(
+                                user_id=str(user_id),
+                                error_type="agent_processing_error",
+                                error_message=str(e)
+                            )
+
+            # Estágio: fallback por regras
+            if result is None:
+                with deadline.stage("fallback"):
+                    result = await self._fallback_process_query(query, context)
+
+            result["rag_sources"] = rag_sources if rag_sources else None
+            if prompt_report:
+                result["prompt"] = prompt_report
+            result["fast_path"] = fast_path
+            result["model_route"] = route.to_dict() if route else None
+
+            duration_ms = deadline.elapsed() * 1000
+            performance_monitor.record_metric("agent_query_time", duration_ms)
+            performance_monitor.increment_counter("total_agent_queries")
+            route_name = route.route if route else "fast_path"
+            model_router.record(route_name, route.reason if route else "matched", duration_ms)
+            performance_monitor.record_metric(f"agent_query_time_{route_name}", duration_ms)
+            performance_monitor.increment_counter(f"agent_route_{route_name}")
+            if deadline.degraded:
+                performance_monitor.increment_counter("agent_degraded_queries")
+
+            if tools_used:
+                audit_logger.log_agent_query(
+                    user_id=str(user_id),
+                    query=query,
+                    tools_used=tools_used,
+                    response_length=len(result["response"] or ""),
+                    success=True
+                )
+                if remember:
+                    await conversation_memory.save_message(
+                        user_id=str(user_id),
+                        message=query,
+                        response=(result["response"] or "")[:500],  # Resumo
+                        metadata={"tools_used": tools_used, "duration_ms": duration_ms},
+                        history=history
+                    )
+
+            result["pipeline"] = deadline.report()
+            return result
+        except AdmissionRejected:
+            raise
         except Exception as e:
             audit_logger.log_error(
                 user_id=str(user_id),
@@ -232,120 +500,149 @@ class AnalyticsAgent:
             )
             return {"success": False, "error": str(e), "response": f"Erro ao processar consulta: {e}"}
 
-    def _get_rag_context(self, query: str):
+    async def _fast_path_answer(
+        self, query: str, permissions: Dict[str, Any], deadline: RequestDeadline
+    ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """Tenta responder sem LLM; qualquer falha segue para o fluxo normal."""
+        try:
+            result, info = await asyncio.wait_for(
+                self.fast_path.answer(query, permissions), timeout=deadline.budget(0.1)
+            )
+        except asyncio.TimeoutError:
+            result, info = None, {"matched": False, "confidence": None, "reason": "timeout"}
+        except Exception as e:
+            print(f"[WARN] Fast path falhou: {type(e).__name__}: {e}")
+            result, info = None, {"matched": False, "confidence": None, "reason": "error"}
+        performance_monitor.increment_counter(
+            "agent_fast_path_hits" if result is not None else "agent_fast_path_misses"
+        )
+        return result, info
+
+    async def _load_history(
+        self, user_id: UUID, history: Optional[List[Dict[str, Any]]], deadline: RequestDeadline
+    ) -> List[Dict[str, Any]]:
+        if history is not None:
+            return history
+        try:
+            return await asyncio.wait_for(
+                conversation_memory.get_history(str(user_id)), timeout=deadline.budget(0.05)
+            )
+        except asyncio.TimeoutError:
+            deadline.degrade("memory_timeout")
+            return []
+
+    async def _retrieve_rag_context(
+        self,
+        query: str,
+        rag: Optional[Tuple[List[RagHit], List[str]]] = None,
+        deadline: Optional[RequestDeadline] = None
+    ) -> Tuple[List[RagHit], List[str]]:
+        """Busca RAG (BM25, CPU) fora do event loop; sem resposta no orçamento, segue sem RAG."""
+        if rag is not None:
+            return rag
+        if deadline is None:
+            return await asyncio.to_thread(self._get_rag_context, query)
+        try:
+            return await asyncio.wait_for(
+                asyncio.to_thread(self._get_rag_context, query), timeout=deadline.budget(0.1)
+            )
+        except asyncio.TimeoutError:
+            deadline.degrade("rag_timeout")
+            return [], []
+
+    def _get_rag_context(self, query: str) -> Tuple[List[RagHit], List[str]]:
+        """Trechos do RAG (com score) e suas fontes; o corte por tokens fica no prompt_assembler."""
         enabled = os.getenv("RAG_ENABLED", "true").lower() in {"1", "true", "yes"}
         if not enabled:
-            return "", []
+            return [], []
         top_k = int(os.getenv("RAG_TOP_K", "3"))
         try:
             hits = self.rag_store.query(query, top_k=top_k)
         except Exception:
-            return "", []
-        if not hits:
-            return "", []
-        parts = []
-        sources = []
-        for i, hit in enumerate(hits, start=1):
-            parts.append(f"[{i}] {hit.source}\n{hit.text}")
-            sources.append(f"{hit.source}")
-        return "\n\n".join(parts), sources
-
-    async def _llm_direct_response(self, query: str, system_prompt: str, retry_count: int = 2) -> Optional[str]:
-        """
-        Fallback direto para o endpoint OpenAI-compatible (Ollama) quando Agno falhar/timeout.
-        Usa httpx sync em thread para evitar travas no loop async.
-        """
-        if not self.llm:
-            return None
-        base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1").rstrip("/")
-        model = os.getenv("OLLAMA_MODEL", "llama3.2")
-        timeout_s = int(os.getenv("AGENT_LLM_TIMEOUT_SECONDS", str(self.settings.agent_llm_timeout_seconds)))
-
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": query},
-            ],
-            "stream": False,
-        }
+            return [], []
+        return hits, [hit.source for hit in hits]
 
-        def _sync_call(local_timeout: int) -> Optional[str]:
-            with httpx.Client(timeout=local_timeout) as client:
-                resp = client.post(
-                    f"{base_url}/chat/completions",
-                    headers={"Authorization": "Bearer ollama", "Content-Type": "application/json"},
-                    json=payload,
-                )
-                resp.raise_for_status()
-                data = resp.json()
-                choice = data.get("choices", [{}])[0]
-                message = choice.get("message", {}) if isinstance(choice, dict) else {}
-                return message.get("content") or None
+    async def _llm_direct_response(
+        self,
+        query: str,
+        system_prompt: str,
+        retry_count: int = 0,
+        deadline: Optional[RequestDeadline] = None,
+        fair_key: str = "anon",
+        prefix: str = "",
+        tier: str = "main"
+    ) -> Optional[str]:
+        """
+        Chamada direta aos endpoints OpenAI-compatible, sem Agno.
+        O llm_router escolhe o backend (latência/erros recentes), faz
+        failover e, se configurado, hedge entre backends. Cada tentativa
+        espera sua vaga no controle de admissão dentro do próprio timeout.
+
+        Por padrão há uma única tentativa: o failover entre backends já fica
+        no llm_router e, esgotada a tentativa, a consulta segue para o
+        fallback. retry_count > 0 (warm-up) repete na hora, com o mesmo
+        timeout. Com deadline, cada tentativa usa no máximo o tempo que sobra
+        (menos a reserva do fallback) e não há tentativa que ele não pague.
+
+        prefix é a parte fixa do system_prompt, registrada no keep-alive
+        para medir o reuso do KV cache e escolher o prompt dos pings.
+        tier="small" tenta antes o modelo pequeno (ver model_router).
+        """
+        if not llm_router.backends:
+            return None
+        timeout_s = float(os.getenv("AGENT_LLM_TIMEOUT_SECONDS", str(self.settings.agent_llm_timeout_seconds)))
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": query},
+        ]
 
         for attempt in range(retry_count + 1):
+            attempt_timeout = timeout_s
+            if deadline is not None:
+                available = deadline.llm_budget()
+                if available <= 0:
+                    print(f"[WARN] Sem tempo para a tentativa {attempt + 1} ao LLM; seguindo para o fallback")
+                    deadline.degrade("deadline_before_llm" if attempt == 0 else "deadline_during_llm_retries")
+                    return None
+                attempt_timeout = min(timeout_s, available)
             try:
-                print(f"[INFO] Tentativa {attempt + 1}/{retry_count + 1} de chamar Ollama (timeout: {timeout_s}s)...")
-                content = await asyncio.to_thread(_sync_call, timeout_s)
+                print(f"[INFO] Tentativa {attempt + 1}/{retry_count + 1} de chamar o LLM (timeout: {attempt_timeout:.0f}s)...")
+                queued_at = time.monotonic()
+                async with llm_admission.slot(fair_key, timeout=attempt_timeout):
+                    started_at = time.monotonic()
+                    call_timeout = attempt_timeout - (started_at - queued_at)
+                    content, backend = await llm_router.complete(messages, call_timeout, tier=tier)
+                    model_keepalive.record_call(
+                        backend, prefix, count_tokens(system_prompt) + count_tokens(query),
+                        time.monotonic() - started_at
+                    )
                 if content:
-                    print(f"[SUCCESS] Ollama respondeu com sucesso (tentativa {attempt + 1})")
+                    print(f"[SUCCESS] {backend} respondeu com sucesso (tentativa {attempt + 1})")
                 return content or None
-            except httpx.ReadTimeout as e:
+            except asyncio.TimeoutError as e:
                 print(f"[WARN] Timeout na tentativa {attempt + 1}/{retry_count + 1}: {e}")
-                if attempt < retry_count:
-                    timeout_s = int(timeout_s * 1.5)
-                    print(f"[INFO] Aumentando timeout para {timeout_s}s na proxima tentativa...")
-                    await asyncio.sleep(1)
-                else:
-                    print(f"[ERROR] Todas as {retry_count + 1} tentativas falharam com timeout")
-                    return None
+            except AdmissionRejected:
+                raise
             except Exception as e:
                 print(f"[ERROR] LLM direto falhou (tentativa {attempt + 1}): {type(e).__name__}: {e}")
-                if attempt < retry_count:
-                    await asyncio.sleep(1)
-                else:
-                    return None
+        if deadline is not None:
+            deadline.degrade("llm_failed")
         return None
 
-    def _build_system_prompt(self, context: Dict[str, Any]) -> str:
+    def _build_system_prompt(self, context: Dict[str, Any]) -> Tuple[str, str]:
         """
         Constroi o system prompt profissional usando o ResponseFormatter.
         Instrui o agente a responder como um analista de negocios senior.
+
+        Returns:
+            (prefixo fixo do nivel de acesso, bloco variavel da requisicao)
         """
-        return response_formatter.create_system_prompt(context)
+        prefix = response_formatter.system_prompt_prefix(tuple(context["available_apis"]))
+        return prefix, response_formatter.request_context_block(context)
 
     async def check_user_permissions(self, user_id: UUID) -> Dict[str, Any]:
         """Busca permissoes do usuario no Supabase usando service role."""
-        try:
-            user_response = (
-                supabase_admin_client.table("usuarios")
-                .select("*, cargos(nivel_acesso), divisoes(codigo)")
-                .eq("id", str(user_id))
-                .single()
-                .execute()
-            )
-
-            user_data = user_response.data if user_response.data else {}
-            nivel_acesso = user_data.get("cargos", {}).get("nivel_acesso", 1) if user_data.get("cargos") else 1
-            divisao = user_data.get("divisoes", {}).get("codigo", "ALL") if user_data.get("divisoes") else "ALL"
-
-            return {
-                "user_id": user_id,
-                "nivel_acesso": nivel_acesso,
-                "divisao": divisao,
-                "can_access_sienge": nivel_acesso >= 3,
-                "can_access_cvdw": nivel_acesso >= 2,
-                "can_access_powerbi": nivel_acesso >= 2,
-            }
-        except Exception:
-            return {
-                "user_id": user_id,
-                "nivel_acesso": 1,
-                "divisao": "ALL",
-                "can_access_sienge": False,
-                "can_access_cvdw": False,
-                "can_access_powerbi": True,
-            }
+        return await load_user_permissions(user_id)
 
     async def _fallback_process_query(
         self, query: str, context: Dict[str, Any]
@@ -445,7 +742,7 @@ class AnalyticsAgent:
                 }
             )
 
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return tool_output.serialize("find_api_endpoints", result)
 
     async def fetch_data_from_api(
         self, api_name: str, endpoint: str, params: Optional[Dict[str, Any]] = None
@@ -474,7 +771,7 @@ class AnalyticsAgent:
             else:
                 data = {"error": f"API desconhecida: {api_name}"}
 
-            return json.dumps(data, ensure_ascii=False, indent=2)
+            return tool_output.serialize("fetch_data_from_api", data)
 
         except Exception as e:
             return json.dumps({"error": str(e)}, ensure_ascii=False)
@@ -485,7 +782,9 @@ class AnalyticsAgent:
         filters: Optional[Dict[str, Any]] = None,
         limit: int = 50,
         offset: int = 0,
-        order_by: Optional[str] = None
+        order_by: Optional[str] = None,
+        columns: Optional[List[str]] = None,
+        count_mode: Optional[str] = None
     ) -> str:
         """
         Tool: Consulta dados RAW das tabelas internas do Supabase com paginação.
@@ -507,55 +806,61 @@ class AnalyticsAgent:
             limit: Numero maximo de registros (padrao: 50, max: 500)
             offset: Número de registros a pular (para paginação)
             order_by: Coluna para ordenação (ex: "created_at")
+            columns: Colunas a retornar (ex: ["nome", "situacao", "raw->>email"]).
+                     Se omitido, usa a projeção padrão da tabela (sem o blob 'raw')
+            count_mode: 'exact', 'planned' ou 'estimated'. Se omitido, tabelas
+                        grandes usam contagem estimada
 
         Returns:
             JSON string com os dados da tabela e informações de paginação
         """
         # Validação de segurança
-        ALLOWED_TABLES = {
-            'leads', 'vendas', 'reservas', 'unidades',
-            'corretores', 'pessoas', 'imobiliarias', 'repasses'
-        }
-
         if table_name not in ALLOWED_TABLES:
             return json.dumps({
-                "error": f"Tabela invalida. Use uma de: {', '.join(ALLOWED_TABLES)}"
+                "error": f"Tabela invalida. Use uma de: {', '.join(sorted(ALLOWED_TABLES))}"
             }, ensure_ascii=False)
 
         # Limite máximo de segurança
         limit = min(limit, 500)
 
+        count_mode = count_mode or default_count_mode(table_name)
+        if count_mode not in COUNT_MODES:
+            return json.dumps({
+                "error": f"count_mode invalido. Use: {', '.join(sorted(COUNT_MODES))}"
+            }, ensure_ascii=False)
+
         try:
-            # Lista de colunas permitidas para cada tabela (evita injection)
-            ALLOWED_COLUMNS = {
-                'leads': ['ativo', 'cidade', 'estado', 'situacao', 'origem'],
-                'vendas': ['ativo', 'cidade', 'contrato_interno'],
-                'reservas': ['ativo', 'cidade', 'bloco'],
-                'unidades': ['ativo', 'bloco', 'andar', 'etapa'],
-                'corretores': ['ativo', 'ativo_login'],
-                'pessoas': ['ativo', 'cidade', 'estado'],
-                'imobiliarias': ['ativo', 'cidade'],
-                'repasses': ['ativo', 'cidade']
-            }
+            projection = resolve_projection(table_name, columns)
+        except ValueError as e:
+            return json.dumps({"error": str(e)}, ensure_ascii=False)
 
-            # Construir query segura usando métodos do Supabase
-            query = supabase_admin_client.table(table_name).select("*", count='exact')
+        # Aplicar filtros de forma segura (previne SQL injection)
+        allowed = FILTER_COLUMNS.get(table_name, [])
+        for key in (filters or {}):
+            if key not in allowed:
+                return json.dumps({
+                    "error": f"Coluna '{key}' nao permitida para tabela {table_name}. Use: {', '.join(allowed)}"
+                }, ensure_ascii=False)
 
-            # Aplicar filtros de forma segura (previne SQL injection)
-            if filters:
-                allowed = ALLOWED_COLUMNS.get(table_name, [])
+        try:
+            # Contagem exata fica em cache por conjunto de filtros; a importação invalida pela tag da tabela
+            count_key = cache_manager._hash_key({'table': table_name, 'filters': filters or {}})
+            count_tags = [f"table:{table_name}"]
+            cached_count = await cache_manager.get('raw_counts', count_key, tags=count_tags) if count_mode == 'exact' else None
+
+            # Construir query segura usando métodos do Supabase
+            if cached_count is not None:
+                query = supabase_admin_client.table(table_name).select(",".join(projection))
+            else:
+                query = supabase_admin_client.table(table_name).select(",".join(projection), count=count_mode)
 
-                for key, value in filters.items():
-                    if key not in allowed:
-                        return json.dumps({
-                            "error": f"Coluna '{key}' nao permitida para tabela {table_name}. Use: {', '.join(allowed)}"
-                        }, ensure_ascii=False)
-                    query = query.eq(key, value)
+            for key, value in (filters or {}).items():
+                query = query.eq(key, value)
 
             # Aplicar ordenação se especificada
             if order_by:
                 # Validar que a coluna existe
-                allowed_order_cols = ALLOWED_COLUMNS.get(table_name, []) + ['id', 'created_at', 'updated_at']
+                allowed_order_cols = allowed + [date_column(table_name), 'id', 'created_at', 'updated_at']
                 if order_by.lstrip('-') in allowed_order_cols:
                     # Suporta ordenação desc com prefixo '-'
                     if order_by.startswith('-'):
@@ -565,32 +870,105 @@ class AnalyticsAgent:
 
             # Aplicar paginação
             query = query.range(offset, offset + limit - 1)
+            query_start = time.perf_counter()
             result = query.execute()
 
+            explain_sql, explain_params = postgrest_equivalent_sql(
+                table_name, projection, filters, order_by, limit, offset
+            )
+            query_monitor.record(
+                "postgrest",
+                filter_shape(table_name, projection, filters, order_by,
+                             None if cached_count is not None else count_mode),
+                (time.perf_counter() - query_start) * 1000,
+                explain_sql=explain_sql,
+                explain_params=explain_params
+            )
+
             # Filtrar dados sensíveis antes de retornar
             filtered_data = self._filter_sensitive_fields(result.data)
 
             # Obter contagem total para paginação
-            total_count = result.count if hasattr(result, 'count') else len(filtered_data)
+            if cached_count is not None:
+                total_count = cached_count
+            else:
+                total_count = getattr(result, 'count', None)
+                if total_count is None:
+                    total_count = offset + len(filtered_data)
+                elif count_mode == 'exact':
+                    await cache_manager.set(
+                        'raw_counts', count_key, total_count, ttl=EXACT_COUNT_TTL_SECONDS, tags=count_tags
+                    )
 
-            return json.dumps({
+            return tool_output.serialize("query_raw_data", {
                 "table": table_name,
                 "count": len(filtered_data),
                 "total_count": total_count,
+                "total_count_mode": count_mode,
                 "offset": offset,
                 "limit": limit,
                 "has_more": (offset + limit) < total_count,
                 "next_offset": offset + limit if (offset + limit) < total_count else None,
+                "columns": projection,
                 "data": filtered_data,
                 "filters_applied": filters or {},
                 "order_by": order_by
-            }, ensure_ascii=False, indent=2)
+            })
 
         except Exception as e:
             return json.dumps({
                 "error": f"Erro ao consultar {table_name}: {str(e)}"
             }, ensure_ascii=False)
 
+    async def aggregate_raw_data(
+        self,
+        table_name: str,
+        metrics: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        group_by: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: int = 50
+    ) -> str:
+        """
+        Tool: Calcula agregações (contagens, somas, médias) direto no banco.
+
+        Prefira esta tool a query_raw_data para perguntas quantitativas como
+        "quantos leads ativos temos?", "VGV por empreendimento" ou
+        "ticket médio das vendas no mês". Retorna só o resultado agregado.
+
+        Args:
+            table_name: Nome da tabela (leads, vendas, reservas, unidades,
+                        corretores, pessoas, imobiliarias, repasses)
+            metrics: Lista de métricas 'funcao[:coluna]'. Funções: count, sum,
+                     avg, min, max, count_distinct. Ex: ["count", "sum:valor_contrato"]
+            filters: Filtros opcionais como {"ativo": "S"} (lista = IN)
+            group_by: Coluna de agrupamento opcional (ex: "situacao", "empreendimento")
+            start_date: Data inicial (YYYY-MM-DD) sobre a coluna de data da tabela
+            end_date: Data final inclusiva (YYYY-MM-DD)
+            limit: Máximo de grupos retornados (padrao: 50, max: 500)
+
+        Returns:
+            JSON string com as linhas agregadas
+        """
+        try:
+            result = await self.aggregator.aggregate(
+                table_name=table_name,
+                metrics=metrics,
+                filters=filters,
+                group_by=group_by,
+                start_date=start_date,
+                end_date=end_date,
+                limit=limit
+            )
+            return tool_output.serialize("aggregate_raw_data", result)
+        except AggregationError as e:
+            return json.dumps({"error": str(e)}, ensure_ascii=False)
+        except Exception as e:
+            return json.dumps({
+                "error": f"Erro ao agregar {table_name}: {str(e)}"
+            }, ensure_ascii=False)
+
     def _filter_sensitive_fields(self, data: List[Dict]) -> List[Dict]:
         """Remove ou mascara campos sensiveis antes de retornar ao LLM"""
         SENSITIVE_FIELDS = {
@@ -652,14 +1030,18 @@ class AnalyticsAgent:
                 }
             )
 
-        return json.dumps(result, ensure_ascii=False, indent=2)
+        return tool_output.serialize("generate_charts", result)
 
-    def analyze_trends(
+    async def analyze_trends(
         self,
-        data: str,
+        data: Optional[str] = None,
         date_column: str = 'data',
         value_column: str = 'valor',
-        period: str = 'monthly'
+        period: str = 'monthly',
+        fact: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None
     ) -> str:
         """
         Tool: Analisa tendências em dados temporais
@@ -669,31 +1051,37 @@ class AnalyticsAgent:
             date_column: Nome da coluna de data
             value_column: Nome da coluna de valor
             period: Período de agregação ('daily', 'weekly', 'monthly')
+            fact: Se informado (vendas, reservas, leads), carrega a série do
+                  rollup diário em vez de usar `data`
+            start_date/end_date: Período da série do rollup (YYYY-MM-DD)
+            filters: Filtros do rollup (idempreendimento, idcorretor, idimobiliaria)
 
         Returns:
             JSON com análise de tendências
         """
         try:
-            data_list = json.loads(data) if isinstance(data, str) else data
+            data_list = await self._load_series(data, fact, start_date, end_date, period, filters)
             result = trend_analyzer.analyze_sales_trend(
                 data_list,
                 date_column=date_column,
                 value_column=value_column,
                 period=period
             )
-            return json.dumps(result, ensure_ascii=False, indent=2)
+            return tool_output.serialize("analyze_trends", result)
         except Exception as e:
             return json.dumps({"erro": str(e)}, ensure_ascii=False)
 
-    def compare_periods(
+    async def compare_periods(
         self,
-        data: str,
+        data: Optional[str] = None,
         date_column: str = 'data',
         value_column: str = 'valor',
         period1_start: Optional[str] = None,
         period1_end: Optional[str] = None,
         period2_start: Optional[str] = None,
-        period2_end: Optional[str] = None
+        period2_end: Optional[str] = None,
+        fact: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None
     ) -> str:
         """
         Tool: Compara métricas entre dois períodos
@@ -704,12 +1092,21 @@ class AnalyticsAgent:
             value_column: Nome da coluna de valor
             period1_start/end: Datas do primeiro período
             period2_start/end: Datas do segundo período
+            fact: Se informado (vendas, reservas, leads), carrega a série diária
+                  do rollup cobrindo os dois períodos em vez de usar `data`
+            filters: Filtros do rollup (idempreendimento, idcorretor, idimobiliaria)
 
         Returns:
             JSON com análise comparativa
         """
         try:
-            data_list = json.loads(data) if isinstance(data, str) else data
+            bounds = [d for d in (period1_start, period1_end, period2_start, period2_end) if d]
+            data_list = await self._load_series(
+                data, fact,
+                min(bounds) if bounds else None,
+                max(bounds) if bounds else None,
+                'daily', filters
+            )
             result = comparative_analyzer.compare_periods(
                 data_list,
                 date_column=date_column,
@@ -719,16 +1116,21 @@ class AnalyticsAgent:
                 period2_start=period2_start,
                 period2_end=period2_end
             )
-            return json.dumps(result, ensure_ascii=False, indent=2)
+            return tool_output.serialize("compare_periods", result)
         except Exception as e:
             return json.dumps({"erro": str(e)}, ensure_ascii=False)
 
-    def forecast_future(
+    async def forecast_future(
         self,
-        data: str,
+        data: Optional[str] = None,
         date_column: str = 'data',
         value_column: str = 'valor',
-        periods_ahead: int = 3
+        periods_ahead: int = 3,
+        fact: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        period: str = 'monthly',
+        filters: Optional[Dict[str, Any]] = None
     ) -> str:
         """
         Tool: Gera previsões para períodos futuros
@@ -738,28 +1140,38 @@ class AnalyticsAgent:
             date_column: Nome da coluna de data
             value_column: Nome da coluna de valor
             periods_ahead: Quantos períodos prever (padrão: 3)
+            period: Granularidade da série do rollup ('daily', 'weekly', 'monthly')
+            fact: Se informado (vendas, reservas, leads), carrega a série do
+                  rollup diário em vez de usar `data`
+            start_date/end_date: Período da série do rollup (YYYY-MM-DD)
+            filters: Filtros do rollup (idempreendimento, idcorretor, idimobiliaria)
 
         Returns:
             JSON com previsões e intervalos de confiança
         """
         try:
-            data_list = json.loads(data) if isinstance(data, str) else data
+            data_list = await self._load_series(data, fact, start_date, end_date, period, filters)
             result = predictive_insights.forecast_sales(
                 data_list,
                 date_column=date_column,
                 value_column=value_column,
                 periods_ahead=periods_ahead
             )
-            return json.dumps(result, ensure_ascii=False, indent=2)
+            return tool_output.serialize("forecast_future", result)
         except Exception as e:
             return json.dumps({"erro": str(e)}, ensure_ascii=False)
 
-    def detect_anomalies(
+    async def detect_anomalies(
         self,
-        data: str,
+        data: Optional[str] = None,
         date_column: str = 'data',
         value_column: str = 'valor',
-        threshold_std: float = 2.0
+        threshold_std: float = 2.0,
+        fact: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        period: str = 'daily',
+        filters: Optional[Dict[str, Any]] = None
     ) -> str:
         """
         Tool: Detecta anomalias estatísticas nos dados
@@ -769,22 +1181,41 @@ class AnalyticsAgent:
             date_column: Nome da coluna de data
             value_column: Nome da coluna de valor
             threshold_std: Desvios padrão para considerar anomalia (padrão: 2.0)
+            period: Granularidade da série do rollup ('daily', 'weekly', 'monthly')
+            fact: Se informado (vendas, reservas, leads), carrega a série do
+                  rollup diário em vez de usar `data`
+            start_date/end_date: Período da série do rollup (YYYY-MM-DD)
+            filters: Filtros do rollup (idempreendimento, idcorretor, idimobiliaria)
 
         Returns:
             JSON com anomalias detectadas
         """
         try:
-            data_list = json.loads(data) if isinstance(data, str) else data
+            data_list = await self._load_series(data, fact, start_date, end_date, period, filters)
             result = alert_generator.analyze_anomalies(
                 data_list,
                 date_column=date_column,
                 value_column=value_column,
                 threshold_std=threshold_std
             )
-            return json.dumps(result, ensure_ascii=False, indent=2)
+            return tool_output.serialize("detect_anomalies", result)
         except Exception as e:
             return json.dumps({"erro": str(e)}, ensure_ascii=False)
 
+    async def _load_series(
+        self,
+        data: Optional[str],
+        fact: Optional[str],
+        start_date: Optional[str],
+        end_date: Optional[str],
+        period: str,
+        filters: Optional[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """Série das tools de tendência: rollup diário quando `fact` é informado, senão `data`"""
+        if fact:
+            return await self.rollups.series(fact, start_date, end_date, period, filters)
+        return json.loads(data) if isinstance(data, str) else (data or [])
+
     def generate_alerts(
         self,
         current_data: str,
@@ -812,7 +1243,7 @@ class AnalyticsAgent:
                 historical,
                 thresh
             )
-            return json.dumps({"alertas": result}, ensure_ascii=False, indent=2)
+            return tool_output.serialize("generate_alerts", {"alertas": result})
         except Exception as e:
             return json.dumps({"erro": str(e)}, ensure_ascii=False)
 
@@ -837,7 +1268,7 @@ class AnalyticsAgent:
                 data_dict,
                 report_type=report_type
             )
-            return json.dumps(result, ensure_ascii=False, indent=2)
+            return tool_output.serialize("create_summary_report", result)
         except Exception as e:
             return json.dumps({"erro": str(e)}, ensure_ascii=False)
 
@@ -855,10 +1286,15 @@ class AnalyticsAgent:
         if self.llm:
             print("\n[INFO] Fazendo warm-up do modelo LLM...")
             try:
+                # Prefixo do nível mais amplo: já fica no KV cache para as primeiras perguntas
+                warmup_prefix = response_formatter.system_prompt_prefix(
+                    ("Sienge ERP", "CVDW CRM", "Power BI Dashboards")
+                )
                 warmup_response = await self._llm_direct_response(
                     query="ola",
-                    system_prompt="Voce e um assistente. Responda apenas 'ok'.",
-                    retry_count=1
+                    system_prompt=warmup_prefix,
+                    retry_count=1,
+                    prefix=warmup_prefix
                 )
                 if warmup_response:
                     print("[SUCCESS] Modelo LLM aquecido e pronto para uso!")
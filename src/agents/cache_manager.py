@@ -1,222 +1,76 @@
 """
 Sistema de Cache e Memória Contextual para Agentes IA
 """
-import json
-import hashlib
 from typing import Dict, Any, Optional, List
-from datetime import datetime, timedelta
-from collections import OrderedDict
-import os
+from datetime import datetime
 
-
-class InMemoryCache:
-    """Cache em memória com LRU (Least Recently Used) para fallback quando Redis não disponível"""
-
-    def __init__(self, max_size: int = 1000, default_ttl: int = 3600):
-        """
-        Args:
-            max_size: Tamanho máximo do cache
-            default_ttl: TTL padrão em segundos (1 hora por padrão)
-        """
-        self.cache: OrderedDict = OrderedDict()
-        self.max_size = max_size
-        self.default_ttl = default_ttl
-        self.expiry: Dict[str, datetime] = {}
-
-    def get(self, key: str) -> Optional[Any]:
-        """Recupera valor do cache"""
-        # Verificar expiração
-        if key in self.expiry:
-            if datetime.now() > self.expiry[key]:
-                self._delete(key)
-                return None
-
-        # Mover para final (mais recente)
-        if key in self.cache:
-            self.cache.move_to_end(key)
-            return self.cache[key]
-
-        return None
-
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """Armazena valor no cache"""
-        # Remover item mais antigo se cache cheio
-        if len(self.cache) >= self.max_size and key not in self.cache:
-            oldest_key = next(iter(self.cache))
-            self._delete(oldest_key)
-
-        # Adicionar/atualizar item
-        self.cache[key] = value
-        self.cache.move_to_end(key)
-
-        # Definir expiração
-        ttl_seconds = ttl if ttl is not None else self.default_ttl
-        self.expiry[key] = datetime.now() + timedelta(seconds=ttl_seconds)
-
-    def delete(self, key: str) -> None:
-        """Remove item do cache"""
-        self._delete(key)
-
-    def _delete(self, key: str) -> None:
-        """Remoção interna"""
-        if key in self.cache:
-            del self.cache[key]
-        if key in self.expiry:
-            del self.expiry[key]
-
-    def clear(self) -> None:
-        """Limpa todo o cache"""
-        self.cache.clear()
-        self.expiry.clear()
-
-    def get_stats(self) -> Dict[str, Any]:
-        """Retorna estatísticas do cache"""
-        return {
-            'size': len(self.cache),
-            'max_size': self.max_size,
-            'usage_percent': (len(self.cache) / self.max_size) * 100,
-            'items': list(self.cache.keys())[:10]  # Primeiros 10 itens
-        }
-
-
-class RedisCache:
-    """Cache distribuído usando Redis (opcional)"""
-
-    def __init__(self):
-        self.redis_client = None
-        self.redis_enabled = False
-        self._try_connect_redis()
-
-    def _try_connect_redis(self):
-        """Tenta conectar ao Redis"""
-        try:
-            import redis
-            redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
-            self.redis_client = redis.from_url(redis_url, decode_responses=True)
-            # Testar conexão
-            self.redis_client.ping()
-            self.redis_enabled = True
-            print(f"[OK] Redis cache conectado: {redis_url}")
-        except ImportError:
-            print("[INFO] Redis nao instalado. Use: pip install redis")
-            self.redis_enabled = False
-        except Exception as e:
-            print(f"[INFO] Redis nao disponivel: {e}. Usando cache em memoria.")
-            self.redis_enabled = False
-
-    def get(self, key: str) -> Optional[Any]:
-        """Recupera valor do Redis"""
-        if not self.redis_enabled:
-            return None
-
-        try:
-            value = self.redis_client.get(key)
-            if value:
-                return json.loads(value)
-            return None
-        except Exception as e:
-            print(f"Erro ao ler do Redis: {e}")
-            return None
-
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """Armazena valor no Redis"""
-        if not self.redis_enabled:
-            return
-
-        try:
-            serialized = json.dumps(value, ensure_ascii=False)
-            if ttl:
-                self.redis_client.setex(key, ttl, serialized)
-            else:
-                self.redis_client.set(key, serialized)
-        except Exception as e:
-            print(f"Erro ao escrever no Redis: {e}")
-
-    def delete(self, key: str) -> None:
-        """Remove item do Redis"""
-        if not self.redis_enabled:
-            return
-
-        try:
-            self.redis_client.delete(key)
-        except Exception as e:
-            print(f"Erro ao deletar do Redis: {e}")
-
-    def clear_pattern(self, pattern: str) -> None:
-        """Remove todos os itens que correspondem ao padrão"""
-        if not self.redis_enabled:
-            return
-
-        try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                self.redis_client.delete(*keys)
-        except Exception as e:
-            print(f"Erro ao limpar padrão do Redis: {e}")
+from ..cache.tiered import TieredCache, tiered_cache
 
 
 class CacheManager:
-    """Gerenciador de cache híbrido (Redis + In-Memory)"""
+    """Cache do agente sobre o cache em dois níveis compartilhado (L1 + Redis)"""
 
-    def __init__(self):
-        self.redis_cache = RedisCache()
-        self.memory_cache = InMemoryCache(max_size=500, default_ttl=1800)  # 30 min
-        self.cache_prefix = "analytics_agent"
+    def __init__(self, cache: Optional[TieredCache] = None):
+        self.cache = cache or tiered_cache
 
     def _make_key(self, namespace: str, key: str) -> str:
         """Gera chave de cache com namespace"""
-        return f"{self.cache_prefix}:{namespace}:{key}"
+        return self.cache.make_key(namespace, key)
 
     def _hash_key(self, data: Any) -> str:
         """Gera hash para usar como chave"""
-        serialized = json.dumps(data, sort_keys=True, ensure_ascii=False)
-        return hashlib.md5(serialized.encode()).hexdigest()
+        return self.cache.hash_key(data)
 
-    def get(self, namespace: str, key: str) -> Optional[Any]:
+    async def get(self, namespace: str, key: str, tags: Optional[List[str]] = None) -> Optional[Any]:
         """
-        Recupera valor do cache (tenta Redis primeiro, depois memória)
+        Recupera valor do cache (memória do processo, depois Redis)
 
         Args:
             namespace: Namespace do cache ('api', 'query', 'analysis', etc)
             key: Chave do item
+            tags: Tags usadas ao gravar o item (ex: ['table:vendas'])
 
         Returns:
             Valor do cache ou None
         """
-        cache_key = self._make_key(namespace, key)
+        return await self.cache.get(namespace, key, tags=tags)
 
-        # Tentar Redis primeiro
-        if self.redis_cache.redis_enabled:
-            value = self.redis_cache.get(cache_key)
-            if value is not None:
-                return value
+    async def get_many(self, items: List[tuple]) -> List[Optional[Any]]:
+        """
+        Recupera vários (namespace, chave[, tags]) com um único round-trip ao Redis
 
-        # Fallback para memória
-        return self.memory_cache.get(cache_key)
+        Returns:
+            Lista de valores na mesma ordem (None quando ausente)
+        """
+        return await self.cache.get_many(items)
 
-    def set(
+    async def set(
         self,
         namespace: str,
         key: str,
         value: Any,
-        ttl: Optional[int] = None
+        ttl: Optional[int] = None,
+        tags: Optional[List[str]] = None
     ) -> None:
         """
-        Armazena valor no cache (Redis + memória)
+        Armazena valor no cache (memória + Redis)
 
         Args:
             namespace: Namespace do cache
             key: Chave do item
             value: Valor a armazenar
-            ttl: Tempo de vida em segundos (None = padrão)
+            ttl: Tempo de vida em segundos (None = padrão do namespace)
+            tags: Tags de invalidação (ex: ['table:vendas', 'user:<id>'])
         """
-        cache_key = self._make_key(namespace, key)
+        await self.cache.set(namespace, key, value, ttl, tags=tags)
 
-        # Armazenar em ambos
-        if self.redis_cache.redis_enabled:
-            self.redis_cache.set(cache_key, value, ttl)
+    async def set_many(self, items: List[tuple]) -> None:
+        """Armazena vários (namespace, chave, valor, ttl[, tags]) com um único pipeline"""
+        await self.cache.set_many(items)
 
-        self.memory_cache.set(cache_key, value, ttl)
+    async def delete(self, namespace: str, key: str, tags: Optional[List[str]] = None) -> None:
+        """Remove um item do cache"""
+        await self.cache.delete(namespace, key, tags=tags)
 
     def cache_api_call(
         self,
@@ -249,7 +103,7 @@ class CacheManager:
                 cache_key = self._hash_key(cache_data)
 
                 # Tentar obter do cache
-                cached = self.get('api_calls', cache_key)
+                cached = await self.get('api_calls', cache_key)
                 if cached is not None:
                     return cached
 
@@ -257,32 +111,28 @@ class CacheManager:
                 result = await func(*args, **kwargs)
 
                 # Armazenar no cache
-                self.set('api_calls', cache_key, result, ttl)
+                await self.set('api_calls', cache_key, result, ttl)
 
                 return result
 
             return wrapper
         return decorator
 
-    def invalidate_namespace(self, namespace: str) -> None:
+    async def invalidate_namespace(self, namespace: str) -> None:
         """Invalida todos os itens de um namespace"""
-        pattern = f"{self.cache_prefix}:{namespace}:*"
-
-        # Limpar Redis
-        if self.redis_cache.redis_enabled:
-            self.redis_cache.clear_pattern(pattern)
+        await self.cache.invalidate_namespace(namespace)
 
-        # Limpar memória (padrão simples - limpa tudo)
-        # Em produção, seria melhor iterar e deletar seletivamente
-        if namespace in ['api_calls', 'queries']:
-            self.memory_cache.clear()
+    async def invalidate_tags(self, tags: List[str]) -> Dict[str, int]:
+        """Invalida os itens marcados com as tags"""
+        return await self.cache.invalidate_tags(tags)
 
-    def get_stats(self) -> Dict[str, Any]:
+    async def get_stats(self) -> Dict[str, Any]:
         """Retorna estatísticas do cache"""
+        stats = await self.cache.get_stats()
         return {
-            'redis_enabled': self.redis_cache.redis_enabled,
-            'memory_cache': self.memory_cache.get_stats(),
-            'namespaces': ['api_calls', 'queries', 'analysis', 'context']
+            'redis_enabled': stats['l2']['enabled'],
+            'memory_cache': stats['l1'],
+            **stats
         }
 
 
@@ -293,12 +143,13 @@ class ConversationMemory:
         self.cache = cache_manager
         self.max_history = 10  # Máximo de mensagens por usuário
 
-    def save_message(
+    async def save_message(
         self,
         user_id: str,
         message: str,
         response: str,
-        metadata: Optional[Dict] = None
+        metadata: Optional[Dict] = None,
+        history: Optional[List[Dict]] = None
     ) -> None:
         """
         Salva mensagem na memória
@@ -308,8 +159,11 @@ class ConversationMemory:
             message: Mensagem enviada
             response: Resposta gerada
             metadata: Metadados adicionais (data_sources, tools_used, etc)
+            history: Histórico já carregado (evita uma leitura extra)
         """
-        history = self.get_history(user_id) or []
+        if history is None:
+            history = await self.get_history(user_id)
+        history = list(history or [])
 
         # Adicionar nova mensagem
         history.append({
@@ -324,13 +178,13 @@ class ConversationMemory:
             history = history[-self.max_history:]
 
         # Salvar (TTL de 24 horas)
-        self.cache.set('conversation', user_id, history, ttl=86400)
+        await self.cache.set('conversation', user_id, history, ttl=86400)
 
-    def get_history(self, user_id: str) -> Optional[List[Dict]]:
+    async def get_history(self, user_id: str) -> Optional[List[Dict]]:
         """Recupera histórico de conversas do usuário"""
-        return self.cache.get('conversation', user_id)
+        return await self.cache.get('conversation', user_id)
 
-    def get_context(self, user_id: str, last_n: int = 3) -> str:
+    async def get_context(self, user_id: str, last_n: int = 3) -> str:
         """
         Gera contexto das últimas N conversas
 
@@ -341,7 +195,10 @@ class ConversationMemory:
         Returns:
             String com contexto formatado
         """
-        history = self.get_history(user_id)
+        return self.format_context(await self.get_history(user_id), last_n)
+
+    def format_context(self, history: Optional[List[Dict]], last_n: int = 3) -> str:
+        """Formata as últimas N conversas de um histórico já carregado"""
         if not history:
             return "Sem histórico anterior."
 
@@ -354,10 +211,9 @@ class ConversationMemory:
 
         return "\n".join(context_lines)
 
-    def clear_user_history(self, user_id: str) -> None:
+    async def clear_user_history(self, user_id: str) -> None:
         """Limpa histórico de um usuário específico"""
-        self.cache.memory_cache.delete(f"analytics_agent:conversation:{user_id}")
-        self.cache.redis_cache.delete(f"analytics_agent:conversation:{user_id}")
+        await self.cache.delete('conversation', user_id)
 
 
 # Instâncias globais
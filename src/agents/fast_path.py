@@ -0,0 +1,302 @@
+"""
+Fast path determinístico para perguntas quantitativas frequentes.
+
+Perguntas como "Quantos leads ativos temos?" ou "Qual o valor total das
+vendas este mês?" são reconhecidas por padrões em português, compiladas em
+uma agregação sobre as tabelas RAW permitidas (RawAggregator) e respondidas
+sem chamar o LLM. Cada palavra da pergunta precisa ser explicada pelo
+template: sobras reduzem a confiança e, abaixo do limiar (por padrão 1.0,
+nenhuma sobra), a pergunta segue para o fluxo normal com LLM. Negações
+("não", "sem", "exceto") nunca casam: o template não sabe negar.
+"""
+import os
+import re
+import asyncio
+import unicodedata
+from datetime import date, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from .response_formatter import response_formatter
+from ..database.aggregations import RawAggregator, AggregationError
+from ..database.raw_tables import FILTER_COLUMNS, groupable_columns
+
+# Sinônimos -> tabela RAW
+TABLE_PATTERNS = [
+    ('leads', r"\bleads?\b"),
+    ('vendas', r"\bvendas?\b|\bcontratos?\b"),
+    ('reservas', r"\breservas?\b"),
+    ('unidades', r"\bunidades?\b|\bimoveis\b|\bapartamentos?\b"),
+    ('corretores', r"\bcorretor(?:es)?\b"),
+    ('pessoas', r"\bpessoas?\b|\bclientes?\b"),
+    ('imobiliarias', r"\bimobiliarias?\b"),
+    ('repasses', r"\brepasses?\b"),
+]
+
+INTENT_PATTERNS = [
+    ('sum', r"\b(?:qual|quanto)(?: e| foi)?(?: o)? (?:valor|montante) total\b|\bvalor total\b"
+            r"|\bsoma (?:do|dos) valor(?:es)?\b|\bfaturamento total\b"),
+    ('avg', r"\b(?:qual|quanto)(?: e| foi)?(?: o)? (?:valor|ticket) medio\b|\b(?:valor|ticket) medio\b"),
+    ('count', r"\bquant[oa]s\b"),
+]
+
+# Coluna de valor usada em soma/média
+VALUE_COLUMNS = {'vendas': 'valor_contrato', 'reservas': 'valor_contrato', 'unidades': 'valor'}
+
+# Dimensão falada -> colunas candidatas (a primeira permitida na tabela)
+GROUP_DIMENSIONS = {
+    'situacao': ['situacao', 'idsituacao'],
+    'corretor': ['corretor', 'idcorretor'],
+    'empreendimento': ['empreendimento', 'idempreendimento', 'idempreendimento_ultimo'],
+    'imobiliaria': ['imobiliaria', 'idimobiliaria'],
+    'cidade': ['cidade'],
+    'estado': ['estado'],
+    'origem': ['origem'],
+    'bloco': ['bloco'],
+    'andar': ['andar'],
+    'etapa': ['etapa'],
+    'tipologia': ['tipologia'],
+    'regiao': ['regiao'],
+}
+_GROUP_RE = re.compile(r"\b(?:por|em cada|de cada|para cada) (" + "|".join(GROUP_DIMENSIONS) + r")\b")
+
+_ACTIVE_RE = re.compile(r"\b(in)?ativ[oa]s?\b")
+
+_NEGATION_RE = re.compile(r"\b(?:nao|sem|exceto|nenhum|nenhuma|nunca)\b")
+
+# "Agora" falado (removido antes do período: "hoje em dia" não é "hoje")
+_NOW_RE = re.compile(r"\b(?:atualmente|hoje em dia|no momento)\b")
+
+# Verbos/particípios neutros (não mudam a consulta)
+_NEUTRAL_RE = re.compile(
+    r"\b(?:realizad[oa]s|feit[oa]s|cadastrad[oa]s|registrad[oa]s|parceir[oa]s|"
+    r"temos|tem|ha|existem|existe|foram|foi|sao|estao|esta|possuimos)\b"
+)
+
+_STOPWORDS = {
+    'o', 'a', 'os', 'as', 'de', 'do', 'da', 'dos', 'das', 'no', 'na', 'nos', 'nas',
+    'em', 'e', 'que', 'um', 'uma', 'ao', 'aos', 'me', 'nosso', 'nossa', 'nossos',
+    'nossas', 'la', 'ja', 'ate', 'agora', 'total', 'ai',
+}
+
+
+def normalize_question(text: str) -> str:
+    """Minúsculas, sem acentos e sem pontuação"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(re.sub(r"[^a-z0-9 ]", " ", text).split())
+
+
+def _month_bounds(day: date) -> Tuple[date, date]:
+    start = day.replace(day=1)
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+def parse_period(text: str, today: Optional[date] = None) -> Tuple[Optional[Tuple[date, date]], str]:
+    """
+    Período falado -> (início, fim) inclusivos
+
+    Returns:
+        (período ou None, texto sem a expressão reconhecida)
+    """
+    today = today or date.today()
+    patterns = [
+        (r"\bultim[oa]s (\d{1,3}) dias\b", lambda m: (today - timedelta(days=int(m.group(1)) - 1), today)),
+        (r"\b(?:neste|nesse|este|esse) mes\b", lambda m: (today.replace(day=1), today)),
+        (r"\bmes passado\b", lambda m: _month_bounds(today.replace(day=1) - timedelta(days=1))),
+        (r"\b(?:nesta|nessa|esta|essa) semana\b", lambda m: (today - timedelta(days=today.weekday()), today)),
+        (r"\b(?:neste|nesse|este|esse) ano\b", lambda m: (today.replace(month=1, day=1), today)),
+        (r"\bano passado\b", lambda m: (date(today.year - 1, 1, 1), date(today.year - 1, 12, 31))),
+        (r"\bontem\b", lambda m: (today - timedelta(days=1), today - timedelta(days=1))),
+        (r"\bhoje\b", lambda m: (today, today)),
+        (r"\b(?:em|de|no ano de) (20\d{2})\b", lambda m: (date(int(m.group(1)), 1, 1), date(int(m.group(1)), 12, 31))),
+    ]
+    for pattern, build in patterns:
+        match = re.search(pattern, text)
+        if match:
+            return build(match), text[:match.start()] + ' ' + text[match.end():]
+    return None, text
+
+
+class FastPathMatch:
+    """Consulta compilada a partir de uma pergunta reconhecida"""
+
+    def __init__(self, template: str, confidence: float, query: Dict[str, Any]):
+        self.template = template
+        self.confidence = confidence
+        self.query = query
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'template': self.template, 'confidence': self.confidence, 'query': self.query}
+
+
+class FastPathAnswerer:
+    """Reconhece perguntas quantitativas e responde com uma agregação, sem LLM"""
+
+    def __init__(self, aggregator: RawAggregator):
+        self.aggregator = aggregator
+        self.min_confidence = float(os.getenv('AGENT_FAST_PATH_MIN_CONFIDENCE', '1.0'))
+        self.enabled = os.getenv('AGENT_FAST_PATH_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+
+    def match(self, question: str, today: Optional[date] = None) -> Tuple[Optional[FastPathMatch], float]:
+        """
+        Compila a pergunta em uma agregação
+
+        Returns:
+            (match ou None, confiança); a confiança é a fração das palavras
+            relevantes explicadas pelo template (0 sem intenção ou tabela)
+        """
+        text = normalize_question(question)
+        content_words = [w for w in text.split() if w not in _STOPWORDS]
+        if not content_words or _NEGATION_RE.search(text):
+            return None, 0.0
+
+        intent = None
+        for name, pattern in INTENT_PATTERNS:
+            found = re.search(pattern, text)
+            if found:
+                intent = name
+                text = text[:found.start()] + ' ' + text[found.end():]
+                break
+
+        tables = []
+        for table, pattern in TABLE_PATTERNS:
+            if re.search(pattern, text):
+                tables.append(table)
+                text = re.sub(pattern, ' ', text)
+        if intent is None or len(tables) != 1:
+            return None, 0.0
+        table = tables[0]
+
+        filters: Dict[str, Any] = {}
+        active = _ACTIVE_RE.search(text)
+        if active:
+            if 'ativo' not in FILTER_COLUMNS.get(table, []):
+                return None, 0.0
+            filters['ativo'] = 'N' if active.group(1) else 'S'
+            text = _ACTIVE_RE.sub(' ', text, count=1)
+
+        group_by = None
+        grouped = _GROUP_RE.search(text)
+        if grouped:
+            allowed = groupable_columns(table)
+            group_by = next((c for c in GROUP_DIMENSIONS[grouped.group(1)] if c in allowed), None)
+            if group_by is None:
+                return None, 0.0
+            text = text[:grouped.start()] + ' ' + text[grouped.end():]
+
+        text = _NOW_RE.sub(' ', text)
+        if filters and re.search(r"\bhoje\b", text):
+            # "ativos hoje" pergunta pelo estado atual, não pelos cadastrados no dia
+            return None, 0.0
+        period, text = parse_period(text, today)
+
+        if intent == 'count':
+            metric = 'count'
+        elif table in VALUE_COLUMNS:
+            metric = f"{intent}:{VALUE_COLUMNS[table]}"
+        else:
+            return None, 0.0
+
+        text = _NEUTRAL_RE.sub(' ', text)
+        leftover = [w for w in text.split() if w not in _STOPWORDS]
+        confidence = round(0.5 + 0.5 * (1 - len(leftover) / len(content_words)), 3)
+
+        query = {
+            'table_name': table,
+            'metrics': [metric],
+            'filters': filters,
+            'group_by': group_by,
+            'start_date': period[0].isoformat() if period else None,
+            'end_date': period[1].isoformat() if period else None,
+        }
+        template = ':'.join(p for p in (intent, table, group_by and f"por_{group_by}") if p)
+        return FastPathMatch(template, confidence, query), confidence
+
+    async def answer(self, question: str, permissions: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Responde a pergunta se ela casar com um template acima do limiar
+
+        Returns:
+            (resposta no formato do agente ou None, metadados do fast path)
+        """
+        if not self.enabled:
+            return None, {'matched': False, 'confidence': 0.0}
+
+        matched, confidence = self.match(question)
+        info: Dict[str, Any] = {'matched': False, 'confidence': confidence}
+        if matched is None or confidence < self.min_confidence:
+            return None, info
+        info['template'] = matched.template
+        if not permissions.get('can_access_cvdw'):
+            info['reason'] = 'sem_permissao_cvdw'
+            return None, info
+
+        try:
+            result, total = await self._run(matched.query)
+        except AggregationError as e:
+            info['reason'] = str(e)
+            return None, info
+
+        info['matched'] = True
+        return {
+            'success': True,
+            'response': self._format(question, matched, result, total),
+            'tools_used': ['fast_path'],
+            'explanation': None,
+            'charts': [],
+            'data': result,
+            'confidence': confidence,
+        }, info
+
+    async def _run(self, query: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Executa a agregação (até 20 grupos)
+
+        Com agrupamento, contagens e somas também rodam sem group_by em
+        paralelo: o total não pode vir da soma dos grupos retornados, que
+        para no limite.
+
+        Returns:
+            (resultado, resultado sem agrupamento ou None)
+        """
+        grouped = self.aggregator.aggregate(**query, limit=20)
+        if not query['group_by'] or query['metrics'][0].partition(':')[0] not in ('count', 'sum'):
+            return await grouped, None
+        return tuple(await asyncio.gather(
+            grouped, self.aggregator.aggregate(**{**query, 'group_by': None}, limit=1)
+        ))
+
+    def _format(
+        self, question: str, matched: FastPathMatch, result: Dict[str, Any],
+        total: Optional[Dict[str, Any]] = None
+    ) -> str:
+        query = matched.query
+        metric = query['metrics'][0]
+        func, _, column = metric.partition(':')
+        key = 'count' if func == 'count' else ('valor_total' if func == 'sum' else 'valor_medio')
+        alias = 'count' if func == 'count' else f"{func}_{column}"
+
+        def value_of(row: Dict[str, Any]) -> Any:
+            value = row.get(alias) or 0
+            return int(value) if func == 'count' else round(float(value), 2)
+
+        rows = result.get('rows') or []
+        if query['group_by']:
+            groups = {str(row.get(query['group_by']) or 'Nao informado'): value_of(row) for row in rows}
+            data: Dict[str, Any] = {query['group_by']: groups}
+            if total is not None:
+                total_rows = total.get('rows') or []
+                data = {key: value_of(total_rows[0]) if total_rows else 0, **data}
+        else:
+            data = {key: value_of(rows[0]) if rows else 0}
+
+        details = [f"Tabela consultada: {query['table_name']}"]
+        if query['filters'].get('ativo'):
+            details.append("Apenas registros ativos" if query['filters']['ativo'] == 'S' else "Apenas registros inativos")
+        if query['start_date']:
+            details.append(f"Período: {query['start_date']} a {query['end_date']}")
+        if query['group_by'] and len(rows) >= 20:
+            details.append("Mostrando os 20 maiores grupos")
+
+        return response_formatter.format_business_response(question=question, data=data, insights=details)
@@ -0,0 +1,369 @@
+"""
+Jobs assíncronos do agente
+
+Análises pesadas (tendências, previsões, sumários, gráficos ou uma pergunta
+ao chat sem limite de request) viram um job: POST /agents/jobs devolve o id
+na hora e workers em background executam com limite de concorrência. Jobs
+e resultados ficam numa fila SQLite local e o resultado expira após um TTL.
+Cada job em execução tem dono (o processo que o pegou) e heartbeat; só
+jobs sem heartbeat recente voltam para a fila, então um worker ainda vivo
+nunca perde o job para outro processo que acabou de subir. O cliente
+acompanha por polling ou SSE.
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import asyncio
+import threading
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# (user_id, params) -> resultado serializável em JSON
+JobHandler = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+FINAL_STATUSES = {JOB_DONE, JOB_FAILED}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL,
+    owner TEXT,
+    heartbeat_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+CREATE INDEX IF NOT EXISTS jobs_user ON jobs (user_id, created_at);
+"""
+
+# Colunas adicionadas depois da primeira versão (bancos já existentes)
+_MIGRATIONS = {
+    'owner': "ALTER TABLE jobs ADD COLUMN owner TEXT",
+    'heartbeat_at': "ALTER TABLE jobs ADD COLUMN heartbeat_at REAL",
+}
+
+
+class JobRejected(Exception):
+    """Job recusado (tipo desconhecido ou limite de jobs pendentes do usuário)"""
+
+
+class JobStore:
+    """Fila e resultados persistidos em SQLite (acesso serializado por lock)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for column, ddl in _MIGRATIONS.items():
+                if column not in columns:
+                    self._conn.execute(ddl)
+        return self._conn
+
+    def execute(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._db().execute(sql, params).fetchall()
+
+    def claim_next(self, owner: str) -> Optional[sqlite3.Row]:
+        """Marca o job mais antigo da fila como em execução por `owner` e o retorna"""
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (JOB_QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    now = time.time()
+                    db.execute(
+                        "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1, "
+                        "owner = ?, heartbeat_at = ? WHERE id = ?",
+                        (JOB_RUNNING, now, owner, now, row['id'])
+                    )
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+            return row
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class JobQueue:
+    """Recebe jobs, executa em workers e guarda o resultado com TTL"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.store = JobStore(path or os.getenv('AGENT_JOBS_DB_PATH', 'data/agent_jobs.sqlite3'))
+        self.workers = max(1, int(os.getenv('AGENT_JOB_WORKERS', '2')))
+        self.timeout_seconds = float(os.getenv('AGENT_JOB_TIMEOUT_SECONDS', '600'))
+        self.result_ttl_seconds = int(os.getenv('AGENT_JOB_RESULT_TTL_SECONDS', '3600'))
+        self.max_pending_per_user = int(os.getenv('AGENT_JOB_MAX_PENDING_PER_USER', '5'))
+        self.max_attempts = int(os.getenv('AGENT_JOB_MAX_ATTEMPTS', '2'))
+        self.heartbeat_seconds = float(os.getenv('AGENT_JOB_HEARTBEAT_SECONDS', '15'))
+        self.stale_seconds = float(os.getenv('AGENT_JOB_STALE_SECONDS', '60'))
+        # Dono dos jobs pegos por este processo
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.handlers: Dict[str, JobHandler] = {}
+        self.completed = 0
+        self.failed = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._changed: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        """Registra como executar um tipo de job"""
+        self.handlers[kind] = handler
+
+    def _notify(self) -> None:
+        """Acorda workers e quem acompanha jobs (SSE)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = asyncio.Event()
+
+    async def submit(self, user_id: str, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Enfileira um job
+
+        Raises:
+            JobRejected: tipo desconhecido ou usuário com jobs pendentes demais
+        """
+        if kind not in self.handlers:
+            raise JobRejected(f"Tipo de job invalido. Use: {', '.join(sorted(self.handlers))}")
+        pending = await asyncio.to_thread(
+            self.store.execute,
+            "SELECT COUNT(*) AS n FROM jobs WHERE user_id = ? AND status IN (?, ?)",
+            (str(user_id), JOB_QUEUED, JOB_RUNNING)
+        )
+        if pending[0]['n'] >= self.max_pending_per_user:
+            raise JobRejected(f"Limite de {self.max_pending_per_user} jobs pendentes por usuario atingido")
+
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(
+            self.store.execute,
+            "INSERT INTO jobs (id, user_id, kind, params, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, str(user_id), kind, json.dumps(params, default=str), JOB_QUEUED, time.time())
+        )
+        self._notify()
+        return await self.get(job_id, user_id)
+
+    async def get(self, job_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Job e resultado (None se não existe, expirou ou é de outro usuário)"""
+        rows = await asyncio.to_thread(self.store.execute, "SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        row = rows[0]
+        if user_id is not None and row['user_id'] != str(user_id):
+            return None
+        if row['expires_at'] is not None and row['expires_at'] < time.time():
+            return None
+        return self._to_dict(row)
+
+    async def list_for_user(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        rows = await asyncio.to_thread(
+            self.store.execute,
+            "SELECT * FROM jobs WHERE user_id = ? AND (expires_at IS NULL OR expires_at >= ?) "
+            "ORDER BY created_at DESC LIMIT ?",
+            (str(user_id), time.time(), limit)
+        )
+        return [self._to_dict(row, include_result=False) for row in rows]
+
+    async def wait_for_change(self, timeout: float) -> bool:
+        """Espera alguma mudança de status para o stream SSE; False se o timeout venceu antes"""
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def _to_dict(self, row: sqlite3.Row, include_result: bool = True) -> Dict[str, Any]:
+        job = {
+            'job_id': row['id'],
+            'kind': row['kind'],
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+            'expires_at': row['expires_at'],
+            'error': row['error'],
+        }
+        if include_result:
+            job['result'] = json.loads(row['result']) if row['result'] else None
+        return job
+
+    async def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        """Grava o resultado, se o job ainda for deste processo (pode ter sido recuperado por outro)"""
+        now = time.time()
+        updated = await asyncio.to_thread(
+            self.store.execute,
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ? "
+            "WHERE id = ? AND owner = ? RETURNING id",
+            (status, json.dumps(result, default=str) if result is not None else None,
+             error, now, now + self.result_ttl_seconds, job_id, self.owner)
+        )
+        if len(updated) != 1:
+            print(f"[WARN] Job {job_id} não pertence mais a {self.owner}; resultado descartado")
+            return
+        if status == JOB_DONE:
+            self.completed += 1
+        else:
+            self.failed += 1
+        self._notify()
+
+    async def _run(self, row: sqlite3.Row) -> None:
+        handler = self.handlers.get(row['kind'])
+        if handler is None:
+            await self._finish(row['id'], JOB_FAILED, error=f"Tipo de job sem handler: {row['kind']}")
+            return
+        self._notify()  # queued -> running
+        heartbeat = asyncio.ensure_future(self._heartbeat(row['id']))
+        try:
+            result = await asyncio.wait_for(
+                handler(row['user_id'], json.loads(row['params'])), timeout=self.timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            await self._finish(row['id'], JOB_FAILED, error=f"Tempo limite de {self.timeout_seconds:.0f}s excedido")
+        except Exception as e:
+            print(f"Erro no job {row['id']} ({row['kind']}): {e}")
+            await self._finish(row['id'], JOB_FAILED, error=str(e))
+        else:
+            await self._finish(row['id'], JOB_DONE, result=result)
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        """Renova o heartbeat do job enquanto ele roda"""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                await asyncio.to_thread(
+                    self.store.execute,
+                    "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND owner = ?",
+                    (time.time(), job_id, self.owner)
+                )
+            except Exception as e:
+                print(f"Erro ao renovar heartbeat do job {job_id}: {e}")
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                row = await asyncio.to_thread(self.store.claim_next, self.owner)
+            except Exception as e:
+                print(f"Erro ao ler a fila de jobs: {e}")
+                row = None
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=30)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(self.recover)
+                    await asyncio.to_thread(self.purge_expired)
+                continue
+            await self._run(row)
+
+    def recover(self) -> int:
+        """
+        Devolve à fila os jobs cujo worker parou (sem heartbeat há mais de
+        AGENT_JOB_STALE_SECONDS), ou falha os que já estouraram as
+        tentativas; jobs com heartbeat recente seguem com o dono
+
+        Returns:
+            Quantidade de jobs devolvidos à fila
+        """
+        now = time.time()
+        stale_before = now - self.stale_seconds
+        self.store.execute(
+            "UPDATE jobs SET status = ?, error = ?, finished_at = ?, expires_at = ?, owner = NULL "
+            "WHERE status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?) AND attempts >= ?",
+            (JOB_FAILED, "Interrompido: worker parou de responder", now, now + self.result_ttl_seconds,
+             JOB_RUNNING, stale_before, self.max_attempts)
+        )
+        requeued = self.store.execute(
+            "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, heartbeat_at = NULL "
+            "WHERE status = ? AND (heartbeat_at IS NULL OR heartbeat_at < ?) RETURNING id",
+            (JOB_QUEUED, JOB_RUNNING, stale_before)
+        )
+        return len(requeued)
+
+    def purge_expired(self) -> int:
+        return len(self.store.execute(
+            "DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ? RETURNING id", (time.time(),)
+        ))
+
+    def start(self) -> None:
+        """Recupera a fila e inicia os workers (chamar no startup da aplicação)"""
+        if self._tasks:
+            return
+        requeued = self.recover()
+        self.purge_expired()
+        if requeued:
+            print(f"{requeued} job(s) interrompido(s) devolvido(s) a fila")
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._changed = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Para os workers e devolve à fila os jobs deste processo que estavam rodando"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(
+            self.store.execute,
+            "UPDATE jobs SET status = ?, started_at = NULL, owner = NULL, heartbeat_at = NULL "
+            "WHERE status = ? AND owner = ?",
+            (JOB_QUEUED, JOB_RUNNING, self.owner)
+        )
+        self.store.close()
+
+    async def get_stats(self) -> Dict[str, Any]:
+        rows = await asyncio.to_thread(
+            self.store.execute, "SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"
+        )
+        counts = {row['status']: row['n'] for row in rows}
+        return {
+            'workers': self.workers,
+            'kinds': sorted(self.handlers),
+            'by_status': counts,
+            'completed': self.completed,
+            'failed': self.failed,
+            'result_ttl_seconds': self.result_ttl_seconds,
+            'owner': self.owner,
+            'stale_seconds': self.stale_seconds,
+        }
+
+
+# Instância global
+job_queue = JobQueue()
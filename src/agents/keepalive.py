@@ -0,0 +1,174 @@
+"""
+Modelo sempre quente: keep-alive por tráfego e reuso do prefixo do prompt
+
+O Ollama descarrega o modelo após alguns minutos ocioso (OLLAMA_KEEP_ALIVE,
+5 min por padrão) e a próxima pergunta paga o cold start. Enquanto houver
+tráfego recente (AGENT_KEEPALIVE_ACTIVE_SECONDS), um ping mínimo é enviado
+aos backends locais antes do modelo ser descarregado, usando o prefixo de
+prompt mais frequente, que assim continua no KV cache do servidor.
+
+Também mede os efeitos: cold starts (chamada após o modelo ter ficado
+ocioso além do limite) e o prefill economizado quando uma chamada repete o
+prefixo da anterior no mesmo backend (ms por token com e sem reuso).
+"""
+import os
+import time
+import asyncio
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Optional
+
+from .llm_router import LLMRouter, llm_router
+from .admission import llm_admission
+from .tokens import count_tokens
+
+
+class _LatencyPerToken:
+    """Média móvel de ms por token de prompt"""
+
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self.value: Optional[float] = None
+        self.samples = 0
+
+    def add(self, ms_per_token: float) -> None:
+        self.samples += 1
+        self.value = ms_per_token if self.value is None else (
+            self.alpha * ms_per_token + (1 - self.alpha) * self.value
+        )
+
+
+class ModelKeepAlive:
+    """Agenda pings conforme o tráfego e mede cold starts e reuso de prefixo"""
+
+    def __init__(self, router: Optional[LLMRouter] = None):
+        self.router = router or llm_router
+        self.unload_seconds = float(os.getenv('AGENT_MODEL_UNLOAD_SECONDS', '300'))
+        self.active_seconds = float(os.getenv('AGENT_KEEPALIVE_ACTIVE_SECONDS', '3600'))
+        self.enabled = os.getenv('AGENT_KEEPALIVE_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+        self.ping_timeout_seconds = float(os.getenv('AGENT_KEEPALIVE_PING_TIMEOUT_SECONDS', '60'))
+        self.requests: Deque[float] = deque(maxlen=1000)
+        self.prefixes: Counter = Counter()
+        self._prefix_tokens: Dict[str, int] = {}
+        self.last_use: Dict[str, float] = {}
+        self.last_prefix: Dict[str, str] = {}
+        self.cold_starts = 0
+        self.pings = 0
+        self.ping_failures = 0
+        self.prefix_hits = 0
+        self.prefix_misses = 0
+        self.prefill_saved_ms = 0.0
+        self._hit_rate = _LatencyPerToken()
+        self._miss_rate = _LatencyPerToken()
+        self._task: Optional[asyncio.Task] = None
+
+    def touch(self) -> None:
+        """Conta uma requisição de chat (tráfego que justifica manter o modelo quente)"""
+        self.requests.append(time.monotonic())
+
+    def _tokens(self, prefix: str) -> int:
+        if prefix not in self._prefix_tokens:
+            if len(self._prefix_tokens) > 64:
+                self._prefix_tokens.clear()
+            self._prefix_tokens[prefix] = count_tokens(prefix)
+        return self._prefix_tokens[prefix]
+
+    def record_call(self, backend: str, prefix: str, prompt_tokens: int, latency_s: float) -> None:
+        """
+        Registra uma chamada ao modelo
+
+        Args:
+            backend: nome do backend que respondeu
+            prefix: prefixo fixo do system prompt usado
+            prompt_tokens: tokens do prompt inteiro
+        """
+        now = time.monotonic()
+        last = self.last_use.get(backend)
+        if last is None or now - last > self.unload_seconds:
+            self.cold_starts += 1
+        self.last_use[backend] = now
+        if prefix:
+            self.prefixes[prefix] += 1
+
+        ms_per_token = latency_s * 1000 / max(1, prompt_tokens)
+        if prefix and self.last_prefix.get(backend) == prefix:
+            self.prefix_hits += 1
+            self._hit_rate.add(ms_per_token)
+            if self._miss_rate.value is not None and self._hit_rate.value is not None:
+                self.prefill_saved_ms += self._tokens(prefix) * max(0.0, self._miss_rate.value - self._hit_rate.value)
+        else:
+            self.prefix_misses += 1
+            self._miss_rate.add(ms_per_token)
+        self.last_prefix[backend] = prefix
+
+    def _recent_traffic(self, now: float) -> bool:
+        return bool(self.requests) and now - self.requests[-1] <= self.active_seconds
+
+    async def tick(self) -> int:
+        """
+        Pinga os backends locais prestes a descarregar o modelo
+
+        Returns:
+            Quantidade de pings enviados
+        """
+        now = time.monotonic()
+        if not self._recent_traffic(now) or llm_admission.active > 0:
+            return 0  # sem tráfego deixa descarregar; com chamadas em curso o modelo já está quente
+        prefix = self.prefixes.most_common(1)[0][0] if self.prefixes else ""
+        messages = [{"role": "system", "content": prefix}] if prefix else []
+        messages.append({"role": "user", "content": "ok"})
+        sent = 0
+        for backend in self.router.all_backends():
+            last = self.last_use.get(backend.name)
+            if not backend.local or last is None or now - last < self.unload_seconds * 0.8:
+                continue
+            try:
+                await self.router.ping(backend, messages, self.ping_timeout_seconds)
+                self.pings += 1
+                sent += 1
+                self.last_use[backend.name] = time.monotonic()
+                self.last_prefix[backend.name] = prefix
+            except Exception as e:
+                self.ping_failures += 1
+                print(f"[WARN] Keep-alive de {backend.name} falhou: {type(e).__name__}: {e}")
+        return sent
+
+    async def _loop(self) -> None:
+        interval = max(5.0, min(60.0, self.unload_seconds / 5))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.tick()
+            except Exception as e:
+                print(f"[WARN] Erro no keep-alive do modelo: {e}")
+
+    def start(self) -> None:
+        """Inicia o agendador (chamar no startup da aplicação)"""
+        if self._task is None and self.enabled:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            'enabled': self.enabled,
+            'unload_seconds': self.unload_seconds,
+            'recent_traffic': self._recent_traffic(now),
+            'idle_seconds': {name: round(now - last, 1) for name, last in self.last_use.items()},
+            'cold_starts': self.cold_starts,
+            'pings': self.pings,
+            'ping_failures': self.ping_failures,
+            'prefix_hits': self.prefix_hits,
+            'prefix_misses': self.prefix_misses,
+            'ms_per_token_hit': round(self._hit_rate.value, 3) if self._hit_rate.value is not None else None,
+            'ms_per_token_miss': round(self._miss_rate.value, 3) if self._miss_rate.value is not None else None,
+            'prefill_saved_ms': round(self.prefill_saved_ms, 1),
+            'distinct_prefixes': len(self.prefixes),
+        }
+
+
+# Instância global
+model_keepalive = ModelKeepAlive()
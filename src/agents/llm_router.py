@@ -0,0 +1,339 @@
+"""
+Roteador de LLM entre backends OpenAI-compatible
+
+Cada backend configurado (Ollama local, Groq, OpenAI ou os definidos em
+LLM_BACKENDS) mantém latência e erros das últimas chamadas. Cada chamada vai
+para o backend de menor latência esperada; backends com falhas seguidas
+ficam em quarentena por alguns segundos. Com hedge ativo, se o primeiro não
+responder até o p95 dele, uma segunda requisição vai para o próximo backend
+e a que perder é cancelada.
+
+Perguntas simples podem usar a camada "small" (OLLAMA_SMALL_MODEL ou
+LLM_SMALL_BACKENDS), com estatísticas próprias; se ela falhar, a chamada
+segue para os backends principais.
+"""
+import os
+import time
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+
+class LLMRouterError(Exception):
+    """Nenhum backend conseguiu responder"""
+
+
+class LLMBackend:
+    """Backend OpenAI-compatible com estatísticas de latência e erro"""
+
+    def __init__(self, name: str, base_url: str, model: str, api_key: str = "", window: int = 50):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        # Modelo servido localmente (descarregado da memória quando ocioso)
+        self.local = name.startswith("ollama") or any(h in self.base_url for h in ("localhost", "127.0.0.1"))
+        self.model = model
+        self.api_key = api_key
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record_success(self, latency_s: float) -> None:
+        self.calls += 1
+        self.latencies.append(latency_s)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+
+    def record_failure(self, cooldown_s: float, failures_to_cooldown: int) -> None:
+        self.calls += 1
+        self.errors += 1
+        self.outcomes.append(False)
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= failures_to_cooldown:
+            self.cooldown_until = time.monotonic() + cooldown_s
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(len(values) * q))]
+
+    def expected_latency(self, prior_s: float) -> float:
+        """Mediana penalizada pela taxa de erro; sem histórico usa o prior (explora backends novos)"""
+        median = self.percentile(0.5)
+        base = median if median is not None else prior_s
+        return base * (1 + 4 * self.error_rate())
+
+    def get_stats(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "base_url": self.base_url,
+            "model": self.model,
+            "calls": self.calls,
+            "errors": self.errors,
+            "cancelled": self.cancelled,
+            "error_rate": round(self.error_rate(), 4),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "available": self.available(),
+            "local": self.local,
+        }
+
+
+def _parse_backends(spec: str) -> List[LLMBackend]:
+    """"nome|base_url|modelo|VAR_DA_CHAVE,..." -> backends"""
+    backends = []
+    for item in spec.split(","):
+        parts = [p.strip() for p in item.split("|")]
+        if len(parts) < 3:
+            continue
+        key = os.getenv(parts[3], "") if len(parts) > 3 and parts[3] else ""
+        backends.append(LLMBackend(parts[0], parts[1], parts[2], key))
+    return backends
+
+
+def _backends_from_env() -> List[LLMBackend]:
+    """
+    Backends configurados
+
+    LLM_BACKENDS="nome|base_url|modelo|VAR_DA_CHAVE,..." define a lista
+    explicitamente (ex: servidores locais de teste); sem ela vale a ordem
+    Ollama -> Groq (se GROQ_API_KEY) -> OpenAI (se USE_OPENAI e OPENAI_API_KEY).
+    """
+    explicit = os.getenv("LLM_BACKENDS", "").strip()
+    if explicit:
+        return _parse_backends(explicit)
+
+    backends = [LLMBackend(
+        "ollama",
+        os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1"),
+        os.getenv("OLLAMA_MODEL", "llama3.2"),
+        os.getenv("OLLAMA_API_KEY", "ollama"),
+    )]
+    if os.getenv("GROQ_API_KEY"):
+        backends.append(LLMBackend(
+            "groq",
+            os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1"),
+            os.getenv("GROQ_MODEL", "mixtral-8x7b-32768"),
+            os.getenv("GROQ_API_KEY", ""),
+        ))
+    if os.getenv("USE_OPENAI", "").lower() in {"1", "true", "yes"} and os.getenv("OPENAI_API_KEY"):
+        backends.append(LLMBackend(
+            "openai",
+            os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+            os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+            os.getenv("OPENAI_API_KEY", ""),
+        ))
+    return backends
+
+
+def _small_backends_from_env() -> List[LLMBackend]:
+    """
+    Backends da camada "small" (modelo pequeno, roda bem em CPU)
+
+    LLM_SMALL_BACKENDS no mesmo formato de LLM_BACKENDS; sem ela,
+    OLLAMA_SMALL_MODEL no mesmo servidor Ollama. Vazio = sem camada small.
+    """
+    explicit = os.getenv("LLM_SMALL_BACKENDS", "").strip()
+    if explicit:
+        return _parse_backends(explicit)
+    small_model = os.getenv("OLLAMA_SMALL_MODEL", "").strip()
+    if not small_model:
+        return []
+    return [LLMBackend(
+        "ollama-small",
+        os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1"),
+        small_model,
+        os.getenv("OLLAMA_API_KEY", "ollama"),
+    )]
+
+
+class LLMRouter:
+    """Escolhe o backend por latência esperada, com failover e hedge opcional"""
+
+    def __init__(
+        self, backends: Optional[List[LLMBackend]] = None, small_backends: Optional[List[LLMBackend]] = None
+    ):
+        self.backends = backends if backends is not None else _backends_from_env()
+        self.small_backends = small_backends if small_backends is not None else _small_backends_from_env()
+        self.hedge_enabled = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in {"1", "true", "yes"}
+        self.hedge_min_delay_s = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "1.0"))
+        self.prior_latency_s = float(os.getenv("LLM_PRIOR_LATENCY_SECONDS", "2.0"))
+        self.cooldown_s = float(os.getenv("LLM_BACKEND_COOLDOWN_SECONDS", "30"))
+        self.failures_to_cooldown = int(os.getenv("LLM_BACKEND_FAILURES_TO_COOLDOWN", "3"))
+        self.hedges_started = 0
+        self.hedges_won = 0
+        self.failovers = 0
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def ranked(self, tier: str = "main") -> List[LLMBackend]:
+        """Backends em ordem de preferência (quarentena no fim, como último recurso)"""
+        pool = self.small_backends if tier == "small" else self.backends
+        return sorted(
+            pool,
+            key=lambda b: (not b.available(), b.expected_latency(self.prior_latency_s))
+        )
+
+    def all_backends(self) -> List[LLMBackend]:
+        return self.backends + self.small_backends
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient()
+        return self._client
+
+    async def _post(
+        self, backend: LLMBackend, messages: List[Dict[str, str]], timeout_s: float, **options: Any
+    ) -> Dict[str, Any]:
+        payload = {"model": backend.model, "messages": messages, "stream": False, **options}
+        headers = {"Content-Type": "application/json"}
+        if backend.api_key:
+            headers["Authorization"] = f"Bearer {backend.api_key}"
+        resp = await self._http().post(
+            f"{backend.base_url}/chat/completions", headers=headers, json=payload, timeout=timeout_s
+        )
+        resp.raise_for_status()
+        return resp.json()
+
+    async def _call(self, backend: LLMBackend, messages: List[Dict[str, str]], timeout_s: float) -> Optional[str]:
+        start = time.monotonic()
+        try:
+            data = await self._post(backend, messages, timeout_s)
+        except asyncio.CancelledError:
+            backend.cancelled += 1
+            raise
+        except Exception:
+            backend.record_failure(self.cooldown_s, self.failures_to_cooldown)
+            raise
+        backend.record_success(time.monotonic() - start)
+        choice = data.get("choices", [{}])[0]
+        message = choice.get("message", {}) if isinstance(choice, dict) else {}
+        return message.get("content") or None
+
+    async def complete(
+        self, messages: List[Dict[str, str]], timeout_s: float, tier: str = "main"
+    ) -> Tuple[Optional[str], str]:
+        """
+        Envia a conversa ao melhor backend dentro de timeout_s
+
+        Com tier="small", os backends do modelo pequeno vêm primeiro e os
+        principais ficam como failover.
+
+        Returns:
+            (conteúdo, nome do backend que respondeu)
+
+        Raises:
+            asyncio.TimeoutError se o tempo acabar; LLMRouterError se todos falharem
+        """
+        candidates = self.ranked("small") + self.ranked() if tier == "small" else self.ranked()
+        if not candidates:
+            raise LLMRouterError("Nenhum backend de LLM configurado")
+
+        deadline = time.monotonic() + timeout_s
+        last_error: Optional[BaseException] = None
+        tried: List[LLMBackend] = []
+        while time.monotonic() < deadline:
+            remaining = [b for b in candidates if b not in tried]
+            if not remaining:
+                break
+            primary = remaining[0]
+            hedge = remaining[1] if self.hedge_enabled and len(remaining) > 1 else None
+            try:
+                return await self._race(primary, hedge, messages, deadline, tried)
+            except asyncio.TimeoutError:
+                raise
+            except Exception as e:
+                last_error = e
+                print(f"[WARN] Backend LLM {primary.name} falhou: {type(e).__name__}: {e}")
+                self.failovers += 1
+        if time.monotonic() >= deadline:
+            raise asyncio.TimeoutError()
+        raise LLMRouterError(f"Todos os backends falharam: {last_error}")
+
+    async def _race(
+        self,
+        primary: LLMBackend,
+        hedge: Optional[LLMBackend],
+        messages: List[Dict[str, str]],
+        deadline: float,
+        tried: List[LLMBackend]
+    ) -> Tuple[Optional[str], str]:
+        """Primeiro backend; com hedge, dispara o segundo após o p95 do primeiro e cancela o perdedor"""
+        remaining = deadline - time.monotonic()
+        tasks = {asyncio.ensure_future(self._call(primary, messages, remaining)): primary}
+        tried.append(primary)
+        try:
+            if hedge is not None:
+                p95 = primary.percentile(0.95) or self.prior_latency_s
+                done, _ = await asyncio.wait(tasks, timeout=min(max(p95, self.hedge_min_delay_s), remaining))
+                if not done and deadline - time.monotonic() > 0:
+                    self.hedges_started += 1
+                    tasks[asyncio.ensure_future(
+                        self._call(hedge, messages, deadline - time.monotonic())
+                    )] = hedge
+                    tried.append(hedge)
+
+            pending = set(tasks)
+            last_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0.0, deadline - time.monotonic()),
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise asyncio.TimeoutError()
+                for task in done:
+                    if task.exception() is None:
+                        winner = tasks[task]
+                        if winner is not primary:
+                            self.hedges_won += 1
+                        return task.result(), winner.name
+                    last_error = task.exception()
+            raise last_error or LLMRouterError("Sem resposta")
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def ping(self, backend: LLMBackend, messages: List[Dict[str, str]], timeout_s: float) -> float:
+        """
+        Requisição mínima (1 token) para manter o modelo carregado; não entra
+        nas estatísticas de roteamento
+
+        Returns:
+            Latência em segundos
+        """
+        start = time.monotonic()
+        await self._post(backend, messages, timeout_s, max_tokens=1)
+        return time.monotonic() - start
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "hedge_enabled": self.hedge_enabled,
+            "hedges_started": self.hedges_started,
+            "hedges_won": self.hedges_won,
+            "failovers": self.failovers,
+            "order": [b.name for b in self.ranked()],
+            "small_order": [b.name for b in self.ranked("small")],
+            "backends": {b.name: b.get_stats() for b in self.all_backends()},
+        }
+
+
+# Instância global
+llm_router = LLMRouter()
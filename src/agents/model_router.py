@@ -0,0 +1,176 @@
+"""
+Roteamento de perguntas por complexidade
+
+Toda pergunta ia para o mesmo modelo principal, de um "oi" a uma análise
+com várias tabelas. Um classificador leve (regex sobre a pergunta
+normalizada, sem modelo) escolhe a rota:
+
+- rules: cumprimentos e agradecimentos, respondidos por regra, sem LLM
+- small: dúvidas conceituais/de documentação e formatação de texto, no
+  modelo pequeno (camada "small" do llm_router; sem ela, no principal)
+- main: perguntas que pedem dados, períodos, comparações ou várias etapas
+
+Decisões e latência por rota ficam em /agents/metrics para medir o ganho.
+"""
+import os
+import re
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from .fast_path import TABLE_PATTERNS, normalize_question, parse_period
+
+ROUTE_RULES = 'rules'
+ROUTE_SMALL = 'small'
+ROUTE_MAIN = 'main'
+
+# Conversa sem pergunta: palavra que define o tipo + complementos aceitos
+_CHIT_CHAT_TRIGGERS = [
+    ('bye', {'tchau', 'ate', 'falou', 'flw', 'abraco'}),
+    ('thanks', {'obrigado', 'obrigada', 'obg', 'valeu', 'vlw', 'agradeco', 'ok', 'certo', 'entendi',
+                'perfeito', 'otimo', 'show', 'legal', 'massa'}),
+    ('greeting', {'oi', 'ola', 'opa', 'eai', 'ei', 'hello', 'hi', 'bom', 'boa', 'tudo', 'beleza', 'blz'}),
+]
+_CHIT_CHAT_FILLER = {
+    'dia', 'tarde', 'noite', 'bem', 'e', 'ai', 'como', 'vai', 'vc', 'voce', 'esta', 'pessoal',
+    'muito', 'pela', 'ajuda', 'mais', 'logo', 'amanha', 'entao', 'por', 'enquanto',
+}
+
+# Precisa de dados (tools) ou de várias etapas de análise
+_DATA_RE = re.compile(
+    r"\bquant[oa]s\b|\bvalor(?:es)?\b|\btotal\b|\bsoma\b|\bmedi[ao]s?\b|\bticket\b|\bfaturamento\b"
+    r"|\breceita\b|\bpipeline\b|\btaxa\b|\bcontas a (?:pagar|receber)\b|\bfinanceiro\b|\bestoque\b"
+    r"|\bmetas?\b|\bindicador(?:es)?\b|\bkpis?\b|\brelatorio\b|\bdados\b|\bnumeros?\b|\blist[ae]\b|\bmostre\b"
+    r"|\bempreendimentos?\b|\bobras?\b|\bprojetos?\b"
+)
+_ANALYSIS_RE = re.compile(
+    r"\bcompar\w*|\btendencias?\b|\bprevis\w*|\bprojec\w*|\banomali\w*|\bevolu\w*|\bpor ?que\b"
+    r"|\banalis\w*|\bcresc\w*|\bqueda\b|\bcaiu\b|\bvariac\w*|\branking\b|\btop \d+\b|\bmelhor(?:es)?\b"
+    r"|\bpior(?:es)?\b|\bcorrelac\w*|\bsazonal\w*|\balertas?\b|\bgrafico\w*|\bdesempenho\b"
+)
+_TABLE_RE = re.compile("|".join(pattern for _, pattern in TABLE_PATTERNS))
+
+# Conceito/documentação e formatação de texto: não precisam de tools
+_DOC_RE = re.compile(
+    r"\bo que (?:e|sao|significa|quer dizer)\b|\bcomo (?:funciona|usar|uso|faco|acesso|acessar)\b"
+    r"|\bpara que serve\b|\bexpli(?:que|ca|car)\b|\bdefini\w*|\bdocumentac\w*|\bendpoints?\b|\bapis?\b"
+    r"|\bo que (?:voce|vc) (?:faz|pode|sabe)\b|\bquem e (?:voce|vc)\b|\bajuda\b"
+)
+_FORMAT_RE = re.compile(
+    r"\bformat\w*|\breescrev\w*|\btraduz\w*|\bcorrij\w*|\bresum\w* (?:este|esse|o|a) (?:texto|paragrafo)\b"
+    r"|\bem topicos\b|\bem tabela\b|\bem markdown\b|\bmais formal\b|\bmais curto\b"
+)
+
+_REPLIES = {
+    'greeting': (
+        "Olá! Sou o assistente de análise de dados. Posso consultar vendas, leads, reservas, "
+        "financeiro e outros indicadores que você tem permissão para ver. "
+        "Experimente perguntar, por exemplo: \"Quantos leads ativos temos?\""
+    ),
+    'thanks': "Por nada! Se precisar de outra análise, é só perguntar.",
+    'bye': "Até mais! Quando precisar de uma análise, estou por aqui.",
+}
+
+
+@dataclass
+class RouteDecision:
+    route: str
+    reason: str
+    signals: List[str] = field(default_factory=list)
+    reply: Optional[str] = None  # resposta pronta da rota rules
+
+    @property
+    def llm_tier(self) -> str:
+        return 'small' if self.route == ROUTE_SMALL else 'main'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'route': self.route, 'reason': self.reason, 'signals': self.signals}
+
+
+class ModelRouter:
+    """Classifica a pergunta e mede a latência de cada rota"""
+
+    def __init__(self):
+        self.enabled = os.getenv('AGENT_MODEL_ROUTING_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+        self.max_simple_words = int(os.getenv('AGENT_MODEL_ROUTING_MAX_SIMPLE_WORDS', '25'))
+        self.decisions: Counter = Counter()
+        self.reasons: Counter = Counter()
+        self.latencies: Dict[str, Deque[float]] = {}
+
+    def _chit_chat(self, words: List[str]) -> Optional[str]:
+        """Tipo da mensagem se ela for só cumprimento/agradecimento/despedida"""
+        if not words or len(words) > 6:
+            return None
+        triggers = set().union(*(kind_words for _, kind_words in _CHIT_CHAT_TRIGGERS))
+        if any(w not in triggers and w not in _CHIT_CHAT_FILLER for w in words):
+            return None
+        for kind, kind_words in _CHIT_CHAT_TRIGGERS:
+            if kind_words & set(words):
+                return kind
+        return None
+
+    def classify(self, query: str) -> RouteDecision:
+        """Rota da pergunta (sem rede nem modelo)"""
+        if not self.enabled:
+            return RouteDecision(ROUTE_MAIN, 'disabled')
+        text = normalize_question(query)
+        words = text.split()
+
+        kind = self._chit_chat(words)
+        if kind:
+            return RouteDecision(ROUTE_RULES, kind, reply=_REPLIES[kind])
+
+        signals = []
+        if _DATA_RE.search(text):
+            signals.append('data')
+        if _ANALYSIS_RE.search(text):
+            signals.append('analysis')
+        if parse_period(text)[0] is not None:
+            signals.append('period')
+        if len(_TABLE_RE.findall(text)) > 1:
+            signals.append('multi_table')
+        if query.count('?') > 1 or len(words) > self.max_simple_words:
+            signals.append('multi_step')
+        if signals:
+            return RouteDecision(ROUTE_MAIN, 'needs_tools', signals)
+
+        # Sem pedido de dados: conceito, documentação ou formatação
+        if _FORMAT_RE.search(text):
+            return RouteDecision(ROUTE_SMALL, 'formatting')
+        if _DOC_RE.search(text):
+            return RouteDecision(ROUTE_SMALL, 'doc_lookup')
+        if _TABLE_RE.search(text):
+            return RouteDecision(ROUTE_MAIN, 'needs_tools', ['table'])
+        return RouteDecision(ROUTE_SMALL, 'short_generic') if len(words) <= 8 else RouteDecision(ROUTE_MAIN, 'default')
+
+    def record(self, route: str, reason: str, latency_ms: float) -> None:
+        """Registra a decisão e a latência total da pergunta na rota"""
+        self.decisions[route] += 1
+        self.reasons[f"{route}:{reason}"] += 1
+        self.latencies.setdefault(route, deque(maxlen=1000)).append(latency_ms)
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = sum(self.decisions.values())
+        routes = {}
+        all_latencies: List[float] = []
+        for route, values in self.latencies.items():
+            ordered = sorted(values)
+            all_latencies.extend(ordered)
+            routes[route] = {
+                'count': self.decisions[route],
+                'share': round(self.decisions[route] / total, 3) if total else 0.0,
+                'avg_ms': round(sum(ordered) / len(ordered), 1),
+                'p50_ms': round(ordered[len(ordered) // 2], 1),
+                'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+            }
+        return {
+            'enabled': self.enabled,
+            'total': total,
+            'avg_ms': round(sum(all_latencies) / len(all_latencies), 1) if all_latencies else None,
+            'routes': routes,
+            'reasons': dict(self.reasons),
+        }
+
+
+# Instância global
+model_router = ModelRouter()
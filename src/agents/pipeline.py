@@ -0,0 +1,71 @@
+"""
+Orçamento de tempo do pipeline do chat
+
+Uma requisição de chat tem um único deadline. Cada estágio (cache,
+permissões, memória, RAG, LLM, Agno, fallback) consome do mesmo orçamento e
+tem seu tempo medido (estágios paralelos se sobrepõem; pre_llm é o total);
+quando o que sobra não paga outra tentativa de LLM, o pipeline vai direto
+para o fallback baseado em regras (sempre com uma reserva para ele).
+"""
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, Optional
+
+
+class RequestDeadline:
+    """Deadline de uma requisição e tempo gasto por estágio"""
+
+    def __init__(
+        self,
+        seconds: float,
+        min_llm_attempt_s: float = 5.0,
+        fallback_reserve_s: float = 2.0
+    ):
+        self.seconds = seconds
+        self.min_llm_attempt_s = min_llm_attempt_s
+        self.fallback_reserve_s = fallback_reserve_s
+        self.started = time.monotonic()
+        self.expires_at = self.started + seconds
+        self.stages: Dict[str, float] = {}
+        self.degraded: Optional[str] = None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def budget(self, share: float) -> float:
+        """Fração do orçamento total para um estágio, limitada ao que resta (menos a reserva do fallback)"""
+        return max(0.0, min(self.seconds * share, self.remaining() - self.fallback_reserve_s))
+
+    def llm_budget(self) -> float:
+        """Tempo disponível para uma chamada de LLM (0 se não paga uma tentativa)"""
+        available = self.remaining() - self.fallback_reserve_s
+        return available if available >= self.min_llm_attempt_s else 0.0
+
+    def degrade(self, reason: str) -> None:
+        """Marca que o pipeline abriu mão de um estágio por falta de tempo ou falha"""
+        if self.degraded is None:
+            self.degraded = reason
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.monotonic() - start) * 1000
+
+    async def run_stage(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        """Aguarda um estágio medindo só o seu tempo (útil dentro de asyncio.gather)"""
+        with self.stage(name):
+            return await awaitable
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "deadline_ms": round(self.seconds * 1000),
+            "elapsed_ms": round(self.elapsed() * 1000, 1),
+            "stages_ms": {name: round(ms, 1) for name, ms in self.stages.items()},
+            "degraded": self.degraded,
+        }
@@ -0,0 +1,177 @@
+"""
+Montagem do prompt dentro de um orçamento de tokens
+
+O system prompt crescia sem limite com trechos do RAG e conversas
+anteriores, e o prefill de um modelo local cresce mais que linearmente com
+o tamanho do prompt. O orçamento (AGENT_CONTEXT_TOKENS menos a resposta
+reservada e a pergunta) vai primeiro para as instruções e o bloco
+variável da requisição; o resto é dividido entre os trechos do RAG (por
+score) e as conversas anteriores (por recência e relevância para a
+pergunta). O que não cabe é cortado ou resumido, e a composição de cada
+prompt é registrada.
+
+Ordem: prefixo fixo do nível (reaproveita o KV cache do servidor) ->
+RAG -> histórico -> bloco variável da requisição.
+"""
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .tokens import count_tokens, truncate_to_tokens
+
+_WORD_RE = re.compile(r"\w{3,}", re.UNICODE)
+
+# Menor fatia que ainda vale incluir cortada
+_MIN_PIECE_TOKENS = 40
+
+_RAG_HEADER = "\n\nContexto recuperado (RAG):\n"
+_HISTORY_HEADER = "\n\nContexto de conversas anteriores:\n"
+
+
+def _words(text: str) -> set:
+    return set(_WORD_RE.findall((text or '').lower()))
+
+
+class PromptAssembler:
+    """Distribui o contexto do modelo entre instruções, RAG e histórico"""
+
+    def __init__(self):
+        self.context_tokens = int(os.getenv('AGENT_CONTEXT_TOKENS', '4096'))
+        self.response_tokens = int(os.getenv('AGENT_RESPONSE_TOKENS', '768'))
+        self.rag_share = float(os.getenv('AGENT_RAG_TOKEN_SHARE', '0.6'))
+        self.turn_response_chars = int(os.getenv('AGENT_HISTORY_RESPONSE_CHARS', '600'))
+        self.log_enabled = os.getenv('AGENT_PROMPT_LOG', 'true').lower() in {'1', 'true', 'yes'}
+
+    def assemble(
+        self,
+        instructions: str,
+        query: str,
+        rag_hits: Optional[List[Any]] = None,
+        history: Optional[List[Dict[str, Any]]] = None,
+        suffix: str = ""
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Monta o system prompt
+
+        Args:
+            instructions: prefixo fixo do prompt (sempre incluído, sempre primeiro)
+            rag_hits: trechos com source, text e score (RagHit)
+            history: conversas anteriores, da mais antiga para a mais recente
+            suffix: parte variável da requisição (sempre incluída, sempre no fim)
+
+        Returns:
+            (system prompt, composição: tokens por parte e o que ficou de fora)
+        """
+        rag_hits = list(rag_hits or [])
+        history = list(history or [])
+        instruction_tokens = count_tokens(instructions) + (count_tokens(suffix) + 1 if suffix else 0)
+        query_tokens = count_tokens(query)
+        headers = count_tokens(_RAG_HEADER) + count_tokens(_HISTORY_HEADER)
+        available = max(0, self.context_tokens - self.response_tokens - query_tokens - instruction_tokens - headers)
+
+        # RAG primeiro dentro da sua fatia; sobra vai para o histórico e vice-versa
+        rag_budget = int(available * self.rag_share) if history else available
+        rag_text, rag_report = self._select_rag(rag_hits, rag_budget)
+        history_budget = available - rag_report['tokens']
+        history_text, history_report = self._select_history(history, query, history_budget)
+        if history_report['tokens'] < history_budget - _MIN_PIECE_TOKENS and rag_report['dropped']:
+            rag_text, rag_report = self._select_rag(rag_hits, available - history_report['tokens'])
+
+        prompt = instructions
+        if rag_text:
+            prompt += _RAG_HEADER + rag_text
+        if history_text:
+            prompt += _HISTORY_HEADER + history_text
+        if suffix:
+            prompt += "\n\n" + suffix
+
+        report = {
+            'budget': self.context_tokens,
+            'reserved_response': self.response_tokens,
+            'instructions': instruction_tokens,
+            'prefix': count_tokens(instructions),
+            'query': query_tokens,
+            'rag': rag_report,
+            'history': history_report,
+            'total': count_tokens(prompt) + query_tokens,
+        }
+        if self.log_enabled:
+            print(
+                "[PROMPT] {total}/{budget} tokens | instrucoes {instructions} | pergunta {query} | "
+                "RAG {rag_kept}/{rag_of} trechos ({rag_tokens}t, {rag_cut} cortado(s)) | "
+                "historico {hist_kept}/{hist_of} turnos ({hist_tokens}t, {hist_cut} resumido(s))".format(
+                    total=report['total'], budget=self.context_tokens - self.response_tokens,
+                    instructions=instruction_tokens, query=query_tokens,
+                    rag_kept=rag_report['kept'], rag_of=len(rag_hits), rag_tokens=rag_report['tokens'],
+                    rag_cut=rag_report['truncated'],
+                    hist_kept=history_report['kept'], hist_of=len(history),
+                    hist_tokens=history_report['tokens'], hist_cut=history_report['summarized'],
+                )
+            )
+        return prompt, report
+
+    def _select_rag(self, hits: List[Any], budget: int) -> Tuple[str, Dict[str, Any]]:
+        parts: List[str] = []
+        used = truncated = 0
+        for hit in sorted(hits, key=lambda h: h.score, reverse=True):
+            header = f"[{len(parts) + 1}] {hit.source}\n"
+            piece = header + hit.text
+            tokens = count_tokens(piece) + 1
+            if used + tokens <= budget:
+                parts.append(piece)
+                used += tokens
+                continue
+            remaining = budget - used - count_tokens(header) - 1
+            if remaining >= _MIN_PIECE_TOKENS:
+                piece = header + truncate_to_tokens(hit.text, remaining)
+                parts.append(piece)
+                used += count_tokens(piece) + 1
+                truncated += 1
+            break
+        return "\n\n".join(parts), {
+            'kept': len(parts), 'dropped': len(hits) - len(parts), 'truncated': truncated, 'tokens': used,
+        }
+
+    def _render_turn(self, entry: Dict[str, Any], response_tokens: Optional[int] = None) -> str:
+        response = (entry.get('response') or '')[:self.turn_response_chars]
+        if response_tokens is not None:
+            response = truncate_to_tokens(response, response_tokens)
+        return f"Usuário: {entry.get('message', '')}\nAssistente: {response}"
+
+    def _select_history(
+        self, history: List[Dict[str, Any]], query: str, budget: int
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Turnos por recência + sobreposição de palavras com a pergunta; saída em ordem cronológica"""
+        query_words = _words(query)
+        total = len(history)
+
+        def score(index: int) -> float:
+            entry = history[index]
+            recency = (index + 1) / total
+            words = _words(f"{entry.get('message', '')} {entry.get('response', '')}")
+            relevance = len(query_words & words) / len(query_words) if query_words else 0.0
+            return recency + relevance
+
+        chosen: Dict[int, str] = {}
+        used = summarized = 0
+        for index in sorted(range(total), key=score, reverse=True):
+            text = self._render_turn(history[index])
+            tokens = count_tokens(text) + 1
+            if used + tokens > budget:
+                # Resumo: pergunta inteira e o começo da resposta
+                question_tokens = count_tokens(self._render_turn(history[index], 0))
+                room = budget - used - question_tokens - 1
+                if room < _MIN_PIECE_TOKENS // 2:
+                    continue
+                text = self._render_turn(history[index], room)
+                tokens = count_tokens(text) + 1
+                summarized += 1
+            chosen[index] = text
+            used += tokens
+        return "\n".join(chosen[i] for i in sorted(chosen)), {
+            'kept': len(chosen), 'dropped': total - len(chosen), 'summarized': summarized, 'tokens': used,
+        }
+
+
+# Instância global
+prompt_assembler = PromptAssembler()
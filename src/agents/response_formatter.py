@@ -2,7 +2,8 @@
 Formatador de respostas do agente IA para linguagem natural e profissional.
 Transforma respostas técnicas em comunicação de negócios clara e acionável.
 """
-from typing import Dict, Any, List, Optional
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 
 
 class ResponseFormatter:
@@ -126,7 +127,18 @@ class ResponseFormatter:
         Cria um system prompt profissional que instrui o agente a responder
         como um analista de negócios sênior.
         """
-        apis_str = ", ".join(context.get("available_apis", [])) or "base de dados interna"
+        prefix = ResponseFormatter.system_prompt_prefix(tuple(context.get("available_apis", [])))
+        return prefix + "\n\n" + ResponseFormatter.request_context_block(context)
+
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def system_prompt_prefix(available_apis: Tuple[str, ...]) -> str:
+        """
+        Parte fixa do system prompt, idêntica byte a byte para todos os
+        usuários de um mesmo nível (mesmas fontes de dados). Vem primeiro
+        para o servidor do modelo reaproveitar o KV cache do prefixo.
+        """
+        apis_str = ", ".join(available_apis) or "base de dados interna"
 
         return f"""Você é um Analista de Negócios Sênior especializado em análise de dados empresariais.
 
@@ -196,14 +208,17 @@ Response: {{'contas_receber': 125340, 'contas_pagar': 89200}}
 ```
 Usando a tool fetch_data_from_api('sienge', '/financeiro')..."
 
-CONTEXTO DA CONSULTA ATUAL:
-- Usuário: {context.get('user_id', 'desconhecido')}
-- Nível de acesso: {context.get('permissions', {}).get('nivel_acesso', 'básico')}
-
 Responda SEMPRE como um analista sênior conversando com um stakeholder de negócios.
 Foque em SIGNIFICADO e AÇÃO, não em tecnologia.
 Seja humano, profissional e útil."""
 
+    @staticmethod
+    def request_context_block(context: Dict[str, Any]) -> str:
+        """Parte variável (usuário, nível), sempre no fim do prompt."""
+        return f"""CONTEXTO DA CONSULTA ATUAL:
+- Usuário: {context.get('user_id', 'desconhecido')}
+- Nível de acesso: {context.get('permissions', {}).get('nivel_acesso', 'básico')}"""
+
     @staticmethod
     def extract_insights_from_data(data: Dict[str, Any], intent: str) -> List[str]:
         """
@@ -1,12 +1,21 @@
 """
 Agent routes for chat and status.
 """
-from typing import Any, Dict
+import json
+from typing import Any, Dict, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from src.auth.dependencies import get_current_user
+from src.auth.dependencies import get_current_user, get_current_admin_user
 from src.agents.agno_agent import analytics_agent
+from src.agents.llm_router import llm_router
+from src.agents.admission import llm_admission, AdmissionRejected
+from src.agents.jobs import job_queue, JobRejected, FINAL_STATUSES
+from src.agents.tool_output import tool_output
+from src.agents.keepalive import model_keepalive
+from src.agents.model_router import model_router
+from src.agents.monitoring import performance_monitor
 
 router = APIRouter(prefix="/agents", tags=["Agents"])
 
@@ -15,17 +24,23 @@ class ChatRequest(BaseModel):
     message: str
 
 
+class JobRequest(BaseModel):
+    kind: str  # chat, trends, compare, forecast, anomalies, summary, charts
+    message: Optional[str] = None
+    params: Dict[str, Any] = {}
+
+
 @router.post("/chat")
 async def chat(request: ChatRequest, current_user=Depends(get_current_user)) -> Dict[str, Any]:
     """Send a message to the analytics agent."""
     try:
-        permissions = await analytics_agent.check_user_permissions(current_user.id)
-        result = await analytics_agent.process_query(
-            user_id=current_user.id,
-            query=request.message,
-            permissions=permissions,
+        return await analytics_agent.handle_chat(current_user.id, request.message)
+    except AdmissionRejected as exc:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
         )
-        return result
     except Exception as exc:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -33,6 +48,67 @@ async def chat(request: ChatRequest, current_user=Depends(get_current_user)) ->
         )
 
 
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def create_job(request: JobRequest, current_user=Depends(get_current_user)) -> Dict[str, Any]:
+    """Queue a long-running analysis; poll GET /agents/jobs/{id} or stream /events."""
+    params = dict(request.params)
+    if request.kind == "chat":
+        if not request.message:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="message is required for chat jobs")
+        params["message"] = request.message
+    try:
+        job = await job_queue.submit(str(current_user.id), request.kind, params)
+    except JobRejected as exc:
+        code = status.HTTP_400_BAD_REQUEST if request.kind not in job_queue.handlers else status.HTTP_429_TOO_MANY_REQUESTS
+        raise HTTPException(status_code=code, detail=str(exc))
+    return {
+        **job,
+        "links": {
+            "self": f"/agents/jobs/{job['job_id']}",
+            "events": f"/agents/jobs/{job['job_id']}/events",
+        },
+    }
+
+
+@router.get("/jobs")
+async def list_jobs(current_user=Depends(get_current_user)) -> Dict[str, Any]:
+    """List the current user's recent jobs (without results)."""
+    return {"jobs": await job_queue.list_for_user(str(current_user.id))}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user=Depends(get_current_user)) -> Dict[str, Any]:
+    """Job status and, once finished, its result (until the result TTL expires)."""
+    job = await job_queue.get(job_id, str(current_user.id))
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, current_user=Depends(get_current_user)) -> StreamingResponse:
+    """Server-sent events with each status change; the last event carries the result."""
+    if await job_queue.get(job_id, str(current_user.id)) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    async def stream():
+        last_status = None
+        while True:
+            job = await job_queue.get(job_id, str(current_user.id))
+            if job is None:
+                yield "event: expired\ndata: {}\n\n"
+                return
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield f"event: {last_status}\ndata: {json.dumps(job, default=str)}\n\n"
+            if last_status in FINAL_STATUSES:
+                return
+            if not await job_queue.wait_for_change(timeout=15):
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
 @router.get("/capabilities")
 async def capabilities() -> Dict[str, Any]:
     """List agent capabilities."""
@@ -46,3 +122,17 @@ async def capabilities() -> Dict[str, Any]:
 async def health() -> Dict[str, Any]:
     """Health endpoint for the agent."""
     return {"status": "ok"}
+
+
+@router.get("/metrics")
+async def metrics(current_user=Depends(get_current_admin_user)) -> Dict[str, Any]:
+    """Agent metrics, LLM admission queue, backend latency/error stats and model routing (admin only)."""
+    return {
+        **performance_monitor.get_all_metrics(),
+        "llm_admission": llm_admission.get_stats(),
+        "llm_router": llm_router.get_stats(),
+        "jobs": await job_queue.get_stats(),
+        "tool_output": tool_output.get_stats(),
+        "keepalive": model_keepalive.get_stats(),
+        "model_routing": model_router.get_stats(),
+    }
@@ -0,0 +1,70 @@
+"""
+Contagem de tokens local
+
+Usa o tiktoken (cl100k_base) quando instalado; sem ele, uma estimativa por
+palavras e pontuação calibrada para português (~1,3 token por palavra),
+bem mais fiel que caracteres/4 e sem custo perceptível.
+
+O encoding do tiktoken pode baixar o arquivo BPE na primeira carga, então
+só é carregado por load_encoding(), chamado em thread no startup; até lá
+count_tokens usa a estimativa e nunca faz I/O no event loop.
+"""
+import os
+import re
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Encoding do tiktoken, preenchido por load_encoding()
+_encoding = None
+
+
+def load_encoding():
+    """Carrega o encoding do tiktoken (pode baixar o arquivo BPE); chamar fora do event loop"""
+    global _encoding
+    if tiktoken is None:
+        return None
+    try:
+        _encoding = tiktoken.get_encoding(os.getenv('AGENT_TOKENIZER_ENCODING', 'cl100k_base'))
+    except Exception as e:
+        print(f"[WARN] Encoding do tiktoken indisponível, usando estimativa de tokens: {type(e).__name__}: {e}")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Tokens de um texto (tiktoken se já carregado, senão estimativa)"""
+    if not text:
+        return 0
+    encoding = _encoding
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    tokens = 0
+    for piece in _WORD_RE.findall(text):
+        tokens += 1 if len(piece) <= 4 else 1 + len(piece) // 4
+    return tokens
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = '…') -> str:
+    """Corta o texto para caber em max_tokens, de preferência no fim de uma frase ou palavra"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ''
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) + 1 <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    cut = text[:low]
+    boundary = max(cut.rfind('. '), cut.rfind('\n'))
+    if boundary > len(cut) * 0.6:
+        cut = cut[:boundary + 1]
+    elif ' ' in cut:
+        cut = cut[:cut.rfind(' ')]
+    return cut.rstrip() + suffix
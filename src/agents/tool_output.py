@@ -0,0 +1,204 @@
+"""
+Serialização compacta das saídas das tools do agente
+
+As tools devolviam json.dumps(..., indent=2) com linhas completas (até 500
+em query_raw_data). Aqui listas de registros viram tabela (columns + rows),
+colunas nulas ou constantes saem das linhas, e cada tool tem um orçamento
+de tokens: quando a saída não cabe, ficam as primeiras linhas e um resumo
+do conjunto inteiro (distribuição/top-N por coluna), que basta para as
+perguntas agregadas.
+"""
+import os
+import json
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List
+
+from .tokens import count_tokens, truncate_to_tokens
+# Desligado em jobs: a saída vai para o usuário, não para o modelo
+_for_model: ContextVar[bool] = ContextVar('tool_output_for_model', default=True)
+
+_MAX_CELL_CHARS = 200
+
+
+def estimate_tokens(text: str) -> int:
+    return count_tokens(text)
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def _parse_budgets(spec: str) -> Dict[str, int]:
+    budgets = {}
+    for part in spec.split(','):
+        name, _, value = part.partition('=')
+        if name.strip() and value.strip().isdigit():
+            budgets[name.strip()] = int(value)
+    return budgets
+
+
+@contextmanager
+def full_output():
+    """Saída JSON completa, sem tabela nem orçamento (ex: resultado de job)"""
+    token = _for_model.set(False)
+    try:
+        yield
+    finally:
+        _for_model.reset(token)
+
+
+def _is_records(value: Any) -> bool:
+    return isinstance(value, list) and len(value) > 1 and all(isinstance(v, dict) for v in value)
+
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, (dict, list)):
+        value = _dumps(value)
+    if isinstance(value, str) and len(value) > _MAX_CELL_CHARS:
+        return value[:_MAX_CELL_CHARS] + '…'
+    return value
+
+
+class ToolOutputSerializer:
+    """Saída das tools em formato tabular compacto, dentro do orçamento de tokens"""
+
+    def __init__(self):
+        self.default_budget = int(os.getenv('AGENT_TOOL_OUTPUT_TOKENS', '1500'))
+        self.budgets = _parse_budgets(os.getenv('AGENT_TOOL_OUTPUT_BUDGETS', 'query_raw_data=2500'))
+        self.top_n = int(os.getenv('AGENT_TOOL_OUTPUT_TOP_N', '5'))
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def budget_for(self, tool: str) -> int:
+        return self.budgets.get(tool, self.default_budget)
+
+    def table(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Registros -> {columns, rows}; colunas sempre nulas ou constantes saem das linhas"""
+        columns: List[str] = []
+        for record in records:
+            for key in record:
+                if key not in columns:
+                    columns.append(key)
+
+        table: Dict[str, Any] = {}
+        kept = []
+        null_columns = []
+        constant: Dict[str, Any] = {}
+        for column in columns:
+            values = [record.get(column) for record in records]
+            non_null = [v for v in values if v not in (None, '', [], {})]
+            if not non_null:
+                null_columns.append(column)
+            elif len(non_null) == len(values) and all(v == values[0] for v in values):
+                constant[column] = _cell(values[0])
+            else:
+                kept.append(column)
+
+        table['columns'] = kept
+        table['rows'] = [[_cell(record.get(c)) for c in kept] for record in records]
+        if constant:
+            table['constant'] = constant
+        if null_columns:
+            table['null_columns'] = null_columns
+        return table
+
+    def summarize(self, records: List[Dict[str, Any]], columns: List[str]) -> Dict[str, Any]:
+        """Resumo por coluna do conjunto inteiro: faixa numérica ou top-N de valores"""
+        summary: Dict[str, Any] = {}
+        for column in columns:
+            values = [r.get(column) for r in records if r.get(column) not in (None, '')]
+            if not values:
+                continue
+            numbers = [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+            if len(numbers) == len(values):
+                summary[column] = {
+                    'min': min(numbers), 'max': max(numbers),
+                    'sum': round(sum(numbers), 2), 'avg': round(sum(numbers) / len(numbers), 2),
+                }
+                continue
+            counts = Counter(_cell(v) for v in values)
+            if len(counts) == len(values) and len(values) > self.top_n:
+                summary[column] = {'distinct': len(counts)}  # identificadores: top-N não diz nada
+            else:
+                summary[column] = {'distinct': len(counts), 'top': counts.most_common(self.top_n)}
+        return summary
+
+    def _compact(self, value: Any) -> Any:
+        if _is_records(value):
+            return self.table(value)
+        if isinstance(value, dict):
+            return {k: self._compact(v) for k, v in value.items() if v is not None}
+        if isinstance(value, list):
+            return [self._compact(v) for v in value]
+        return value
+
+    def _fit(self, payload: Any, original: Any, budget: int) -> str:
+        """Corta linhas das tabelas (mantendo o resumo do conjunto) até caber no orçamento"""
+        tables = []
+
+        def collect(node: Any, source: Any) -> None:
+            if isinstance(node, dict) and 'rows' in node and _is_records(source):
+                tables.append((node, source))
+            elif isinstance(node, dict) and isinstance(source, dict):
+                for key, child in node.items():
+                    collect(child, source.get(key))
+            elif isinstance(node, list) and isinstance(source, list):
+                for child, child_source in zip(node, source):
+                    collect(child, child_source)
+
+        collect(payload, original)
+        all_rows = [list(table['rows']) for table, _ in tables]
+        summaries = [self.summarize(records, table['columns']) for table, records in tables]
+
+        def render(keep: int) -> str:
+            for (table, _), rows, summary in zip(tables, all_rows, summaries):
+                table['rows'] = rows[:keep]
+                table.pop('rows_omitted', None)
+                table.pop('summary', None)
+                if keep < len(rows):
+                    table['rows_omitted'] = len(rows) - keep
+                    table['summary'] = summary
+            return _dumps(payload)
+
+        longest = max((len(rows) for rows in all_rows), default=0)
+        low, high = 0, longest
+        while low < high:
+            middle = (low + high + 1) // 2
+            if estimate_tokens(render(middle)) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        text = render(low)
+        if estimate_tokens(text) > budget:
+            text = truncate_to_tokens(text, budget, '…(truncado)')
+        return text
+
+    def serialize(self, tool: str, result: Any) -> str:
+        """Saída final da tool (JSON compacto, dentro do orçamento da tool)"""
+        if not _for_model.get():
+            return _dumps(result)
+        text = _dumps(self._compact(result))
+        original_tokens = estimate_tokens(_dumps(result))
+        if estimate_tokens(text) > self.budget_for(tool):
+            text = self._fit(self._compact(result), result, self.budget_for(tool))
+
+        stats = self.stats.setdefault(tool, {'calls': 0, 'tokens_in': 0, 'tokens_out': 0})
+        stats['calls'] += 1
+        stats['tokens_in'] += original_tokens
+        stats['tokens_out'] += estimate_tokens(text)
+        return text
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'default_budget': self.default_budget,
+            'budgets': self.budgets,
+            'tools': {
+                tool: {**s, 'ratio': round(s['tokens_out'] / s['tokens_in'], 3) if s['tokens_in'] else 1.0}
+                for tool, s in self.stats.items()
+            },
+        }
+
+
+# Instância global
+tool_output = ToolOutputSerializer()
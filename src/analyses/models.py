@@ -1,7 +1,7 @@
 """
 Pydantic models for analyses (dashboards/reports).
 """
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
 
 
@@ -33,3 +33,13 @@ class AnalysisResponse(AnalysisBase):
     id: Optional[str] = None
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
+
+
+class RawAggregationRequest(BaseModel):
+    table: str
+    metrics: List[str] = ["count"]
+    filters: Optional[Dict[str, Any]] = None
+    group_by: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    limit: int = 50
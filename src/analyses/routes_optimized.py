@@ -9,16 +9,24 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
 
 from src.cache.redis_manager import cache_manager, cache_decorator
+from src.cache.warming import cache_warmer
+from src.cache.data_versions import data_version_watcher
 from src.database.query_optimizer import QueryOptimizer
+from src.database.aggregations import RawAggregator, AggregationError
+from src.database.query_monitor import query_monitor
 from src.utils.pagination import SmartPaginator, PaginationParams
-from ..auth.dependencies import get_current_user
+from ..auth.dependencies import get_current_user, get_current_admin_user
+from ..auth.permissions import require_cvdw_access
 from ..database.supabase_client import get_supabase_client
+from ..supabase_client import supabase_admin_client
+from .models import RawAggregationRequest
 
 router = APIRouter(prefix="/analyses", tags=["Análises Otimizadas"])
 
 # Instâncias globais
 _query_optimizer = None
 _paginator = None
+_raw_aggregator = None
 
 def get_query_optimizer():
     """Obtém instância do Query Optimizer"""
@@ -28,6 +36,13 @@ def get_query_optimizer():
         _query_optimizer = QueryOptimizer(supabase)
     return _query_optimizer
 
+def get_raw_aggregator():
+    """Obtém instância do agregador de tabelas RAW"""
+    global _raw_aggregator
+    if _raw_aggregator is None:
+        _raw_aggregator = RawAggregator(supabase_admin_client)
+    return _raw_aggregator
+
 def get_paginator():
     """Obtém instância do Paginator"""
     global _paginator
@@ -37,7 +52,9 @@ def get_paginator():
 
 
 @router.get("/kpis/{period}")
-@cache_decorator(prefix="kpis", expiration=300)  # Cache de 5 minutos
+@cache_decorator(
+    prefix="kpis", expiration=86400, stale_ttl=600, tags=["table:vendas"], scope="tier", warm=True, per_day=True
+)  # Válido até a próxima versão de vendas (ou até virar o dia)
 async def get_kpis(
     period: str = "month",
     comparison: bool = True,
@@ -58,7 +75,6 @@ async def get_kpis(
         return {
             "status": "success",
             "data": kpis,
-            "cached": False,  # Will be True if from cache
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -69,7 +85,16 @@ async def get_kpis(
 
 
 @router.get("/sales/trends")
-@cache_decorator(prefix="sales_trends", expiration=600)  # Cache de 10 minutos
+@cache_decorator(
+    prefix="sales_trends",
+    expiration=86400,  # Válido até a próxima versão de vendas
+    stale_ttl=1200,
+    tags=["table:vendas"],
+    scope="tier",
+    date_params=("start_date", "end_date"),
+    grain_param="group_by",
+    warm=True
+)
 async def get_sales_trends(
     start_date: str = Query(..., description="Data início (YYYY-MM-DD)"),
     end_date: str = Query(..., description="Data fim (YYYY-MM-DD)"),
@@ -239,28 +264,80 @@ async def get_product_performance(
         )
 
 
+@router.post("/raw/aggregate")
+async def aggregate_raw_data(
+    request: RawAggregationRequest,
+    current_user: dict = Depends(require_cvdw_access)
+):
+    """
+    Agrega uma tabela RAW no banco (count, sum, avg, min, max, count_distinct)
+
+    Retorna apenas o resultado agregado, sem trafegar as linhas. Exige o
+    mesmo acesso ao CVDW que o agente (nivel_acesso >= 2).
+    """
+    try:
+        aggregator = get_raw_aggregator()
+        result = await aggregator.aggregate(
+            table_name=request.table,
+            metrics=request.metrics,
+            filters=request.filters,
+            group_by=request.group_by,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            limit=request.limit
+        )
+
+        return {
+            "status": "success",
+            "data": result,
+            "timestamp": datetime.now().isoformat()
+        }
+    except AggregationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Erro ao agregar dados: {str(e)}"
+        )
+
+
 @router.post("/cache/invalidate")
 async def invalidate_cache(
-    pattern: str = Query(..., description="Padrão para invalidar (ex: kpis:*, sales_trends:*)"),
-    current_user: dict = Depends(get_current_user)
+    namespace: Optional[str] = Query(None, description="Namespace inteiro (ex: kpis, sales_trends)"),
+    table: Optional[str] = Query(None, description="Resultados derivados de uma tabela (ex: vendas)"),
+    user_id: Optional[str] = Query(None, description="Entradas de um usuário"),
+    tag: Optional[List[str]] = Query(None, description="Tags adicionais (ex: table:leads)"),
+    _admin=Depends(get_current_admin_user)
 ):
     """
-    Invalida cache por padrão (apenas admin)
+    Invalida cache por namespace, tabela, usuário ou tags (apenas admin)
+
+    Cada alvo vira uma tag cuja versão é incrementada (O(1), sem varrer chaves).
     """
-    # Verificar se é admin
-    if current_user.get('nivel_acesso', 0) < 5:
+    tags = list(tag or [])
+    if namespace:
+        tags.append(f"ns:{namespace}")
+    if table:
+        tags.append(f"table:{table}")
+    if user_id:
+        tags.append(f"user:{user_id}")
+
+    if not tags:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Apenas administradores podem invalidar cache"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Informe namespace, table, user_id ou tag"
         )
 
     try:
-        deleted_count = cache_manager.invalidate_cache(pattern)
+        versions = await cache_manager.invalidate_tags(tags)
 
         return {
             "status": "success",
-            "message": f"Cache invalidado para padrão: {pattern}",
-            "deleted_keys": deleted_count,
+            "message": f"Cache invalidado para: {', '.join(sorted(versions))}",
+            "tag_versions": versions,
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -285,11 +362,13 @@ async def get_cache_stats(
         )
 
     try:
-        stats = cache_manager.get_cache_stats()
+        stats = await cache_manager.get_cache_stats()
 
         return {
             "status": "success",
             "cache_stats": stats,
+            "warming": cache_warmer.get_stats(),
+            "data_versions": data_version_watcher.get_stats(),
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -299,8 +378,29 @@ async def get_cache_stats(
         )
 
 
+@router.post("/cache/warm")
+async def warm_cache(
+    top_n: Optional[int] = Query(None, ge=1, le=100, description="Chaves por nível de permissão"),
+    _admin=Depends(get_current_admin_user)
+):
+    """
+    Pré-calcula as chaves mais pedidas de cada nível (ex: após uma importação)
+
+    Respeita o orçamento de tempo e CPU do cache warming.
+    """
+    report = await cache_warmer.warm(reason="manual", top_n=top_n)
+    return {
+        "status": "success",
+        "warming": report,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 @router.get("/performance/report")
-@cache_decorator(prefix="performance_report", expiration=1800)  # Cache de 30 minutos
+@cache_decorator(
+    prefix="performance_report", expiration=1800, stale_ttl=3600, scope="tier", warm=True, per_day=True,
+    tags=["table:vendas", "table:clientes", "table:produtos", "table:produtos_venda", "table:estoque"]
+)  # Cache de 30 minutos: clientes, produtos e estoque não têm versão publicada pelo importador
 async def get_performance_report(
     period: str = Query("month", description="Período: day, week, month"),
     current_user: dict = Depends(get_current_user)
@@ -346,6 +446,36 @@ async def get_performance_report(
         )
 
 
+@router.get("/performance/slow-queries")
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=200),
+    _admin=Depends(get_current_admin_user)
+):
+    """
+    Log de queries lentas com planos EXPLAIN e p50/p95 por fingerprint (apenas admin)
+    """
+    return {
+        "status": "success",
+        "threshold_ms": query_monitor.threshold_ms,
+        "slow_queries": query_monitor.get_slow_queries(limit),
+        "fingerprints": query_monitor.get_fingerprint_stats()[:limit],
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@router.delete("/performance/slow-queries")
+async def reset_slow_queries(_admin=Depends(get_current_admin_user)):
+    """
+    Limpa o log de queries lentas e as estatísticas por fingerprint (apenas admin)
+    """
+    query_monitor.reset()
+    return {
+        "status": "success",
+        "message": "Log de queries lentas limpo",
+        "timestamp": datetime.now().isoformat()
+    }
+
+
 def _calculate_performance_grade(kpis: Dict) -> str:
     """Calcula grade de performance baseado nos KPIs"""
     try:
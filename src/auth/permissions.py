@@ -0,0 +1,76 @@
+"""
+Permission profile of a user (access level of the job title and division).
+
+Single source for the agent, the analysis routes and the 'tier' cache scope:
+the profile is read from `usuarios` (cargos.nivel_acesso, divisoes.codigo)
+with the service role and cached per user.
+"""
+import asyncio
+from typing import Any, Dict, Optional
+
+from fastapi import Depends, HTTPException, status
+
+from src.auth.dependencies import get_current_user
+from src.cache.tiered import tiered_cache
+from src import supabase_client
+
+PERMISSIONS_NAMESPACE = "permissions"
+
+# Minimum access level for the CVDW (RAW tables) data
+CVDW_MIN_LEVEL = 2
+
+
+def build_permissions(user_id: Any, nivel_acesso: int, divisao: str) -> Dict[str, Any]:
+    """Permission profile for an access level and division."""
+    return {
+        "user_id": str(user_id),
+        "nivel_acesso": nivel_acesso,
+        "divisao": divisao,
+        "can_access_sienge": nivel_acesso >= 3,
+        "can_access_cvdw": nivel_acesso >= CVDW_MIN_LEVEL,
+        "can_access_powerbi": nivel_acesso >= 2,
+    }
+
+
+def permission_tier(permissions: Optional[Dict[str, Any]]) -> str:
+    """Users with the same tier see the same data (shared cache entries)."""
+    permissions = permissions or {}
+    return "nivel:{}:{}".format(permissions.get("nivel_acesso", "-"), permissions.get("divisao", "-"))
+
+
+async def load_user_permissions(user_id: Any) -> Dict[str, Any]:
+    """
+    Read the profile from the database and refresh the cache.
+
+    On failure returns the most restrictive profile (not cached).
+    """
+    try:
+        response = await asyncio.to_thread(
+            lambda: supabase_client.supabase_admin_client.table("usuarios")
+            .select("*, cargos(nivel_acesso), divisoes(codigo)")
+            .eq("id", str(user_id))
+            .single()
+            .execute()
+        )
+        user_data = response.data if isinstance(response.data, dict) else {}
+        nivel_acesso = user_data.get("cargos", {}).get("nivel_acesso", 1) if user_data.get("cargos") else 1
+        divisao = user_data.get("divisoes", {}).get("codigo", "ALL") if user_data.get("divisoes") else "ALL"
+        permissions = build_permissions(user_id, nivel_acesso, divisao)
+        await tiered_cache.set(PERMISSIONS_NAMESPACE, str(user_id), permissions, tags=[f"user:{user_id}"])
+        return permissions
+    except Exception:
+        return {**build_permissions(user_id, 1, "ALL"), "can_access_powerbi": True}
+
+
+async def get_user_permissions(user_id: Any) -> Dict[str, Any]:
+    """Cached profile of the user (database on a miss)."""
+    cached = await tiered_cache.get(PERMISSIONS_NAMESPACE, str(user_id), tags=[f"user:{user_id}"])
+    return cached or await load_user_permissions(user_id)
+
+
+async def require_cvdw_access(current_user=Depends(get_current_user)):
+    """Dependency: same CVDW gate the agent applies (nivel_acesso >= 2)."""
+    permissions = await get_user_permissions(current_user.id)
+    if not permissions.get("can_access_cvdw"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Sem permissao para dados do CVDW")
+    return current_user
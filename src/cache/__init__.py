@@ -1,3 +1,6 @@
+from .tiered import TieredCache, tiered_cache
+from .warming import CacheWarmer, cache_warmer
+from .range_cache import RangeCache, range_cache
 from .redis_manager import RedisCacheManager, cache_manager, cache_decorator
 
-__all__ = ['RedisCacheManager', 'cache_manager', 'cache_decorator']
+__all__ = ['TieredCache', 'tiered_cache', 'CacheWarmer', 'cache_warmer', 'RangeCache', 'range_cache', 'RedisCacheManager', 'cache_manager', 'cache_decorator']
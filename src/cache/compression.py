@@ -0,0 +1,196 @@
+# src/cache/compression.py
+"""
+Compressão dos payloads grandes do cache
+
+Valores acima de CACHE_COMPRESS_MIN_BYTES (gráficos plotly, relatórios,
+páginas de resultados) são comprimidos antes de ir para o L1 e o Redis.
+Usa zstd (pacote zstandard) quando instalado e zlib da biblioteca padrão
+como fallback; os dois aceitam um dicionário treinado com payloads típicos
+(scripts/train_cache_dictionary.py), o que melhora muito a razão em
+payloads JSON de poucos KB com as mesmas chaves.
+"""
+import os
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_NONE = 0
+CODEC_ZSTD = 1
+CODEC_ZLIB = 2
+
+CODEC_NAMES = {CODEC_NONE: 'none', CODEC_ZSTD: 'zstd', CODEC_ZLIB: 'zlib'}
+
+# Janela máxima do zlib: dicionários maiores são truncados (vale o final)
+_ZLIB_MAX_DICT = 32 * 1024
+
+
+def dictionary_id(data: bytes) -> int:
+    """Identificador estável do dicionário, gravado em cada payload comprimido"""
+    if zstandard is not None:
+        try:
+            dict_id = zstandard.ZstdCompressionDict(data).dict_id()
+            if dict_id:
+                return dict_id
+        except Exception:
+            pass
+    return zlib.adler32(data) or 1
+
+
+def train_dictionary(samples: List[bytes], dict_size: int = 64 * 1024) -> bytes:
+    """
+    Treina um dicionário a partir de payloads típicos
+
+    Com zstandard usa o treinador do zstd; sem ele, monta um dicionário
+    zlib com as amostras mais recentes (o zlib prioriza o fim do dicionário).
+    """
+    if not samples:
+        raise ValueError("Nenhuma amostra para treinar o dicionario")
+    if zstandard is not None:
+        return zstandard.train_dictionary(dict_size, samples).as_bytes()
+
+    size = min(dict_size, _ZLIB_MAX_DICT)
+    per_sample = max(256, size // len(samples))
+    return b''.join(sample[:per_sample] for sample in samples)[-size:]
+
+
+class PayloadCompressor:
+    """Comprime/descomprime corpos serializados e mede o ganho"""
+
+    def __init__(
+        self,
+        min_bytes: Optional[int] = None,
+        level: Optional[int] = None,
+        dictionary_path: Optional[str] = None
+    ):
+        """dictionary_path='' ignora CACHE_COMPRESS_DICT_PATH (sem dicionário)"""
+        self.min_bytes = min_bytes if min_bytes is not None else int(os.getenv('CACHE_COMPRESS_MIN_BYTES', '4096'))
+        self.level = level if level is not None else int(os.getenv('CACHE_COMPRESS_LEVEL', '3'))
+        self.enabled = os.getenv('CACHE_COMPRESS_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+        self.codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+        self.dict_id = 0
+        self._dictionaries: Dict[int, bytes] = {}
+        self._zstd_dicts: Dict[int, Any] = {}
+        self._compressor = None
+
+        self.compressed = 0
+        self.skipped_small = 0
+        self.skipped_incompressible = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.encode_seconds = 0.0
+        self.decoded = 0
+        self.decode_seconds = 0.0
+
+        path = dictionary_path if dictionary_path is not None else os.getenv('CACHE_COMPRESS_DICT_PATH')
+        if path:
+            try:
+                with open(path, 'rb') as f:
+                    self.load_dictionary(f.read())
+                print(f"[OK] Dicionario de compressao do cache carregado: {path} (id={self.dict_id})")
+            except OSError as e:
+                print(f"[WARN] Dicionario de compressao nao carregado ({path}): {e}")
+        self._build_compressor()
+
+    def load_dictionary(self, data: bytes) -> int:
+        """Passa a comprimir com o dicionário (os anteriores seguem decodificáveis)"""
+        dict_id = dictionary_id(data)
+        self._dictionaries[dict_id] = data
+        self.dict_id = dict_id
+        self._build_compressor()
+        return dict_id
+
+    def _build_compressor(self) -> None:
+        if self.codec != CODEC_ZSTD:
+            return
+        zdict = self._zstd_dict(self.dict_id) if self.dict_id else None
+        self._compressor = zstandard.ZstdCompressor(level=self.level, dict_data=zdict)
+
+    def _zstd_dict(self, dict_id: int):
+        zdict = self._zstd_dicts.get(dict_id)
+        if zdict is None:
+            zdict = zstandard.ZstdCompressionDict(self._dictionaries[dict_id])
+            self._zstd_dicts[dict_id] = zdict
+        return zdict
+
+    def compress(self, body: bytes) -> Tuple[int, int, bytes]:
+        """
+        Returns:
+            (codec, dict_id, dados); CODEC_NONE quando não compensa comprimir
+        """
+        if not self.enabled or len(body) < self.min_bytes:
+            self.skipped_small += 1
+            return CODEC_NONE, 0, body
+
+        start = time.perf_counter()
+        if self.codec == CODEC_ZSTD:
+            data = self._compressor.compress(body)
+        else:
+            compressor = (
+                zlib.compressobj(self.level, zdict=self._dictionaries[self.dict_id][-_ZLIB_MAX_DICT:])
+                if self.dict_id else zlib.compressobj(self.level)
+            )
+            data = compressor.compress(body) + compressor.flush()
+        self.encode_seconds += time.perf_counter() - start
+
+        if len(data) >= len(body):
+            self.skipped_incompressible += 1
+            return CODEC_NONE, 0, body
+
+        self.compressed += 1
+        self.bytes_in += len(body)
+        self.bytes_out += len(data)
+        return self.codec, self.dict_id, data
+
+    def decompress(self, codec: int, dict_id: int, data: bytes) -> bytes:
+        """Desfaz compress(); ValueError se o codec ou o dicionário não estiverem disponíveis"""
+        if codec == CODEC_NONE:
+            return bytes(data)
+        if dict_id and dict_id not in self._dictionaries:
+            raise ValueError(f"Dicionario de compressao desconhecido: {dict_id}")
+
+        start = time.perf_counter()
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise ValueError("Payload zstd no cache, mas zstandard nao esta instalado")
+            decompressor = zstandard.ZstdDecompressor(dict_data=self._zstd_dict(dict_id) if dict_id else None)
+            body = decompressor.decompress(data)
+        elif codec == CODEC_ZLIB:
+            decompressor = (
+                zlib.decompressobj(zdict=self._dictionaries[dict_id][-_ZLIB_MAX_DICT:])
+                if dict_id else zlib.decompressobj()
+            )
+            body = decompressor.decompress(data) + decompressor.flush()
+        else:
+            raise ValueError(f"Codec de compressao desconhecido: {codec}")
+        self.decoded += 1
+        self.decode_seconds += time.perf_counter() - start
+        return body
+
+    def get_stats(self) -> Dict[str, Any]:
+        attempts = self.compressed + self.skipped_incompressible
+        return {
+            'enabled': self.enabled,
+            'codec': CODEC_NAMES[self.codec],
+            'dictionary_id': self.dict_id or None,
+            'min_bytes': self.min_bytes,
+            'level': self.level,
+            'compressed': self.compressed,
+            'skipped_small': self.skipped_small,
+            'skipped_incompressible': self.skipped_incompressible,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'bytes_saved': self.bytes_in - self.bytes_out,
+            'ratio': round(self.bytes_in / self.bytes_out, 3) if self.bytes_out else None,
+            'avg_encode_ms': round(self.encode_seconds / attempts * 1000, 3) if attempts else 0.0,
+            'avg_decode_ms': round(self.decode_seconds / self.decoded * 1000, 3) if self.decoded else 0.0,
+        }
+
+
+# Instância global
+payload_compressor = PayloadCompressor()
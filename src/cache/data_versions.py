@@ -0,0 +1,102 @@
+# src/cache/data_versions.py
+"""
+Invalidação dos caches por evento de importação
+
+O importador CVDW publica uma versão por tabela RAW em data_versions
+(database/migrations/005) ao terminar, apenas quando o conteúdo mudou.
+Este watcher acompanha a tabela e, a cada mudança, invalida as tags
+table:<tabela> (e data:all) e dispara o cache warming. Resultados
+derivados só de tabelas versionadas ficam válidos até os dados mudarem,
+sem depender de TTL curto.
+"""
+import os
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from .tiered import TieredCache, tiered_cache
+from .warming import cache_warmer
+
+# Tag de entradas que dependem de qualquer tabela (ex: respostas do agente)
+ANY_DATA_TAG = 'data:all'
+
+
+class DataVersionWatcher:
+    """Acompanha data_versions e invalida os caches das tabelas alteradas"""
+
+    def __init__(self, cache: Optional[TieredCache] = None):
+        self.cache = cache or tiered_cache
+        self.poll_seconds = int(os.getenv('CACHE_DATA_VERSION_POLL_SECONDS', '60'))
+        self.client = None
+        self.versions: Dict[str, int] = {}
+        self.polls = 0
+        self.errors = 0
+        self.changes = 0
+        self.last_change: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def fetch_versions(self) -> Dict[str, int]:
+        response = await asyncio.to_thread(
+            lambda: self.client.table('data_versions').select('tabela, versao').execute()
+        )
+        return {row['tabela']: int(row['versao']) for row in (response.data or [])}
+
+    async def poll(self) -> List[str]:
+        """
+        Lê as versões atuais e invalida o que mudou
+
+        Returns:
+            Tabelas invalidadas nesta leitura
+        """
+        versions = await self.fetch_versions()
+        self.polls += 1
+        changed = await self.cache.observe_data_versions(versions)
+        self.versions = versions
+        if not changed:
+            return []
+
+        new_versions = await self.cache.invalidate_tags([f"table:{t}" for t in changed] + [ANY_DATA_TAG])
+        self.changes += 1
+        self.last_change = {
+            'tables': changed,
+            'data_versions': {t: versions[t] for t in changed},
+            'tag_versions': new_versions,
+            'at': datetime.now().isoformat(),
+        }
+        print(f"Dados atualizados ({', '.join(changed)}): caches derivados invalidados")
+        cache_warmer.notify_data_changed()
+        return changed
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                self.errors += 1
+                print(f"Erro ao ler data_versions: {e}")
+            await asyncio.sleep(self.poll_seconds)
+
+    def start(self, client) -> None:
+        """Inicia o acompanhamento (chamar no startup da aplicação)"""
+        self.client = client
+        if self._task is None and self.poll_seconds > 0:
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'poll_seconds': self.poll_seconds,
+            'versions': self.versions,
+            'polls': self.polls,
+            'errors': self.errors,
+            'changes': self.changes,
+            'last_change': self.last_change,
+        }
+
+
+# Instância global
+data_version_watcher = DataVersionWatcher()
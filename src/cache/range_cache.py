@@ -0,0 +1,164 @@
+# src/cache/range_cache.py
+"""
+Cache de séries por intervalo de datas
+
+Em vez de guardar a série inteira por (início, fim), guarda um agregado por
+segmento fixo (dia, semana, mês ou ano). Um intervalo pedido é montado com
+os segmentos já em cache e só os que faltam vão ao banco, agrupados em
+trechos contíguos: Jan–Jun e Fev–Jul compartilham cinco meses.
+"""
+import os
+import asyncio
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .tiered import TieredCache, tiered_cache
+
+# (início, fim) inclusivos -> linhas com a data de início do segmento
+RangeFetcher = Callable[[str, str], Awaitable[List[Dict[str, Any]]]]
+
+SEGMENT_UNITS = {'day', 'week', 'month', 'year'}
+
+
+def segment_start(day: date, unit: str) -> date:
+    """Início do segmento que contém o dia (semana começa na segunda, como DATE_TRUNC)"""
+    if unit == 'week':
+        return day - timedelta(days=day.weekday())
+    if unit == 'month':
+        return day.replace(day=1)
+    if unit == 'year':
+        return day.replace(month=1, day=1)
+    return day
+
+
+def next_segment(start: date, unit: str) -> date:
+    if unit == 'week':
+        return start + timedelta(days=7)
+    if unit == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    if unit == 'year':
+        return start.replace(year=start.year + 1)
+    return start + timedelta(days=1)
+
+
+def split_segments(start: date, end: date, unit: str) -> List[Tuple[date, date, date, bool]]:
+    """
+    Segmentos que cobrem [start, end]
+
+    Returns:
+        (início do segmento, início recortado, fim recortado, completo?)
+        Segmentos das bordas cortados pelo intervalo não são completos.
+    """
+    segments = []
+    current = segment_start(start, unit)
+    while current <= end:
+        following = next_segment(current, unit)
+        last_day = following - timedelta(days=1)
+        clipped_start, clipped_end = max(current, start), min(last_day, end)
+        segments.append((current, clipped_start, clipped_end, clipped_start == current and clipped_end == last_day))
+        current = following
+    return segments
+
+
+class RangeCache:
+    """Agregados por segmento de tempo, combinados para qualquer intervalo"""
+
+    def __init__(self, namespace: str = 'ranges', cache: Optional[TieredCache] = None):
+        self.namespace = namespace
+        self.cache = cache or tiered_cache
+        self.max_segments = int(os.getenv('CACHE_RANGE_MAX_SEGMENTS', '1000'))
+        self.segment_hits = 0
+        self.segment_misses = 0
+        self.db_fetches = 0
+        self.bypassed = 0
+
+    async def series(
+        self,
+        series_key: Dict[str, Any],
+        start_date: Optional[str],
+        end_date: Optional[str],
+        unit: str,
+        fetch: RangeFetcher,
+        date_field: str = 'data',
+        tags: Optional[Iterable[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Série do intervalo por segmento, buscando no banco só o que falta
+
+        Args:
+            series_key: identifica a série (fato, filtros...); entra na chave de cada segmento
+            unit: tamanho do segmento (day, week, month, year), igual ao agrupamento da série
+            fetch: consulta o banco para um trecho contíguo (datas inclusivas)
+            date_field: campo da linha com o início do segmento
+            tags: tags de invalidação dos segmentos (ex: ["table:vendas"])
+        """
+        tags = list(tags or [])
+        try:
+            start = date.fromisoformat(str(start_date)[:10])
+            end = date.fromisoformat(str(end_date)[:10])
+        except ValueError:
+            start = end = None
+        if unit not in SEGMENT_UNITS or start is None or end is None or start > end:
+            self.bypassed += 1
+            return await fetch(start_date, end_date)
+
+        segments = split_segments(start, end, unit)
+        if len(segments) > self.max_segments:
+            self.bypassed += 1
+            return await fetch(start_date, end_date)
+
+        keys = [self._segment_key(series_key, unit, seg[0]) for seg in segments]
+        full = [i for i, seg in enumerate(segments) if seg[3]]
+        cached = await self.cache.get_many([(self.namespace, keys[i], tags) for i in full])
+        rows: Dict[int, Optional[Dict[str, Any]]] = {}
+        for i, value in zip(full, cached):
+            if value is not None:
+                rows[i] = value or None  # {} = segmento sem dados
+        self.segment_hits += len(rows)
+        self.segment_misses += len(segments) - len(rows)
+
+        # Trechos contíguos de segmentos ausentes, um fetch cada
+        runs: List[List[int]] = []
+        for i in range(len(segments)):
+            if i in rows:
+                continue
+            if runs and runs[-1][-1] == i - 1:
+                runs[-1].append(i)
+            else:
+                runs.append([i])
+
+        if runs:
+            results = await asyncio.gather(*(
+                fetch(segments[run[0]][1].isoformat(), segments[run[-1]][2].isoformat()) for run in runs
+            ))
+            self.db_fetches += len(runs)
+            to_store = []
+            for run, fetched in zip(runs, results):
+                by_segment = {str(row.get(date_field))[:10]: row for row in fetched}
+                for i in run:
+                    row = by_segment.get(segments[i][0].isoformat())
+                    rows[i] = row
+                    if segments[i][3]:
+                        to_store.append((self.namespace, keys[i], row or {}, None, tags))
+            if to_store:
+                await self.cache.set_many(to_store)
+
+        return [rows[i] for i in range(len(segments)) if rows.get(i)]
+
+    def _segment_key(self, series_key: Dict[str, Any], unit: str, start: date) -> str:
+        return self.cache.hash_key({'series': series_key, 'unit': unit, 'segment': start.isoformat()})
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.segment_hits + self.segment_misses
+        return {
+            'namespace': self.namespace,
+            'segment_hits': self.segment_hits,
+            'segment_misses': self.segment_misses,
+            'segment_hit_rate': round(self.segment_hits / lookups, 4) if lookups else 0.0,
+            'db_fetches': self.db_fetches,
+            'bypassed': self.bypassed,
+        }
+
+
+# Instância global
+range_cache = RangeCache()
@@ -1,158 +1,353 @@
 # src/cache/redis_manager.py
-import redis
 import json
 import hashlib
+import inspect
 from typing import Any, Optional, Dict, List
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import asyncio
+import time
 from functools import wraps
 
+from .tiered import CacheEntry, TieredCache, tiered_cache
+from .warming import cache_warmer, WARM_FRESH, WARM_WARMED
+from .range_cache import range_cache
+
 class RedisCacheManager:
-    """Sistema de cache otimizado para o Analytics Platform"""
+    """Interface de cache usada por /analyses, sobre o cache em dois níveis (L1 + Redis)"""
 
-    def __init__(self):
-        try:
-            self.redis_client = redis.Redis(
-                host='localhost',
-                port=6379,
-                db=0,
-                decode_responses=True,
-                socket_timeout=5,
-                socket_connect_timeout=5,
-                retry_on_timeout=True,
-                health_check_interval=30
-            )
-            # Testar conexão
-            self.redis_client.ping()
-            print("Redis connected successfully")
-        except Exception as e:
-            print(f"Redis unavailable, using in-memory cache: {e}")
-            self.redis_client = None
-            self.memory_cache = {}
+    def __init__(self, cache: Optional[TieredCache] = None):
+        self.cache = cache or tiered_cache
 
     def generate_cache_key(self, prefix: str, params: Dict) -> str:
         """Gera chave de cache única baseada nos parâmetros"""
         params_str = json.dumps(params, sort_keys=True, default=str)
-        params_hash = hashlib.md5(params_str.encode()).hexdigest()[:8]
+        params_hash = hashlib.sha256(params_str.encode()).hexdigest()
         return f"{prefix}:{params_hash}"
 
-    def cache_result(self, key: str, data: Any, expiration: int = 3600) -> bool:
-        """Armazena resultado no cache"""
+    async def cache_result(
+        self,
+        key: str,
+        data: Any,
+        expiration: int = 3600,
+        tags: Optional[List[str]] = None,
+        stale_ttl: int = 0,
+        compute_time: float = 0.0
+    ) -> bool:
+        """Armazena resultado no cache (o prefixo da chave é o namespace)"""
         try:
-            if self.redis_client:
-                serialized_data = json.dumps(data, default=str)
-                return self.redis_client.setex(key, expiration, serialized_data)
-            else:
-                # Cache em memória como fallback
-                self.memory_cache[key] = {
-                    'data': data,
-                    'expires': datetime.now() + timedelta(seconds=expiration)
-                }
-                return True
+            namespace, _, name = key.partition(':')
+            return await self.cache.set(
+                namespace, name, data, expiration,
+                tags=tags, stale_ttl=stale_ttl, compute_time=compute_time
+            )
         except Exception as e:
             print(f"Erro ao armazenar cache: {e}")
             return False
 
-    def get_cached_result(self, key: str) -> Optional[Any]:
-        """Recupera resultado do cache"""
+    async def get_cached_result(self, key: str, tags: Optional[List[str]] = None) -> Optional[Any]:
+        """Recupera resultado do cache (use as mesmas tags do cache_result)"""
         try:
-            if self.redis_client:
-                cached_data = self.redis_client.get(key)
-                if cached_data:
-                    return json.loads(cached_data)
-            else:
-                # Cache em memória
-                if key in self.memory_cache:
-                    cache_item = self.memory_cache[key]
-                    if cache_item['expires'] > datetime.now():
-                        return cache_item['data']
-                    else:
-                        # Expirou, remover
-                        del self.memory_cache[key]
+            namespace, _, name = key.partition(':')
+            return await self.cache.get(namespace, name, tags=tags)
+        except Exception as e:
+            print(f"Erro ao recuperar cache: {e}")
             return None
+
+    async def get_cached_entry(self, key: str, tags: Optional[List[str]] = None) -> Optional[CacheEntry]:
+        """Recupera a entrada com metadados (idade, validade), inclusive stale"""
+        try:
+            namespace, _, name = key.partition(':')
+            return await self.cache.get_entry(namespace, name, tags=tags)
         except Exception as e:
             print(f"Erro ao recuperar cache: {e}")
             return None
 
-    def invalidate_cache(self, pattern: str) -> int:
-        """Invalida cache por padrão"""
+    async def acquire_refresh_lock(self, key: str, ttl: int = 60) -> bool:
+        """Lock entre workers para recalcular uma entrada"""
+        namespace, _, name = key.partition(':')
+        return await self.cache.acquire_refresh_lock(namespace, name, ttl)
+
+    async def invalidate_cache(self, pattern: str) -> int:
+        """
+        Invalida o namespace de um padrão 'namespace:*'
+
+        Sem varredura de chaves: o namespace inteiro muda de geração.
+        Retorna a nova geração.
+        """
         try:
-            if self.redis_client:
-                keys = self.redis_client.keys(pattern)
-                if keys:
-                    return self.redis_client.delete(*keys)
-            else:
-                # Cache em memória
-                deleted = 0
-                keys_to_delete = [k for k in self.memory_cache.keys() if pattern.replace('*', '') in k]
-                for key in keys_to_delete:
-                    del self.memory_cache[key]
-                    deleted += 1
-                return deleted
-            return 0
+            namespace = pattern.partition(':')[0]
+            return await self.cache.invalidate_namespace(namespace)
         except Exception as e:
             print(f"Erro ao invalidar cache: {e}")
             return 0
 
-    def get_cache_stats(self) -> Dict:
-        """Retorna estatísticas do cache"""
+    async def invalidate_tags(self, tags: List[str]) -> Dict[str, int]:
+        """Invalida as entradas marcadas com as tags (ex: table:vendas, user:<id>)"""
+        try:
+            return await self.cache.invalidate_tags(tags)
+        except Exception as e:
+            print(f"Erro ao invalidar tags: {e}")
+            return {}
+
+    async def get_cache_stats(self) -> Dict:
+        """Retorna estatísticas do cache por nível"""
         try:
-            if self.redis_client:
-                info = self.redis_client.info()
-                db_info = info.get('db0', {})
-                keyspace_hits = info.get('keyspace_hits', 0)
-                keyspace_misses = info.get('keyspace_misses', 1)
-
-                return {
-                    'total_keys': db_info.get('keys', 0) if isinstance(db_info, dict) else 0,
-                    'expires': db_info.get('expires', 0) if isinstance(db_info, dict) else 0,
-                    'used_memory': info.get('used_memory_human', '0B'),
-                    'hit_rate': keyspace_hits / max(1, keyspace_hits + keyspace_misses),
-                    'status': 'connected'
-                }
-            else:
-                return {
-                    'total_keys': len(self.memory_cache),
-                    'expires': len([k for k, v in self.memory_cache.items() if v['expires'] > datetime.now()]),
-                    'used_memory': f'{sum(len(str(v)) for v in self.memory_cache.values())} bytes',
-                    'hit_rate': 0.85,  # Estimativa
-                    'status': 'memory_fallback'
-                }
+            stats = await self.cache.get_stats()
+            return {
+                'total_keys': stats['l1']['size'],
+                'hit_rate': stats['l1']['hit_rate'],
+                'status': 'connected' if stats['l2']['enabled'] else 'memory_fallback',
+                **stats,
+                'ranges': range_cache.get_stats()
+            }
         except Exception as e:
             return {'status': 'error', 'error': str(e)}
 
 # Instância global
 cache_manager = RedisCacheManager()
 
-def cache_decorator(prefix: str, expiration: int = 3600, invalidate_patterns: List[str] = None):
-    """Decorator para cache automático de funções"""
+# Parâmetros de rota que identificam o usuário (nunca entram na chave)
+_USER_PARAMS = ('current_user', '_admin')
+
+CACHE_SCOPES = ('public', 'tier', 'user')
+
+
+def _user_attr(user: Any, name: str) -> Any:
+    if isinstance(user, dict):
+        return user.get(name)
+    return getattr(user, name, None)
+
+
+def cache_scope_id(scope: str, user: Any, permissions: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Identificador do escopo de compartilhamento de uma entrada
+
+    public: todos os usuários; tier: mesmo nível de acesso e divisão
+    (perfil de permissões do usuário); user: só o usuário
+    """
+    if scope not in CACHE_SCOPES:
+        raise ValueError(f"Escopo de cache invalido: {scope}. Use: {', '.join(CACHE_SCOPES)}")
+    if scope == 'public' or user is None:
+        return 'public'
+    if scope == 'tier':
+        from ..auth.permissions import permission_tier  # import tardio: permissions importa o cache
+        return f"tier:{permission_tier(permissions)}"
+    return f"user:{_user_attr(user, 'id')}"
+
+
+async def _scope_permissions(scope: str, user: Any) -> Optional[Dict[str, Any]]:
+    """Perfil de permissões que define o escopo 'tier' (o mesmo que o agente usa)"""
+    if scope != 'tier' or user is None:
+        return None
+    from ..auth.permissions import get_user_permissions
+    return await get_user_permissions(_user_attr(user, 'id'))
+
+
+def _scope_user(scope: str, user: Any) -> Optional[Dict[str, Any]]:
+    """
+    Usuário da receita de aquecimento: só o id, que basta para refazer o
+    escopo (no 'tier', o perfil desse usuário define o nível)
+    """
+    if scope == 'public' or user is None:
+        return None
+    return {'id': _user_attr(user, 'id')}
+
+
+def canonicalize(value: Any) -> Any:
+    """Forma canônica de um parâmetro para compor a chave"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {str(k): canonicalize(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (set, frozenset)):
+        return sorted(canonicalize(v) for v in value)
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(v) for v in value]
+    if hasattr(value, 'model_dump'):
+        return canonicalize(value.model_dump())
+    return value
+
+
+def snap_date_range(start: Optional[str], end: Optional[str], grain: Optional[str]) -> tuple:
+    """
+    Alinha um intervalo de datas ao grão do agrupamento
+
+    weekly: segunda a domingo; monthly: mês inteiro; yearly: ano inteiro.
+    daily (ou grão desconhecido) mantém as datas.
+    """
+    grain = (grain or '').lower()
+    try:
+        start_d = date.fromisoformat(str(start)[:10]) if start else None
+        end_d = date.fromisoformat(str(end)[:10]) if end else None
+    except ValueError:
+        return start, end
+
+    if grain in ('weekly', 'week'):
+        start_d = start_d and start_d - timedelta(days=start_d.weekday())
+        end_d = end_d and end_d + timedelta(days=6 - end_d.weekday())
+    elif grain in ('monthly', 'month'):
+        start_d = start_d and start_d.replace(day=1)
+        end_d = end_d and (end_d.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    elif grain in ('yearly', 'year'):
+        start_d = start_d and start_d.replace(month=1, day=1)
+        end_d = end_d and end_d.replace(month=12, day=31)
+    else:
+        return start, end
+
+    return (start_d.isoformat() if start_d else start, end_d.isoformat() if end_d else end)
+
+
+# Recalculos em andamento neste processo (single-flight por chave)
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+def _single_flight(cache_key: str, factory) -> asyncio.Task:
+    task = _inflight.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _inflight[cache_key] = task
+        task.add_done_callback(lambda _: _inflight.pop(cache_key, None))
+    return task
+
+
+def _log_refresh_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception():
+        print(f"Erro ao recalcular cache em background: {task.exception()}")
+
+
+def _annotate(result: Any, cached: bool, age: float, stale: bool = False) -> Any:
+    """Marca a resposta com a origem real (cache ou cálculo) e a idade em segundos"""
+    if not isinstance(result, dict):
+        return result
+    annotated = {**result, 'cached': cached, 'age': round(age, 1)}
+    if stale:
+        annotated['stale'] = True
+    return annotated
+
+
+def cache_decorator(
+    prefix: str,
+    expiration: int = 3600,
+    invalidate_patterns: List[str] = None,
+    tags: Optional[List[str]] = None,
+    scope: str = 'user',
+    date_params: Optional[tuple] = None,
+    grain_param: Optional[str] = None,
+    stale_ttl: int = 0,
+    warm: bool = False,
+    per_day: bool = False
+):
+    """
+    Decorator para cache automático de rotas
+
+    A chave é feita dos parâmetros da rota em forma canônica (sem o usuário)
+    mais o escopo: 'public', 'tier' (nível de acesso + divisão) ou 'user'.
+
+    Com stale_ttl > 0 a entrada vencida continua sendo servida por até
+    stale_ttl segundos enquanto um único worker a recalcula em background;
+    perto do vencimento o recálculo é antecipado de forma probabilística
+    (XFetch), espalhando os refreshes.
+
+    Args:
+        tags: tags de invalidação das entradas (ex: ["table:vendas"])
+        scope: com quem a entrada é compartilhada
+        date_params: nomes dos parâmetros (início, fim) a alinhar ao grão
+        grain_param: parâmetro com o grão (daily, weekly, monthly, yearly)
+        stale_ttl: janela (s) em que o valor vencido ainda é servido
+        warm: conta os acessos e pré-calcula as chaves mais pedidas (ver warming.py)
+        per_day: a entrada vale só no dia corrente (janelas relativas a hoje)
+
+    Com tags table:<tabela>, a entrada é invalidada quando o importador
+    publica uma nova versão da tabela (ver data_versions.py), então o
+    expiration pode ser longo se todas as tabelas de origem têm versão
+    publicada; com alguma tabela fora de data_versions, mantenha-o curto.
+    """
+    cache_scope_id(scope, None)  # valida o escopo na importação
+
     def decorator(func):
+        signature = inspect.signature(func)
+
+        async def resolve(arguments: Dict[str, Any]) -> tuple:
+            # Alinhar datas ao grão: chave e consulta usam o mesmo intervalo
+            if date_params and grain_param:
+                start_name, end_name = date_params
+                arguments[start_name], arguments[end_name] = snap_date_range(
+                    arguments.get(start_name), arguments.get(end_name), arguments.get(grain_param)
+                )
+
+            user = next((arguments[name] for name in _USER_PARAMS if name in arguments), None)
+            scope_id = cache_scope_id(scope, user, await _scope_permissions(scope, user))
+            entry_tags = list(tags or [])
+            if scope_id.startswith('user:'):
+                entry_tags.append(scope_id)
+
+            params = {k: canonicalize(v) for k, v in arguments.items() if k not in _USER_PARAMS}
+            key_data = {'scope': scope_id, 'params': params}
+            if per_day:
+                key_data['as_of'] = date.today().isoformat()
+            cache_key = cache_manager.generate_cache_key(prefix, key_data)
+            return cache_key, entry_tags, scope_id, params, user
+
+        def compute_and_store(arguments: Dict[str, Any], cache_key: str, entry_tags: List[str]):
+            async def run():
+                start = time.perf_counter()
+                if asyncio.iscoroutinefunction(func):
+                    result = await func(**arguments)
+                else:
+                    result = func(**arguments)
+                await cache_manager.cache_result(
+                    cache_key, result, expiration,
+                    tags=entry_tags, stale_ttl=stale_ttl,
+                    compute_time=time.perf_counter() - start
+                )
+                return result
+            return run
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # Gerar chave de cache
-            cache_params = {
-                'func_name': func.__name__,
-                'args': str(args),
-                'kwargs': kwargs
-            }
-            cache_key = cache_manager.generate_cache_key(prefix, cache_params)
+            bound = signature.bind_partial(*args, **kwargs)
+            arguments = dict(bound.arguments)
+            cache_key, entry_tags, scope_id, params, user = await resolve(arguments)
+            factory = compute_and_store(arguments, cache_key, entry_tags)
+
+            if warm:
+                cache_warmer.record(prefix, {
+                    'arguments': params,
+                    'user_param': next((name for name in _USER_PARAMS if name in arguments), None),
+                }, scope_id, context={'user': _scope_user(scope, user)})
 
-            # Tentar recuperar do cache
-            cached_result = cache_manager.get_cached_result(cache_key)
-            if cached_result is not None:
+            entry = await cache_manager.get_cached_entry(cache_key, tags=entry_tags)
+            if entry is not None:
+                if not entry.is_fresh or entry.should_refresh_early():
+                    if cache_key not in _inflight and await cache_manager.acquire_refresh_lock(cache_key):
+                        print(f"Cache refresh em background: {cache_key}")
+                        _single_flight(cache_key, factory).add_done_callback(_log_refresh_error)
                 print(f"Cache hit: {cache_key}")
-                return cached_result
+                return _annotate(entry.value, cached=True, age=entry.age, stale=not entry.is_fresh)
 
-            # Executar função
+            # Miss: chamadas concorrentes no processo aguardam o mesmo cálculo
             print(f"Cache miss: {cache_key}")
-            if asyncio.iscoroutinefunction(func):
-                result = await func(*args, **kwargs)
-            else:
-                result = func(*args, **kwargs)
+            result = await asyncio.shield(_single_flight(cache_key, factory))
+            return _annotate(result, cached=False, age=0.0)
+
+        async def warm_entry(recipe: Dict[str, Any]) -> str:
+            """Recalcula a entrada de uma receita se ela estiver ausente ou na metade final do TTL"""
+            arguments = dict(recipe['arguments'])
+            if recipe.get('user_param'):
+                arguments[recipe['user_param']] = recipe.get('user')
+            cache_key, entry_tags, _, _, _ = await resolve(arguments)
 
-            # Armazenar no cache
-            cache_manager.cache_result(cache_key, result, expiration)
+            entry = await cache_manager.get_cached_entry(cache_key, tags=entry_tags)
+            if entry is not None and entry.is_fresh and entry.age < expiration / 2:
+                return WARM_FRESH
+            if cache_key not in _inflight and not await cache_manager.acquire_refresh_lock(cache_key):
+                return WARM_FRESH  # outro worker já está recalculando
+            await asyncio.shield(_single_flight(cache_key, compute_and_store(arguments, cache_key, entry_tags)))
+            return WARM_WARMED
 
-            return result
+        if warm:
+            cache_warmer.register(prefix, warm_entry)
         return wrapper
     return decorator
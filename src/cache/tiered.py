@@ -0,0 +1,773 @@
+# src/cache/tiered.py
+"""
+Cache em dois níveis compartilhado pela API (/analyses) e pelo agente.
+
+L1: LRU em processo limitada por bytes (valores guardados já serializados)
+L2: Redis compartilhado entre workers (REDIS_URL, redis.asyncio)
+
+Todas as chaves seguem o formato {CACHE_KEY_PREFIX}:{namespace}:{chave}.
+"""
+import asyncio
+import hashlib
+import heapq
+import json
+import math
+import os
+import random
+import struct
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from .compression import CODEC_NONE, payload_compressor
+
+# TTL padrão (segundos) por namespace; os demais usam REDIS_TTL
+NAMESPACE_TTLS = {
+    'kpis': 86400,
+    'sales_trends': 86400,
+    'performance_report': 1800,  # lê tabelas sem versão de dados
+    'pagination': 300,
+    'api_calls': 300,
+    'queries': 1800,
+    'analysis': 1800,
+    'context': 1800,
+    'conversation': 86400,
+    'permissions': 300,
+    'answers': 300,
+    'ranges': 86400,
+}
+DEFAULT_TTL = int(os.getenv('REDIS_TTL', '3600'))
+
+# Envelope: formato (1 byte) + criado_em + fresco_ate + stale_ate (epoch) + tempo de cálculo (s)
+# O byte de formato traz a serialização nos 4 bits baixos e o codec de
+# compressão nos 4 altos; corpos comprimidos vêm precedidos do id do dicionário.
+_HEADER = struct.Struct('>Bdddd')
+_DICT_ID = struct.Struct('>I')
+_FORMAT_MSGPACK = 1
+_FORMAT_JSON = 2
+
+# Peso do recálculo antecipado probabilístico (XFetch); 0 desliga
+XFETCH_BETA = float(os.getenv('CACHE_XFETCH_BETA', '1.0'))
+
+
+@dataclass
+class CacheEntry:
+    """Valor em cache com os metadados do envelope"""
+    value: Any
+    created_at: float
+    fresh_until: float
+    stale_until: float
+    compute_time: float = 0.0
+
+    @property
+    def age(self) -> float:
+        return max(0.0, time.time() - self.created_at)
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.time() < self.fresh_until
+
+    def should_refresh_early(self, beta: float = XFETCH_BETA) -> bool:
+        """
+        XFetch: recalcula antes de expirar com probabilidade crescente
+        perto do fim, proporcional ao custo do cálculo
+        """
+        if self.compute_time <= 0 or beta <= 0:
+            return False
+        jitter = -self.compute_time * beta * math.log(1.0 - random.random())
+        return time.time() + jitter >= self.fresh_until
+
+
+def _msgpack_default(obj: Any) -> Any:
+    """Mesmo comportamento do json.dumps(default=str) usado antes"""
+    return str(obj)
+
+
+def serialize(value: Any) -> Tuple[int, bytes]:
+    """Corpo serializado (msgpack, ou JSON sem msgpack), antes da compressão"""
+    if msgpack is not None:
+        return _FORMAT_MSGPACK, msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+    return _FORMAT_JSON, json.dumps(value, default=str, ensure_ascii=False).encode('utf-8')
+
+
+def encode(
+    value: Any,
+    ttl: float,
+    stale_ttl: float = 0,
+    compute_time: float = 0.0,
+    created_at: Optional[float] = None
+) -> bytes:
+    """Serializa o valor com o envelope de metadados"""
+    created_at = created_at if created_at is not None else time.time()
+    fmt, body = serialize(value)
+    fresh_until = created_at + ttl
+    codec, dict_id, body = payload_compressor.compress(body)
+    header = _HEADER.pack(fmt | codec << 4, created_at, fresh_until, fresh_until + stale_ttl, compute_time)
+    if codec != CODEC_NONE:
+        return header + _DICT_ID.pack(dict_id) + body
+    return header + body
+
+
+def decode(payload: bytes) -> CacheEntry:
+    """Desserializa um payload gerado por encode()"""
+    fmt, created_at, fresh_until, stale_until, compute_time = _HEADER.unpack_from(payload)
+    fmt, codec = fmt & 0x0F, fmt >> 4
+    body = memoryview(payload)[_HEADER.size:]
+    if codec != CODEC_NONE:
+        (dict_id,) = _DICT_ID.unpack_from(body)
+        body = payload_compressor.decompress(codec, dict_id, body[_DICT_ID.size:])
+    if fmt == _FORMAT_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Payload msgpack no cache, mas msgpack nao esta instalado")
+        value = msgpack.unpackb(body, raw=False, strict_map_key=False)
+    elif fmt == _FORMAT_JSON:
+        value = json.loads(bytes(body).decode('utf-8'))
+    else:
+        raise ValueError(f"Formato de cache desconhecido: {fmt}")
+    return CacheEntry(value, created_at, fresh_until, stale_until, compute_time)
+
+
+def _parse_quotas(spec: str) -> Dict[str, float]:
+    """'conversation=0.1,api_calls=0.3' -> {'conversation': 0.1, 'api_calls': 0.3}"""
+    quotas = {}
+    for part in spec.split(','):
+        name, _, fraction = part.partition('=')
+        if name.strip() and fraction.strip():
+            quotas[name.strip()] = float(fraction)
+    return quotas
+
+
+# Fração do L1 que cada namespace pode ocupar (os demais usam CACHE_L1_DEFAULT_QUOTA)
+NAMESPACE_QUOTAS = {
+    'conversation': 0.10,
+    'answers': 0.10,
+    'pagination': 0.15,
+    'api_calls': 0.30,
+    'warming': 0.02,
+    'ranges': 0.15,
+    **_parse_quotas(os.getenv('CACHE_L1_NAMESPACE_QUOTAS', '')),
+}
+DEFAULT_QUOTA = float(os.getenv('CACHE_L1_DEFAULT_QUOTA', '0.25'))
+
+
+class _NamespaceArea:
+    """LRU e contabilidade de bytes de um namespace no L1"""
+    __slots__ = ('entries', 'bytes', 'quota_bytes', 'evictions')
+
+    def __init__(self, quota_bytes: int):
+        self.entries: OrderedDict = OrderedDict()  # chave -> (payload, deadline monotônico)
+        self.bytes = 0
+        self.quota_bytes = quota_bytes
+        self.evictions = 0
+
+
+class MemoryTier:
+    """
+    L1: LRU em processo limitada pelo total de bytes armazenados
+
+    Cada namespace tem sua própria LRU e uma cota (fração de max_bytes), de
+    modo que um namespace grande (ex: conversation) despeja as próprias
+    entradas antes de tocar nas de outro. Expirações são varridas por um
+    heap de deadlines (tempo monotônico), não só quando a chave é lida.
+    """
+
+    # Entradas expiradas removidas por operação de escrita
+    SWEEP_BATCH = 64
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.areas: Dict[str, _NamespaceArea] = {}
+        self.index: Dict[str, str] = {}  # chave -> namespace
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejected = 0
+
+    def _area(self, namespace: str) -> _NamespaceArea:
+        area = self.areas.get(namespace)
+        if area is None:
+            quota = NAMESPACE_QUOTAS.get(namespace, DEFAULT_QUOTA)
+            area = _NamespaceArea(int(self.max_bytes * quota))
+            self.areas[namespace] = area
+        return area
+
+    @staticmethod
+    def _entry_size(key: str, payload: bytes) -> int:
+        return len(key) + len(payload)
+
+    def get(self, key: str) -> Optional[bytes]:
+        namespace = self.index.get(key)
+        if namespace is None:
+            self.misses += 1
+            return None
+        area = self.areas[namespace]
+        payload, deadline = area.entries[key]
+        if time.monotonic() >= deadline:
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        area.entries.move_to_end(key)
+        self.hits += 1
+        return payload
+
+    def set(self, key: str, payload: bytes, ttl: float, namespace: str = 'default') -> bool:
+        size = self._entry_size(key, payload)
+        area = self._area(namespace)
+        if size > area.quota_bytes or size > self.max_bytes or ttl <= 0:
+            self.rejected += 1
+            return False
+
+        self.sweep()
+        if key in self.index:
+            self._remove(key)
+
+        # Primeiro a cota do próprio namespace, depois o limite global
+        while area.entries and area.bytes + size > area.quota_bytes:
+            self._evict_from(area)
+        while self.size_bytes + size > self.max_bytes:
+            self._evict_from(self._most_over_quota())
+
+        deadline = time.monotonic() + ttl
+        area.entries[key] = (payload, deadline)
+        area.bytes += size
+        self.index[key] = namespace
+        self.size_bytes += size
+        heapq.heappush(self._expiry_heap, (deadline, key))
+        return True
+
+    def _most_over_quota(self) -> _NamespaceArea:
+        # Namespace que mais usa em relação à própria cota
+        return max(
+            (area for area in self.areas.values() if area.entries),
+            key=lambda area: area.bytes / area.quota_bytes if area.quota_bytes else float('inf')
+        )
+
+    def _evict_from(self, area: _NamespaceArea) -> None:
+        oldest = next(iter(area.entries))
+        self._remove(oldest)
+        area.evictions += 1
+        self.evictions += 1
+
+    def sweep(self, limit: Optional[int] = None) -> int:
+        """Remove entradas expiradas pelo heap de deadlines; retorna quantas saíram"""
+        limit = self.SWEEP_BATCH if limit is None else limit
+        now = time.monotonic()
+        removed = 0
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now and removed < limit:
+            deadline, key = heapq.heappop(heap)
+            namespace = self.index.get(key)
+            # Itens do heap de chaves já removidas ou regravadas são ignorados
+            if namespace is not None and self.areas[namespace].entries[key][1] == deadline:
+                self._remove(key)
+                self.expirations += 1
+                removed += 1
+
+        # Compactar o heap quando acumular muitos itens obsoletos
+        if len(heap) > 2 * len(self.index) + 1024:
+            self._expiry_heap = [
+                (self.areas[ns].entries[key][1], key) for key, ns in self.index.items()
+            ]
+            heapq.heapify(self._expiry_heap)
+        return removed
+
+    def delete(self, key: str) -> bool:
+        if key in self.index:
+            self._remove(key)
+            return True
+        return False
+
+    def clear(self) -> None:
+        self.areas.clear()
+        self.index.clear()
+        self._expiry_heap.clear()
+        self.size_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        area = self.areas[self.index.pop(key)]
+        payload, _ = area.entries.pop(key)
+        size = self._entry_size(key, payload)
+        area.bytes -= size
+        self.size_bytes -= size
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.index),
+            'bytes': self.size_bytes,
+            'max_bytes': self.max_bytes,
+            'usage_percent': round(self.size_bytes / self.max_bytes * 100, 2) if self.max_bytes else 0,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'rejected': self.rejected,
+            'pending_expiries': len(self._expiry_heap),
+            'namespaces': {
+                namespace: {
+                    'items': len(area.entries),
+                    'bytes': area.bytes,
+                    'quota_bytes': area.quota_bytes,
+                    'quota_usage_percent': round(area.bytes / area.quota_bytes * 100, 2) if area.quota_bytes else 0,
+                    'evictions': area.evictions,
+                }
+                for namespace, area in sorted(self.areas.items())
+            }
+        }
+
+
+class RedisTier:
+    """L2: Redis compartilhado via redis.asyncio com pool de conexões (opcional)"""
+
+    def __init__(self, redis_url: str, max_connections: Optional[int] = None):
+        self.redis_url = redis_url
+        self.max_connections = max_connections or int(os.getenv('REDIS_MAX_CONNECTIONS', '50'))
+        self.retry_after_s = int(os.getenv('REDIS_RETRY_SECONDS', '30'))
+        self.client = None
+        self.enabled = False
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._next_attempt = 0.0
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    async def _ensure(self) -> bool:
+        """Conecta na primeira utilização; se falhar, tenta de novo após REDIS_RETRY_SECONDS"""
+        if self.enabled:
+            return True
+        if time.monotonic() < self._next_attempt:
+            return False
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+
+        async with self._connect_lock:
+            if self.enabled:
+                return True
+            try:
+                import redis.asyncio as aioredis
+                client = aioredis.from_url(
+                    self.redis_url,
+                    decode_responses=False,
+                    max_connections=self.max_connections,
+                    socket_timeout=5,
+                    socket_connect_timeout=5,
+                    retry_on_timeout=True,
+                    health_check_interval=30
+                )
+                await client.ping()
+                self.client = client
+                self.enabled = True
+                print(f"[OK] Redis cache conectado: {self.redis_url}")
+            except ImportError:
+                print("[INFO] Redis nao instalado. Use: pip install redis")
+                self._next_attempt = float('inf')
+            except Exception as e:
+                print(f"[INFO] Redis nao disponivel: {e}. Usando apenas cache em memoria.")
+                self._next_attempt = time.monotonic() + self.retry_after_s
+        return self.enabled
+
+    def _fail(self, action: str, error: Exception) -> None:
+        self.errors += 1
+        print(f"Erro ao {action} no Redis: {error}")
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return (await self.get_many([key]))[0]
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        """Busca várias chaves em um único round-trip (MGET)"""
+        if not keys or not await self._ensure():
+            return [None] * len(keys)
+        try:
+            payloads = await self.client.mget(keys)
+        except Exception as e:
+            self._fail("ler", e)
+            return [None] * len(keys)
+        for payload in payloads:
+            if payload is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return payloads
+
+    async def set(self, key: str, payload: bytes, ttl: int) -> bool:
+        return await self.set_many([(key, payload, ttl)])
+
+    async def set_many(self, items: List[Tuple[str, bytes, int]]) -> bool:
+        """Grava várias chaves em um único pipeline"""
+        if not items or not await self._ensure():
+            return False
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, payload, ttl in items:
+                pipe.set(key, payload, ex=max(1, int(ttl)))
+            await pipe.execute()
+            return True
+        except Exception as e:
+            self._fail("escrever", e)
+            return False
+
+    async def delete(self, key: str) -> bool:
+        if not await self._ensure():
+            return False
+        try:
+            return bool(await self.client.unlink(key))
+        except Exception as e:
+            self._fail("deletar", e)
+            return False
+
+    async def acquire_lock(self, key: str, ttl: int) -> bool:
+        """SET NX EX; sem Redis, retorna True (só vale o controle local)"""
+        if not await self._ensure():
+            return True
+        try:
+            return bool(await self.client.set(key, b"1", nx=True, ex=max(1, int(ttl))))
+        except Exception as e:
+            self._fail("obter lock", e)
+            return True
+
+    async def get_counters(self, keys: List[str]) -> Optional[List[int]]:
+        """Lê contadores (versões de tag) em um MGET; None se o Redis estiver indisponível"""
+        if not await self._ensure():
+            return None
+        try:
+            values = await self.client.mget(keys)
+        except Exception as e:
+            self._fail("ler versoes", e)
+            return None
+        return [int(v) if v is not None else 0 for v in values]
+
+    async def incr_many(self, keys: List[str]) -> Optional[List[int]]:
+        """Incrementa contadores em um único pipeline; None se o Redis estiver indisponível"""
+        if not await self._ensure():
+            return None
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key in keys:
+                pipe.incr(key)
+            return [int(v) for v in await pipe.execute()]
+        except Exception as e:
+            self._fail("incrementar versoes", e)
+            return None
+
+    async def swap_counters(self, values: Dict[str, int]) -> Optional[Dict[str, Optional[int]]]:
+        """SET ... GET atômico de cada chave; retorna os valores anteriores (None se inexistente)"""
+        if not await self._ensure():
+            return None
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in values.items():
+                pipe.set(key, int(value), get=True)
+            previous = await pipe.execute()
+        except Exception as e:
+            self._fail("trocar versoes", e)
+            return None
+        return {key: int(old) if old is not None else None for key, old in zip(values, previous)}
+
+    async def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        stats = {
+            'enabled': self.enabled,
+            'max_connections': self.max_connections,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'errors': self.errors
+        }
+        if await self._ensure():
+            try:
+                info = await self.client.info()
+                stats.update({
+                    'evictions': info.get('evicted_keys', 0),
+                    'expirations': info.get('expired_keys', 0),
+                    'used_memory': info.get('used_memory_human', '0B')
+                })
+            except Exception as e:
+                stats['info_error'] = str(e)
+        return stats
+
+
+class TieredCache:
+    """
+    Cache L1 (memória) + L2 (Redis) com esquema único de chaves e TTLs
+
+    Invalidação por tags sem varrer chaves: cada entrada pertence à tag
+    implícita ns:<namespace> e às tags informadas (ex: table:vendas,
+    user:<id>). A chave física embute a versão atual de cada tag; invalidar
+    uma tag é um INCR, e as entradas antigas ficam inalcançáveis até expirar.
+    """
+
+    def __init__(
+        self,
+        key_prefix: Optional[str] = None,
+        l1_max_bytes: Optional[int] = None,
+        redis_url: Optional[str] = None
+    ):
+        self.key_prefix = key_prefix or os.getenv('CACHE_KEY_PREFIX', 'analytics')
+        self.l1 = MemoryTier(l1_max_bytes or int(os.getenv('CACHE_L1_MAX_BYTES', str(64 * 1024 * 1024))))
+        self.l2 = RedisTier(redis_url or os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+        # Versões de tag lidas do Redis ficam válidas localmente por este tempo
+        self.version_ttl_s = float(os.getenv('CACHE_VERSION_TTL_SECONDS', '2'))
+        self._versions: Dict[str, Tuple[int, float]] = {}
+        # Tags invalidadas com o Redis fora do ar (o INCR é repetido quando ele voltar)
+        self._pending_invalidations: set = set()
+        # Versões de dados vistas sem Redis (ver observe_data_versions)
+        self._data_versions: Dict[str, int] = {}
+
+    def make_key(self, namespace: str, key: str) -> str:
+        """Chave lógica no formato {prefixo}:{namespace}:{chave}"""
+        return f"{self.key_prefix}:{namespace}:{key}"
+
+    @staticmethod
+    def hash_key(data: Any) -> str:
+        """Hash estável de parâmetros arbitrários para usar como chave"""
+        serialized = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.md5(serialized.encode()).hexdigest()
+
+    def ttl_for(self, namespace: str, ttl: Optional[int] = None) -> int:
+        """TTL efetivo: explícito, do namespace ou o padrão"""
+        if ttl is not None:
+            return ttl
+        return NAMESPACE_TTLS.get(namespace, DEFAULT_TTL)
+
+    @staticmethod
+    def _entry_tags(namespace: str, tags: Optional[Iterable[str]]) -> List[str]:
+        return [f"ns:{namespace}"] + sorted(set(tags or []))
+
+    def _version_key(self, tag: str) -> str:
+        return f"{self.key_prefix}:tagver:{tag}"
+
+    async def _resolve_versions(self, tags: Iterable[str]) -> Dict[str, int]:
+        """Versão atual de cada tag (cache local curto + um MGET para as vencidas)"""
+        now = time.monotonic()
+        versions: Dict[str, int] = {}
+        stale: List[str] = []
+        for tag in set(tags):
+            cached = self._versions.get(tag)
+            if cached is not None and now - cached[1] < self.version_ttl_s:
+                versions[tag] = cached[0]
+            else:
+                stale.append(tag)
+
+        if stale:
+            await self._replay_invalidations()
+            remote = await self.l2.get_counters([self._version_key(t) for t in stale])
+            for i, tag in enumerate(stale):
+                if remote is not None:
+                    version = remote[i]
+                else:
+                    # Sem Redis as versões locais valem até a próxima tentativa de leitura
+                    version = self._versions.get(tag, (0, 0.0))[0]
+                self._versions[tag] = (version, now)
+                versions[tag] = version
+        return versions
+
+    async def _replay_invalidations(self) -> None:
+        """Repete no Redis os INCR das tags invalidadas enquanto ele estava fora"""
+        if not self._pending_invalidations:
+            return
+        tags = sorted(self._pending_invalidations)
+        remote = await self.l2.incr_many([self._version_key(t) for t in tags])
+        if remote is None:
+            return
+        self._pending_invalidations.clear()
+        now = time.monotonic()
+        for tag, version in zip(tags, remote):
+            self._versions[tag] = (version, now)
+
+    def _physical_key(self, namespace: str, key: str, tags: List[str], versions: Dict[str, int]) -> str:
+        return f"{self.make_key(namespace, key)}#{'.'.join(str(versions[t]) for t in tags)}"
+
+    async def _physical_keys(self, items: List[Tuple[str, str, Optional[Iterable[str]]]]) -> List[str]:
+        entry_tags = [self._entry_tags(namespace, tags) for namespace, _, tags in items]
+        versions = await self._resolve_versions(t for tags in entry_tags for t in tags)
+        return [
+            self._physical_key(namespace, key, tags, versions)
+            for (namespace, key, _), tags in zip(items, entry_tags)
+        ]
+
+    async def get(
+        self,
+        namespace: str,
+        key: str,
+        default: Any = None,
+        tags: Optional[Iterable[str]] = None
+    ) -> Any:
+        """Busca no L1, depois no L2 (promovendo para o L1 com o TTL restante)"""
+        return (await self.get_many([(namespace, key, tags)], default))[0]
+
+    async def get_many(self, items: List[tuple], default: Any = None) -> List[Any]:
+        """
+        Busca vários (namespace, chave[, tags]) de uma vez: o que falta no L1
+        vai ao Redis em um único MGET. Entradas vencidas contam como ausentes.
+        """
+        entries = await self.get_entries(items)
+        return [e.value if e is not None and e.is_fresh else default for e in entries]
+
+    async def get_entry(
+        self,
+        namespace: str,
+        key: str,
+        tags: Optional[Iterable[str]] = None
+    ) -> Optional[CacheEntry]:
+        """Entrada com metadados, inclusive se já estiver na janela stale"""
+        return (await self.get_entries([(namespace, key, tags)]))[0]
+
+    async def get_entries(self, items: List[tuple]) -> List[Optional[CacheEntry]]:
+        """Como get_many, mas retorna CacheEntry (frescas ou stale)"""
+        full_keys = await self._physical_keys([
+            (item[0], item[1], item[2] if len(item) > 2 else None) for item in items
+        ])
+        results: List[Optional[CacheEntry]] = [None] * len(full_keys)
+        pending: List[int] = []
+
+        for i, full_key in enumerate(full_keys):
+            payload = self.l1.get(full_key)
+            if payload is not None:
+                results[i] = self._decode(full_key, payload)
+            if results[i] is None:
+                pending.append(i)
+
+        if pending:
+            payloads = await self.l2.get_many([full_keys[i] for i in pending])
+            now = time.time()
+            for i, payload in zip(pending, payloads):
+                if payload is None:
+                    continue
+                entry = self._decode(full_keys[i], payload)
+                if entry is None or entry.stale_until <= now:
+                    continue
+                self.l1.set(full_keys[i], payload, entry.stale_until - now, namespace=items[i][0])
+                results[i] = entry
+
+        return results
+
+    def _decode(self, full_key: str, payload: bytes) -> Optional[CacheEntry]:
+        # Payload ilegível neste processo (ex: dicionário de compressão trocado) conta como ausente
+        try:
+            return decode(payload)
+        except ValueError as e:
+            print(f"[WARN] Entrada de cache ignorada ({full_key}): {e}")
+            self.l1.delete(full_key)
+            return None
+
+    async def set(
+        self,
+        namespace: str,
+        key: str,
+        value: Any,
+        ttl: Optional[int] = None,
+        tags: Optional[Iterable[str]] = None,
+        stale_ttl: int = 0,
+        compute_time: float = 0.0
+    ) -> bool:
+        """
+        Serializa uma vez e grava nos dois níveis
+
+        stale_ttl: por quanto tempo após o TTL a entrada ainda pode ser
+        servida (stale) enquanto é recalculada
+        compute_time: quanto o cálculo levou (s), usado pelo XFetch
+        """
+        full_key = (await self._physical_keys([(namespace, key, tags)]))[0]
+        return await self._store([(full_key, namespace, value, ttl, stale_ttl, compute_time)])
+
+    async def set_many(self, items: List[tuple]) -> bool:
+        """Grava vários (namespace, chave, valor, ttl[, tags]) com um único pipeline no Redis"""
+        full_keys = await self._physical_keys([
+            (item[0], item[1], item[4] if len(item) > 4 else None) for item in items
+        ])
+        return await self._store([
+            (full_key, item[0], item[2], item[3], 0, 0.0) for full_key, item in zip(full_keys, items)
+        ])
+
+    async def _store(self, batch: List[tuple]) -> bool:
+        writes = []
+        stored = False
+        for full_key, namespace, value, ttl, stale_ttl, compute_time in batch:
+            ttl = self.ttl_for(namespace, ttl)
+            payload = encode(value, ttl, stale_ttl, compute_time)
+            stored = self.l1.set(full_key, payload, ttl + stale_ttl, namespace=namespace) or stored
+            writes.append((full_key, payload, ttl + stale_ttl))
+
+        return await self.l2.set_many(writes) or stored
+
+    async def acquire_refresh_lock(self, namespace: str, key: str, ttl: int = 60) -> bool:
+        """Garante que só um worker recalcula a entrada (SET NX no Redis)"""
+        return await self.l2.acquire_lock(f"{self.key_prefix}:lock:{namespace}:{key}", ttl)
+
+    async def delete(self, namespace: str, key: str, tags: Optional[Iterable[str]] = None) -> None:
+        full_key = (await self._physical_keys([(namespace, key, tags)]))[0]
+        self.l1.delete(full_key)
+        await self.l2.delete(full_key)
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> Dict[str, int]:
+        """
+        Invalida todas as entradas marcadas com as tags em O(1) por tag
+
+        Returns:
+            Nova versão de cada tag
+        """
+        tags = sorted(set(tags))
+        if not tags:
+            return {}
+
+        now = time.monotonic()
+        remote = await self.l2.incr_many([self._version_key(t) for t in tags])
+        versions = {}
+        for i, tag in enumerate(tags):
+            if remote is not None:
+                versions[tag] = remote[i]
+            else:
+                versions[tag] = self._versions.get(tag, (0, 0.0))[0] + 1
+                self._pending_invalidations.add(tag)
+            self._versions[tag] = (versions[tag], now)
+        return versions
+
+    async def observe_data_versions(self, versions: Dict[str, int]) -> List[str]:
+        """
+        Registra as versões de dados vistas (tabela -> versão)
+
+        A troca é atômica no Redis, então só um worker enxerga cada mudança.
+        A primeira observação de uma tabela não conta como mudança.
+
+        Returns:
+            Tabelas cuja versão mudou desde a última observação
+        """
+        keys = {f"{self.key_prefix}:dataver:{table}": table for table in versions}
+        previous = await self.l2.swap_counters({key: versions[table] for key, table in keys.items()})
+        if previous is None:
+            previous = {key: self._data_versions.get(table) for key, table in keys.items()}
+        self._data_versions.update(versions)
+        return sorted(
+            table for key, table in keys.items()
+            if previous[key] is not None and previous[key] != versions[table]
+        )
+
+    async def invalidate_namespace(self, namespace: str) -> int:
+        """Invalida todas as entradas do namespace; retorna a nova geração"""
+        return (await self.invalidate_tags([f"ns:{namespace}"]))[f"ns:{namespace}"]
+
+    async def get_stats(self) -> Dict[str, Any]:
+        return {
+            'key_prefix': self.key_prefix,
+            'serializer': 'msgpack' if msgpack is not None else 'json',
+            'tag_versions_cached': len(self._versions),
+            'pending_invalidations': len(self._pending_invalidations),
+            'compression': payload_compressor.get_stats(),
+            'l1': self.l1.get_stats(),
+            'l2': await self.l2.get_stats()
+        }
+
+
+# Instância global
+tiered_cache = TieredCache()
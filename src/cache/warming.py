@@ -0,0 +1,259 @@
+# src/cache/warming.py
+"""
+Aquecimento do cache (cache warming)
+
+Cada acesso a uma chave aquecível é contado (com decaimento exponencial)
+junto com a "receita" para recalculá-la. No startup, quando o
+data_version_watcher vê uma importação nova ou periodicamente, as N chaves
+mais pedidas de cada nível de permissão são recalculadas dentro de um
+orçamento de tempo e CPU, antes que o primeiro usuário pague o cache frio.
+"""
+import os
+import json
+import time
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .tiered import TieredCache, tiered_cache
+
+# Resultado de uma fonte ao aquecer uma receita
+WARM_FRESH = 'fresh'      # já estava no cache e longe de vencer
+WARM_WARMED = 'warmed'    # recalculada agora
+WARM_FAILED = 'failed'
+
+WarmFunction = Callable[[Dict[str, Any]], Awaitable[str]]
+
+# Frequências persistidas entre restarts (namespace próprio no cache)
+_STATE_NAMESPACE = 'warming'
+_STATE_KEY = 'frequencies'
+_STATE_TTL = 7 * 86400
+
+
+class CacheWarmer:
+    """Conta acessos por chave e pré-calcula as mais pedidas por nível"""
+
+    def __init__(self, cache: Optional[TieredCache] = None):
+        self.cache = cache or tiered_cache
+        self.top_n = int(os.getenv('CACHE_WARM_TOP_N', '10'))
+        self.budget_seconds = float(os.getenv('CACHE_WARM_BUDGET_SECONDS', '60'))
+        self.cpu_budget_seconds = float(os.getenv('CACHE_WARM_CPU_SECONDS', '10'))
+        self.concurrency = max(1, int(os.getenv('CACHE_WARM_CONCURRENCY', '2')))
+        self.interval_seconds = int(os.getenv('CACHE_WARM_INTERVAL_SECONDS', '1800'))
+        self.half_life_seconds = float(os.getenv('CACHE_WARM_HALF_LIFE_SECONDS', '86400'))
+        self.max_recipes = int(os.getenv('CACHE_WARM_MAX_RECIPES', '2000'))
+        self.enabled = os.getenv('CACHE_WARM_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+
+        self.sources: Dict[str, WarmFunction] = {}
+        # receita -> {'source', 'params', 'tier', 'count', 'last_seen'}
+        self.recipes: Dict[str, Dict[str, Any]] = {}
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._data_changed: Optional[asyncio.Event] = None
+        self._loaded = False
+
+    def register(self, source: str, warm_fn: WarmFunction) -> None:
+        """Registra como recalcular as chaves de uma fonte (ex: prefixo da rota)"""
+        self.sources[source] = warm_fn
+
+    def _score(self, recipe: Dict[str, Any], now: float) -> float:
+        elapsed = max(0.0, now - recipe['last_seen'])
+        return recipe['count'] * 0.5 ** (elapsed / self.half_life_seconds)
+
+    def record(
+        self,
+        source: str,
+        params: Dict[str, Any],
+        tier: str,
+        context: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Conta um acesso
+
+        Args:
+            source: fonte registrada que sabe recalcular a chave
+            params: argumentos (serializáveis em JSON) para recalcular
+            tier: nível de permissão que compartilha a entrada
+            context: argumentos extras que não identificam a chave (ex: um
+                     usuário do nível); o último visto é usado ao recalcular
+        """
+        if not self.enabled:
+            return
+        recipe_id = json.dumps([source, tier, params], sort_keys=True, default=str)
+        now = time.time()
+        recipe = self.recipes.get(recipe_id)
+        if recipe is None:
+            if len(self.recipes) >= self.max_recipes:
+                self._evict(now)
+            recipe = {'source': source, 'params': params, 'tier': tier, 'count': 0.0, 'last_seen': now}
+            self.recipes[recipe_id] = recipe
+        recipe['count'] = self._score(recipe, now) + 1
+        recipe['last_seen'] = now
+        if context:
+            recipe['context'] = context
+
+    def _evict(self, now: float) -> None:
+        # Remove o quarto menos pedido
+        ranked = sorted(self.recipes, key=lambda rid: self._score(self.recipes[rid], now))
+        for recipe_id in ranked[:max(1, len(ranked) // 4)]:
+            del self.recipes[recipe_id]
+
+    def top_recipes(self, top_n: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """As N receitas mais pedidas de cada nível de permissão"""
+        top_n = top_n or self.top_n
+        now = time.time()
+        by_tier: Dict[str, List[Dict[str, Any]]] = {}
+        for recipe in self.recipes.values():
+            if recipe['source'] in self.sources:
+                by_tier.setdefault(recipe['tier'], []).append(recipe)
+        return {
+            tier: sorted(items, key=lambda r: self._score(r, now), reverse=True)[:top_n]
+            for tier, items in by_tier.items()
+        }
+
+    async def load(self) -> None:
+        """Carrega as frequências salvas (sobrevivem a deploys e restarts)"""
+        if self._loaded:
+            return
+        self._loaded = True
+        saved = await self.cache.get(_STATE_NAMESPACE, _STATE_KEY) or []
+        for recipe in saved:
+            recipe_id = json.dumps([recipe['source'], recipe['tier'], recipe['params']], sort_keys=True, default=str)
+            current = self.recipes.get(recipe_id)
+            if current is None or current['last_seen'] < recipe['last_seen']:
+                self.recipes[recipe_id] = dict(recipe)
+
+    async def save(self) -> None:
+        """Salva as frequências no cache compartilhado"""
+        await self.cache.set(_STATE_NAMESPACE, _STATE_KEY, list(self.recipes.values()), _STATE_TTL)
+
+    async def warm(self, reason: str = 'manual', top_n: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Recalcula as chaves mais pedidas de cada nível dentro do orçamento
+
+        Entradas ainda frescas são puladas. O ciclo para ao estourar o tempo
+        (CACHE_WARM_BUDGET_SECONDS) ou a CPU (CACHE_WARM_CPU_SECONDS); a
+        concorrência (CACHE_WARM_CONCURRENCY) limita a carga no banco.
+
+        Returns:
+            Relatório do ciclo, incluindo a cobertura (fração das chaves
+            selecionadas que ficaram quentes)
+        """
+        if self._lock.locked():
+            return {'status': 'running', 'reason': reason}
+
+        async with self._lock:
+            await self.load()
+            selected = self.top_recipes(top_n)
+            queue = [r for tier in sorted(selected) for r in selected[tier]]
+            queue.sort(key=lambda r: self._score(r, time.time()), reverse=True)
+
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            results: Dict[str, int] = {WARM_FRESH: 0, WARM_WARMED: 0, WARM_FAILED: 0}
+            per_tier: Dict[str, Dict[str, int]] = {}
+            skipped = 0
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            def over_budget() -> bool:
+                return (time.perf_counter() - wall_start > self.budget_seconds
+                        or time.process_time() - cpu_start > self.cpu_budget_seconds)
+
+            async def run(recipe: Dict[str, Any]) -> None:
+                nonlocal skipped
+                async with semaphore:
+                    if over_budget():
+                        skipped += 1
+                        return
+                    remaining = self.budget_seconds - (time.perf_counter() - wall_start)
+                    try:
+                        outcome = await asyncio.wait_for(
+                            self.sources[recipe['source']]({**recipe['params'], **recipe.get('context', {})}),
+                            timeout=max(1.0, remaining)
+                        )
+                    except Exception as e:
+                        print(f"Erro ao aquecer {recipe['source']}: {e}")
+                        outcome = WARM_FAILED
+                    outcome = outcome if outcome in results else WARM_FAILED
+                    results[outcome] += 1
+                    tier_stats = per_tier.setdefault(recipe['tier'], {'selected': 0, 'hot': 0})
+                    tier_stats['hot'] += outcome != WARM_FAILED
+
+            for recipe in queue:
+                per_tier.setdefault(recipe['tier'], {'selected': 0, 'hot': 0})['selected'] += 1
+            await asyncio.gather(*(run(recipe) for recipe in queue))
+
+            hot = results[WARM_FRESH] + results[WARM_WARMED]
+            self.last_run = {
+                'reason': reason,
+                'finished_at': datetime.now().isoformat(),
+                'duration_seconds': round(time.perf_counter() - wall_start, 3),
+                'cpu_seconds': round(time.process_time() - cpu_start, 3),
+                'selected': len(queue),
+                'skipped_budget': skipped,
+                **results,
+                'coverage': round(hot / len(queue), 4) if queue else 1.0,
+                'tiers': {
+                    tier: {**stats, 'coverage': round(stats['hot'] / stats['selected'], 4) if stats['selected'] else 1.0}
+                    for tier, stats in per_tier.items()
+                },
+            }
+
+            await self.save()
+            print(f"Cache warming ({reason}): {hot}/{len(queue)} chaves quentes, "
+                  f"{results[WARM_WARMED]} recalculadas, {skipped} fora do orçamento")
+            return self.last_run
+
+    def notify_data_changed(self) -> None:
+        """Pede um ciclo logo após uma importação (chamado pelo data_version_watcher)"""
+        if self._data_changed is not None:
+            self._data_changed.set()
+
+    async def _schedule_loop(self) -> None:
+        try:
+            await self.warm('startup')
+        except Exception as e:
+            print(f"Erro no cache warming: {e}")
+        while True:
+            # Próximo ciclo: nova versão dos dados ou intervalo fixo, o que vier antes
+            try:
+                await asyncio.wait_for(self._data_changed.wait(), timeout=self.interval_seconds)
+                reason = 'import'
+            except asyncio.TimeoutError:
+                reason = 'schedule'
+            self._data_changed.clear()
+            try:
+                await self.warm(reason)
+            except Exception as e:
+                print(f"Erro no cache warming: {e}")
+
+    def start(self) -> None:
+        """Inicia o agendador (chamar no startup da aplicação)"""
+        if self.enabled and self._task is None:
+            self._data_changed = asyncio.Event()
+            self._task = asyncio.ensure_future(self._schedule_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            await self.save()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas do aquecimento (cobertura do último ciclo)"""
+        return {
+            'enabled': self.enabled,
+            'sources': sorted(self.sources),
+            'tracked_keys': len(self.recipes),
+            'tiers': len({r['tier'] for r in self.recipes.values()}),
+            'top_n': self.top_n,
+            'budget_seconds': self.budget_seconds,
+            'cpu_budget_seconds': self.cpu_budget_seconds,
+            'coverage': self.last_run['coverage'] if self.last_run else None,
+            'last_run': self.last_run,
+        }
+
+
+# Instância global
+cache_warmer = CacheWarmer()
@@ -27,6 +27,9 @@ class Settings(BaseSettings):
     ollama_base_url: str = "http://localhost:11434/v1"
     ollama_model: str = "llama3.2"
     agent_llm_timeout_seconds: int = 60  # Aumentado para 60s (cold start do modelo)
+    agent_request_deadline_seconds: int = 90  # Orçamento total de uma pergunta no chat
+    agent_llm_min_attempt_seconds: float = 5.0  # Abaixo disso não tenta outra chamada ao LLM
+    agent_fallback_reserve_seconds: float = 2.0  # Sempre reservado para o fallback por regras
     agent_use_agno: bool = False
 
     # RAG
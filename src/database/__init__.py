@@ -1,3 +1,5 @@
 from .query_optimizer import QueryOptimizer
+from .aggregations import RawAggregator, AggregationError
+from .rollups import DailyRollups, RollupError
 
-__all__ = ['QueryOptimizer']
+__all__ = ['QueryOptimizer', 'RawAggregator', 'AggregationError', 'DailyRollups', 'RollupError']
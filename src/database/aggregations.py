@@ -0,0 +1,174 @@
+# src/database/aggregations.py
+"""
+Agregações server-side sobre as tabelas RAW.
+
+Permite responder perguntas como "quantos leads ativos temos?" ou
+"VGV por empreendimento" com uma única query agregada no PostgreSQL,
+sem trazer as linhas para o Python.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from .raw_tables import (
+    ALLOWED_TABLES,
+    FILTER_COLUMNS,
+    NUMERIC_COLUMNS,
+    DISTINCT_COLUMNS,
+    groupable_columns,
+    date_column,
+)
+from .query_monitor import query_monitor
+
+# Funções de agregação suportadas
+AGGREGATE_FUNCTIONS = {'count', 'sum', 'avg', 'min', 'max', 'count_distinct'}
+
+
+class AggregationError(ValueError):
+    """Erro de validação em uma requisição de agregação"""
+
+
+class RawAggregator:
+    """Monta e executa agregações validadas contra as allow-lists das tabelas RAW"""
+
+    MAX_GROUPS = 500
+
+    def __init__(self, supabase_client):
+        self.client = supabase_client
+
+    def parse_metric(self, table_name: str, metric: str) -> Tuple[str, Optional[str], str]:
+        """
+        Converte uma métrica no formato 'funcao[:coluna]' em (funcao, coluna, alias)
+
+        Exemplos: 'count', 'sum:valor_contrato', 'count_distinct:idcliente'
+        """
+        func, _, column = metric.strip().lower().partition(':')
+        column = column or None
+
+        if func not in AGGREGATE_FUNCTIONS:
+            raise AggregationError(
+                f"Funcao '{func}' invalida. Use: {', '.join(sorted(AGGREGATE_FUNCTIONS))}"
+            )
+
+        if func == 'count':
+            if column:
+                raise AggregationError("count nao aceita coluna; use count_distinct:<coluna>")
+            return func, None, 'count'
+
+        if not column:
+            raise AggregationError(f"Funcao '{func}' requer coluna (ex: {func}:valor_contrato)")
+
+        if func == 'count_distinct':
+            allowed = DISTINCT_COLUMNS.get(table_name, [])
+        elif func in ('min', 'max'):
+            allowed = NUMERIC_COLUMNS.get(table_name, []) + [date_column(table_name)]
+        else:
+            allowed = NUMERIC_COLUMNS.get(table_name, [])
+
+        if column not in allowed:
+            raise AggregationError(
+                f"Coluna '{column}' nao permitida em {func} para {table_name}. "
+                f"Use: {', '.join(c for c in allowed if c)}"
+            )
+
+        return func, column, f"{func}_{column}"
+
+    def build_query(
+        self,
+        table_name: str,
+        metrics: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        group_by: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: int = 50
+    ) -> Tuple[str, List[Any]]:
+        """Gera SQL parametrizado ($1, $2, ...) para a agregação"""
+        if table_name not in ALLOWED_TABLES:
+            raise AggregationError(f"Tabela invalida. Use uma de: {', '.join(sorted(ALLOWED_TABLES))}")
+
+        parsed = [self.parse_metric(table_name, m) for m in (metrics or ['count'])]
+
+        select_parts = []
+        if group_by:
+            if group_by not in groupable_columns(table_name):
+                raise AggregationError(
+                    f"Coluna '{group_by}' nao permitida em group_by para {table_name}. "
+                    f"Use: {', '.join(groupable_columns(table_name))}"
+                )
+            select_parts.append(group_by)
+
+        for func, column, alias in parsed:
+            if func == 'count':
+                select_parts.append("COUNT(*) AS count")
+            elif func == 'count_distinct':
+                select_parts.append(f"COUNT(DISTINCT {column}) AS {alias}")
+            else:
+                select_parts.append(f"{func.upper()}({column}) AS {alias}")
+
+        conditions = []
+        params: List[Any] = []
+
+        allowed_filters = FILTER_COLUMNS.get(table_name, [])
+        for key, value in (filters or {}).items():
+            if key not in allowed_filters:
+                raise AggregationError(
+                    f"Coluna '{key}' nao permitida para tabela {table_name}. Use: {', '.join(allowed_filters)}"
+                )
+            if isinstance(value, list):
+                placeholders = []
+                for item in value:
+                    params.append(item)
+                    placeholders.append(f"${len(params)}")
+                conditions.append(f"{key} IN ({', '.join(placeholders)})")
+            else:
+                params.append(value)
+                conditions.append(f"{key} = ${len(params)}")
+
+        if start_date or end_date:
+            date_col = date_column(table_name)
+            if start_date:
+                params.append(start_date)
+                conditions.append(f"{date_col} >= ${len(params)}::date")
+            if end_date:
+                params.append(end_date)
+                conditions.append(f"{date_col} < ${len(params)}::date + 1")
+
+        query = f"SELECT {', '.join(select_parts)} FROM {table_name}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        if group_by:
+            query += f" GROUP BY {group_by} ORDER BY {parsed[0][2]} DESC NULLS LAST"
+            query += f" LIMIT {max(1, min(int(limit), self.MAX_GROUPS))}"
+
+        return query, params
+
+    async def aggregate(
+        self,
+        table_name: str,
+        metrics: Optional[List[str]] = None,
+        filters: Optional[Dict[str, Any]] = None,
+        group_by: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: int = 50
+    ) -> Dict[str, Any]:
+        """
+        Executa a agregação no banco e retorna apenas o resultado agregado
+
+        Returns:
+            Dict com 'rows' (uma linha por grupo, ou uma única linha sem group_by)
+        """
+        query, params = self.build_query(
+            table_name, metrics, filters, group_by, start_date, end_date, limit
+        )
+
+        rows = await query_monitor.exec_sql(self.client, query, params)
+
+        return {
+            "table": table_name,
+            "metrics": metrics or ['count'],
+            "group_by": group_by,
+            "filters_applied": filters or {},
+            "period": {"start": start_date, "end": end_date} if (start_date or end_date) else None,
+            "total_groups": len(rows) if group_by else None,
+            "rows": rows
+        }
@@ -0,0 +1,314 @@
+# src/database/index_advisor.py
+"""
+Index advisor baseado em pg_stat_statements.
+
+Lê as queries com maior tempo total, identifica tabelas RAW com scans
+sequenciais, propõe índices compostos ou de expressão (inclusive em
+raw->>'campo') e estima o ganho de cada um.
+"""
+import re
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from .raw_tables import ALLOWED_TABLES
+
+_IDENT = r"[a-z_][a-z0-9_]*"
+_COLUMN_EXPR = rf"(?:({_IDENT})\.)?({_IDENT}(?:\s*->>?\s*'[^']+')?)"
+_PREDICATE_RE = re.compile(
+    rf"{_COLUMN_EXPR}\s*(=|>=|<=|<>|!=|>|<|\bin\b|\bbetween\b)", re.IGNORECASE
+)
+_ORDER_RE = re.compile(rf"\border\s+by\s+{_COLUMN_EXPR}", re.IGNORECASE)
+_FROM_RE = re.compile(rf"\b(?:from|join)\s+({_IDENT})(?:\s+(?:as\s+)?({_IDENT}))?", re.IGNORECASE)
+_INDEX_COLS_RE = re.compile(r"using\s+\w+\s+\((.*)\)", re.IGNORECASE)
+
+_KEYWORDS = {
+    'where', 'on', 'left', 'right', 'inner', 'join', 'group', 'order', 'limit',
+    'and', 'or', 'not', 'select', 'as', 'case', 'when', 'then', 'else', 'end',
+    'offset', 'union', 'lateral', 'cross', 'full', 'outer', 'using', 'null',
+    'true', 'false', 'interval', 'current_date', 'now'
+}
+_EQUALITY_OPS = {'=', 'in'}
+_RANGE_OPS = {'>', '<', '>=', '<=', 'between'}
+
+# Fração do tempo de scan sequencial que se assume recuperável por um índice
+# quando não é possível medir o custo com hypopg
+HEURISTIC_SPEEDUP = 0.8
+
+
+@dataclass
+class IndexProposal:
+    table: str
+    columns: List[str]
+    statements: int = 0
+    calls: int = 0
+    total_time_ms: float = 0.0
+    estimated_saving_ms: float = 0.0
+    estimated_benefit_pct: float = 0.0
+    estimate_method: str = "heuristic"
+    sample_query: str = ""
+    queryids: List[Any] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        parts = [re.sub(r"\W+", "_", col.replace("'", "")).strip("_") for col in self.columns]
+        return f"idx_{self.table}_{'_'.join(parts)}"[:63]
+
+    @property
+    def ddl(self) -> str:
+        cols = ", ".join(f"({col})" if "->" in col else col for col in self.columns)
+        return f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.name} ON {self.table} ({cols})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.update({"name": self.name, "ddl": self.ddl})
+        return data
+
+
+def clean_statement(sql: str) -> str:
+    """Remove aspas de identificadores e o schema public (formato do PostgREST)"""
+    text = sql.replace('"', '')
+    text = re.sub(r"\bpublic\.", "", text, flags=re.IGNORECASE)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _normalize_expr(expr: str) -> str:
+    expr = re.sub(r"\s+", "", expr.lower())
+    return expr.replace("::text", "").replace("(", "").replace(")", "")
+
+
+def extract_predicates(sql: str, tables: Iterable[str] = ALLOWED_TABLES) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Extrai colunas usadas em igualdade, faixa e ORDER BY por tabela
+
+    Chaves JSON parametrizadas (raw->>$1) não são recuperáveis e são ignoradas.
+    """
+    text = clean_statement(sql)
+    tables = set(tables)
+
+    aliases: Dict[str, str] = {}
+    for table, alias in _FROM_RE.findall(text):
+        table = table.lower()
+        if table in tables:
+            aliases[table] = table
+            if alias and alias.lower() not in _KEYWORDS:
+                aliases[alias.lower()] = table
+
+    referenced = set(aliases.values())
+    if not referenced:
+        return {}
+
+    result: Dict[str, Dict[str, List[str]]] = {
+        t: {"eq": [], "range": [], "order": []} for t in referenced
+    }
+
+    def _resolve(qualifier: str, column: str) -> Optional[str]:
+        if qualifier:
+            return aliases.get(qualifier.lower())
+        return next(iter(referenced)) if len(referenced) == 1 else None
+
+    def _add(bucket: List[str], column: str) -> None:
+        column = re.sub(r"\s+", "", column.lower())
+        if column not in bucket:
+            bucket.append(column)
+
+    where_part = re.split(r"\bwhere\b", text, maxsplit=1, flags=re.IGNORECASE)
+    if len(where_part) == 2:
+        for qualifier, column, op in _PREDICATE_RE.findall(where_part[1]):
+            if column.lower() in _KEYWORDS or column.startswith("$"):
+                continue
+            table = _resolve(qualifier, column)
+            if not table:
+                continue
+            op = op.lower()
+            if op in _EQUALITY_OPS:
+                _add(result[table]["eq"], column)
+            elif op in _RANGE_OPS:
+                _add(result[table]["range"], column)
+
+    for qualifier, column in _ORDER_RE.findall(text):
+        table = _resolve(qualifier, column)
+        if table and column.lower() not in _KEYWORDS:
+            _add(result[table]["order"], column)
+
+    return {t: cols for t, cols in result.items() if any(cols.values())}
+
+
+def candidate_columns(predicates: Dict[str, List[str]], max_columns: int = 3) -> List[str]:
+    """Ordena colunas do índice: igualdade primeiro, depois uma coluna de faixa ou ordenação"""
+    columns = list(predicates.get("eq", []))[:max_columns - 1]
+    tail = predicates.get("range") or predicates.get("order") or []
+    for col in tail:
+        if col not in columns:
+            columns.append(col)
+            break
+    return columns[:max_columns]
+
+
+def index_covers(indexdef: str, columns: List[str]) -> bool:
+    """True se um índice existente já começa pelas colunas propostas"""
+    match = _INDEX_COLS_RE.search(indexdef)
+    if not match:
+        return False
+    existing = [_normalize_expr(c) for c in match.group(1).split(",")]
+    wanted = [_normalize_expr(c) for c in columns]
+    return existing[:len(wanted)] == wanted
+
+
+def statements_from_query_monitor(fingerprints: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Converte o export de /analyses/performance/slow-queries no formato de pg_stat_statements"""
+    return [
+        {
+            "queryid": fp.get("fingerprint"),
+            "query": fp.get("query", ""),
+            "calls": fp.get("count", 0),
+            "total_time_ms": fp.get("total_ms", 0.0),
+        }
+        for fp in fingerprints
+        if fp.get("kind") == "exec_sql" or str(fp.get("query", "")).startswith("select")
+    ]
+
+
+class IndexAdvisor:
+    """Propõe e (opcionalmente) cria índices a partir de pg_stat_statements"""
+
+    def __init__(self, conn, tables: Iterable[str] = ALLOWED_TABLES, min_rows: int = 1000):
+        self.conn = conn
+        self.tables = sorted(set(tables))
+        self.min_rows = min_rows
+        self._server_version = getattr(conn, "server_version", 0)
+
+    def _fetch(self, sql: str, params: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        with self.conn.cursor() as cur:
+            cur.execute(sql, params)
+            names = [d[0] for d in cur.description]
+            return [dict(zip(names, row)) for row in cur.fetchall()]
+
+    def top_statements(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Queries com maior tempo total que tocam as tabelas monitoradas"""
+        time_col = "total_exec_time" if self._server_version >= 130000 else "total_time"
+        patterns = [f"%{t}%" for t in self.tables]
+        return self._fetch(
+            f"""
+            SELECT queryid, query, calls, {time_col} AS total_time_ms, rows
+            FROM pg_stat_statements
+            WHERE query ILIKE ANY(%s)
+              AND query !~* '^\\s*(explain|create|alter|drop|vacuum|analyze|refresh)'
+            ORDER BY {time_col} DESC
+            LIMIT %s
+            """,
+            (patterns, limit),
+        )
+
+    def table_scan_stats(self) -> Dict[str, Dict[str, Any]]:
+        """seq_scan x idx_scan por tabela (pg_stat_user_tables)"""
+        rows = self._fetch(
+            """
+            SELECT relname, seq_scan, seq_tup_read, COALESCE(idx_scan, 0) AS idx_scan, n_live_tup
+            FROM pg_stat_user_tables
+            WHERE relname = ANY(%s)
+            """,
+            (self.tables,),
+        )
+        return {row["relname"]: row for row in rows}
+
+    def existing_indexes(self) -> Dict[str, List[str]]:
+        rows = self._fetch(
+            "SELECT tablename, indexdef FROM pg_indexes WHERE tablename = ANY(%s)",
+            (self.tables,),
+        )
+        indexes: Dict[str, List[str]] = {}
+        for row in rows:
+            indexes.setdefault(row["tablename"], []).append(row["indexdef"])
+        return indexes
+
+    def has_hypopg(self) -> bool:
+        rows = self._fetch("SELECT 1 AS ok FROM pg_extension WHERE extname = 'hypopg'")
+        return bool(rows) and self._server_version >= 160000
+
+    def _plan_cost(self, query: str) -> Optional[float]:
+        try:
+            rows = self._fetch(f"EXPLAIN (GENERIC_PLAN, FORMAT JSON) {query}")
+            return float(rows[0]["QUERY PLAN"][0]["Plan"]["Total Cost"])
+        except Exception:
+            self.conn.rollback()
+            return None
+
+    def _measure_with_hypopg(self, proposal: IndexProposal, queries: List[str]) -> Optional[float]:
+        """Fração de custo economizada com um índice hipotético (hypopg + GENERIC_PLAN)"""
+        before = [self._plan_cost(q) for q in queries]
+        try:
+            self._fetch("SELECT * FROM hypopg_create_index(%s)", (proposal.ddl.replace(" CONCURRENTLY IF NOT EXISTS", ""),))
+            after = [self._plan_cost(q) for q in queries]
+        finally:
+            self._fetch("SELECT hypopg_reset() AS reset")
+
+        pairs = [(b, a) for b, a in zip(before, after) if b and a is not None]
+        if not pairs:
+            return None
+        return max(0.0, 1.0 - sum(a for _, a in pairs) / sum(b for b, _ in pairs))
+
+    def analyze(
+        self,
+        limit: int = 50,
+        extra_statements: Optional[List[Dict[str, Any]]] = None
+    ) -> List[IndexProposal]:
+        """
+        Gera propostas de índice ordenadas pelo ganho estimado
+
+        Args:
+            limit: Quantas queries de pg_stat_statements considerar
+            extra_statements: Queries adicionais (ex: fingerprints do QueryMonitor,
+                              que preservam chaves raw->>'campo')
+        """
+        scan_stats = self.table_scan_stats()
+        existing = self.existing_indexes()
+        use_hypopg = self.has_hypopg()
+
+        proposals: Dict[tuple, IndexProposal] = {}
+        queries_by_proposal: Dict[tuple, List[str]] = {}
+
+        for stmt in self.top_statements(limit) + list(extra_statements or []):
+            for table, predicates in extract_predicates(stmt["query"], self.tables).items():
+                stats = scan_stats.get(table, {})
+                if not stats.get("seq_scan") or (stats.get("n_live_tup") or 0) < self.min_rows:
+                    continue
+                columns = candidate_columns(predicates)
+                if not columns or any(index_covers(d, columns) for d in existing.get(table, [])):
+                    continue
+
+                key = (table, tuple(columns))
+                proposal = proposals.setdefault(key, IndexProposal(table=table, columns=columns))
+                proposal.statements += 1
+                proposal.calls += int(stmt.get("calls") or 0)
+                proposal.total_time_ms += float(stmt.get("total_time_ms") or 0.0)
+                proposal.queryids.append(stmt.get("queryid"))
+                proposal.sample_query = proposal.sample_query or stmt["query"][:500]
+                queries_by_proposal.setdefault(key, []).append(stmt["query"])
+
+        for key, proposal in proposals.items():
+            benefit = None
+            if use_hypopg:
+                benefit = self._measure_with_hypopg(proposal, queries_by_proposal[key])
+                if benefit is not None:
+                    proposal.estimate_method = "hypopg"
+            if benefit is None:
+                stats = scan_stats.get(proposal.table, {})
+                scans = (stats.get("seq_scan") or 0) + (stats.get("idx_scan") or 0)
+                seq_share = (stats.get("seq_scan") or 0) / scans if scans else 0.0
+                benefit = seq_share * HEURISTIC_SPEEDUP
+            proposal.estimated_benefit_pct = round(benefit * 100, 1)
+            proposal.estimated_saving_ms = round(proposal.total_time_ms * benefit, 1)
+
+        return sorted(proposals.values(), key=lambda p: p.estimated_saving_ms, reverse=True)
+
+    def apply(self, proposal: IndexProposal) -> None:
+        """Cria o índice com CREATE INDEX CONCURRENTLY (exige autocommit)"""
+        # analyze() deixa uma transação aberta; autocommit não pode ser ligado dentro dela
+        self.conn.rollback()
+        previous = self.conn.autocommit
+        self.conn.autocommit = True
+        try:
+            with self.conn.cursor() as cur:
+                cur.execute(proposal.ddl)
+        finally:
+            self.conn.autocommit = previous
@@ -0,0 +1,305 @@
+# src/database/query_monitor.py
+"""
+Instrumentação de queries: tempo por fingerprint, log de queries lentas
+e captura de EXPLAIN (ANALYZE, BUFFERS) via DATABASE_URL.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Set
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+# Literais de string, exceto chaves JSON (raw->>'campo'), que fazem parte da forma da query
+_STRING_RE = re.compile(r"(->>?\s*)?'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM_RE = re.compile(r"\$\d+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """Remove comentários e literais para agrupar queries de mesma forma"""
+    text = _COMMENT_RE.sub(" ", sql)
+    text = _STRING_RE.sub(lambda m: m.group(0) if m.group(1) else "?", text)
+    text = _PARAM_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    return _SPACE_RE.sub(" ", text).strip().lower()
+
+
+def fingerprint(text: str) -> str:
+    """Hash estável da forma normalizada da query"""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def filter_shape(
+    table_name: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    order_by: Optional[str] = None,
+    count_mode: Optional[str] = None
+) -> str:
+    """Descreve a forma de uma query PostgREST (sem os valores dos filtros)"""
+    parts = [f"postgrest {table_name}", f"select={','.join(columns or ['*'])}"]
+    if filters:
+        parts.append(f"eq={','.join(sorted(filters))}")
+    if order_by:
+        parts.append(f"order={order_by}")
+    if count_mode:
+        parts.append(f"count={count_mode}")
+    return " ".join(parts)
+
+
+def postgrest_equivalent_sql(
+    table_name: str,
+    columns: Optional[List[str]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    order_by: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0
+) -> tuple:
+    """Monta o SQL equivalente a uma query PostgREST para uso em EXPLAIN"""
+    select_cols = []
+    for col in columns or ['*']:
+        if '->' in col:
+            base, op, field = re.split(r"(->>?)", col, maxsplit=1)
+            select_cols.append(f"{base}{op}'{field}'")
+        else:
+            select_cols.append(col)
+
+    sql = f"SELECT {', '.join(select_cols)} FROM {table_name}"
+    params: List[Any] = []
+    if filters:
+        conditions = []
+        for key, value in filters.items():
+            params.append(value)
+            conditions.append(f"{key} = ${len(params)}")
+        sql += " WHERE " + " AND ".join(conditions)
+    if order_by:
+        sql += f" ORDER BY {order_by.lstrip('-')}{' DESC' if order_by.startswith('-') else ''}"
+    if limit:
+        sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+    return sql, params
+
+
+def to_psycopg_sql(sql: str, params: Optional[List[Any]]) -> tuple:
+    """Converte placeholders $n (exec_sql) para o formato nomeado do psycopg2"""
+    text = sql.replace("%", "%%")
+    text = _PARAM_RE.sub(lambda m: f"%(p{m.group(0)[1:]})s", text)
+    named = {f"p{i}": value for i, value in enumerate(params or [], start=1)}
+    return text, named
+
+
+class QueryMonitor:
+    """Mede queries, mantém p50/p95 por fingerprint e um log limitado de queries lentas"""
+
+    def __init__(
+        self,
+        threshold_ms: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        samples_per_fingerprint: int = 500
+    ):
+        self.threshold_ms = threshold_ms if threshold_ms is not None else float(
+            os.getenv("SLOW_QUERY_THRESHOLD_MS", "500")
+        )
+        self.explain_enabled = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() in {"1", "true", "yes"}
+        self.explain_cooldown_s = int(os.getenv("SLOW_QUERY_EXPLAIN_COOLDOWN_SECONDS", "600"))
+        self.samples_per_fingerprint = samples_per_fingerprint
+
+        self.slow_log: Deque[Dict[str, Any]] = deque(
+            maxlen=max_entries or int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+        )
+        self.timings: Dict[str, Deque[float]] = {}
+        self.shapes: Dict[str, Dict[str, Any]] = {}
+        # fingerprint -> último EXPLAIN, em ordem cronológica (podado por idade e tamanho)
+        self._last_explain: Dict[str, float] = {}
+        self.max_explain_fingerprints = int(os.getenv("SLOW_QUERY_EXPLAIN_MAX_FINGERPRINTS", "1000"))
+        # Referências fortes: o loop só guarda referência fraca às tasks
+        self._explain_tasks: Set[asyncio.Task] = set()
+
+    def record(
+        self,
+        kind: str,
+        text: str,
+        duration_ms: float,
+        explain_sql: Optional[str] = None,
+        explain_params: Optional[List[Any]] = None,
+        error: Optional[str] = None
+    ) -> str:
+        """
+        Registra a execução de uma query
+
+        Args:
+            kind: 'exec_sql' ou 'postgrest'
+            text: SQL ou forma da query PostgREST
+            duration_ms: Duração medida
+            explain_sql: SQL equivalente para EXPLAIN (quando houver)
+            explain_params: Parâmetros $n do SQL equivalente
+            error: Mensagem de erro, se a query falhou
+
+        Returns:
+            Fingerprint da query
+        """
+        normalized = normalize_sql(text)
+        fp = fingerprint(f"{kind}:{normalized}")
+
+        samples = self.timings.get(fp)
+        if samples is None:
+            samples = self.timings[fp] = deque(maxlen=self.samples_per_fingerprint)
+            self.shapes[fp] = {
+                "kind": kind, "query": normalized[:500], "slow_count": 0, "error_count": 0,
+                "calls": 0, "total_ms": 0.0
+            }
+        # Contadores acumulados; a deque guarda só as últimas amostras (percentis)
+        samples.append(duration_ms)
+        self.shapes[fp]["calls"] += 1
+        self.shapes[fp]["total_ms"] += duration_ms
+        if error:
+            self.shapes[fp]["error_count"] += 1
+
+        if duration_ms >= self.threshold_ms:
+            self.shapes[fp]["slow_count"] += 1
+            entry = {
+                "fingerprint": fp,
+                "kind": kind,
+                "query": normalized[:2000],
+                "duration_ms": round(duration_ms, 2),
+                "error": error,
+                "explain": None,
+                "timestamp": datetime.now().isoformat()
+            }
+            self.slow_log.append(entry)
+            if explain_sql and not error and self._should_explain(fp):
+                self._schedule_explain(entry, explain_sql, explain_params)
+
+        return fp
+
+    async def exec_sql(self, client, query: str, params: Optional[List[Any]] = None) -> List[Dict]:
+        """Executa a RPC exec_sql fora do event loop, medindo o tempo da chamada"""
+        start = time.perf_counter()
+        error = None
+        try:
+            response = await asyncio.to_thread(
+                lambda: client.rpc('exec_sql', {'query': query, 'params': params}).execute()
+            )
+            return response.data or []
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self.record(
+                "exec_sql",
+                query,
+                (time.perf_counter() - start) * 1000,
+                explain_sql=query,
+                explain_params=params,
+                error=error
+            )
+
+    def _should_explain(self, fp: str) -> bool:
+        if not self.explain_enabled or not os.getenv("DATABASE_URL"):
+            return False
+        now = time.monotonic()
+        last = self._last_explain.get(fp)
+        if last is not None and now - last < self.explain_cooldown_s:
+            return False
+        self._last_explain.pop(fp, None)
+        self._last_explain[fp] = now
+        self._prune_explains(now)
+        return True
+
+    def _prune_explains(self, now: float) -> None:
+        """Descarta cooldowns vencidos (os mais antigos primeiro) e limita o tamanho"""
+        while self._last_explain:
+            oldest_fp, oldest = next(iter(self._last_explain.items()))
+            if now - oldest < self.explain_cooldown_s and len(self._last_explain) <= self.max_explain_fingerprints:
+                break
+            del self._last_explain[oldest_fp]
+
+    def _schedule_explain(self, entry: Dict[str, Any], sql: str, params: Optional[List[Any]]) -> None:
+        """Captura o plano em background para não atrasar a resposta"""
+        async def _capture():
+            entry["explain"] = await asyncio.to_thread(self.explain, sql, params)
+
+        try:
+            task = asyncio.get_running_loop().create_task(_capture())
+        except RuntimeError:
+            entry["explain"] = self.explain(sql, params)
+            return
+        self._explain_tasks.add(task)
+        task.add_done_callback(self._explain_tasks.discard)
+
+    def explain(self, sql: str, params: Optional[List[Any]] = None) -> Optional[Any]:
+        """
+        Executa EXPLAIN (ANALYZE, BUFFERS) via DATABASE_URL dentro de uma
+        transação que sofre rollback
+        """
+        database_url = os.getenv("DATABASE_URL")
+        if not database_url:
+            return None
+
+        try:
+            import psycopg2
+        except ImportError:
+            return {"error": "psycopg2 nao instalado. Use: pip install psycopg2-binary"}
+
+        statement, named = to_psycopg_sql(sql, params)
+        conn = None
+        try:
+            conn = psycopg2.connect(database_url)
+            with conn.cursor() as cur:
+                cur.execute("SET LOCAL statement_timeout = %s", (int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "15000")),))
+                cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", named)
+                plan = cur.fetchone()[0]
+            conn.rollback()
+            return plan
+        except Exception as e:
+            return {"error": str(e)}
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def get_fingerprint_stats(self) -> List[Dict[str, Any]]:
+        """
+        Estatísticas por fingerprint, ordenadas pelo tempo total
+
+        count e total_ms cobrem todas as execuções; p50/p95/max vêm das
+        últimas amostras retidas (samples_per_fingerprint).
+        """
+        stats = []
+        for fp, samples in self.timings.items():
+            values = sorted(samples)
+            if not values:
+                continue
+            shape = self.shapes[fp]
+            stats.append({
+                "fingerprint": fp,
+                "kind": shape["kind"],
+                "query": shape["query"],
+                "slow_count": shape["slow_count"],
+                "error_count": shape["error_count"],
+                "count": shape["calls"],
+                "p50_ms": round(values[int(len(values) * 0.50)], 2),
+                "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))], 2),
+                "max_ms": round(values[-1], 2),
+                "total_ms": round(shape["total_ms"], 2),
+                "samples": len(values)
+            })
+        return sorted(stats, key=lambda s: s["total_ms"], reverse=True)
+
+    def get_slow_queries(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Últimas queries lentas (mais recentes primeiro)"""
+        return list(reversed(self.slow_log))[:limit]
+
+    def reset(self) -> None:
+        """Limpa log e estatísticas"""
+        self.slow_log.clear()
+        self.timings.clear()
+        self.shapes.clear()
+        self._last_explain.clear()
+
+
+# Instância global
+query_monitor = QueryMonitor()
@@ -1,15 +1,18 @@
 # src/database/query_optimizer.py
 from typing import Dict, List, Optional, Any
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import asyncio
 from functools import lru_cache
-import pandas as pd
+
+from .query_monitor import query_monitor
+from .rollups import DailyRollups
 
 class QueryOptimizer:
     """Otimizador de queries para Supabase PostgreSQL"""
 
     def __init__(self, supabase_client):
         self.client = supabase_client
+        self.rollups = DailyRollups(supabase_client)
 
     async def get_optimized_sales_data(
         self,
@@ -18,43 +21,34 @@ class QueryOptimizer:
         group_by: str = "daily",
         filters: Optional[Dict] = None
     ) -> List[Dict]:
-        """Recupera dados de vendas otimizados com índices e cache"""
+        """Série de vendas lida do rollup diário (filtros: idempreendimento, idcorretor, idimobiliaria)"""
+
+        series = await self.rollups.series(
+            'vendas',
+            start_date=start_date,
+            end_date=end_date,
+            granularity=group_by,
+            filters=filters
+        )
 
-        # Query otimizada com índices
-        query = """
-        SELECT
-            DATE(data_venda) as data,
-            SUM(valor_venda) as total_vendas,
-            COUNT(*) as quantidade_vendas,
-            AVG(valor_venda) as ticket_medio,
-            cliente_id,
-            categoria_produto
-        FROM vendas
-        WHERE data_venda >= $1
-        AND data_venda <= $2
-        {filters}
-        GROUP BY DATE(data_venda), cliente_id, categoria_produto
-        ORDER BY data DESC
-        LIMIT 10000
-        """.format(filters=self._build_filter_clause(filters))
-
-        # Executar query com parâmetros
-        result = await self.client.rpc('exec_sql', {
-            'query': query,
-            'params': [start_date, end_date]
-        })
-
-        # Agrupar por período solicitado
-        return self._group_by_period(result, group_by)
+        return [
+            {
+                'periodo': row['data'],
+                'total_vendas': row['valor_total'],
+                'quantidade_vendas': row['quantidade'],
+                'ticket_medio': row['ticket_medio'],
+                'clientes_unicos': row['clientes_unicos']
+            }
+            for row in series
+        ]
 
     async def get_kpi_metrics(
         self,
         period: str = "month",
         comparison_period: bool = True
     ) -> Dict:
-        """Recupera KPIs otimizados com materialized views"""
+        """Recupera KPIs de vendas a partir do rollup diário"""
 
-        # Usar materialized view se disponível
         if period == "month":
             current_metrics = await self._get_monthly_kpi()
         elif period == "week":
@@ -131,10 +125,7 @@ class QueryOptimizer:
             """
             params = [limit]
 
-        return await self.client.rpc('exec_sql', {
-            'query': query,
-            'params': params
-        })
+        return await self._exec_sql(query, params)
 
     async def get_product_performance(
         self,
@@ -198,137 +189,74 @@ class QueryOptimizer:
             category_filter=category_filter
         )
 
-        return await self.client.rpc('exec_sql', {
-            'query': query,
-            'params': params or None
-        })
-
-    def _build_filter_clause(self, filters: Optional[Dict]) -> str:
-        """Constrói cláusula WHERE para filtros"""
-
-        if not filters:
-            return ""
-
-        conditions = []
-        for key, value in filters.items():
-            if isinstance(value, list):
-                conditions.append(f"AND {key} IN ({','.join(['%s'] * len(value))})")
-            else:
-                conditions.append(f"AND {key} = %s")
-
-        return " " + " ".join(conditions)
-
-    def _group_by_period(self, data: List[Dict], group_by: str) -> List[Dict]:
-        """Agrupa dados por período específico"""
+        return await self._exec_sql(query, params or None)
 
-        if not data:
-            return []
-
-        df = pd.DataFrame(data)
-        df['data'] = pd.to_datetime(df['data'])
-
-        if group_by == "weekly":
-            df['periodo'] = df['data'].dt.to_period('W').astype(str)
-        elif group_by == "monthly":
-            df['periodo'] = df['data'].dt.to_period('M').astype(str)
-        else:  # daily
-            df['periodo'] = df['data'].dt.date.astype(str)
-
-        # Agrupar e somar
-        grouped = df.groupby('periodo').agg({
-            'total_vendas': 'sum',
-            'quantidade_vendas': 'sum',
-            'ticket_medio': 'mean'
-        }).reset_index()
-
-        return grouped.to_dict('records')
+    async def _exec_sql(self, query: str, params: Optional[List] = None) -> List[Dict]:
+        """Executa SQL via RPC exec_sql com instrumentação de tempo"""
+        return await query_monitor.exec_sql(self.client, query, params)
 
     async def _get_monthly_kpi(self) -> Dict:
-        """KPIs mensais otimizados"""
+        """KPIs mensais a partir do rollup diário"""
 
-        query = """
-        SELECT
-            DATE_TRUNC('month', CURRENT_DATE) as mes_referencia,
-            COUNT(*) as total_vendas,
-            SUM(valor_venda) as receita_total,
-            AVG(valor_venda) as ticket_medio,
-            COUNT(DISTINCT cliente_id) as clientes_unicos,
-            COUNT(DISTINCT CASE WHEN data_venda >= CURRENT_DATE - INTERVAL '30 days' THEN cliente_id END) as clientes_ativos_30d
-        FROM vendas
-        WHERE data_venda >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '1 month')
-        AND data_venda < DATE_TRUNC('month', CURRENT_DATE + INTERVAL '1 month')
-        """
+        today = date.today()
+        # Mesma janela de antes: do início do mês anterior ao fim do mês corrente
+        metrics = await self._sales_kpi(_add_months(today, -1), _add_months(today, 1) - timedelta(days=1))
+        active = await self.rollups.totals('vendas', today - timedelta(days=30), today)
 
-        result = await self.client.rpc('exec_sql', {'query': query, 'params': []})
-        return result[0] if result else {}
+        return {
+            'mes_referencia': today.replace(day=1).isoformat(),
+            **metrics,
+            'clientes_ativos_30d': active['clientes_unicos']
+        }
 
     async def _get_weekly_kpi(self) -> Dict:
-        """KPIs semanais otimizados"""
+        """KPIs semanais a partir do rollup diário"""
 
-        query = """
-        SELECT
-            DATE_TRUNC('week', CURRENT_DATE) as semana_referencia,
-            COUNT(*) as total_vendas,
-            SUM(valor_venda) as receita_total,
-            AVG(valor_venda) as ticket_medio,
-            COUNT(DISTINCT cliente_id) as clientes_unicos
-        FROM vendas
-        WHERE data_venda >= DATE_TRUNC('week', CURRENT_DATE - INTERVAL '1 week')
-        AND data_venda < DATE_TRUNC('week', CURRENT_DATE + INTERVAL '1 week')
-        """
+        week_start = date.today() - timedelta(days=date.today().weekday())
+        metrics = await self._sales_kpi(week_start - timedelta(weeks=1), week_start + timedelta(days=6))
 
-        result = await self.client.rpc('exec_sql', {'query': query, 'params': []})
-        return result[0] if result else {}
+        return {'semana_referencia': week_start.isoformat(), **metrics}
 
     async def _get_daily_kpi(self) -> Dict:
-        """KPIs diários otimizados"""
+        """KPIs diários a partir do rollup diário"""
 
-        query = """
-        SELECT
-            CURRENT_DATE as data_referencia,
-            COUNT(*) as total_vendas,
-            SUM(valor_venda) as receita_total,
-            AVG(valor_venda) as ticket_medio,
-            COUNT(DISTINCT cliente_id) as clientes_unicos
-        FROM vendas
-        WHERE data_venda = CURRENT_DATE
-        """
+        today = date.today()
+        metrics = await self._sales_kpi(today, today)
 
-        result = await self.client.rpc('exec_sql', {'query': query, 'params': []})
-        return result[0] if result else {}
+        return {'data_referencia': today.isoformat(), **metrics}
 
     async def _get_comparison_metrics(self, period: str) -> Dict:
         """Métricas de comparação com período anterior"""
 
+        today = date.today()
         if period == "month":
-            query = """
-            SELECT
-                COUNT(*) as vendas_anterior,
-                SUM(valor_venda) as receita_anterior,
-                AVG(valor_venda) as ticket_medio_anterior
-            FROM vendas
-            WHERE data_venda >= DATE_TRUNC('month', CURRENT_DATE - INTERVAL '2 months')
-            AND data_venda < DATE_TRUNC('month', CURRENT_DATE - INTERVAL '1 month')
-            """
+            start, end = _add_months(today, -2), _add_months(today, -1) - timedelta(days=1)
         elif period == "week":
-            query = """
-            SELECT
-                COUNT(*) as vendas_anterior,
-                SUM(valor_venda) as receita_anterior,
-                AVG(valor_venda) as ticket_medio_anterior
-            FROM vendas
-            WHERE data_venda >= DATE_TRUNC('week', CURRENT_DATE - INTERVAL '2 weeks')
-            AND data_venda < DATE_TRUNC('week', CURRENT_DATE - INTERVAL '1 week')
-            """
+            week_start = today - timedelta(days=today.weekday())
+            start, end = week_start - timedelta(weeks=2), week_start - timedelta(weeks=1, days=1)
         else:  # daily
-            query = """
-            SELECT
-                COUNT(*) as vendas_anterior,
-                SUM(valor_venda) as receita_anterior,
-                AVG(valor_venda) as ticket_medio_anterior
-            FROM vendas
-            WHERE data_venda = CURRENT_DATE - INTERVAL '1 day'
-            """
-
-        result = await self.client.rpc('exec_sql', {'query': query, 'params': []})
-        return result[0] if result else {}
+            start = end = today - timedelta(days=1)
+
+        metrics = await self._sales_kpi(start, end)
+        return {
+            'vendas_anterior': metrics['total_vendas'],
+            'receita_anterior': metrics['receita_total'],
+            'ticket_medio_anterior': metrics['ticket_medio']
+        }
+
+    async def _sales_kpi(self, start: date, end: date) -> Dict:
+        """Totais de vendas entre duas datas (inclusivas) lidos do rollup"""
+
+        totals = await self.rollups.totals('vendas', start.isoformat(), end.isoformat())
+        return {
+            'total_vendas': totals['quantidade'],
+            'receita_total': totals['valor_total'],
+            'ticket_medio': totals['ticket_medio'],
+            'clientes_unicos': totals['clientes_unicos']
+        }
+
+
+def _add_months(day: date, months: int) -> date:
+    """Primeiro dia do mês deslocado em `months` meses"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
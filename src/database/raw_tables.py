@@ -0,0 +1,139 @@
+# src/database/raw_tables.py
+"""
+Allow-lists das tabelas RAW importadas do CVDW.
+
+Centraliza quais tabelas e colunas podem ser usadas em filtros, agrupamentos
+e agregações vindos do agente IA ou da API, evitando SQL injection. Toda
+coluna listada existe em analyse_api/supabase_schema.sql.
+"""
+import os
+import re
+from typing import Dict, List, Optional
+
+# Tabelas internas que o agente e a API podem consultar
+ALLOWED_TABLES = {
+    'leads', 'vendas', 'reservas', 'unidades',
+    'corretores', 'pessoas', 'imobiliarias', 'repasses'
+}
+
+# Colunas permitidas em filtros de igualdade
+FILTER_COLUMNS: Dict[str, List[str]] = {
+    'leads': ['ativo', 'cidade', 'estado', 'situacao', 'origem'],
+    'vendas': ['ativo', 'cidade', 'contrato_interno'],
+    'reservas': ['ativo', 'cidade', 'bloco'],
+    'unidades': ['bloco', 'andar', 'etapa'],
+    'corretores': ['ativo', 'ativo_login'],
+    'pessoas': ['ativo', 'cidade', 'estado'],
+    'imobiliarias': ['ativo'],
+    'repasses': ['ativo']
+}
+
+# Colunas permitidas em GROUP BY (além das colunas de filtro)
+GROUP_BY_COLUMNS: Dict[str, List[str]] = {
+    'leads': ['idsituacao', 'idcorretor', 'idimobiliaria', 'idempreendimento_ultimo'],
+    'vendas': ['empreendimento', 'idempreendimento', 'corretor', 'idcorretor',
+               'imobiliaria', 'idimobiliaria', 'aprovada'],
+    'reservas': ['situacao', 'idsituacao', 'empreendimento', 'idempreendimento',
+                 'corretor', 'idcorretor', 'imobiliaria', 'idimobiliaria', 'regiao'],
+    'unidades': ['idempreendimento', 'tipologia', 'situacao_vendida', 'situacao_para_venda'],
+    'corretores': ['idimobiliaria'],
+    'pessoas': [],
+    'imobiliarias': [],
+    'repasses': []
+}
+
+# Colunas numéricas permitidas em sum/avg/min/max
+NUMERIC_COLUMNS: Dict[str, List[str]] = {
+    'leads': ['renda_familiar', 'score'],
+    'vendas': ['valor_contrato', 'renda', 'idade', 'area_privativa'],
+    'reservas': ['valor_contrato', 'valor_contrato_com_juros', 'valor_proposta',
+                 'valor_financiamento', 'valor_fgts', 'valor_subsidio', 'vgv_tabela', 'renda'],
+    'unidades': ['valor', 'valor_avaliacao', 'area_privativa'],
+    'corretores': [],
+    'pessoas': ['renda_familiar'],
+    'imobiliarias': [],
+    'repasses': []
+}
+
+# Colunas permitidas em count_distinct
+DISTINCT_COLUMNS: Dict[str, List[str]] = {
+    'leads': ['idcorretor', 'idimobiliaria', 'cidade'],
+    'vendas': ['idcliente', 'idcorretor', 'idimobiliaria', 'idempreendimento'],
+    'reservas': ['idcliente', 'idcorretor', 'idimobiliaria', 'idempreendimento'],
+    'unidades': ['idempreendimento'],
+    'corretores': ['idimobiliaria'],
+    'pessoas': ['cidade'],
+    'imobiliarias': [],
+    'repasses': []
+}
+
+# Coluna de data usada em filtros por período (start_date/end_date)
+DATE_COLUMNS: Dict[str, str] = {
+    'leads': 'data_cad',
+    'vendas': 'data_venda',
+    'reservas': 'data_cad',
+    'unidades': 'referencia_data',
+    'corretores': 'data_cad',
+    'pessoas': 'data_cad',
+    'imobiliarias': 'data_cad',
+    'repasses': 'data_cad'
+}
+
+# Projeção padrão por tabela (evita trafegar o blob 'raw' inteiro para o LLM)
+DEFAULT_PROJECTIONS: Dict[str, List[str]] = {
+    'leads': ['idlead', 'nome', 'situacao', 'origem', 'cidade', 'estado', 'data_cad', 'ativo'],
+    'vendas': ['idreserva', 'cliente', 'empreendimento', 'corretor', 'imobiliaria',
+               'valor_contrato', 'data_venda', 'ativo'],
+    'reservas': ['idreserva', 'cliente', 'empreendimento', 'situacao', 'corretor',
+                 'valor_contrato', 'data_cad', 'ativo'],
+    'unidades': ['referencia', 'idempreendimento', 'bloco', 'andar', 'tipologia',
+                 'valor', 'situacao_para_venda'],
+    'corretores': ['idcorretor', 'nome', 'idimobiliaria', 'ativo'],
+    'pessoas': ['idpessoa', 'nome', 'cidade', 'estado', 'data_cad', 'ativo'],
+    'imobiliarias': ['idimobiliaria', 'nome', 'ativo'],
+    'repasses': ['idrepasse', 'cliente', 'empreendimento', 'situacao', 'valor_previsto',
+                 'data_cad', 'ativo']
+}
+
+# Tabelas grandes: contagem estimada por padrão (evita full scan do count exato)
+ESTIMATED_COUNT_TABLES = {'leads', 'pessoas'}
+
+COUNT_MODES = {'exact', 'planned', 'estimated'}
+
+# TTL máximo da contagem exata em cache; a importação invalida antes pela tag table:<tabela>
+EXACT_COUNT_TTL_SECONDS = int(os.getenv('RAW_EXACT_COUNT_TTL_SECONDS', '900'))
+
+# Coluna simples ou caminho JSON dentro de 'raw' (ex: raw->>email)
+_PROJECTION_RE = re.compile(r"^(?:[a-z_][a-z0-9_]*|raw->>?[a-zA-Z0-9_]+)$")
+
+
+def groupable_columns(table_name: str) -> List[str]:
+    """Colunas aceitas em GROUP BY para a tabela"""
+    return FILTER_COLUMNS.get(table_name, []) + GROUP_BY_COLUMNS.get(table_name, [])
+
+
+def date_column(table_name: str) -> Optional[str]:
+    """Coluna de data de referência da tabela"""
+    return DATE_COLUMNS.get(table_name)
+
+
+def resolve_projection(table_name: str, columns: Optional[List[str]] = None) -> List[str]:
+    """
+    Valida a projeção pedida ou retorna a projeção padrão da tabela
+
+    Raises:
+        ValueError: se alguma coluna tiver formato inválido
+    """
+    if not columns:
+        return DEFAULT_PROJECTIONS.get(table_name, ['*'])
+
+    invalid = [c for c in columns if not _PROJECTION_RE.match(c)]
+    if invalid:
+        raise ValueError(f"Colunas invalidas na projecao: {', '.join(invalid)}")
+    return list(dict.fromkeys(columns))
+
+
+def default_count_mode(table_name: str) -> str:
+    """Modo de contagem padrão da tabela ('exact' ou 'estimated')"""
+    return 'estimated' if table_name in ESTIMATED_COUNT_TABLES else 'exact'
+
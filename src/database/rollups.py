@@ -0,0 +1,187 @@
+# src/database/rollups.py
+"""
+Leitura do rollup diário (rollup_diario) de vendas, reservas e leads.
+
+O grão é dia × empreendimento × corretor × imobiliária; séries mensais ou
+anuais somam centenas de linhas do rollup em vez de milhões de linhas RAW.
+Clientes distintos vêm de sketches KMV unidos no banco (kmv_union).
+"""
+import asyncio
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .query_monitor import query_monitor
+from ..cache.range_cache import range_cache
+
+# Fatos mantidos pelo rollup (ver database/migrations/004_create_rollup_diario.sql)
+ROLLUP_FACTS = {'vendas', 'reservas', 'leads'}
+
+# Dimensões do grão (0 = não informado)
+ROLLUP_DIMENSIONS = ['idempreendimento', 'idcorretor', 'idimobiliaria']
+
+# Granularidade -> unidade do DATE_TRUNC
+GRANULARITIES = {
+    'daily': 'day', 'day': 'day',
+    'weekly': 'week', 'week': 'week',
+    'monthly': 'month', 'month': 'month',
+    'yearly': 'year', 'year': 'year',
+}
+
+
+class RollupError(ValueError):
+    """Erro de validação em uma consulta ao rollup"""
+
+
+class DailyRollups:
+    """Consulta e atualiza o rollup diário"""
+
+    def __init__(self, supabase_client):
+        self.client = supabase_client
+
+    def build_query(
+        self,
+        fact: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        granularity: Optional[str] = 'monthly',
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, List[Any]]:
+        """
+        Gera SQL parametrizado ($1, $2, ...) sobre rollup_diario
+
+        granularity=None retorna uma única linha com os totais do período.
+        """
+        if fact not in ROLLUP_FACTS:
+            raise RollupError(f"Fato invalido. Use um de: {', '.join(sorted(ROLLUP_FACTS))}")
+
+        params: List[Any] = [fact]
+        conditions = ["fato = $1"]
+
+        if start_date:
+            params.append(str(start_date))
+            conditions.append(f"dia >= ${len(params)}::date")
+        if end_date:
+            params.append(str(end_date))
+            conditions.append(f"dia <= ${len(params)}::date")
+
+        for key, value in (filters or {}).items():
+            if key not in ROLLUP_DIMENSIONS:
+                raise RollupError(
+                    f"Filtro '{key}' nao disponivel no rollup. Use: {', '.join(ROLLUP_DIMENSIONS)}"
+                )
+            if isinstance(value, list):
+                placeholders = []
+                for item in value:
+                    params.append(int(item))
+                    placeholders.append(f"${len(params)}")
+                conditions.append(f"{key} IN ({', '.join(placeholders)})")
+            else:
+                params.append(int(value))
+                conditions.append(f"{key} = ${len(params)}")
+
+        metrics = (
+            "SUM(quantidade) AS quantidade, "
+            "SUM(valor_total) AS valor_total, "
+            "SUM(vgv) AS vgv, "
+            "kmv_estimate(kmv_union(clientes_sketch)) AS clientes_unicos"
+        )
+        where = " AND ".join(conditions)
+
+        if granularity is None:
+            return f"SELECT {metrics} FROM rollup_diario WHERE {where}", params
+
+        unit = GRANULARITIES.get(granularity)
+        if not unit:
+            raise RollupError(
+                f"Granularidade invalida. Use: {', '.join(sorted(set(GRANULARITIES.values())))}"
+            )
+
+        query = (
+            f"SELECT DATE_TRUNC('{unit}', dia)::date AS data, {metrics} "
+            f"FROM rollup_diario WHERE {where} GROUP BY 1 ORDER BY 1"
+        )
+        return query, params
+
+    async def series(
+        self,
+        fact: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        granularity: str = 'monthly',
+        filters: Optional[Dict[str, Any]] = None,
+        use_cache: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Série temporal do fato por período
+
+        Cada linha traz 'data', 'quantidade', 'valor_total', 'vgv',
+        'clientes_unicos' e 'valor' (valor_total; quantidade para leads).
+        Com use_cache, cada período fica em cache separado (range_cache) e
+        só os períodos ausentes são consultados.
+        """
+        # Valida fato, filtros e granularidade antes de tocar no cache
+        self.build_query(fact, start_date, end_date, granularity, filters)
+
+        async def fetch(start: Optional[str], end: Optional[str]) -> List[Dict[str, Any]]:
+            query, params = self.build_query(fact, start, end, granularity, filters)
+            rows = await query_monitor.exec_sql(self.client, query, params)
+            return [self._normalize_row(fact, row) for row in rows]
+
+        if not use_cache:
+            return await fetch(start_date, end_date)
+        return await range_cache.series(
+            {'rollup': fact, 'filters': filters or {}},
+            start_date, end_date, GRANULARITIES[granularity], fetch,
+            tags=[f"table:{fact}"]
+        )
+
+    async def totals(
+        self,
+        fact: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Totais do fato no período (datas inclusivas)"""
+        query, params = self.build_query(fact, start_date, end_date, None, filters)
+        rows = await query_monitor.exec_sql(self.client, query, params)
+        return self._normalize_row(fact, rows[0] if rows else {})
+
+    async def refresh(self, fact: str, days: Optional[Iterable] = None) -> int:
+        """
+        Recalcula o rollup apenas dos dias informados (None = fato inteiro)
+
+        Returns:
+            Número de linhas de rollup gravadas
+        """
+        if fact not in ROLLUP_FACTS:
+            raise RollupError(f"Fato invalido. Use um de: {', '.join(sorted(ROLLUP_FACTS))}")
+
+        day_list = None
+        if days is not None:
+            day_list = sorted({str(d)[:10] for d in days if d})
+            if not day_list:
+                return 0
+
+        response = await asyncio.to_thread(
+            lambda: self.client.rpc(
+                'refresh_rollup_diario', {'p_fato': fact, 'p_dias': day_list}
+            ).execute()
+        )
+        return response.data or 0
+
+    def _normalize_row(self, fact: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        quantidade = int(row.get('quantidade') or 0)
+        valor_total = float(row.get('valor_total') or 0)
+        normalized = {
+            **row,
+            'quantidade': quantidade,
+            'valor_total': valor_total,
+            'vgv': float(row.get('vgv') or 0),
+            'clientes_unicos': int(float(row.get('clientes_unicos') or 0)),
+            'ticket_medio': round(valor_total / quantidade, 2) if quantidade else 0.0,
+        }
+        normalized['valor'] = quantidade if fact == 'leads' else valor_total
+        if isinstance(normalized.get('data'), date):
+            normalized['data'] = normalized['data'].isoformat()
+        return normalized
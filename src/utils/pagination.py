@@ -39,7 +39,7 @@ class SmartPaginator:
         )
 
         # Tentar recuperar do cache
-        cached_result = self.cache.get_cached_result(cache_key)
+        cached_result = await self.cache.get_cached_result(cache_key)
         if cached_result:
             return cached_result
 
@@ -87,7 +87,7 @@ class SmartPaginator:
         }
 
         # Cachear resultado
-        self.cache.cache_result(cache_key, result, cache_expiration)
+        await self.cache.cache_result(cache_key, result, cache_expiration)
 
         return result
 
@@ -39,7 +39,7 @@ async def test_redis_cache():
         from src.cache.redis_manager import cache_manager
 
         # Teste 1: Conectividade
-        stats = cache_manager.get_cache_stats()
+        stats = await cache_manager.get_cache_stats()
         status = stats.get('status', 'error')
 
         if status in ['connected', 'memory_fallback']:
@@ -56,8 +56,8 @@ async def test_redis_cache():
             "data": [1, 2, 3, 4, 5]
         }
 
-        cache_manager.cache_result(test_key, test_data, 60)
-        retrieved_data = cache_manager.get_cached_result(test_key)
+        await cache_manager.cache_result(test_key, test_data, 60)
+        retrieved_data = await cache_manager.get_cached_result(test_key)
 
         if retrieved_data and retrieved_data.get('test') == True:
             print_test("Armazenar e Recuperar Cache", "PASS")
@@ -66,8 +66,8 @@ async def test_redis_cache():
             return False
 
         # Teste 3: Invalidação
-        cache_manager.invalidate_cache("test:*")
-        after_invalidation = cache_manager.get_cached_result(test_key)
+        await cache_manager.invalidate_cache("test:*")
+        after_invalidation = await cache_manager.get_cached_result(test_key)
 
         if after_invalidation is None:
             print_test("Invalidar Cache", "PASS")
@@ -76,7 +76,7 @@ async def test_redis_cache():
             return False
 
         # Teste 4: Estatísticas
-        stats = cache_manager.get_cache_stats()
+        stats = await cache_manager.get_cache_stats()
         if 'total_keys' in stats:
             print_test("Estatísticas do Cache", "PASS",
                       f"Total keys: {stats['total_keys']}, Status: {stats['status']}")
@@ -153,7 +153,7 @@ async def test_pagination():
             return False
 
         # Limpar cache de teste
-        cache_manager.invalidate_cache("test_pagination:*")
+        await cache_manager.invalidate_cache("test_pagination:*")
 
         return True
 
@@ -118,15 +118,15 @@ async def test_cache_manager():
     from src.agents.cache_manager import cache_manager
 
     # Testar cache em memória
-    cache_manager.set('test', 'key1', {'data': 'test_value'}, ttl=60)
-    cached_value = cache_manager.get('test', 'key1')
+    await cache_manager.set('test', 'key1', {'data': 'test_value'}, ttl=60)
+    cached_value = await cache_manager.get('test', 'key1')
 
     if cached_value and cached_value.get('data') == 'test_value':
         print("[OK] Cache em memória funcionando")
     else:
         print("[ERRO] Erro no cache em memória")
 
-    stats = cache_manager.get_stats()
+    stats = await cache_manager.get_stats()
     print(f"[OK] Redis enabled: {stats['redis_enabled']}")
     print(f"[OK] Cache size: {stats['memory_cache']['size']}")
     return True
@@ -140,31 +140,31 @@ async def test_conversation_memory():
     user_id = str(uuid4())
 
     # Salvar algumas mensagens
-    conversation_memory.save_message(
+    await conversation_memory.save_message(
         user_id=user_id,
         message="Qual o total de vendas?",
         response="O total de vendas foi R$ 125.000,00"
     )
 
-    conversation_memory.save_message(
+    await conversation_memory.save_message(
         user_id=user_id,
         message="E no mês anterior?",
         response="No mês anterior foi R$ 110.000,00"
     )
 
     # Recuperar histórico
-    history = conversation_memory.get_history(user_id)
+    history = await conversation_memory.get_history(user_id)
     if history and len(history) == 2:
         print(f"[OK] Memória de conversas funcionando ({len(history)} mensagens)")
     else:
         print("[ERRO] Erro na memória de conversas")
 
     # Testar contexto
-    context = conversation_memory.get_context(user_id, last_n=2)
+    context = await conversation_memory.get_context(user_id, last_n=2)
     print(f"[OK] Contexto gerado: {len(context)} caracteres")
 
     # Limpar
-    conversation_memory.clear_user_history(user_id)
+    await conversation_memory.clear_user_history(user_id)
     return True
 
 
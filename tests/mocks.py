@@ -215,3 +215,79 @@ def create_mock_refresh_token(user_id: str = None) -> str:
     """Create mock refresh token"""
     user_id = user_id or str(uuid.uuid4())
     return f"mock_refresh_token_{user_id}"
+
+
+class MockAsyncRedis:
+    """In-memory stand-in for a redis.asyncio client (mget, set NX/GET, incr, pipeline)"""
+    def __init__(self):
+        self.store: Dict[str, bytes] = {}
+        self.expiry: Dict[str, int] = {}
+        self.calls: List[str] = []
+        self.fail = False
+
+    def _check(self, command: str):
+        self.calls.append(command)
+        if self.fail:
+            raise ConnectionError("redis down")
+
+    def _set(self, key, value, ex=None, nx=False, get=False):
+        previous = self.store.get(key)
+        if nx and previous is not None:
+            return None
+        self.store[key] = value if isinstance(value, bytes) else str(value).encode()
+        if ex is not None:
+            self.expiry[key] = ex
+        return previous if get else True
+
+    def _incr(self, key):
+        value = int(self.store.get(key, b"0")) + 1
+        self.store[key] = str(value).encode()
+        return value
+
+    async def ping(self):
+        self._check("ping")
+        return True
+
+    async def mget(self, keys):
+        self._check("mget")
+        return [self.store.get(k) for k in keys]
+
+    async def set(self, key, value, ex=None, nx=False, get=False):
+        self._check("set")
+        return self._set(key, value, ex=ex, nx=nx, get=get)
+
+    async def unlink(self, key):
+        self._check("unlink")
+        return int(self.store.pop(key, None) is not None)
+
+    async def info(self):
+        self._check("info")
+        return {"evicted_keys": 0, "expired_keys": 0, "used_memory_human": "1K"}
+
+    def pipeline(self, transaction=False):
+        return MockAsyncRedisPipeline(self)
+
+
+class MockAsyncRedisPipeline:
+    """Queued commands executed in one round-trip"""
+    def __init__(self, redis: MockAsyncRedis):
+        self.redis = redis
+        self.commands = []
+
+    def set(self, key, value, ex=None, nx=False, get=False):
+        self.commands.append(lambda: self.redis._set(key, value, ex=ex, nx=nx, get=get))
+
+    def incr(self, key):
+        self.commands.append(lambda: self.redis._incr(key))
+
+    async def execute(self):
+        self.redis._check("pipeline")
+        return [command() for command in self.commands]
+
+
+def attach_mock_redis(tiered_cache) -> MockAsyncRedis:
+    """Connect a TieredCache L2 to a fresh MockAsyncRedis"""
+    redis = MockAsyncRedis()
+    tiered_cache.l2.client = redis
+    tiered_cache.l2.enabled = True
+    return redis
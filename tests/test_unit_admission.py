@@ -0,0 +1,121 @@
+"""
+Unit tests for LLM admission control (concurrency limit, fair queue, rejection)
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from src.agents import routes
+from src.agents.admission import AdmissionRejected, LLMAdmissionController
+
+
+async def _hold(admission, key, order, release):
+    async with admission.slot(key):
+        order.append(key)
+        await release.wait()
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.unit
+class TestFairQueue:
+    """Waiting keys are served round-robin"""
+
+    async def test_burst_from_one_user_does_not_starve_others(self):
+        admission = LLMAdmissionController(max_concurrent=1, max_queue=10)
+        order, release = [], asyncio.Event()
+        blocker = asyncio.ensure_future(_hold(admission, "blocker", order, release))
+        await _settle()
+
+        done = asyncio.Event()
+        done.set()  # waiters leave as soon as they are admitted
+        waiters = [asyncio.ensure_future(_hold(admission, key, order, done))
+                   for key in ("user:a", "user:a", "user:a", "user:b", "user:c")]
+        await _settle()
+        assert admission.queued == 5 and admission.get_stats()["queued_by_key"]["user:a"] == 3
+
+        release.set()
+        await asyncio.gather(blocker, *waiters)
+        assert order == ["blocker", "user:a", "user:b", "user:c", "user:a", "user:a"]
+        assert admission.active == 0 and admission.queued == 0
+
+    async def test_concurrency_limit(self):
+        admission = LLMAdmissionController(max_concurrent=2, max_queue=10)
+        order, release = [], asyncio.Event()
+        tasks = [asyncio.ensure_future(_hold(admission, f"user:{i}", order, release)) for i in range(3)]
+        await _settle()
+        assert admission.active == 2 and admission.queued == 1
+        release.set()
+        await asyncio.gather(*tasks)
+        assert len(order) == 3 and admission.active == 0
+
+    def test_division_fairness_key(self):
+        admission = LLMAdmissionController(fairness="division")
+        assert admission.key_for("u1", {"divisao": "COM"}) == "div:COM"
+        assert LLMAdmissionController(fairness="user").key_for("u1") == "user:u1"
+
+
+@pytest.mark.unit
+class TestCancellation:
+    """Timeouts and cancelled waiters never leak slots"""
+
+    async def test_timeout_while_queued_leaves_the_queue(self):
+        admission = LLMAdmissionController(max_concurrent=1, max_queue=10)
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(_hold(admission, "a", [], release))
+        await _settle()
+
+        with pytest.raises(asyncio.TimeoutError):
+            async with admission.slot("b", timeout=0.01):
+                pass
+        assert admission.queued == 0 and admission.get_stats()["queued_by_key"] == {}
+        release.set()
+        await holder
+        assert admission.active == 0
+
+    async def test_cancel_after_grant_returns_the_slot(self):
+        admission = LLMAdmissionController(max_concurrent=1, max_queue=10)
+        await admission.acquire("a")
+        waiter = asyncio.ensure_future(admission.acquire("b"))
+        await _settle()
+
+        admission.release()  # grants the slot to b ...
+        waiter.cancel()      # ... which is cancelled before it resumes
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert admission.active == 0 and admission.queued == 0
+
+
+@pytest.mark.unit
+class TestRejection:
+    """A full queue is refused immediately with a Retry-After estimate"""
+
+    async def test_full_queue_rejects(self):
+        admission = LLMAdmissionController(max_concurrent=1, max_queue=1)
+        admission._service_s.extend([4.0, 4.0])
+        await admission.acquire("a")
+        waiter = asyncio.ensure_future(admission.acquire("b"))
+        await _settle()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("c")
+        assert rejected.value.retry_after == 8 and rejected.value.queued == 1
+        assert admission.rejected == 1
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        admission.release()
+
+    async def test_chat_route_maps_rejection_to_429(self, monkeypatch):
+        async def handle_chat(user_id, message):
+            raise AdmissionRejected(retry_after=7, queued=20)
+
+        monkeypatch.setattr(routes.analytics_agent, "handle_chat", handle_chat)
+        with pytest.raises(HTTPException) as error:
+            await routes.chat(routes.ChatRequest(message="oi"), current_user=SimpleNamespace(id="u1"))
+        assert error.value.status_code == 429 and error.value.headers == {"Retry-After": "7"}
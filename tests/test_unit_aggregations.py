@@ -0,0 +1,128 @@
+"""
+Unit tests for server-side aggregations over the RAW tables
+"""
+import re
+import uuid
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from src.auth.dependencies import get_current_user
+from src.analyses import routes_optimized
+from src.database import raw_tables
+from src.database.aggregations import RawAggregator, AggregationError
+
+SCHEMA_PATH = Path(__file__).resolve().parents[1] / "analyse_api" / "supabase_schema.sql"
+
+
+def _schema_columns():
+    sql = SCHEMA_PATH.read_text(encoding="utf-8")
+    tables = {}
+    for match in re.finditer(r"create table if not exists (\w+) \((.*?)\n\);", sql, re.S):
+        tables[match.group(1)] = {
+            line.strip().split()[0]
+            for line in match.group(2).splitlines()
+            if line.strip() and not line.strip().startswith("--")
+        }
+    return tables
+
+
+@pytest.mark.unit
+class TestAllowListsMatchSchema:
+    """Every allow-listed column must exist in supabase_schema.sql"""
+
+    @pytest.mark.parametrize("name", [
+        "FILTER_COLUMNS", "GROUP_BY_COLUMNS", "NUMERIC_COLUMNS", "DISTINCT_COLUMNS", "DEFAULT_PROJECTIONS",
+    ])
+    def test_columns_exist(self, name):
+        schema = _schema_columns()
+        missing = {
+            table: [c for c in columns if c not in schema[table]]
+            for table, columns in getattr(raw_tables, name).items()
+        }
+        assert {t: c for t, c in missing.items() if c} == {}
+
+    def test_date_columns_exist(self):
+        schema = _schema_columns()
+        for table, column in raw_tables.DATE_COLUMNS.items():
+            assert column in schema[table], f"{table}.{column}"
+
+    def test_imobiliarias_has_no_cidade(self):
+        assert "cidade" not in raw_tables.DISTINCT_COLUMNS["imobiliarias"]
+        assert "cidade" not in raw_tables.DEFAULT_PROJECTIONS["imobiliarias"]
+
+
+@pytest.mark.unit
+class TestBuildQuery:
+    """SQL generation and validation"""
+
+    def setup_method(self):
+        self.aggregator = RawAggregator(supabase_client=None)
+
+    def test_count_without_group(self):
+        query, params = self.aggregator.build_query("leads", ["count"], {"ativo": "S"})
+        assert query == "SELECT COUNT(*) AS count FROM leads WHERE ativo = $1"
+        assert params == ["S"]
+
+    def test_group_by_orders_by_first_metric_and_limits(self):
+        query, _ = self.aggregator.build_query(
+            "vendas", ["sum:valor_contrato", "count"], group_by="empreendimento", limit=10_000
+        )
+        assert query.startswith("SELECT empreendimento, SUM(valor_contrato) AS sum_valor_contrato, COUNT(*) AS count")
+        assert "GROUP BY empreendimento ORDER BY sum_valor_contrato DESC NULLS LAST" in query
+        assert query.endswith(f"LIMIT {RawAggregator.MAX_GROUPS}")
+
+    def test_list_filter_and_period_are_parameters(self):
+        query, params = self.aggregator.build_query(
+            "reservas", ["count"], {"bloco": ["A", "B"]}, start_date="2025-01-01", end_date="2025-01-31"
+        )
+        assert "bloco IN ($1, $2)" in query
+        assert "data_cad >= $3::date" in query and "data_cad < $4::date + 1" in query
+        assert params == ["A", "B", "2025-01-01", "2025-01-31"]
+
+    @pytest.mark.parametrize("kwargs", [
+        {"table_name": "usuarios"},
+        {"table_name": "leads", "metrics": ["median:score"]},
+        {"table_name": "leads", "metrics": ["count:idlead"]},
+        {"table_name": "leads", "metrics": ["sum"]},
+        {"table_name": "leads", "metrics": ["sum:nome"]},
+        {"table_name": "leads", "filters": {"nome; drop table leads": "x"}},
+        {"table_name": "leads", "group_by": "email"},
+        {"table_name": "imobiliarias", "metrics": ["count_distinct:cidade"]},
+    ])
+    def test_rejects_invalid_input(self, kwargs):
+        with pytest.raises(AggregationError):
+            self.aggregator.build_query(**kwargs)
+
+
+class _FakeAggregator:
+    async def aggregate(self, **kwargs):
+        return {"table": kwargs["table_name"], "rows": [{"count": 3}]}
+
+
+@pytest.mark.unit
+class TestAggregateRoutePermissions:
+    """POST /analyses/raw/aggregate applies the agent's CVDW gate"""
+
+    @pytest.fixture
+    def raw_client(self, monkeypatch, mock_supabase):
+        user_id = str(uuid.uuid4())
+        app.dependency_overrides[get_current_user] = lambda: type("User", (), {"id": user_id})()
+        monkeypatch.setattr(routes_optimized, "_raw_aggregator", _FakeAggregator())
+        yield TestClient(app), mock_supabase
+        app.dependency_overrides.pop(get_current_user, None)
+
+    def test_level_one_is_forbidden(self, raw_client):
+        client, supabase = raw_client
+        supabase.mock_data["usuarios"] = {"cargos": {"nivel_acesso": 1}, "divisoes": {"codigo": "COM"}}
+        response = client.post("/analyses/raw/aggregate", json={"table": "leads"})
+        assert response.status_code == 403
+
+    def test_level_two_is_allowed(self, raw_client):
+        client, supabase = raw_client
+        supabase.mock_data["usuarios"] = {"cargos": {"nivel_acesso": 2}, "divisoes": {"codigo": "COM"}}
+        response = client.post("/analyses/raw/aggregate", json={"table": "leads"})
+        assert response.status_code == 200
+        assert response.json()["data"]["rows"] == [{"count": 3}]
@@ -0,0 +1,183 @@
+"""
+Unit tests for cache_decorator keys and sharing scopes
+"""
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from src.auth import permissions
+from src.auth.models import UserResponse
+from src.cache import redis_manager
+from src.cache.redis_manager import cache_decorator, canonicalize, snap_date_range
+from src.cache.tiered import CacheEntry
+from src.cache.warming import CacheWarmer
+
+
+def _user(**extra):
+    return UserResponse(id=str(uuid.uuid4()), email="user@test.com", **extra)
+
+
+@pytest.fixture
+def profiles(monkeypatch):
+    """user id -> (nivel_acesso, divisao), served as the cached permission profile"""
+    table = {}
+
+    async def get_user_permissions(user_id):
+        nivel, divisao = table.get(str(user_id), (1, "ALL"))
+        return permissions.build_permissions(user_id, nivel, divisao)
+
+    monkeypatch.setattr(permissions, "get_user_permissions", get_user_permissions)
+    return table
+
+
+@pytest.fixture
+def warmer(monkeypatch):
+    warmer = CacheWarmer()
+    monkeypatch.setattr(redis_manager, "cache_warmer", warmer)
+    return warmer
+
+
+def _counted_route(prefix, scope, **options):
+    calls = []
+
+    @cache_decorator(prefix=f"{prefix}_{uuid.uuid4().hex[:8]}", expiration=60, scope=scope, **options)
+    async def route(period: str = "month", current_user=None):
+        calls.append(period)
+        return {"period": period}
+
+    return route, calls
+
+
+@pytest.mark.unit
+class TestCanonicalKeys:
+    """Equivalent route params map to one key"""
+
+    def test_canonicalize(self):
+        assert canonicalize({"b": [" x ", {2, 1}], "a": 1}) == {"a": 1, "b": ["x", [1, 2]]}
+
+    @pytest.mark.parametrize("grain,expected", [
+        ("weekly", ("2025-01-06", "2025-01-19")),
+        ("monthly", ("2025-01-01", "2025-01-31")),
+        ("yearly", ("2025-01-01", "2025-12-31")),
+        ("daily", ("2025-01-08", "2025-01-15")),
+    ])
+    def test_snap_date_range(self, grain, expected):
+        assert snap_date_range("2025-01-08", "2025-01-15", grain) == expected
+
+    async def test_snapped_ranges_share_an_entry(self, profiles):
+        calls = []
+
+        @cache_decorator(prefix=f"trend_{uuid.uuid4().hex[:8]}", scope="public",
+                         date_params=("start", "end"), grain_param="grain")
+        async def route(start: str, end: str, grain: str = "monthly", current_user=None):
+            calls.append((start, end))
+            return {"n": len(calls)}
+
+        await route("2025-01-03", "2025-02-10", grain="monthly")
+        cached = await route("2025-01-20", "2025-02-27", grain="monthly")
+        assert calls == [("2025-01-01", "2025-02-28")] and cached["cached"] is True
+
+
+@pytest.mark.unit
+class TestScopes:
+    """tier = access level + division from the permission profile"""
+
+    async def test_users_of_the_same_tier_share_entries(self, profiles):
+        route, calls = _counted_route("kpis", "tier")
+        a, b = _user(), _user()
+        profiles[a.id] = profiles[b.id] = (3, "COM")
+
+        await route(current_user=a)
+        second = await route(current_user=b)
+        assert calls == ["month"] and second["cached"] is True
+
+    async def test_missing_cargo_ids_do_not_collapse_tiers(self, profiles):
+        route, calls = _counted_route("kpis", "tier")
+        low, high = _user(), _user()  # cargo_id / divisao_id are never filled by get_user
+        profiles[low.id], profiles[high.id] = (2, "COM"), (5, "COM")
+
+        await route(current_user=low)
+        await route(current_user=high)
+        assert calls == ["month", "month"]
+
+    async def test_user_scope_is_private(self, profiles):
+        route, calls = _counted_route("analysis", "user")
+        await route(current_user=_user())
+        await route(current_user=_user())
+        assert len(calls) == 2
+
+    def test_invalid_scope(self):
+        with pytest.raises(ValueError):
+            cache_decorator(prefix="x", scope="division")
+
+
+@pytest.mark.unit
+class TestWarmRecipes:
+    """Recipes are counted per tier and warm the entry users will read"""
+
+    async def test_recipe_is_per_tier_and_warms_the_shared_key(self, profiles, warmer):
+        route, calls = _counted_route("report", "tier", warm=True)
+        a, b = _user(), _user()
+        profiles[a.id] = profiles[b.id] = (4, "FIN")
+
+        await route(current_user=a)
+        await route(current_user=b)
+        assert len(warmer.recipes) == 1
+        recipe = next(iter(warmer.recipes.values()))
+        assert recipe["tier"] == "tier:nivel:4:FIN" and recipe["count"] > 1.9
+
+        source = next(iter(warmer.sources.values()))
+        await redis_manager.cache_manager.invalidate_cache(f"{next(iter(warmer.sources))}:*")
+        assert await source({**recipe["params"], **recipe["context"]}) == "warmed"
+        assert (await route(current_user=a))["cached"] is True
+        assert calls == ["month", "month"]
+
+
+@pytest.mark.unit
+class TestStaleWhileRevalidate:
+    """Stale entries are served while one refresh runs; XFetch refreshes early"""
+
+    def test_xfetch_probability_grows_near_expiry(self, monkeypatch):
+        monkeypatch.setattr("src.cache.tiered.random.random", lambda: 0.5)
+        now = time.time()
+        far = CacheEntry("v", now, now + 3600, now + 3600, compute_time=1.0)
+        near = CacheEntry("v", now, now + 0.5, now + 0.5, compute_time=1.0)
+        free = CacheEntry("v", now, now + 0.5, now + 0.5, compute_time=0.0)
+        assert not far.should_refresh_early()
+        assert near.should_refresh_early()
+        assert not free.should_refresh_early()
+        assert not near.should_refresh_early(beta=0)
+
+    async def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        @cache_decorator(prefix=f"slow_{uuid.uuid4().hex[:8]}", scope="public")
+        async def route(current_user=None):
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"n": len(calls)}
+
+        results = await asyncio.gather(*(route() for _ in range(5)))
+        assert calls == [1] and {r["n"] for r in results} == {1}
+
+    async def test_stale_entry_is_served_and_refreshed_once(self, monkeypatch):
+        calls = []
+        prefix = f"swr_{uuid.uuid4().hex[:8]}"
+
+        @cache_decorator(prefix=prefix, expiration=60, stale_ttl=600, scope="public")
+        async def route(current_user=None):
+            calls.append(1)
+            return {"n": len(calls)}
+
+        await route()
+        # Age the entry past its TTL but inside the stale window
+        real_time = time.time
+        monkeypatch.setattr("src.cache.tiered.time.time", lambda: real_time() + 120)
+
+        stale = await asyncio.gather(route(), route(), route())
+        assert all(r["stale"] and r["n"] == 1 for r in stale)
+        await asyncio.sleep(0.01)
+        assert calls == [1, 1]
+        assert (await route())["n"] == 2
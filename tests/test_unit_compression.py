@@ -0,0 +1,96 @@
+"""
+Unit tests for cache payload compression (zstd/zlib, trained dictionaries)
+"""
+import json
+import os
+
+import pytest
+
+from src.cache import compression, tiered
+from src.cache.compression import (
+    CODEC_NONE,
+    CODEC_ZLIB,
+    CODEC_ZSTD,
+    PayloadCompressor,
+    train_dictionary,
+)
+
+
+def _payload(i: int) -> bytes:
+    rows = [{"empreendimento": f"Residencial {j % 7}", "valor_contrato": 1000 + i * j, "situacao": "Vendida"}
+            for j in range(80)]
+    return json.dumps({"status": "success", "data": rows}).encode()
+
+
+@pytest.fixture
+def compressor():
+    return PayloadCompressor(min_bytes=256, level=3, dictionary_path="")
+
+
+@pytest.mark.unit
+class TestCompressor:
+    """Round trips, thresholds and stats"""
+
+    def test_round_trip(self, compressor):
+        body = _payload(1)
+        codec, dict_id, data = compressor.compress(body)
+        assert codec == compressor.codec != CODEC_NONE and dict_id == 0
+        assert len(data) < len(body)
+        assert compressor.decompress(codec, dict_id, data) == body
+
+    def test_small_and_incompressible_bodies_are_kept(self, compressor):
+        assert compressor.compress(b"{}")[0] == CODEC_NONE
+        assert compressor.compress(os.urandom(1024))[0] == CODEC_NONE
+        stats = compressor.get_stats()
+        assert stats["skipped_small"] == 1 and stats["skipped_incompressible"] == 1
+
+    def test_dictionary_improves_small_payloads(self, compressor):
+        samples = [_payload(i)[:600] for i in range(200)]
+        body = _payload(999)[:600]
+        plain = len(compressor.compress(body)[2])
+
+        dict_id = compressor.load_dictionary(train_dictionary(samples, dict_size=4096))
+        codec, used_id, data = compressor.compress(body)
+        assert used_id == dict_id and len(data) < plain
+        assert compressor.decompress(codec, used_id, data) == body
+
+    def test_unknown_dictionary_is_a_value_error(self, compressor):
+        other = PayloadCompressor(min_bytes=256, dictionary_path="")
+        other.load_dictionary(train_dictionary([_payload(i) for i in range(50)], dict_size=2048))
+        codec, dict_id, data = other.compress(_payload(3))
+        with pytest.raises(ValueError):
+            compressor.decompress(codec, dict_id, data)
+
+    def test_zlib_fallback(self, monkeypatch):
+        monkeypatch.setattr(compression, "zstandard", None)
+        zlib_compressor = PayloadCompressor(min_bytes=256, dictionary_path="")
+        zlib_compressor.load_dictionary(train_dictionary([_payload(i) for i in range(20)]))
+        codec, dict_id, data = zlib_compressor.compress(_payload(5))
+        assert codec == CODEC_ZLIB
+        assert zlib_compressor.decompress(codec, dict_id, data) == _payload(5)
+
+    @pytest.mark.skipif(compression.zstandard is None, reason="zstandard not installed")
+    def test_zstd_is_preferred(self, compressor):
+        assert compressor.codec == CODEC_ZSTD
+
+
+@pytest.mark.unit
+class TestEnvelope:
+    """Compressed bodies travel inside the tiered cache envelope"""
+
+    def test_encode_decode_with_compression(self, compressor, monkeypatch):
+        monkeypatch.setattr(tiered, "payload_compressor", compressor)
+        value = json.loads(_payload(2))
+        payload = tiered.encode(value, ttl=60)
+        assert payload[0] >> 4 == compressor.codec
+        assert tiered.decode(payload).value == value
+
+    async def test_unreadable_payload_counts_as_miss(self, compressor, monkeypatch):
+        other = PayloadCompressor(min_bytes=256, dictionary_path="")
+        other.load_dictionary(train_dictionary([_payload(i) for i in range(50)], dict_size=2048))
+        cache = tiered.TieredCache(key_prefix="compress-test")
+
+        monkeypatch.setattr(tiered, "payload_compressor", other)
+        await cache.set("reports", "k", json.loads(_payload(4)))
+        monkeypatch.setattr(tiered, "payload_compressor", compressor)  # dictionary swapped
+        assert await cache.get("reports", "k") is None
@@ -0,0 +1,105 @@
+"""
+Unit tests for import-driven cache invalidation (data_versions watcher)
+"""
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from src.analyses import routes_optimized
+from src.cache import data_versions
+from src.cache.data_versions import ANY_DATA_TAG, DataVersionWatcher
+from src.cache.tiered import NAMESPACE_TTLS, TieredCache
+from tests.mocks import attach_mock_redis
+
+
+class FakeVersionsClient:
+    """Serves the data_versions table from a dict"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def table(self, name):
+        assert name == "data_versions"
+        return self
+
+    def select(self, columns):
+        return self
+
+    def execute(self):
+        return SimpleNamespace(data=[{"tabela": t, "versao": v} for t, v in self.rows.items()])
+
+
+@pytest.fixture
+def notified(monkeypatch):
+    calls = []
+    monkeypatch.setattr(data_versions.cache_warmer, "notify_data_changed", lambda: calls.append(1))
+    return calls
+
+
+@pytest.fixture
+def watcher():
+    watcher = DataVersionWatcher(cache=TieredCache(key_prefix=f"dv-{uuid.uuid4().hex[:6]}"))
+    watcher.client = FakeVersionsClient()
+    return watcher
+
+
+@pytest.mark.unit
+class TestPoll:
+    """Only changed tables are invalidated"""
+
+    async def test_first_observation_is_not_a_change(self, watcher, notified):
+        watcher.client.rows = {"vendas": 1, "leads": 4}
+        assert await watcher.poll() == []
+        assert watcher.changes == 0 and notified == []
+
+    async def test_changed_tables_invalidate_their_tags(self, watcher, notified):
+        cache = watcher.cache
+        watcher.client.rows = {"vendas": 1, "leads": 4}
+        await watcher.poll()
+
+        await cache.set("analysis", "vendas", 1, tags=["table:vendas"])
+        await cache.set("analysis", "leads", 2, tags=["table:leads"])
+        await cache.set("answers", "q", "r", tags=[ANY_DATA_TAG])
+
+        watcher.client.rows = {"vendas": 2, "leads": 4}
+        assert await watcher.poll() == ["vendas"]
+        assert await cache.get("analysis", "vendas", tags=["table:vendas"]) is None
+        assert await cache.get("answers", "q", tags=[ANY_DATA_TAG]) is None
+        assert await cache.get("analysis", "leads", tags=["table:leads"]) == 2
+        assert notified == [1] and watcher.last_change["data_versions"] == {"vendas": 2}
+
+    async def test_one_worker_sees_each_change_through_redis(self, notified):
+        prefix = f"dv-{uuid.uuid4().hex[:6]}"
+        first, second = DataVersionWatcher(TieredCache(key_prefix=prefix)), DataVersionWatcher(TieredCache(key_prefix=prefix))
+        redis = attach_mock_redis(first.cache)
+        second.cache.l2.client, second.cache.l2.enabled = redis, True
+        first.client = second.client = FakeVersionsClient()
+
+        first.client.rows = {"vendas": 1}
+        await first.poll()
+        first.client.rows["vendas"] = 2
+        assert await first.poll() == ["vendas"]
+        assert await second.poll() == []
+        assert len(notified) == 1
+
+    async def test_failed_read_is_not_counted_as_a_poll(self, watcher):
+        watcher.client = None
+        with pytest.raises(Exception):
+            await watcher.poll()
+        assert watcher.polls == 0
+
+
+@pytest.mark.unit
+class TestDerivedTtls:
+    """Caches built only from versioned tables live until the data changes"""
+
+    def test_namespace_ttls(self):
+        assert NAMESPACE_TTLS["kpis"] == 86400 and NAMESPACE_TTLS["sales_trends"] == 86400
+        assert NAMESPACE_TTLS["performance_report"] == 1800  # reads tables without a data version
+
+    def test_performance_report_is_tagged_with_every_source(self):
+        source = open(routes_optimized.__file__, encoding="utf-8").read()
+        decorator = source[source.index('prefix="performance_report"'):source.index("async def get_performance_report")]
+        for table in ("vendas", "clientes", "produtos", "produtos_venda", "estoque"):
+            assert f'"table:{table}"' in decorator
@@ -0,0 +1,137 @@
+"""
+Unit tests for the deterministic fast path (quantitative questions without the LLM)
+"""
+from datetime import date
+
+import pytest
+
+from src.agents.fast_path import FastPathAnswerer, normalize_question, parse_period
+from src.database.aggregations import AggregationError
+
+TODAY = date(2025, 3, 15)
+CVDW = {"can_access_cvdw": True}
+
+
+class FakeAggregator:
+    """Records aggregate() calls; grouped queries return `groups` capped at the limit"""
+
+    def __init__(self, groups=None, total=None, error=None):
+        self.groups = groups or {}
+        self.total = total
+        self.error = error
+        self.calls = []
+
+    async def aggregate(self, table_name, metrics=None, filters=None, group_by=None,
+                        start_date=None, end_date=None, limit=50):
+        self.calls.append({"group_by": group_by, "limit": limit, "metrics": metrics})
+        if self.error:
+            raise AggregationError(self.error)
+        alias = "count" if metrics[0] == "count" else metrics[0].replace(":", "_")
+        if group_by:
+            rows = [{group_by: name, alias: value} for name, value in self.groups.items()][:limit]
+        else:
+            rows = [{alias: self.total}]
+        return {"table": table_name, "group_by": group_by, "rows": rows}
+
+
+@pytest.mark.unit
+class TestMatch:
+    """Questions compile to aggregations only when fully explained"""
+
+    @pytest.mark.parametrize("question,template,filters,group_by", [
+        ("Quantos leads ativos temos?", "count:leads", {"ativo": "S"}, None),
+        ("Qual o valor total das vendas este mês?", "sum:vendas", {}, None),
+        ("Quantas vendas por empreendimento?", "count:vendas:por_empreendimento", {}, "empreendimento"),
+        ("Qual o ticket médio das reservas em 2024?", "avg:reservas", {}, None),
+    ])
+    def test_templates(self, question, template, filters, group_by):
+        matched, confidence = FastPathAnswerer(None).match(question, today=TODAY)
+        assert matched.template == template and confidence == 1.0
+        assert matched.query["filters"] == filters and matched.query["group_by"] == group_by
+
+    def test_unexplained_words_lower_the_confidence(self):
+        matched, confidence = FastPathAnswerer(None).match(
+            "Quantos leads vieram do instagram na campanha de natal?", today=TODAY
+        )
+        assert confidence < 0.9
+
+    @pytest.mark.parametrize("question", [
+        "Explique a estratégia comercial",  # no intent
+        "Quantos leads e vendas?",           # two tables
+        "Qual o valor total dos leads?",     # no value column
+        "Quantos leads ativos temos hoje?",  # current state, not leads created today
+        "Quantos leads não estão ativos hoje?",  # negation
+        "Quantas vendas sem corretor?",
+        "Quantas reservas exceto as canceladas?",
+    ])
+    def test_no_match(self, question):
+        assert FastPathAnswerer(None).match(question, today=TODAY) == (None, 0.0)
+
+    def test_now_phrases_are_not_a_period(self):
+        matched, confidence = FastPathAnswerer(None).match("Quantos leads ativos temos hoje em dia?", today=TODAY)
+        assert confidence == 1.0 and matched.query["filters"] == {"ativo": "S"}
+        assert matched.query["start_date"] is None and matched.query["end_date"] is None
+
+    def test_week_period_survives_neutral_words(self):
+        matched, confidence = FastPathAnswerer(None).match("Quantas vendas esta semana?", today=TODAY)
+        assert confidence == 1.0 and matched.query["start_date"] == "2025-03-10"
+
+    @pytest.mark.parametrize("text,period", [
+        ("ultimos 7 dias", ("2025-03-09", "2025-03-15")),
+        ("mes passado", ("2025-02-01", "2025-02-28")),
+        ("ano passado", ("2024-01-01", "2024-12-31")),
+        ("ontem", ("2025-03-14", "2025-03-14")),
+    ])
+    def test_parse_period(self, text, period):
+        (start, end), rest = parse_period(normalize_question(text), TODAY)
+        assert (start.isoformat(), end.isoformat()) == period and rest.strip() == ""
+
+
+@pytest.mark.unit
+class TestAnswer:
+    """Aggregation results become agent answers"""
+
+    async def test_count_answer(self):
+        aggregator = FakeAggregator(total=1234)
+        result, info = await FastPathAnswerer(aggregator).answer("Quantos leads ativos temos?", CVDW)
+        assert info["matched"] and result["tools_used"] == ["fast_path"]
+        assert "1.234" in result["response"]
+        assert aggregator.calls == [{"group_by": None, "limit": 20, "metrics": ["count"]}]
+
+    async def test_grouped_total_comes_from_an_ungrouped_query(self):
+        groups = {f"Empreendimento {i}": 10 for i in range(30)}
+        aggregator = FakeAggregator(groups=groups, total=300)
+        result, _ = await FastPathAnswerer(aggregator).answer("Quantas vendas por empreendimento?", CVDW)
+
+        assert sorted(call["group_by"] or "" for call in aggregator.calls) == ["", "empreendimento"]
+        assert "Quantidade: 300" in result["response"]  # not the 200 of the 20 groups shown
+        assert "Mostrando os 20 maiores grupos" in result["response"]
+
+    async def test_grouped_average_has_no_total(self):
+        aggregator = FakeAggregator(groups={"A": 100.0, "B": 300.0})
+        answerer = FastPathAnswerer(aggregator)
+        matched, _ = answerer.match("Qual o ticket médio das vendas por empreendimento?", today=TODAY)
+        result, total = await answerer._run(matched.query)
+        assert total is None and len(aggregator.calls) == 1
+
+    async def test_unexplained_word_falls_through(self):
+        aggregator = FakeAggregator(total=1)
+        result, info = await FastPathAnswerer(aggregator).answer(
+            "Qual o valor total das vendas canceladas este mês?", CVDW
+        )
+        assert result is None and info["confidence"] < 1.0 and aggregator.calls == []
+
+    async def test_without_cvdw_permission_falls_through(self):
+        aggregator = FakeAggregator(total=1)
+        result, info = await FastPathAnswerer(aggregator).answer("Quantos leads temos?", {})
+        assert result is None and info["reason"] == "sem_permissao_cvdw" and aggregator.calls == []
+
+    async def test_aggregation_error_falls_through(self):
+        answerer = FastPathAnswerer(FakeAggregator(error="Tabela não permitida"))
+        result, info = await answerer.answer("Quantos leads temos?", CVDW)
+        assert result is None and info["reason"] == "Tabela não permitida"
+
+    async def test_disabled(self):
+        answerer = FastPathAnswerer(FakeAggregator(total=1))
+        answerer.enabled = False
+        assert (await answerer.answer("Quantos leads temos?", CVDW))[0] is None
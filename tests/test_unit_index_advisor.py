@@ -0,0 +1,124 @@
+"""
+Unit tests for the pg_stat_statements index advisor
+"""
+import pytest
+
+from src.database.index_advisor import (
+    IndexAdvisor,
+    IndexProposal,
+    candidate_columns,
+    extract_predicates,
+    index_covers,
+)
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = []
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if not self.conn.autocommit:
+            self.conn.in_transaction = True
+        self.conn.executed.append(sql)
+        columns, rows = self.conn.results.get(sql.split()[0].upper(), ([], []))
+        self.description = [(c,) for c in columns]
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+
+class _FakeConnection:
+    """Mimics psycopg2: autocommit cannot change inside an open transaction"""
+
+    server_version = 150000
+
+    def __init__(self, results=None):
+        self._autocommit = False
+        self.in_transaction = False
+        self.executed = []
+        self.rollbacks = 0
+        self.results = results or {}
+
+    @property
+    def autocommit(self):
+        return self._autocommit
+
+    @autocommit.setter
+    def autocommit(self, value):
+        if self.in_transaction:
+            raise RuntimeError("set_session cannot be used inside a transaction")
+        self._autocommit = value
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+
+@pytest.mark.unit
+class TestPredicateExtraction:
+    """Columns used by equality, range and ORDER BY"""
+
+    def test_equality_range_and_order(self):
+        sql = 'SELECT * FROM "public"."leads" WHERE ativo = $1 AND data_cad >= $2 ORDER BY data_cad DESC'
+        assert extract_predicates(sql) == {"leads": {"eq": ["ativo"], "range": ["data_cad"], "order": ["data_cad"]}}
+
+    def test_json_expression_and_alias(self):
+        sql = "SELECT 1 FROM vendas v WHERE v.raw->>'status' = 'A'"
+        assert extract_predicates(sql)["vendas"]["eq"] == ["raw->>'status'"]
+
+    def test_candidate_puts_equality_first(self):
+        assert candidate_columns({"eq": ["ativo", "cidade"], "range": ["data_cad"]}) == ["ativo", "cidade", "data_cad"]
+
+    def test_existing_index_covers_prefix(self):
+        ddl = "CREATE INDEX idx ON public.leads USING btree (ativo, data_cad)"
+        assert index_covers(ddl, ["ativo"]) and not index_covers(ddl, ["data_cad"])
+
+    def test_expression_index_ddl(self):
+        proposal = IndexProposal(table="vendas", columns=["raw->>'status'"])
+        assert proposal.ddl == (
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vendas_raw_status ON vendas ((raw->>'status'))"
+        )
+
+
+@pytest.mark.unit
+class TestApply:
+    """CREATE INDEX CONCURRENTLY runs outside the analyze() transaction"""
+
+    def test_apply_after_analyze_rolls_back_first(self):
+        conn = _FakeConnection({
+            "SELECT": (["relname", "seq_scan", "seq_tup_read", "idx_scan", "n_live_tup"], []),
+        })
+        advisor = IndexAdvisor(conn)
+        advisor.analyze()
+        assert conn.in_transaction
+
+        advisor.apply(IndexProposal(table="leads", columns=["ativo"]))
+        assert conn.rollbacks == 1
+        assert conn.executed[-1].startswith("CREATE INDEX CONCURRENTLY")
+        assert conn.autocommit is False
+
+    def test_analyze_ranks_by_estimated_saving(self):
+        conn = _FakeConnection()
+        advisor = IndexAdvisor(conn, min_rows=10)
+        advisor.table_scan_stats = lambda: {"leads": {"seq_scan": 9, "idx_scan": 1, "n_live_tup": 100}}
+        advisor.existing_indexes = lambda: {}
+        advisor.has_hypopg = lambda: False
+        advisor.top_statements = lambda limit: [
+            {"queryid": 1, "query": "SELECT * FROM leads WHERE ativo = $1", "calls": 10, "total_time_ms": 100.0},
+            {"queryid": 2, "query": "SELECT * FROM leads WHERE cidade = $1", "calls": 5, "total_time_ms": 400.0},
+        ]
+        proposals = advisor.analyze()
+        assert [p.columns for p in proposals] == [["cidade"], ["ativo"]]
+        assert proposals[0].estimated_saving_ms == pytest.approx(400 * 0.9 * 0.8, abs=0.1)
@@ -0,0 +1,194 @@
+"""
+Unit tests for the agent job queue (SQLite store, workers, ownership and recovery)
+"""
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from src.agents.jobs import JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JobQueue, JobRejected
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(path=str(tmp_path / "jobs.sqlite3"))
+    yield queue
+    queue.store.close()
+
+
+async def _wait_final(queue, job_id, user_id="u1", timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await queue.get(job_id, user_id)
+        if job["status"] in (JOB_DONE, JOB_FAILED):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def _insert_running(queue, job_id, owner, heartbeat_at, attempts=1):
+    queue.store.execute(
+        "INSERT INTO jobs (id, user_id, kind, params, status, attempts, created_at, started_at, owner, heartbeat_at) "
+        "VALUES (?, 'u1', 'echo', '{}', ?, ?, ?, ?, ?, ?)",
+        (job_id, JOB_RUNNING, attempts, time.time(), time.time(), owner, heartbeat_at)
+    )
+
+
+@pytest.mark.unit
+class TestSubmitAndRun:
+    """Jobs run in background workers and keep their result"""
+
+    async def test_job_runs_and_result_is_private(self, queue):
+        async def echo(user_id, params):
+            return {"user": user_id, **params}
+
+        queue.register("echo", echo)
+        queue.start()
+        try:
+            job = await queue.submit("u1", "echo", {"x": 1})
+            assert job["status"] == JOB_QUEUED
+            done = await _wait_final(queue, job["job_id"])
+            assert done["status"] == JOB_DONE and done["result"] == {"user": "u1", "x": 1}
+            assert await queue.get(job["job_id"], "u2") is None
+        finally:
+            await queue.stop()
+
+    async def test_rejections(self, queue):
+        queue.register("echo", lambda user_id, params: None)
+        queue.max_pending_per_user = 1
+        with pytest.raises(JobRejected):
+            await queue.submit("u1", "unknown", {})
+        await queue.submit("u1", "echo", {})
+        with pytest.raises(JobRejected):
+            await queue.submit("u1", "echo", {})
+
+    async def test_timeout_fails_the_job(self, queue):
+        async def slow(user_id, params):
+            await asyncio.sleep(10)
+
+        queue.register("slow", slow)
+        queue.timeout_seconds = 0.05
+        queue.start()
+        try:
+            job = await queue.submit("u1", "slow", {})
+            done = await _wait_final(queue, job["job_id"])
+            assert done["status"] == JOB_FAILED and "Tempo limite" in done["error"]
+        finally:
+            await queue.stop()
+
+    async def test_stats_are_read_off_the_event_loop(self, queue):
+        queue.register("echo", lambda user_id, params: None)
+        await queue.submit("u1", "echo", {})
+        stats = await queue.get_stats()
+        assert stats["by_status"] == {JOB_QUEUED: 1} and stats["owner"] == queue.owner
+
+
+@pytest.mark.unit
+class TestOwnership:
+    """Only jobs without a recent heartbeat are recovered"""
+
+    def test_claim_sets_owner_and_heartbeat(self, queue):
+        queue.store.execute(
+            "INSERT INTO jobs (id, user_id, kind, params, status, created_at) VALUES ('j1', 'u1', 'echo', '{}', ?, ?)",
+            (JOB_QUEUED, time.time())
+        )
+        row = queue.store.claim_next(queue.owner)
+        (stored,) = queue.store.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],))
+        assert stored["status"] == JOB_RUNNING and stored["owner"] == queue.owner
+        assert stored["heartbeat_at"] is not None and stored["attempts"] == 1
+
+    def test_recover_skips_live_jobs_of_other_workers(self, queue):
+        now = time.time()
+        _insert_running(queue, "live", "other:1", now)
+        _insert_running(queue, "stale", "other:2", now - queue.stale_seconds - 1)
+        _insert_running(queue, "legacy", None, None)  # row from before the heartbeat columns
+
+        assert queue.recover() == 2
+        statuses = {row["id"]: (row["status"], row["owner"]) for row in queue.store.execute("SELECT * FROM jobs")}
+        assert statuses == {
+            "live": (JOB_RUNNING, "other:1"),
+            "stale": (JOB_QUEUED, None),
+            "legacy": (JOB_QUEUED, None),
+        }
+
+    def test_stale_job_out_of_attempts_fails(self, queue):
+        _insert_running(queue, "j1", "other", time.time() - queue.stale_seconds - 1, attempts=queue.max_attempts)
+        assert queue.recover() == 0
+        (row,) = queue.store.execute("SELECT * FROM jobs")
+        assert row["status"] == JOB_FAILED and row["expires_at"] is not None
+
+    async def test_late_result_from_a_previous_owner_is_ignored(self, queue):
+        _insert_running(queue, "j1", "someone-else", time.time())
+        await queue._finish("j1", JOB_DONE, result={"late": True})
+        (row,) = queue.store.execute("SELECT * FROM jobs")
+        assert row["status"] == JOB_RUNNING and row["result"] is None
+        assert queue.completed == 0 and queue.failed == 0
+
+    async def test_wait_for_change_reports_timeouts(self, queue):
+        assert await queue.wait_for_change(timeout=0.01) is False
+        waiter = asyncio.ensure_future(queue.wait_for_change(timeout=1))
+        await asyncio.sleep(0)
+        queue._notify()
+        assert await waiter is True
+
+    async def test_heartbeat_is_renewed_while_running(self, queue):
+        release = asyncio.Event()
+
+        async def long_job(user_id, params):
+            await release.wait()
+            return "ok"
+
+        queue.register("long", long_job)
+        queue.heartbeat_seconds = 0.02
+        queue.start()
+        try:
+            job = await queue.submit("u1", "long", {})
+            await asyncio.sleep(0.01)
+            (first,) = queue.store.execute("SELECT heartbeat_at FROM jobs WHERE id = ?", (job["job_id"],))
+            await asyncio.sleep(0.1)
+            (later,) = queue.store.execute("SELECT heartbeat_at FROM jobs WHERE id = ?", (job["job_id"],))
+            assert later["heartbeat_at"] > first["heartbeat_at"]
+            release.set()
+            assert (await _wait_final(queue, job["job_id"]))["result"] == "ok"
+        finally:
+            await queue.stop()
+
+    async def test_stop_requeues_own_running_jobs(self, queue):
+        async def forever(user_id, params):
+            await asyncio.sleep(10)
+
+        queue.register("forever", forever)
+        queue.start()
+        job = await queue.submit("u1", "forever", {})
+        await asyncio.sleep(0.05)
+        await queue.stop()
+        (row,) = queue.store.execute("SELECT status, owner FROM jobs WHERE id = ?", (job["job_id"],))
+        assert row["status"] == JOB_QUEUED and row["owner"] is None
+
+
+@pytest.mark.unit
+class TestSchemaMigration:
+    """Databases created before owner/heartbeat_at get the new columns"""
+
+    def test_old_database_is_migrated(self, tmp_path):
+        path = tmp_path / "old.sqlite3"
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE jobs (id TEXT PRIMARY KEY, user_id TEXT NOT NULL, kind TEXT NOT NULL, "
+            "params TEXT NOT NULL, status TEXT NOT NULL, result TEXT, error TEXT, "
+            "attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, started_at REAL, "
+            "finished_at REAL, expires_at REAL)"
+        )
+        conn.execute("INSERT INTO jobs (id, user_id, kind, params, status, created_at) "
+                     "VALUES ('j1', 'u1', 'echo', '{}', 'running', 0)")
+        conn.commit()
+        conn.close()
+
+        queue = JobQueue(path=str(path))
+        try:
+            assert queue.recover() == 1
+            columns = {row["name"] for row in queue.store.execute("PRAGMA table_info(jobs)")}
+            assert {"owner", "heartbeat_at"} <= columns
+        finally:
+            queue.store.close()
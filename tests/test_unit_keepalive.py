@@ -0,0 +1,129 @@
+"""
+Unit tests for stable prompt prefixes and traffic-driven model keep-alive
+"""
+import time
+
+import pytest
+
+from src.agents import keepalive
+from src.agents.keepalive import ModelKeepAlive
+from src.agents.llm_router import LLMBackend, LLMRouter
+from src.agents.prompt_budget import PromptAssembler
+from src.agents.response_formatter import response_formatter
+
+
+class PingRouter(LLMRouter):
+    """Router whose pings are recorded instead of sent"""
+
+    def __init__(self, backends, fail=False):
+        super().__init__(backends=backends, small_backends=[])
+        self.fail = fail
+        self.pinged = []
+
+    async def ping(self, backend, messages, timeout_s):
+        if self.fail:
+            raise RuntimeError("connection refused")
+        self.pinged.append((backend.name, messages))
+        return 0.01
+
+
+@pytest.fixture
+def local():
+    return LLMBackend("ollama", "http://localhost:11434/v1", "llama3.2")
+
+
+@pytest.fixture
+def remote():
+    return LLMBackend("groq", "https://api.groq.com/openai/v1", "mixtral")
+
+
+def _keepalive(router):
+    keeper = ModelKeepAlive(router=router)
+    keeper.unload_seconds = 300
+    keeper.active_seconds = 3600
+    return keeper
+
+
+@pytest.mark.unit
+class TestStablePrefix:
+    """The system prompt starts with a per-tier prefix that never carries request data"""
+
+    def test_prefix_is_identical_across_users_of_a_tier(self):
+        apis = ("CVDW CRM",)
+        first = response_formatter.request_context_block({"user_id": "a", "permissions": {"nivel_acesso": 2}})
+        second = response_formatter.request_context_block({"user_id": "b", "permissions": {"nivel_acesso": 2}})
+        prefix = response_formatter.system_prompt_prefix(apis)
+        assert prefix == response_formatter.system_prompt_prefix(apis)
+        assert "CONTEXTO DA CONSULTA ATUAL" not in prefix
+        assembler = PromptAssembler()
+        assembler.log_enabled = False
+        prompt_a, _ = assembler.assemble(prefix, "q", [], [], suffix=first)
+        prompt_b, _ = assembler.assemble(prefix, "q", [], [], suffix=second)
+        assert prompt_a.startswith(prefix) and prompt_b.startswith(prefix)
+        assert prompt_a.endswith(first) and prompt_a != prompt_b
+
+    def test_prefix_depends_only_on_the_data_sources(self):
+        assert response_formatter.system_prompt_prefix(("CVDW CRM",)) != response_formatter.system_prompt_prefix(())
+
+
+@pytest.mark.unit
+class TestMeasurements:
+    """Cold starts and prefix reuse"""
+
+    def test_cold_start_after_idle(self, local):
+        keeper = _keepalive(PingRouter([local]))
+        keeper.record_call("ollama", "P", 100, 2.0)
+        keeper.record_call("ollama", "P", 100, 0.5)
+        assert keeper.cold_starts == 1
+        keeper.last_use["ollama"] -= 301
+        keeper.record_call("ollama", "P", 100, 2.0)
+        assert keeper.cold_starts == 2
+
+    def test_prefix_reuse_saves_prefill(self, local, monkeypatch):
+        monkeypatch.setattr(keepalive, "count_tokens", lambda text: 1000)
+        keeper = _keepalive(PingRouter([local]))
+        keeper.record_call("ollama", "A", 1000, 2.0)   # miss: 2 ms/token
+        keeper.record_call("ollama", "A", 1000, 0.5)   # hit: 0.5 ms/token
+        keeper.record_call("ollama", "B", 1000, 2.0)   # miss: other tier's prefix
+        stats = keeper.get_stats()
+        assert stats["prefix_hits"] == 1 and stats["prefix_misses"] == 2
+        assert stats["prefill_saved_ms"] == pytest.approx(1500.0)
+        assert stats["distinct_prefixes"] == 2
+
+
+@pytest.mark.unit
+class TestTick:
+    """Pings only local backends that are about to unload, and only with recent traffic"""
+
+    async def test_no_ping_without_recent_traffic(self, local):
+        router = PingRouter([local])
+        keeper = _keepalive(router)
+        keeper.last_use["ollama"] = time.monotonic() - 280
+        assert await keeper.tick() == 0 and router.pinged == []
+
+    async def test_pings_idle_local_backend_with_top_prefix(self, local, remote):
+        router = PingRouter([local, remote])
+        keeper = _keepalive(router)
+        keeper.touch()
+        keeper.prefixes.update({"PREFIXO": 3, "OUTRO": 1})
+        keeper.last_use.update({"ollama": time.monotonic() - 280, "groq": time.monotonic() - 280})
+
+        assert await keeper.tick() == 1
+        (name, messages), = router.pinged
+        assert name == "ollama" and messages[0] == {"role": "system", "content": "PREFIXO"}
+        assert keeper.last_prefix["ollama"] == "PREFIXO"
+        assert await keeper.tick() == 0  # just refreshed
+
+    async def test_busy_model_is_not_pinged(self, local, monkeypatch):
+        router = PingRouter([local])
+        keeper = _keepalive(router)
+        keeper.touch()
+        keeper.last_use["ollama"] = time.monotonic() - 280
+        monkeypatch.setattr(keepalive.llm_admission, "active", 1)
+        assert await keeper.tick() == 0
+
+    async def test_ping_failures_are_counted(self, local):
+        keeper = _keepalive(PingRouter([local], fail=True))
+        keeper.touch()
+        keeper.last_use["ollama"] = time.monotonic() - 280
+        assert await keeper.tick() == 0 and keeper.ping_failures == 1
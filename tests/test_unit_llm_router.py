@@ -0,0 +1,126 @@
+"""
+Unit tests for LLM backend routing: latency ranking, failover, cooldown and hedging
+"""
+import asyncio
+
+import pytest
+
+from src.agents.llm_router import LLMBackend, LLMRouter, LLMRouterError, _parse_backends
+
+MESSAGES = [{"role": "user", "content": "oi"}]
+
+
+def _backend(name):
+    return LLMBackend(name, f"http://{name}:8000/v1", "model")
+
+
+def _router(monkeypatch, behaviour, small=()):
+    """behaviour: backend name -> (delay seconds, error or None)"""
+    router = LLMRouter(
+        backends=[_backend(n) for n in behaviour if n not in small],
+        small_backends=[_backend(n) for n in small],
+    )
+    router.hedge_enabled = False
+    router.prior_latency_s = 0.05
+    router.hedge_min_delay_s = 0.02
+    posted = []
+
+    async def post(backend, messages, timeout_s, **options):
+        posted.append(backend.name)
+        delay, error = behaviour[backend.name]
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return {"choices": [{"message": {"content": f"from {backend.name}"}}]}
+
+    monkeypatch.setattr(router, "_post", post)
+    return router, posted
+
+
+@pytest.mark.unit
+class TestRanking:
+    """Expected latency orders backends; quarantined ones go last"""
+
+    def test_faster_and_healthier_backends_first(self):
+        fast, slow, flaky = _backend("fast"), _backend("slow"), _backend("flaky")
+        fast.record_success(0.2)
+        slow.record_success(1.0)
+        flaky.record_success(0.1)
+        flaky.record_failure(30, 3)
+        router = LLMRouter(backends=[slow, flaky, fast], small_backends=[])
+        assert [b.name for b in router.ranked()] == ["fast", "flaky", "slow"]
+
+    def test_cooldown_after_consecutive_failures(self):
+        backend = _backend("a")
+        for _ in range(3):
+            backend.record_failure(30, 3)
+        other = _backend("b")
+        other.record_success(5.0)
+        router = LLMRouter(backends=[backend, other], small_backends=[])
+        assert not backend.available() and [b.name for b in router.ranked()] == ["b", "a"]
+
+    def test_parse_backends(self, monkeypatch):
+        monkeypatch.setenv("TEST_LLM_KEY", "secret")
+        backends = _parse_backends("local|http://localhost:8080/v1/|qwen,remote|https://x/v1|m|TEST_LLM_KEY,bad")
+        assert [(b.name, b.base_url, b.local) for b in backends] == [
+            ("local", "http://localhost:8080/v1", True), ("remote", "https://x/v1", False)
+        ]
+        assert backends[1].api_key == "secret"
+
+
+@pytest.mark.unit
+class TestComplete:
+    """Failover, timeouts and the small tier"""
+
+    async def test_failover_to_next_backend(self, monkeypatch):
+        router, posted = _router(monkeypatch, {"a": (0, RuntimeError("500")), "b": (0, None)})
+        assert await router.complete(MESSAGES, 1.0) == ("from b", "b")
+        assert posted == ["a", "b"] and router.failovers == 1
+        assert router.backends[0].errors == 1
+
+    async def test_all_backends_failing(self, monkeypatch):
+        router, _ = _router(monkeypatch, {"a": (0, RuntimeError("500")), "b": (0, RuntimeError("503"))})
+        with pytest.raises(LLMRouterError):
+            await router.complete(MESSAGES, 1.0)
+
+    async def test_timeout(self, monkeypatch):
+        router, _ = _router(monkeypatch, {"a": (1.0, None)})
+        with pytest.raises(asyncio.TimeoutError):
+            await router.complete(MESSAGES, 0.05)
+        await asyncio.sleep(0)
+        assert router.backends[0].cancelled == 1
+
+    async def test_small_tier_fails_over_to_main(self, monkeypatch):
+        router, posted = _router(
+            monkeypatch, {"small": (0, RuntimeError("oom")), "main": (0, None)}, small=("small",)
+        )
+        assert await router.complete(MESSAGES, 1.0, tier="small") == ("from main", "main")
+        assert posted == ["small", "main"]
+        assert await router.complete(MESSAGES, 1.0) == ("from main", "main")
+        assert posted[-1] == "main"
+
+    async def test_no_backends(self):
+        with pytest.raises(LLMRouterError):
+            await LLMRouter(backends=[], small_backends=[]).complete(MESSAGES, 1.0)
+
+
+@pytest.mark.unit
+class TestHedging:
+    """A second request starts after the primary's p95 and the loser is cancelled"""
+
+    async def test_hedge_wins_and_primary_is_cancelled(self, monkeypatch):
+        router, posted = _router(monkeypatch, {"slow": (1.0, None), "fast": (0.01, None)})
+        router.hedge_enabled = True
+        router.backends[1].record_success(0.5)  # ranked second by history
+
+        assert await router.complete(MESSAGES, 2.0) == ("from fast", "fast")
+        await asyncio.sleep(0)
+        assert posted == ["slow", "fast"]
+        assert router.hedges_started == 1 and router.hedges_won == 1
+        assert router.backends[0].cancelled == 1
+
+    async def test_no_hedge_when_primary_answers_in_time(self, monkeypatch):
+        router, posted = _router(monkeypatch, {"a": (0.0, None), "b": (0.0, None)})
+        router.hedge_enabled = True
+        assert (await router.complete(MESSAGES, 1.0))[1] == "a"
+        assert posted == ["a"] and router.hedges_started == 0
@@ -0,0 +1,99 @@
+"""
+Unit tests for complexity-based routing between rules, the small model and the main model
+"""
+import uuid
+
+import pytest
+
+from src.agents import agno_agent
+from src.agents.agno_agent import analytics_agent
+from src.agents.model_router import ROUTE_MAIN, ROUTE_RULES, ROUTE_SMALL, ModelRouter
+from src.agents.pipeline import RequestDeadline
+from src.auth.permissions import build_permissions
+
+
+@pytest.fixture
+def router():
+    return ModelRouter()
+
+
+@pytest.mark.unit
+class TestClassify:
+    """Regex signals pick the route without a model call"""
+
+    @pytest.mark.parametrize("query,route,reason", [
+        ("Oi, bom dia!", ROUTE_RULES, "greeting"),
+        ("Valeu pela ajuda", ROUTE_RULES, "thanks"),
+        ("tchau, até amanhã", ROUTE_RULES, "bye"),
+        ("O que é VGV?", ROUTE_SMALL, "doc_lookup"),
+        ("Reescreva esse texto de forma mais formal", ROUTE_SMALL, "formatting"),
+        ("Quantos leads ativos temos?", ROUTE_MAIN, "needs_tools"),
+        ("Compare as vendas com o mês passado", ROUTE_MAIN, "needs_tools"),
+        ("Fale sobre reservas", ROUTE_MAIN, "needs_tools"),
+    ])
+    def test_routes(self, router, query, route, reason):
+        decision = router.classify(query)
+        assert (decision.route, decision.reason) == (route, reason)
+
+    def test_rules_route_carries_a_reply(self, router):
+        assert router.classify("olá").reply
+
+    def test_greeting_with_a_question_is_not_chit_chat(self, router):
+        assert router.classify("Oi, quantas vendas tivemos ontem?").route == ROUTE_MAIN
+
+    def test_signals(self, router):
+        decision = router.classify("Compare leads e vendas neste ano")
+        assert {"analysis", "period", "multi_table"} <= set(decision.signals)
+        assert decision.llm_tier == "main" and router.classify("O que é VGV?").llm_tier == "small"
+
+    def test_disabled(self, router):
+        router.enabled = False
+        assert router.classify("oi").route == ROUTE_MAIN
+
+    def test_stats(self, router):
+        router.record(ROUTE_SMALL, "doc_lookup", 100)
+        router.record(ROUTE_MAIN, "needs_tools", 300)
+        router.record(ROUTE_MAIN, "needs_tools", 500)
+        stats = router.get_stats()
+        assert stats["total"] == 3 and stats["avg_ms"] == 300.0
+        assert stats["routes"]["main"]["share"] == 0.667 and stats["reasons"]["main:needs_tools"] == 2
+
+
+@pytest.mark.unit
+class TestAgentRouting:
+    """process_query answers chit-chat by rule and sends simple questions to the small tier"""
+
+    @pytest.fixture
+    def tiers(self, monkeypatch):
+        tiers = []
+
+        async def no_fast_path(query, permissions):
+            return None, {"matched": False, "confidence": None, "reason": "no_match"}
+
+        async def complete(messages, timeout, tier="main"):
+            tiers.append(tier)
+            return "resposta", "fake"
+
+        monkeypatch.setattr(analytics_agent.fast_path, "answer", no_fast_path)
+        monkeypatch.setattr(agno_agent.llm_router, "backends", [object()])
+        monkeypatch.setattr(agno_agent.llm_router, "complete", complete)
+        return tiers
+
+    async def _ask(self, query):
+        return await analytics_agent.process_query(
+            uuid.uuid4(), query, build_permissions(uuid.uuid4(), 5, "ALL"),
+            history=[], deadline=RequestDeadline(30), remember=False, rag=([], []),
+        )
+
+    async def test_chit_chat_skips_the_llm(self, tiers):
+        result = await self._ask("Oi, tudo bem?")
+        assert tiers == [] and result["tools_used"] == ["rule_chit_chat"]
+        assert result["model_route"]["route"] == ROUTE_RULES
+
+    async def test_doc_question_uses_the_small_tier(self, tiers):
+        result = await self._ask("O que é VGV?")
+        assert tiers == ["small"] and result["model_route"]["route"] == ROUTE_SMALL
+
+    async def test_data_question_uses_the_main_model(self, tiers):
+        result = await self._ask("Compare as vendas deste ano com o ano passado")
+        assert tiers == ["main"] and result["model_route"]["reason"] == "needs_tools"
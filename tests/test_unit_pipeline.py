@@ -0,0 +1,167 @@
+"""
+Unit tests for the chat pipeline: request deadline, staged LLM calls and the parallel pre-LLM stage
+"""
+import asyncio
+import time
+import uuid
+
+import pytest
+
+from src.agents import agno_agent
+from src.agents.agno_agent import analytics_agent
+from src.agents.model_router import RouteDecision
+from src.agents.pipeline import RequestDeadline
+from src.auth.permissions import build_permissions
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Fake LLM backend; `spend` seconds are taken off the deadline per call"""
+    state = {"calls": 0, "reply": None, "spend": 0.0, "deadline": None}
+
+    async def complete(messages, timeout, tier="main"):
+        state["calls"] += 1
+        if state["deadline"] is not None:
+            state["deadline"].expires_at -= state["spend"]
+        if state["reply"] is None:
+            raise RuntimeError("model server down")
+        return state["reply"], "fake"
+
+    monkeypatch.setattr(agno_agent.llm_router, "backends", [object()])
+    monkeypatch.setattr(agno_agent.llm_router, "complete", complete)
+    return state
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    """Main-model route, no fast path match, no Agno, canned fallback"""
+    async def no_fast_path(query, permissions):
+        return None, {"matched": False, "confidence": None, "reason": "no_match"}
+
+    async def fallback(query, context):
+        return {"success": True, "response": "fallback", "tools_used": ["fallback"], "charts": []}
+
+    monkeypatch.setattr(analytics_agent.fast_path, "answer", no_fast_path)
+    monkeypatch.setattr(agno_agent.model_router, "classify", lambda query: RouteDecision("main", "test"))
+    monkeypatch.setattr(analytics_agent, "_fallback_process_query", fallback)
+    monkeypatch.setenv("AGENT_USE_AGNO", "false")
+    return analytics_agent
+
+
+async def _ask(agent, deadline):
+    return await agent.process_query(
+        uuid.uuid4(), "compare as vendas por empreendimento", build_permissions(uuid.uuid4(), 5, "ALL"),
+        history=[], deadline=deadline, remember=False, rag=([], []),
+    )
+
+
+@pytest.mark.unit
+class TestRequestDeadline:
+    """Budget arithmetic and stage timings"""
+
+    def test_llm_budget_keeps_the_fallback_reserve(self):
+        deadline = RequestDeadline(10, min_llm_attempt_s=5, fallback_reserve_s=2)
+        assert 7.9 < deadline.llm_budget() <= 8
+        deadline.expires_at -= 4
+        assert deadline.llm_budget() == 0.0  # 4s left - 2s reserve does not pay an attempt
+
+    def test_stage_budget_is_a_share_capped_by_what_remains(self):
+        deadline = RequestDeadline(100, fallback_reserve_s=2)
+        assert deadline.budget(0.1) == 10
+        deadline.expires_at -= 95
+        assert 2.9 < deadline.budget(0.1) <= 3
+
+    def test_first_degradation_reason_wins(self):
+        deadline = RequestDeadline(10)
+        deadline.degrade("memory_timeout")
+        deadline.degrade("llm_failed")
+        assert deadline.report()["degraded"] == "memory_timeout"
+
+    async def test_stages_accumulate_and_overlap(self):
+        deadline = RequestDeadline(10)
+        with deadline.stage("pre_llm"):
+            await asyncio.gather(
+                deadline.run_stage("a", asyncio.sleep(0.05)),
+                deadline.run_stage("b", asyncio.sleep(0.05)),
+            )
+        with deadline.stage("a"):
+            pass
+        stages = deadline.report()["stages_ms"]
+        assert stages["a"] >= 50 and stages["b"] >= 50
+        assert stages["pre_llm"] < stages["a"] + stages["b"]
+
+
+@pytest.mark.unit
+class TestStagedLlm:
+    """Each LLM stage makes a single attempt; explicit retries stop when the deadline can't pay them"""
+
+    async def test_success_calls_the_model_once(self, agent, llm):
+        llm["reply"] = "resposta"
+        result = await _ask(agent, RequestDeadline(30))
+        assert llm["calls"] == 1 and result["response"] == "resposta"
+        assert result["tools_used"] == ["llm_direct"] and result["pipeline"]["degraded"] is None
+
+    async def test_no_attempt_without_budget(self, agent, llm):
+        result = await _ask(agent, RequestDeadline(4, min_llm_attempt_s=5, fallback_reserve_s=2))
+        assert llm["calls"] == 0
+        assert result["response"] == "fallback" and result["pipeline"]["degraded"] == "deadline_before_llm"
+
+    async def test_down_model_gets_a_single_attempt(self, agent, llm):
+        result = await _ask(agent, RequestDeadline(60))
+        assert llm["calls"] == 1
+        assert result["response"] == "fallback" and result["pipeline"]["degraded"] == "llm_failed"
+
+    async def test_explicit_retries_stop_at_the_deadline(self, agent, llm):
+        deadline = RequestDeadline(20, min_llm_attempt_s=5, fallback_reserve_s=2)
+        llm["deadline"], llm["spend"] = deadline, 10
+        assert await agent._llm_direct_response("q", "s", retry_count=2, deadline=deadline) is None
+        assert llm["calls"] == 2 and deadline.degraded == "deadline_during_llm_retries"
+
+
+@pytest.mark.unit
+class TestParallelPreLlm:
+    """Permissions and RAG retrieval overlap; RAG runs off the event loop"""
+
+    async def test_permissions_and_rag_run_concurrently(self, monkeypatch):
+        seen = {}
+
+        async def load_request_state(user_id, query):
+            return {"history": [], "permissions": None, "answer": None}
+
+        async def check_user_permissions(user_id):
+            await asyncio.sleep(0.1)
+            return build_permissions(user_id, 2, "COM")
+
+        def get_rag_context(query):
+            time.sleep(0.1)  # blocking BM25 stand-in; must not stall the loop
+            return [], ["doc.md"]
+
+        async def cached_answer(permissions, query):
+            return None
+
+        async def process_query(user_id, query, permissions, history, deadline, rag):
+            seen.update(rag=rag, permissions=permissions)
+            return {"success": False, "pipeline": deadline.report()}
+
+        monkeypatch.setattr(analytics_agent, "load_request_state", load_request_state)
+        monkeypatch.setattr(analytics_agent, "check_user_permissions", check_user_permissions)
+        monkeypatch.setattr(analytics_agent, "_get_rag_context", get_rag_context)
+        monkeypatch.setattr(analytics_agent, "_cached_answer", cached_answer)
+        monkeypatch.setattr(analytics_agent, "process_query", process_query)
+
+        result = await analytics_agent.handle_chat(uuid.uuid4(), "quais vendas?", deadline=RequestDeadline(30))
+        stages = result["pipeline"]["stages_ms"]
+        assert seen["rag"] == ([], ["doc.md"]) and seen["permissions"]["divisao"] == "COM"
+        assert stages["permissions"] >= 100 and stages["rag"] >= 100
+        assert stages["pre_llm"] < 190
+
+    async def test_slow_rag_degrades_instead_of_blocking(self, monkeypatch):
+        def get_rag_context(query):
+            time.sleep(0.3)
+            return [], ["doc.md"]
+
+        monkeypatch.setattr(analytics_agent, "_get_rag_context", get_rag_context)
+        deadline = RequestDeadline(1, fallback_reserve_s=0)  # 10% share = 0.1s
+        started = time.monotonic()
+        assert await analytics_agent._retrieve_rag_context("quais vendas?", deadline=deadline) == ([], [])
+        assert time.monotonic() - started < 0.25 and deadline.degraded == "rag_timeout"
@@ -0,0 +1,99 @@
+"""
+Unit tests for token counting and token-budgeted prompt assembly
+"""
+import pytest
+
+from src.agents import tokens
+from src.agents.prompt_budget import PromptAssembler
+from src.agents.rag_store import RagHit
+from src.agents.tokens import count_tokens, truncate_to_tokens
+
+LOREM = " ".join(f"palavra{i} de contexto sobre vendas e reservas." for i in range(200))
+
+
+@pytest.fixture
+def assembler():
+    assembler = PromptAssembler()
+    assembler.context_tokens = 1200
+    assembler.response_tokens = 200
+    assembler.log_enabled = False
+    return assembler
+
+
+def _history(n):
+    return [{"message": f"pergunta {i} sobre estoque", "response": LOREM[:400]} for i in range(n)]
+
+
+@pytest.mark.unit
+class TestTokens:
+    """Local token counts and truncation"""
+
+    def test_fallback_estimate_without_tiktoken(self, monkeypatch):
+        monkeypatch.setattr(tokens, "tiktoken", None)
+        monkeypatch.setattr(tokens, "_encoding", None)
+        assert tokens.load_encoding() is None
+        assert count_tokens("") == 0
+        assert count_tokens("Qual o valor total?") == 7  # long words count extra
+        assert count_tokens("empreendimento") == 4
+
+    def test_counting_never_loads_the_encoding(self, monkeypatch):
+        class Tiktoken:
+            loads = 0
+
+            @classmethod
+            def get_encoding(cls, name):
+                cls.loads += 1
+                raise OSError("offline")
+
+        monkeypatch.setattr(tokens, "tiktoken", Tiktoken)
+        monkeypatch.setattr(tokens, "_encoding", None)
+        assert count_tokens("Qual o valor total?") == 7 and Tiktoken.loads == 0
+        assert tokens.load_encoding() is None and Tiktoken.loads == 1
+
+    def test_truncate_fits_and_keeps_word_boundaries(self):
+        text = truncate_to_tokens(LOREM, 50)
+        assert count_tokens(text) <= 50 and text.endswith("…")
+        assert text[:-1].split()[-1] in LOREM.split()
+        assert truncate_to_tokens("curto", 50) == "curto"
+        assert truncate_to_tokens(LOREM, 0) == ""
+
+
+@pytest.mark.unit
+class TestAssembly:
+    """Instructions and request block always fit; RAG and history share the rest"""
+
+    def test_everything_fits(self, assembler):
+        hits = [RagHit("doc.md", "Trecho curto.", 1.0)]
+        history = [{"message": "oi", "response": "olá"}]
+        prompt, report = assembler.assemble("INSTRUCOES", "pergunta", hits, history, suffix="REQUISICAO")
+        assert prompt.startswith("INSTRUCOES") and prompt.endswith("REQUISICAO")
+        assert report["rag"]["kept"] == 1 and report["history"]["kept"] == 1
+        assert prompt.index("Trecho curto.") < prompt.index("Usuário: oi")
+
+    def test_prompt_stays_within_the_budget(self, assembler):
+        hits = [RagHit(f"doc{i}.md", LOREM[:1500], score=i) for i in range(6)]
+        prompt, report = assembler.assemble("INSTRUCOES", "estoque", hits, _history(10), suffix="REQ")
+        assert report["total"] <= assembler.context_tokens - assembler.response_tokens
+        assert report["rag"]["dropped"] > 0 and report["history"]["dropped"] + report["history"]["summarized"] > 0
+
+    def test_rag_keeps_the_best_scores(self, assembler):
+        hits = [RagHit("low.md", LOREM[:2500], 0.1), RagHit("high.md", LOREM[:2500], 0.9)]
+        prompt, report = assembler.assemble("I", "q", hits)
+        assert "[1] high.md" in prompt and report["rag"]["dropped"] + report["rag"]["truncated"] >= 1
+        assert "[2] low.md" not in prompt or report["rag"]["truncated"] == 1
+
+    def test_unused_history_share_goes_to_rag(self, assembler):
+        hits = [RagHit(f"doc{i}.md", LOREM[:600], score=i) for i in range(6)]
+        _, with_history = assembler.assemble("I", "q", hits, [{"message": "oi", "response": "olá"}])
+        _, without = assembler.assemble("I", "q", hits)
+        assert with_history["rag"]["kept"] >= without["rag"]["kept"] - 1
+        assert with_history["rag"]["tokens"] > (with_history["rag"]["tokens"] + with_history["history"]["tokens"]) * 0.6
+
+    def test_history_prefers_recent_and_relevant_turns_in_order(self, assembler):
+        assembler.context_tokens = 500
+        history = [{"message": f"turno {i}", "response": LOREM[:300]} for i in range(8)]
+        history[1]["message"] = "qual o estoque de unidades"
+        prompt, report = assembler.assemble("I", "estoque de unidades", [], history)
+        kept = [i for i in range(8) if f"Usuário: {history[i]['message']}\n" in prompt]
+        assert 1 in kept and 7 in kept and 0 not in kept
+        assert kept == sorted(kept)
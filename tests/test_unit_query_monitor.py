@@ -0,0 +1,111 @@
+"""
+Unit tests for query instrumentation (fingerprints, slow log, EXPLAIN scheduling)
+"""
+import asyncio
+
+import pytest
+
+from src.database.query_monitor import (
+    QueryMonitor,
+    filter_shape,
+    normalize_sql,
+    postgrest_equivalent_sql,
+    to_psycopg_sql,
+)
+
+
+@pytest.mark.unit
+class TestNormalization:
+    """Queries with the same shape share a fingerprint"""
+
+    def test_literals_and_params_are_removed(self):
+        a = normalize_sql("SELECT * FROM vendas WHERE cidade = 'Brasília' AND id = $1 -- x")
+        b = normalize_sql("select *  from vendas where cidade = 'Goiânia' and id = $2")
+        assert a == b == "select * from vendas where cidade = ? and id = ?"
+
+    def test_json_keys_are_kept(self):
+        assert "raw->>'email'" in normalize_sql("SELECT raw->>'email' FROM leads")
+
+    def test_filter_shape_ignores_values(self):
+        assert filter_shape("leads", ["nome"], {"ativo": "S"}, "-data_cad", "exact") == \
+            "postgrest leads select=nome eq=ativo order=-data_cad count=exact"
+
+    def test_postgrest_equivalent_sql(self):
+        sql, params = postgrest_equivalent_sql("leads", ["nome", "raw->>email"], {"ativo": "S"}, "-data_cad", 10, 20)
+        assert sql == "SELECT nome, raw->>'email' FROM leads WHERE ativo = $1 ORDER BY data_cad DESC LIMIT 10 OFFSET 20"
+        assert params == ["S"]
+
+    def test_psycopg_placeholders(self):
+        assert to_psycopg_sql("SELECT $1 LIKE '%a'", ["x"]) == ("SELECT %(p1)s LIKE '%%a'", {"p1": "x"})
+
+
+@pytest.mark.unit
+class TestSlowLog:
+    """Slow queries are logged and aggregated per fingerprint"""
+
+    def test_slow_query_is_logged_once_per_execution(self):
+        monitor = QueryMonitor(threshold_ms=100)
+        monitor.record("exec_sql", "SELECT 1", 50)
+        fp = monitor.record("exec_sql", "SELECT 2", 150)
+        stats = monitor.get_fingerprint_stats()
+        assert len(stats) == 1 and stats[0]["count"] == 2 and stats[0]["slow_count"] == 1
+        assert [e["fingerprint"] for e in monitor.get_slow_queries()] == [fp]
+
+    def test_totals_cover_more_calls_than_the_retained_samples(self):
+        monitor = QueryMonitor(threshold_ms=10_000, samples_per_fingerprint=10)
+        for _ in range(100):
+            monitor.record("exec_sql", "SELECT * FROM leads", 5)
+        for _ in range(20):
+            monitor.record("exec_sql", "SELECT * FROM vendas", 20)
+        busy, other = monitor.get_fingerprint_stats()
+        assert "leads" in busy["query"] and busy["count"] == 100 and busy["total_ms"] == 500
+        assert busy["samples"] == 10 and other["total_ms"] == 400
+
+
+@pytest.mark.unit
+class TestExplainScheduling:
+    """Background EXPLAIN tasks are referenced and cooldowns stay bounded"""
+
+    @pytest.fixture
+    def monitor(self, monkeypatch):
+        monkeypatch.setenv("DATABASE_URL", "postgresql://example")
+        monitor = QueryMonitor(threshold_ms=0)
+        monitor.explain_enabled = True
+        return monitor
+
+    async def test_task_is_kept_until_done(self, monitor, monkeypatch):
+        release = asyncio.Event()
+        loop = asyncio.get_running_loop()
+
+        def fake_explain(sql, params=None):
+            asyncio.run_coroutine_threadsafe(release.wait(), loop).result()
+            return {"plan": sql}
+
+        monkeypatch.setattr(monitor, "explain", fake_explain)
+        monitor.record("exec_sql", "SELECT 1", 10, explain_sql="SELECT 1")
+        assert len(monitor._explain_tasks) == 1
+
+        release.set()
+        await asyncio.gather(*monitor._explain_tasks)
+        await asyncio.sleep(0)
+        assert monitor._explain_tasks == set()
+        assert monitor.get_slow_queries()[0]["explain"] == {"plan": "SELECT 1"}
+
+    def test_cooldown_blocks_repeated_explain(self, monitor):
+        assert monitor._should_explain("fp") is True
+        assert monitor._should_explain("fp") is False
+
+    def test_expired_cooldowns_are_pruned(self, monitor, monkeypatch):
+        monitor.explain_cooldown_s = 10
+        clock = iter([100.0, 105.0, 120.0])
+        monkeypatch.setattr("src.database.query_monitor.time.monotonic", lambda: next(clock))
+        monitor._should_explain("a")
+        monitor._should_explain("b")
+        monitor._should_explain("c")
+        assert list(monitor._last_explain) == ["c"]
+
+    def test_cooldowns_are_bounded(self, monitor):
+        monitor.max_explain_fingerprints = 3
+        for i in range(10):
+            monitor._should_explain(f"fp{i}")
+        assert list(monitor._last_explain) == ["fp7", "fp8", "fp9"]
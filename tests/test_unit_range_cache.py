@@ -0,0 +1,102 @@
+"""
+Unit tests for the per-segment range cache
+"""
+from datetime import date
+
+import pytest
+
+from src.cache.range_cache import RangeCache, split_segments
+from src.cache.tiered import TieredCache
+
+
+def _monthly_fetcher(calls, empty=()):
+    async def fetch(start, end):
+        calls.append((start, end))
+        first, last = date.fromisoformat(start), date.fromisoformat(end)
+        return [
+            {"data": f"{first.year}-{m:02d}-01", "valor": m}
+            for m in range(first.month, last.month + 1)
+            if m not in empty
+        ]
+    return fetch
+
+
+@pytest.fixture
+def ranges():
+    return RangeCache(cache=TieredCache(key_prefix="range-test"))
+
+
+@pytest.mark.unit
+class TestSegments:
+    """Segment boundaries follow DATE_TRUNC"""
+
+    def test_partial_edges_are_not_complete(self):
+        segments = split_segments(date(2025, 1, 15), date(2025, 3, 10), "month")
+        assert [(s[0].isoformat(), s[3]) for s in segments] == [
+            ("2025-01-01", False), ("2025-02-01", True), ("2025-03-01", False)
+        ]
+        assert segments[0][1] == date(2025, 1, 15) and segments[-1][2] == date(2025, 3, 10)
+
+    def test_weeks_start_on_monday(self):
+        segments = split_segments(date(2025, 1, 1), date(2025, 1, 12), "week")
+        assert [s[0].isoformat() for s in segments] == ["2024-12-30", "2025-01-06"]
+
+
+@pytest.mark.unit
+class TestSeries:
+    """Only missing segments go to the database"""
+
+    async def test_overlapping_ranges_share_segments(self, ranges):
+        calls = []
+        fetch = _monthly_fetcher(calls)
+        await ranges.series({"fact": "vendas"}, "2025-01-01", "2025-06-30", "month", fetch)
+        rows = await ranges.series({"fact": "vendas"}, "2025-02-01", "2025-07-31", "month", fetch)
+
+        assert [r["valor"] for r in rows] == [2, 3, 4, 5, 6, 7]
+        assert calls == [("2025-01-01", "2025-06-30"), ("2025-07-01", "2025-07-31")]
+        assert ranges.get_stats()["segment_hits"] == 5
+
+    async def test_gaps_are_fetched_as_contiguous_runs(self, ranges):
+        calls = []
+        fetch = _monthly_fetcher(calls)
+        await ranges.series({"fact": "vendas"}, "2025-03-01", "2025-04-30", "month", fetch)
+        calls.clear()
+        await ranges.series({"fact": "vendas"}, "2025-01-01", "2025-06-30", "month", fetch)
+        assert calls == [("2025-01-01", "2025-02-28"), ("2025-05-01", "2025-06-30")]
+
+    async def test_empty_segments_are_cached(self, ranges):
+        calls = []
+        fetch = _monthly_fetcher(calls, empty={2})
+        await ranges.series({"fact": "leads"}, "2025-01-01", "2025-03-31", "month", fetch)
+        rows = await ranges.series({"fact": "leads"}, "2025-01-01", "2025-03-31", "month", fetch)
+        assert [r["valor"] for r in rows] == [1, 3] and len(calls) == 1
+
+    async def test_partial_edges_are_always_fetched(self, ranges):
+        calls = []
+        fetch = _monthly_fetcher(calls)
+        await ranges.series({"fact": "vendas"}, "2025-01-15", "2025-02-28", "month", fetch)
+        await ranges.series({"fact": "vendas"}, "2025-01-15", "2025-02-28", "month", fetch)
+        assert calls == [("2025-01-15", "2025-02-28"), ("2025-01-15", "2025-01-31")]
+
+    async def test_table_tag_invalidates_segments(self, ranges):
+        calls = []
+        fetch = _monthly_fetcher(calls)
+        await ranges.series({"fact": "vendas"}, "2025-01-01", "2025-02-28", "month", fetch, tags=["table:vendas"])
+        await ranges.cache.invalidate_tags(["table:vendas"])
+        await ranges.series({"fact": "vendas"}, "2025-01-01", "2025-02-28", "month", fetch, tags=["table:vendas"])
+        assert len(calls) == 2
+
+    @pytest.mark.parametrize("start,end,unit", [
+        (None, "2025-01-31", "month"),
+        ("2025-02-01", "2025-01-01", "month"),
+        ("2025-01-01", "2025-01-31", "quarter"),
+    ])
+    async def test_bypass_for_open_or_invalid_ranges(self, ranges, start, end, unit):
+        calls = []
+
+        async def fetch(s, e):
+            calls.append((s, e))
+            return []
+
+        await ranges.series({"fact": "vendas"}, start, end, unit, fetch)
+        assert calls == [(start, end)] and ranges.bypassed == 1
@@ -0,0 +1,104 @@
+"""
+Unit tests for RAW table projections and count modes
+"""
+import json
+import uuid
+
+import pytest
+
+from src.agents import agno_agent
+from src.agents.cache_manager import cache_manager
+from src.database import raw_tables
+
+
+class _FakeQuery:
+    def __init__(self, calls, rows, count):
+        self.calls = calls
+        self.rows = rows
+        self.count = count
+
+    def select(self, columns, count=None):
+        self.calls.append(count)
+        self.requested_count = count
+        return self
+
+    def eq(self, key, value):
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def range(self, start, end):
+        return self
+
+    def execute(self):
+        count = self.count if self.requested_count else None
+        return type("Response", (), {"data": self.rows, "count": count})()
+
+
+class _FakeSupabase:
+    def __init__(self, rows, count):
+        self.calls = []
+        self.rows = rows
+        self.count = count
+
+    def table(self, name):
+        return _FakeQuery(self.calls, self.rows, self.count)
+
+
+@pytest.mark.unit
+class TestProjectionAndCountMode:
+    """Projection validation and default count modes"""
+
+    def test_default_projection_has_no_raw_blob(self):
+        projection = raw_tables.resolve_projection("vendas")
+        assert projection == raw_tables.DEFAULT_PROJECTIONS["vendas"]
+        assert "raw" not in projection
+
+    def test_custom_projection_accepts_json_paths_and_dedups(self):
+        assert raw_tables.resolve_projection("leads", ["nome", "raw->>email", "nome"]) == ["nome", "raw->>email"]
+
+    def test_custom_projection_rejects_expressions(self):
+        with pytest.raises(ValueError):
+            raw_tables.resolve_projection("leads", ["nome, (select 1)"])
+
+    def test_large_tables_default_to_estimated(self):
+        assert raw_tables.default_count_mode("leads") == "estimated"
+        assert raw_tables.default_count_mode("vendas") == "exact"
+
+
+@pytest.mark.unit
+class TestExactCountCache:
+    """Exact counts are cached with a bounded TTL and the table tag"""
+
+    @pytest.fixture
+    def fake_db(self, monkeypatch):
+        db = _FakeSupabase([{"idvenda": 1}], count=42)
+        monkeypatch.setattr(agno_agent, "supabase_admin_client", db)
+        return db
+
+    async def test_exact_count_is_cached_with_bounded_ttl(self, fake_db, monkeypatch):
+        stored = {}
+        original_set = cache_manager.set
+
+        async def spy_set(namespace, key, value, ttl=None, tags=None, **kwargs):
+            if namespace == "raw_counts":
+                stored.update(ttl=ttl, tags=tags)
+            return await original_set(namespace, key, value, ttl=ttl, tags=tags, **kwargs)
+
+        monkeypatch.setattr(cache_manager, "set", spy_set)
+        filters = {"contrato_interno": str(uuid.uuid4())}
+
+        first = json.loads(await agno_agent.analytics_agent.query_raw_data("vendas", filters=filters))
+        second = json.loads(await agno_agent.analytics_agent.query_raw_data("vendas", filters=filters))
+
+        assert first["total_count"] == second["total_count"] == 42
+        assert fake_db.calls == ["exact", None]
+        assert stored == {"ttl": raw_tables.EXACT_COUNT_TTL_SECONDS, "tags": ["table:vendas"]}
+
+    async def test_table_invalidation_drops_cached_count(self, fake_db):
+        filters = {"contrato_interno": str(uuid.uuid4())}
+        await agno_agent.analytics_agent.query_raw_data("vendas", filters=filters)
+        await cache_manager.invalidate_tags(["table:vendas"])
+        await agno_agent.analytics_agent.query_raw_data("vendas", filters=filters)
+        assert fake_db.calls == ["exact", "exact"]
@@ -0,0 +1,140 @@
+"""
+Unit tests for the daily rollup reader and its KMV distinct-client sketches
+"""
+import random
+
+import pytest
+
+from src.cache.range_cache import RangeCache
+from src.cache.tiered import TieredCache
+from src.database import rollups
+from src.database.rollups import DailyRollups, RollupError
+
+K = 256
+
+
+# Python model of kmv_trim / kmv_union / kmv_estimate
+# (database/migrations/004_create_rollup_diario.sql)
+def kmv_trim(hashes, k=K):
+    return sorted({h for h in hashes if h is not None})[:k]
+
+
+def kmv_union(sketches, k=K):
+    state = []
+    for sketch in sketches:
+        state = kmv_trim(state + sketch, k)
+    return state
+
+
+def kmv_estimate(sketch, k=K):
+    if len(sketch) < k:
+        return len(sketch)
+    return round((k - 1) / ((sketch[k - 1] + 2 ** 63) / 2 ** 64))
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+    def execute(self):
+        return self
+
+
+class _FakeClient:
+    def __init__(self, rows=None):
+        self.rows = rows or []
+        self.calls = []
+
+    def rpc(self, name, params):
+        self.calls.append((name, params))
+        if name == "exec_sql":
+            return _Response(self.rows(params) if callable(self.rows) else self.rows)
+        return _Response(len(params.get("p_dias") or []))
+
+
+@pytest.mark.unit
+class TestKmvSketch:
+    """Sketches merged across days estimate the distinct count of the union"""
+
+    def test_union_of_trimmed_sketches_equals_sketch_of_union(self):
+        rng = random.Random(7)
+        clients = [rng.randrange(-2 ** 63, 2 ** 63) for _ in range(5000)]
+        days = [rng.sample(clients, 800) for _ in range(10)]
+        merged = kmv_union(kmv_trim(day) for day in days)
+        assert merged == kmv_trim([h for day in days for h in day])
+
+    def test_estimate_is_exact_below_k_and_close_above(self):
+        rng = random.Random(11)
+        assert kmv_estimate(kmv_trim([1, 2, 2, 3])) == 3
+        hashes = [rng.randrange(-2 ** 63, 2 ** 63) for _ in range(20000)]
+        assert abs(kmv_estimate(kmv_trim(hashes)) - 20000) / 20000 < 0.2
+
+    def test_period_query_merges_sketches_before_estimating(self):
+        query, _ = DailyRollups(None).build_query("vendas", "2025-01-01", "2025-12-31", None)
+        assert "kmv_estimate(kmv_union(clientes_sketch)) AS clientes_unicos" in query
+        assert "GROUP BY" not in query
+
+
+@pytest.mark.unit
+class TestBuildQuery:
+    """SQL generation over rollup_diario"""
+
+    def test_monthly_series(self):
+        query, params = DailyRollups(None).build_query(
+            "reservas", "2025-01-01", "2025-03-31", "monthly", {"idcorretor": [1, "2"]}
+        )
+        assert query.startswith("SELECT DATE_TRUNC('month', dia)::date AS data")
+        assert "idcorretor IN ($4, $5)" in query and query.endswith("GROUP BY 1 ORDER BY 1")
+        assert params == ["reservas", "2025-01-01", "2025-03-31", 1, 2]
+
+    @pytest.mark.parametrize("kwargs", [
+        {"fact": "pessoas"},
+        {"fact": "vendas", "granularity": "hourly"},
+        {"fact": "vendas", "filters": {"cidade": "X"}},
+    ])
+    def test_rejects_invalid_input(self, kwargs):
+        with pytest.raises(RollupError):
+            DailyRollups(None).build_query(**kwargs)
+
+
+@pytest.mark.unit
+class TestReads:
+    """Totals, series and incremental refresh"""
+
+    async def test_totals_normalizes_row(self):
+        client = _FakeClient([{"quantidade": 4, "valor_total": "1000", "vgv": None, "clientes_unicos": "3"}])
+        totals = await DailyRollups(client).totals("vendas", "2025-01-01", "2025-01-31")
+        assert totals["ticket_medio"] == 250.0 and totals["clientes_unicos"] == 3 and totals["valor"] == 1000.0
+
+    async def test_leads_value_is_the_count(self):
+        totals = await DailyRollups(_FakeClient([{"quantidade": 7}])).totals("leads")
+        assert totals["valor"] == 7
+
+    async def test_series_only_fetches_missing_months(self, monkeypatch):
+        monkeypatch.setattr(rollups, "range_cache", RangeCache(cache=TieredCache()))
+
+        def rows(params):
+            start, end = params["params"][1], params["params"][2]
+            return [{"data": f"2025-{m:02d}-01", "quantidade": m}
+                    for m in range(int(start[5:7]), int(end[5:7]) + 1)]
+
+        client = _FakeClient(rows)
+        reader = DailyRollups(client)
+        await reader.series("vendas", "2025-01-01", "2025-06-30")
+        second = await reader.series("vendas", "2025-02-01", "2025-07-31")
+
+        assert [r["quantidade"] for r in second] == [2, 3, 4, 5, 6, 7]
+        assert [c[1]["params"][1:] for c in client.calls] == [
+            ["2025-01-01", "2025-06-30"], ["2025-07-01", "2025-07-31"]
+        ]
+
+    async def test_refresh_deduplicates_days(self):
+        client = _FakeClient()
+        written = await DailyRollups(client).refresh("vendas", ["2025-01-02T10:00:00", "2025-01-02", None, "2025-01-01"])
+        assert client.calls == [("refresh_rollup_diario", {"p_fato": "vendas", "p_dias": ["2025-01-01", "2025-01-02"]})]
+        assert written == 2
+
+    async def test_refresh_without_days_is_a_noop(self):
+        client = _FakeClient()
+        assert await DailyRollups(client).refresh("vendas", []) == 0
+        assert client.calls == []
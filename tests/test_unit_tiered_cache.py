@@ -0,0 +1,232 @@
+"""
+Unit tests for the tiered L1 (memory) + L2 (Redis) cache
+"""
+from datetime import date
+
+import pytest
+
+from src.agents.cache_manager import cache_manager as agent_cache
+from src.cache import redis_manager
+from src.cache import tiered
+from src.cache.tiered import DEFAULT_TTL, NAMESPACE_TTLS, MemoryTier, TieredCache, tiered_cache
+from tests.mocks import MockAsyncRedis, attach_mock_redis
+
+
+@pytest.fixture
+def cache():
+    return TieredCache(key_prefix="test", l1_max_bytes=1024 * 1024)
+
+
+@pytest.mark.unit
+class TestTwoLevels:
+    """One key scheme over memory and Redis"""
+
+    async def test_memory_only_without_redis(self, cache):
+        cache.l2._next_attempt = float("inf")
+        await cache.set("queries", "k", {"total": 1})
+        assert await cache.get("queries", "k") == {"total": 1}
+        assert (await cache.get_stats())["l2"]["enabled"] is False
+
+    async def test_l1_hit_does_not_touch_redis(self, cache):
+        redis = attach_mock_redis(cache)
+        await cache.set("queries", "k", [1, 2])
+        redis.calls.clear()
+        assert await cache.get("queries", "k") == [1, 2]
+        assert redis.calls == []
+
+    async def test_other_worker_reads_from_redis_and_promotes(self, cache):
+        redis = attach_mock_redis(cache)
+        other = TieredCache(key_prefix="test")
+        other.l2.client, other.l2.enabled = redis, True
+
+        await cache.set("queries", "k", {"day": date(2025, 1, 2)})
+        assert await other.get("queries", "k") == {"day": "2025-01-02"}
+        assert other.l1.get_stats()["size"] == 1
+
+    async def test_get_many_keeps_order_and_default(self, cache):
+        await cache.set_many([("queries", "a", 1, None), ("analysis", "b", 2, 60)])
+        assert await cache.get_many([("queries", "a"), ("queries", "x"), ("analysis", "b")], default=-1) == [1, -1, 2]
+
+    def test_namespace_ttls(self, cache):
+        assert cache.ttl_for("pagination") == NAMESPACE_TTLS["pagination"]
+        assert cache.ttl_for("unknown") == DEFAULT_TTL
+        assert cache.ttl_for("pagination", 5) == 5
+
+    def test_hash_key_is_order_independent(self):
+        assert TieredCache.hash_key({"a": 1, "b": 2}) == TieredCache.hash_key({"b": 2, "a": 1})
+
+
+@pytest.mark.unit
+class TestSharedStore:
+    """API and agent caches use the same tiered instance"""
+
+    def test_api_and_agent_share_the_tiered_cache(self):
+        assert redis_manager.cache_manager.cache is tiered_cache
+        assert agent_cache.cache is tiered_cache
+
+    async def test_agent_entry_is_visible_to_api_manager(self):
+        key = TieredCache.hash_key({"test": "shared"})
+        await agent_cache.set("api_calls", key, {"ok": True})
+        assert await redis_manager.cache_manager.get_cached_result(f"api_calls:{key}") == {"ok": True}
+
+
+@pytest.mark.unit
+class TestRedisTier:
+    """redis.asyncio client with batched round-trips"""
+
+    async def test_batch_read_is_one_mget(self, cache):
+        redis = attach_mock_redis(cache)
+        await cache.set_many([("queries", str(i), i, None) for i in range(5)])
+        cache.l1.clear()
+        redis.calls.clear()
+        assert await cache.get_many([("queries", str(i)) for i in range(5)]) == list(range(5))
+        assert redis.calls == ["mget"]
+
+    async def test_batch_write_is_one_pipeline(self, cache):
+        redis = attach_mock_redis(cache)
+        cache._versions.clear()
+        await cache.set_many([("queries", str(i), i, 30) for i in range(5)])
+        assert redis.calls == ["mget", "pipeline"]
+        assert set(redis.expiry.values()) == {30}
+
+    async def test_errors_fall_back_to_memory(self, cache):
+        redis = attach_mock_redis(cache)
+        await cache.set("queries", "k", "v")
+        redis.fail = True
+        cache.l1.clear()
+        assert await cache.get("queries", "k") is None
+        assert await cache.set("queries", "k", "v2") is True  # L1 still stores
+        assert await cache.get("queries", "k") == "v2"
+        assert cache.l2.errors >= 2
+
+    async def test_reconnects_after_retry_interval(self, cache, monkeypatch):
+        import redis.asyncio as aioredis
+
+        attempts = []
+        healthy = MockAsyncRedis()
+
+        def from_url(url, **kwargs):
+            attempts.append(url)
+            if len(attempts) == 1:
+                broken = MockAsyncRedis()
+                broken.fail = True
+                return broken
+            return healthy
+
+        monkeypatch.setattr(aioredis, "from_url", from_url)
+        assert await cache.l2._ensure() is False
+        assert await cache.l2._ensure() is False  # still inside the retry window
+        cache.l2._next_attempt = 0.0
+        assert await cache.l2._ensure() is True
+        assert cache.l2.client is healthy and len(attempts) == 2
+
+
+@pytest.mark.unit
+class TestTagVersions:
+    """Invalidation by tag versions embedded in the physical key"""
+
+    async def test_tag_invalidation_hides_tagged_entries_only(self, cache):
+        attach_mock_redis(cache)
+        await cache.set("analysis", "vendas", 1, tags=["table:vendas"])
+        await cache.set("analysis", "leads", 2, tags=["table:leads"])
+        await cache.invalidate_tags(["table:vendas"])
+        assert await cache.get("analysis", "vendas", tags=["table:vendas"]) is None
+        assert await cache.get("analysis", "leads", tags=["table:leads"]) == 2
+
+    async def test_namespace_invalidation(self, cache):
+        attach_mock_redis(cache)
+        await cache.set("kpis", "a", 1)
+        assert await cache.invalidate_namespace("kpis") == 1
+        assert await cache.get("kpis", "a") is None
+
+    async def test_other_worker_sees_invalidation_after_version_ttl(self, cache):
+        redis = attach_mock_redis(cache)
+        other = TieredCache(key_prefix="test")
+        other.l2.client, other.l2.enabled = redis, True
+        other.version_ttl_s = 0
+
+        await cache.set("analysis", "k", "old", tags=["table:vendas"])
+        assert await other.get("analysis", "k", tags=["table:vendas"]) == "old"
+        await cache.invalidate_tags(["table:vendas"])
+        assert await other.get("analysis", "k", tags=["table:vendas"]) is None
+
+    async def test_fallback_versions_expire_and_resync_with_redis(self, cache, monkeypatch):
+        redis = attach_mock_redis(cache)
+        clock = [1000.0]
+        monkeypatch.setattr("src.cache.tiered.time.monotonic", lambda: clock[0])
+
+        await cache.set("analysis", "k", "before", tags=["table:vendas"])
+        redis.fail = True
+        await cache.invalidate_tags(["table:vendas"])  # only local while Redis is down
+        assert cache._versions["table:vendas"][1] == 1000.0
+
+        # Redis comes back: the local version is not pinned and the pending INCR is replayed
+        redis.fail = False
+        clock[0] += cache.version_ttl_s + 1
+        cache.l1.clear()
+        assert await cache.get("analysis", "k", tags=["table:vendas"]) is None
+        assert int(redis.store["test:tagver:table:vendas"]) == 1
+        assert cache._pending_invalidations == set()
+
+    async def test_versions_written_elsewhere_are_picked_up_after_outage(self, cache, monkeypatch):
+        redis = attach_mock_redis(cache)
+        clock = [1000.0]
+        monkeypatch.setattr("src.cache.tiered.time.monotonic", lambda: clock[0])
+
+        redis.fail = True
+        assert await cache.get("analysis", "k", tags=["table:vendas"]) is None
+        redis.fail = False
+        redis.store["test:tagver:table:vendas"] = b"7"
+        clock[0] += cache.version_ttl_s + 1
+        await cache.get("analysis", "k", tags=["table:vendas"])
+        assert cache._versions["table:vendas"][0] == 7
+
+
+@pytest.mark.unit
+class TestMemoryTier:
+    """Per-namespace quotas and heap-based expiry in the L1"""
+
+    @pytest.fixture
+    def l1(self, monkeypatch):
+        monkeypatch.setitem(tiered.NAMESPACE_QUOTAS, "small", 0.25)
+        monkeypatch.setitem(tiered.NAMESPACE_QUOTAS, "big", 0.5)
+        return MemoryTier(max_bytes=4000)
+
+    def test_namespace_evicts_its_own_entries_first(self, l1):
+        l1.set("s1", b"x" * 300, 60, namespace="small")
+        for i in range(10):
+            l1.set(f"b{i}", b"x" * 300, 60, namespace="big")
+        assert l1.get("s1") is not None
+        assert l1.areas["big"].bytes <= l1.areas["big"].quota_bytes
+        assert l1.areas["big"].evictions > 0 and l1.areas["small"].evictions == 0
+
+    def test_lru_order_within_namespace(self, l1):
+        for key in ("a", "b", "c"):
+            l1.set(key, b"x" * 300, 60, namespace="small")  # quota fits 3
+        l1.get("a")
+        l1.set("d", b"x" * 300, 60, namespace="small")
+        assert l1.get("b") is None and l1.get("a") is not None
+
+    def test_oversized_entry_is_rejected(self, l1):
+        assert l1.set("huge", b"x" * 2000, 60, namespace="small") is False
+        assert l1.rejected == 1
+
+    def test_sweep_removes_expired_without_reads(self, l1, monkeypatch):
+        clock = [100.0]
+        monkeypatch.setattr("src.cache.tiered.time.monotonic", lambda: clock[0])
+        for i in range(5):
+            l1.set(f"k{i}", b"v", 1 if i < 3 else 60, namespace="small")
+        clock[0] += 2
+        assert l1.sweep() == 3
+        assert l1.get_stats()["size"] == 2 and l1.expirations == 3
+
+    def test_rewritten_key_keeps_new_deadline(self, l1, monkeypatch):
+        clock = [100.0]
+        monkeypatch.setattr("src.cache.tiered.time.monotonic", lambda: clock[0])
+        l1.set("k", b"v", 1, namespace="small")
+        l1.set("k", b"v2", 60, namespace="small")
+        clock[0] += 2
+        assert l1.sweep() == 0 and l1.get("k") == b"v2"
+
+    def test_quota_override_from_env(self):
+        assert tiered._parse_quotas("conversation=0.1, api_calls=0.3,bad") == {"conversation": 0.1, "api_calls": 0.3}
@@ -0,0 +1,92 @@
+"""
+Unit tests for compact, token-budgeted tool output serialization
+"""
+import asyncio
+import json
+
+import pytest
+
+from src.agents.tokens import count_tokens
+from src.agents.tool_output import ToolOutputSerializer, full_output
+
+
+def _records(n):
+    return [
+        {"id": i, "empreendimento": f"Residencial {i % 3}", "valor": 1000 + i,
+         "cidade": "Goiania", "observacao": None}
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def serializer():
+    serializer = ToolOutputSerializer()
+    serializer.default_budget = 400
+    serializer.budgets = {"big": 5000}
+    serializer.top_n = 3
+    return serializer
+
+
+@pytest.mark.unit
+class TestTable:
+    """Records become columns + rows; null and constant columns leave the rows"""
+
+    def test_table_layout(self, serializer):
+        table = serializer.table(_records(3))
+        assert table["columns"] == ["id", "empreendimento", "valor"]
+        assert table["rows"][0] == [0, "Residencial 0", 1000]
+        assert table["constant"] == {"cidade": "Goiania"} and table["null_columns"] == ["observacao"]
+
+    def test_long_cells_are_cut(self, serializer):
+        table = serializer.table([{"texto": "x" * 500}, {"texto": "y"}])
+        assert len(table["rows"][0][0]) == 201
+
+    def test_summary(self, serializer):
+        summary = serializer.summarize(_records(10), ["id", "empreendimento", "valor"])
+        assert summary["valor"] == {"min": 1000, "max": 1009, "sum": 10045, "avg": 1004.5}
+        assert summary["empreendimento"]["distinct"] == 3 and summary["empreendimento"]["top"][0][1] == 4
+        assert summary["id"] == {"min": 0, "max": 9, "sum": 45, "avg": 4.5}
+
+
+@pytest.mark.unit
+class TestBudget:
+    """Outputs fit the tool budget and keep a whole-set summary"""
+
+    def test_small_output_is_complete(self, serializer):
+        text = serializer.serialize("small", {"status": "success", "data": _records(3), "erro": None})
+        payload = json.loads(text)
+        assert len(payload["data"]["rows"]) == 3 and "erro" not in payload
+        assert "rows_omitted" not in payload["data"]
+
+    def test_large_output_is_cut_to_the_budget(self, serializer):
+        text = serializer.serialize("small", {"data": _records(200)})
+        payload = json.loads(text)
+        assert count_tokens(text) <= 400
+        assert 0 < len(payload["data"]["rows"]) < 200
+        assert payload["data"]["rows_omitted"] == 200 - len(payload["data"]["rows"])
+        assert payload["data"]["summary"]["valor"]["sum"] == sum(1000 + i for i in range(200))
+
+    def test_per_tool_budget(self, serializer):
+        text = serializer.serialize("big", {"data": _records(60)})
+        assert len(json.loads(text)["data"]["rows"]) == 60
+
+    def test_stats_track_the_saving(self, serializer):
+        serializer.serialize("small", {"data": _records(200)})
+        stats = serializer.get_stats()["tools"]["small"]
+        assert stats["calls"] == 1 and stats["tokens_out"] < stats["tokens_in"] and stats["ratio"] < 1
+
+
+@pytest.mark.unit
+class TestFullOutput:
+    """Jobs get the complete JSON, also inside worker threads"""
+
+    def test_full_output_skips_table_and_budget(self, serializer):
+        result = {"data": _records(200)}
+        with full_output():
+            assert json.loads(serializer.serialize("small", result)) == json.loads(json.dumps(result))
+        assert "rows" in json.loads(serializer.serialize("small", result))["data"]
+
+    async def test_context_reaches_to_thread(self, serializer):
+        with full_output():
+            text = await asyncio.to_thread(serializer.serialize, "small", {"data": _records(200)})
+        assert len(json.loads(text)["data"]) == 200
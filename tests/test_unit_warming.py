@@ -0,0 +1,198 @@
+"""
+Unit tests for cache warming (recipes per permission tier, triggers, budget)
+"""
+import asyncio
+import uuid
+
+import pytest
+
+from src.agents import agno_agent
+from src.agents.agno_agent import analytics_agent
+from src.agents.cache_manager import conversation_memory
+from src.auth.permissions import build_permissions
+from src.cache.tiered import TieredCache
+from src.cache.warming import CacheWarmer, WARM_FAILED, WARM_FRESH, WARM_WARMED
+
+
+@pytest.fixture
+def warmer():
+    warmer = CacheWarmer(cache=TieredCache(key_prefix=f"warm-{uuid.uuid4().hex[:6]}"))
+    warmer.enabled = True
+    return warmer
+
+
+@pytest.mark.unit
+class TestRecipes:
+    """Access counting and selection"""
+
+    def test_top_recipes_per_tier(self, warmer):
+        warmer.register("kpis", lambda params: None)
+        for _ in range(3):
+            warmer.record("kpis", {"period": "month"}, "nivel:2:COM")
+        warmer.record("kpis", {"period": "week"}, "nivel:2:COM")
+        warmer.record("kpis", {"period": "day"}, "nivel:5:ALL")
+        warmer.record("unregistered", {}, "nivel:5:ALL")
+
+        top = warmer.top_recipes(top_n=1)
+        assert [r["params"]["period"] for r in top["nivel:2:COM"]] == ["month"]
+        assert list(top) == ["nivel:2:COM", "nivel:5:ALL"]
+
+    def test_context_is_not_part_of_the_identity(self, warmer):
+        warmer.record("kpis", {"period": "month"}, "tier:nivel:2:COM", context={"user": {"id": "a"}})
+        warmer.record("kpis", {"period": "month"}, "tier:nivel:2:COM", context={"user": {"id": "b"}})
+        (recipe,) = warmer.recipes.values()
+        assert recipe["context"] == {"user": {"id": "b"}} and recipe["count"] > 1.9
+
+    async def test_warm_passes_context_and_reports_coverage(self, warmer):
+        seen = []
+
+        async def source(params):
+            seen.append(params)
+            return WARM_WARMED if params["ok"] else WARM_FAILED
+
+        warmer.register("src", source)
+        warmer.record("src", {"ok": True}, "t1", context={"user": {"id": "u"}})
+        warmer.record("src", {"ok": False}, "t2")
+        report = await warmer.warm("manual")
+
+        assert {"ok": True, "user": {"id": "u"}} in seen
+        assert report["warmed"] == 1 and report["failed"] == 1 and report["coverage"] == 0.5
+        assert report["tiers"]["t1"]["coverage"] == 1.0
+
+    async def test_budget_skips_remaining_recipes(self, warmer):
+        async def source(params):
+            return WARM_WARMED
+
+        warmer.register("src", source)
+        warmer.budget_seconds = -1
+        warmer.record("src", {"n": 1}, "t")
+        report = await warmer.warm("manual")
+        assert report["skipped_budget"] == 1 and report["warmed"] == 0
+
+
+@pytest.mark.unit
+class TestSchedule:
+    """Startup failure is contained and imports trigger a cycle"""
+
+    async def test_startup_failure_does_not_stop_the_loop(self, warmer, monkeypatch):
+        reasons = []
+
+        async def warm(reason="manual", top_n=None):
+            reasons.append(reason)
+            if reason == "startup":
+                raise RuntimeError("cache down")
+            return {}
+
+        monkeypatch.setattr(warmer, "warm", warm)
+        warmer.interval_seconds = 3600
+        warmer.start()
+        try:
+            await asyncio.sleep(0.01)
+            warmer.notify_data_changed()
+            await asyncio.sleep(0.01)
+            assert reasons == ["startup", "import"]
+            assert not warmer._task.done()
+        finally:
+            warmer._task.cancel()
+
+    async def test_interval_cycle(self, warmer, monkeypatch):
+        reasons = []
+
+        async def warm(reason="manual", top_n=None):
+            reasons.append(reason)
+            return {}
+
+        monkeypatch.setattr(warmer, "warm", warm)
+        warmer.interval_seconds = 0.01
+        warmer.start()
+        try:
+            await asyncio.sleep(0.05)
+            assert reasons[0] == "startup" and "schedule" in reasons
+        finally:
+            warmer._task.cancel()
+
+    def test_notify_without_scheduler_is_a_noop(self, warmer):
+        warmer.notify_data_changed()
+
+
+@pytest.mark.unit
+class TestAgentAnswers:
+    """Agent questions are counted and warmed per tier, not per user"""
+
+    def test_questions_from_one_tier_share_a_recipe(self, monkeypatch, warmer):
+        monkeypatch.setattr(agno_agent, "cache_warmer", warmer)
+        for _ in range(2):
+            user_id = uuid.uuid4()
+            analytics_agent._record_question(user_id, "Quantos  leads?", build_permissions(user_id, 2, "COM"))
+        (recipe,) = warmer.recipes.values()
+        assert recipe["tier"] == "nivel:2:COM"
+        assert recipe["params"] == {"nivel_acesso": 2, "divisao": "COM", "query": "Quantos leads?"}
+
+    async def test_warmed_answer_is_served_to_users_of_the_tier(self, monkeypatch):
+        calls = []
+        query = f"quantas vendas {uuid.uuid4().hex}"
+
+        async def process_query(user_id, query, permissions, **kwargs):
+            calls.append((user_id, permissions["nivel_acesso"], permissions["divisao"]))
+            return {"success": True, "response": "42"}
+
+        monkeypatch.setattr(analytics_agent, "process_query", process_query)
+        params = {"nivel_acesso": 3, "divisao": "FIN", "query": query}
+        assert await analytics_agent._warm_answer(params) == WARM_WARMED
+        assert await analytics_agent._warm_answer(params) == WARM_FRESH
+        assert calls == [("warming:nivel:3:FIN", 3, "FIN")]
+
+        other = build_permissions(uuid.uuid4(), 3, "FIN")
+        assert (await analytics_agent._cached_answer(other, query))["response"] == "42"
+        assert await analytics_agent._cached_answer(build_permissions(uuid.uuid4(), 1, "FIN"), query) is None
+
+    async def test_chat_answer_is_shared_within_the_tier(self, monkeypatch, mock_supabase):
+        calls = []
+        query = f"quantas reservas {uuid.uuid4().hex}"
+
+        async def process_query(user_id, query, permissions, **kwargs):
+            calls.append(user_id)
+            return {"success": True, "response": "7"}
+
+        monkeypatch.setattr(analytics_agent, "process_query", process_query)
+        mock_supabase.mock_data["usuarios"] = {"cargos": {"nivel_acesso": 2}, "divisoes": {"codigo": "COM"}}
+
+        first = await analytics_agent.handle_chat(uuid.uuid4(), query)
+        second = await analytics_agent.handle_chat(uuid.uuid4(), query)
+        assert len(calls) == 1
+        assert "cached" not in first and second["cached"] is True and second["response"] == "7"
+
+    async def test_follow_ups_with_history_are_not_shared(self, monkeypatch, mock_supabase):
+        calls = []
+        query = f"e no mes anterior {uuid.uuid4().hex}?"
+
+        async def process_query(user_id, query, permissions, history=None, **kwargs):
+            calls.append((user_id, [turn["message"] for turn in history]))
+            return {"success": True, "response": f"resposta para {history[-1]['message']}"}
+
+        monkeypatch.setattr(analytics_agent, "process_query", process_query)
+        mock_supabase.mock_data["usuarios"] = {"cargos": {"nivel_acesso": 2}, "divisoes": {"codigo": "COM"}}
+        a, b = uuid.uuid4(), uuid.uuid4()
+        await conversation_memory.save_message(str(a), "quantas vendas em marco?", "10")
+        await conversation_memory.save_message(str(b), "quantos leads em marco?", "99")
+
+        first = await analytics_agent.handle_chat(a, query)
+        second = await analytics_agent.handle_chat(b, query)
+        assert [user for user, _ in calls] == [a, b]
+        assert "cached" not in second and second["response"] == "resposta para quantos leads em marco?"
+        assert first["response"] == "resposta para quantas vendas em marco?"
+
+    async def test_cache_hit_is_recorded_in_the_history(self, monkeypatch, mock_supabase):
+        query = f"quantas unidades {uuid.uuid4().hex}"
+
+        async def process_query(user_id, query, permissions, **kwargs):
+            return {"success": True, "response": "12", "tools_used": ["llm_direct"]}
+
+        monkeypatch.setattr(analytics_agent, "process_query", process_query)
+        mock_supabase.mock_data["usuarios"] = {"cargos": {"nivel_acesso": 2}, "divisoes": {"codigo": "COM"}}
+        await analytics_agent.handle_chat(uuid.uuid4(), query)
+
+        reader = uuid.uuid4()
+        assert (await analytics_agent.handle_chat(reader, query))["cached"] is True
+        (turn,) = await conversation_memory.get_history(str(reader))
+        assert turn["message"] == query and turn["response"] == "12" and turn["metadata"]["cached"] is True